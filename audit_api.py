@@ -3,35 +3,150 @@ server.py
 
 Flask API serving:
 1. /api/audit/run        → runs the potion audit + reconciliation (no CSVs)
+                            ?mode=incremental processes only telemetry/tickets since the last run
+   /api/audit/<table>    → one filtered, sorted page of daily_audit or mismatched_tickets from the
+                            indexed audit snapshot (see audit_index; no rerun per page)
 2. /api/optimization/run → runs the optimized courier/witch scheduling with drain rate, capacity, and market trips
+                            (cached per input fingerprint; ?fresh=1 recomputes; ?validate=1 adds a
+                            "validation" block from replaying the schedule, see schedule_sim)
+   /api/optimization/rolling → one rolling-horizon re-planning tick: keeps committed route prefixes
+                            and witch states between calls, re-plans the rest (see rolling_planner)
+3. /api/jobs             → POST starts either of the above as a background job, GET /api/jobs/<id> polls it,
+                            GET /api/jobs/<id>/events streams partial results (server-sent events)
+4. /api/forecast         → projected level curves per cauldron for what-if scenarios (fill rate +-X%,
+                            collections at given minutes), downsampled (see forecasting)
+5. /metrics              → per-stage span totals (calls, wall / CPU time, items) in Prometheus text format
+
+/api/audit/run and /api/optimization/run(/rolling) take ?timings=1 to add a "timings" block with the
+spans of that request (see instrumentation).
+
+Responses are encoded by json_codec (orjson when installed). Audit tables are lists of
+records; ?tables=columns returns them column-wise instead.
 """
 
-from flask import Flask, jsonify
-import numpy as np
-import math, traceback
+from flask import Flask, Response, jsonify, request, stream_with_context
+import math
+import traceback
+from datetime import datetime, timezone
 from flask_cors import CORS
+from json_codec import dumps, TABLE_FORMATS
 from ttst import run_reconciliation
-from optimized_routes import compute_minimum_witches_with_markets  # ✅ updated import
+from audit_index import PAGE_SIZE, CursorExpired, get_audit_index_store
+from schedule_cache import get_schedule_cache
+from job_queue import JOB_RETRY_AFTER_SEC, JobQueueFull, get_job_store
+from instrumentation import collect, metrics_text
+from rolling_planner import rolling_tick
+from forecasting import FORECAST_HORIZON_MIN, FORECAST_POINTS, FORECAST_STEP_MIN, forecast_curves
+
+JOB_SSE_KEEPALIVE_SEC = 15.0
+MAX_BUDGET_SEC = 30.0         # ?budget is clamped to this (it holds a request or job worker)
 
 app = Flask(__name__)
 CORS(app)
 
 
 # ---------- Helpers ----------
-def make_json_safe(obj):
-    """Convert numpy/pandas/scalar objects to JSON-safe Python types."""
-    if isinstance(obj, dict):
-        return {k: make_json_safe(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [make_json_safe(i) for i in obj]
-    elif isinstance(obj, (np.floating, float)):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return float(obj)
-    elif isinstance(obj, (np.integer, int)):
-        return int(obj)
-    else:
-        return obj
+def json_response(obj, status=200, tables="records"):
+    """Encode obj (NumPy / pandas values included, NaN -> null) straight into a JSON response."""
+    return Response(dumps(obj, tables=tables), status=status, mimetype="application/json")
+
+
+def _tables_arg():
+    tables = request.args.get("tables", "records")
+    if tables not in TABLE_FORMATS:
+        raise ValueError(f"tables must be one of {', '.join(TABLE_FORMATS)}")
+    return tables
+
+
+def build_audit_response(result):
+    """Summary, cauldron status and audit tables of a run_reconciliation() result."""
+    recon = result["reconciliation"]
+    forecasts = result.get("forecasts", {})
+    audit_df = result.get("daily_audit", None)
+    mismatch_df = result.get("mismatched_tickets", None)
+
+    summary = {
+        "detected_events": len(result["events"]),
+        "matches": len(recon["matches"]),
+        "mismatches": len(recon["mismatches"]),
+        "unlogged_drains": len(recon["unmatched_events"]),
+        "ghost_tickets": len(recon["unmatched_tickets"]),
+        "recovered_previous_day": recon.get("recovered_previous_day", 0),
+        "average_fill_rate_per_min": round(result.get("average_fill_rate_per_min", 0.0), 5),
+        "average_drain_rate_per_min": round(result.get("average_drain_rate_per_min", 0.0), 5),
+    }
+
+    daily_audit, mismatched_tickets, total_missing = [], [], 0
+    if audit_df is not None and not audit_df.empty:
+        daily_audit = audit_df
+        total_missing = audit_df[audit_df["type"].isin(
+            ["Unlogged Drain", "Under-reported"]
+        )]["volume"].sum()
+    if mismatch_df is not None and not mismatch_df.empty:
+        mismatched_tickets = mismatch_df.fillna("")
+
+    summary["potentially_missing_potion"] = round(float(total_missing), 2)
+
+    cauldron_status = []
+    for cid, f in forecasts.items():
+        cauldron_status.append({
+            "cauldron_id": cid,
+            "current_level": round(float(f.get("current_level", 0) or 0), 2),
+            "max_volume": round(float(f.get("max_volume", 0) or 0), 2),
+            "fill_rate_per_min": round(float(f.get("fill_rate_per_min", 0) or 0), 5),
+            "drain_rate_per_min": round(float(f.get("drain_rate_per_min", 0) or 0), 5),
+            "time_to_overflow_min": (
+                None if f.get("time_to_overflow_min") is None
+                else round(float(f["time_to_overflow_min"]), 2)
+            ),
+        })
+
+    response = {
+        "summary": summary,
+        "cauldron_status": cauldron_status,
+        "daily_audit": daily_audit,
+        "mismatched_tickets": mismatched_tickets,
+    }
+
+    return response
+
+
+def _flag(value):
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _budget_arg(value):
+    """Seconds from ?budget, clamped to MAX_BUDGET_SEC; ValueError unless a number >= 0."""
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"budget must be a number of seconds, got {value!r}") from None
+    if not math.isfinite(budget) or budget < 0:
+        raise ValueError(f"budget must be a number of seconds, got {value!r}")
+    return min(budget, MAX_BUDGET_SEC)
+
+
+def _limit_arg(value):
+    """Rows per page from ?limit (audit_index clamps it to MAX_PAGE_SIZE); ValueError unless an integer >= 1."""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"limit must be a positive integer, got {value!r}") from None
+    if limit < 1:
+        raise ValueError(f"limit must be a positive integer, got {value!r}")
+    return limit
+
+
+def optimization_kwargs(params):
+    """schedule_cache.schedule() options from query args or a job's params; ValueError if invalid."""
+    kwargs = {"optimize": _flag(params.get("optimize", False))}
+    if params.get("budget") is not None:
+        kwargs["time_budget_sec"] = _budget_arg(params["budget"])
+    if _flag(params.get("fresh", False)):
+        kwargs["max_age"] = 0
+    if _flag(params.get("validate", False)):
+        kwargs["validate"] = True
+    return kwargs
 
 
 # ---------- Routes ----------
@@ -39,77 +154,286 @@ def make_json_safe(obj):
 def run_audit():
     """Run the potion audit pipeline and return everything as JSON (no CSVs)."""
     try:
-        print("\n🔮 Running full potion audit pipeline...")
-        result = run_reconciliation()
-        recon = result["reconciliation"]
-        forecasts = result.get("forecasts", {})
-        audit_df = result.get("daily_audit", None)
-        mismatch_df = result.get("mismatched_tickets", None)
-
-        summary = {
-            "detected_events": len(result["events"]),
-            "matches": len(recon["matches"]),
-            "mismatches": len(recon["mismatches"]),
-            "unlogged_drains": len(recon["unmatched_events"]),
-            "ghost_tickets": len(recon["unmatched_tickets"]),
-            "recovered_previous_day": recon.get("recovered_previous_day", 0),
-            "average_fill_rate_per_min": round(result.get("average_fill_rate_per_min", 0.0), 5),
-            "average_drain_rate_per_min": round(result.get("average_drain_rate_per_min", 0.0), 5),
-        }
+        tables = _tables_arg()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        incremental = request.args.get("mode") == "incremental"
+        print("\n🔮 Running potion audit pipeline" + (" (incremental)..." if incremental else "..."))
+        with collect(_flag(request.args.get("timings", False))) as trace:
+            result = run_reconciliation(incremental=incremental)
+            get_audit_index_store().publish(result)
+            response = build_audit_response(result)
+        if trace is not None:
+            response["timings"] = trace.summary()
+        return json_response(response, tables=tables)
 
-        daily_audit, mismatched_tickets, total_missing = [], [], 0
-        if audit_df is not None and not audit_df.empty:
-            daily_audit = audit_df.to_dict(orient="records")
-            total_missing = audit_df[audit_df["type"].isin(
-                ["Unlogged Drain", "Under-reported"]
-            )]["volume"].sum()
-        if mismatch_df is not None and not mismatch_df.empty:
-            mismatched_tickets = mismatch_df.fillna("").to_dict(orient="records")
-
-        summary["potentially_missing_potion"] = round(float(total_missing), 2)
-
-        cauldron_status = []
-        for cid, f in forecasts.items():
-            cauldron_status.append({
-                "cauldron_id": cid,
-                "current_level": round(float(f.get("current_level", 0) or 0), 2),
-                "max_volume": round(float(f.get("max_volume", 0) or 0), 2),
-                "fill_rate_per_min": round(float(f.get("fill_rate_per_min", 0) or 0), 5),
-                "drain_rate_per_min": round(float(f.get("drain_rate_per_min", 0) or 0), 5),
-                "time_to_overflow_min": (
-                    None if f.get("time_to_overflow_min") is None
-                    else round(float(f["time_to_overflow_min"]), 2)
-                ),
-            })
-
-        response = {
-            "summary": summary,
-            "cauldron_status": cauldron_status,
-            "daily_audit": daily_audit,
-            "mismatched_tickets": mismatched_tickets,
-        }
+    except Exception as e:
+        print("❌ Internal Server Error:", e)
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+def _csv_arg(name):
+    value = request.args.get(name)
+    return None if not value else {v.strip() for v in value.split(",") if v.strip()}
 
-        return jsonify(make_json_safe(response)), 200
 
+@app.route("/api/audit/<table>", methods=["GET"])
+def audit_table(table):
+    """
+    One page of daily_audit or mismatched_tickets from the current audit snapshot.
+    ?cauldron_id=a,b  ?type=<discrepancy type / direction>,...  ?start=&end= (YYYY-MM-DD, inclusive)
+    ?sort=[-]cauldron_id|date|volume  ?limit=<rows>  ?cursor=<next_cursor of the previous page>
+    ?fresh=1 re-runs the audit first.
+    """
+    try:
+        tables = _tables_arg()
+        limit = _limit_arg(request.args.get("limit", PAGE_SIZE))
+        cursor = request.args.get("cursor")
+        store = get_audit_index_store()
+        if cursor:
+            snapshot = store.for_cursor(cursor)
+        else:
+            snapshot = store.current(max_age=0 if _flag(request.args.get("fresh", False)) else None)
+        page = snapshot.page(
+            table,
+            cauldrons=_csv_arg("cauldron_id"),
+            types=_csv_arg("type"),
+            start=request.args.get("start"),
+            end=request.args.get("end"),
+            sort=request.args.get("sort", "cauldron_id"),
+            limit=limit,
+            cursor=cursor,
+        )
+        return json_response(page, tables=tables)
+    except CursorExpired as e:
+        return jsonify({"error": str(e)}), 410
+    except ValueError as e:   # bad filter, sort or cursor
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print("❌ Internal Server Error:", e)
+        print("❌ Audit table error:", e)
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/optimization/run", methods=["GET"])
 def run_optimization():
-    """Run the optimized courier/witch scheduling pipeline (market-aware)."""
+    """
+    Run the optimized courier/witch scheduling pipeline (market-aware).
+    ?optimize=1 improves the greedy schedule with local search; ?budget=<sec> caps its run time
+    (at most MAX_BUDGET_SEC). Results are cached per input fingerprint (see schedule_cache);
+    ?fresh=1 forces a recompute.
+    """
     try:
-        print("\n🧙 Running optimized courier scheduling (market-aware)...")
-        result = compute_minimum_witches_with_markets()
-        return jsonify(make_json_safe(result)), 200
+        kwargs = optimization_kwargs(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        print("\n🧙 Running optimized courier scheduling (market-aware)" + (" + local search..." if kwargs["optimize"] else "..."))
+        with collect(_flag(request.args.get("timings", False))) as trace:
+            result = get_schedule_cache().schedule(**kwargs)
+        if trace is not None:
+            result["timings"] = trace.summary()
+        return json_response(result)
     except Exception as e:
         print("❌ Optimization error:", e)
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/optimization/rolling", methods=["GET"])
+def run_rolling():
+    """
+    One tick of the shared rolling-horizon planner on the current data: commits what the
+    witches are setting out for, re-plans the rest. ?optimize=1 / ?budget=<sec> as for
+    /api/optimization/run (budget = whole tick); ?reset=1 drops the committed plan. Changing
+    them between ticks keeps the committed plan.
+    """
+    try:
+        options = {"optimize": _flag(request.args.get("optimize", False))}
+        if request.args.get("budget") is not None:
+            options["budget_sec"] = _budget_arg(request.args["budget"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with collect(_flag(request.args.get("timings", False))) as trace:
+            result = rolling_tick(reset=_flag(request.args.get("reset", False)), **options)
+        if trace is not None:
+            result["timings"] = trace.summary()
+        return json_response(result)
+    except Exception as e:
+        print("❌ Rolling re-plan error:", e)
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+def _collect_arg(value):
+    """<cauldron_id or *>@<minute>[:<amount>] -> collection dict (no amount = empty it)."""
+    target, _, rest = value.partition("@")
+    at, _, amount = rest.partition(":")
+    if not target or not at:
+        raise ValueError(f"collect must look like <cauldron_id|*>@<minute>[:<amount>], got {value!r}")
+    return {"cauldron_id": None if target == "*" else target, "at_min": float(at),
+            "amount": float(amount) if amount else None}
+
+
+def forecast_scenarios(args):
+    """Scenarios from query args: one per ?fill_rate_pct=a,b,... value, each with all ?collect= entries."""
+    collections = [_collect_arg(v) for v in args.getlist("collect")]
+    pcts = [float(p) for p in (args.get("fill_rate_pct") or "0").split(",") if p.strip()]
+    return [{"name": f"fill {p:+g}%" + (" + collections" if collections else ""),
+             "fill_rate_pct": p, "collections": collections} for p in pcts]
+
+
+@app.route("/api/forecast", methods=["GET", "POST"])
+def forecast():
+    """
+    Projected level curves (cauldron x sample per scenario), with overflow minute, spilled and
+    collected volume per cauldron. ?horizon_min= ?step_min= ?points= ?cauldron_id=a,b
+    GET: ?fill_rate_pct=-10,0,10 ?collect=<cauldron_id|*>@<minute>[:<amount>] (repeatable)
+    POST: {"scenarios": [{"name", "fill_rate_pct", "collections": [{"cauldron_id", "at_min", "amount"}]}]}
+    """
+    try:
+        body = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+        if not isinstance(body, dict):
+            raise ValueError("body must be a JSON object")
+        opts = dict(request.args.items(), **{k: v for k, v in body.items() if k != "scenarios"})
+        scenarios = body["scenarios"] if "scenarios" in body else forecast_scenarios(request.args)
+        cauldrons = _csv_arg("cauldron_id")
+        kwargs = {
+            "horizon_min": float(opts.get("horizon_min", FORECAST_HORIZON_MIN)),
+            "step_min": float(opts.get("step_min", FORECAST_STEP_MIN)),
+            "points": int(opts.get("points", FORECAST_POINTS)),
+            "cauldron_ids": sorted(cauldrons) if cauldrons else None,
+        }
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({"error": f"bad forecast request: {e}"}), 400
+    try:
+        forecasts = get_schedule_cache().current_forecasts()
+        result = forecast_curves(forecasts, scenarios, **kwargs)
+        result["as_of"] = datetime.now(timezone.utc).isoformat()
+        return json_response(result)
+    except ValueError as e:   # invalid scenario
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("❌ Forecast error:", e)
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Span totals since start-up in the Prometheus text exposition format."""
+    return Response(metrics_text(), mimetype="text/plain; version=0.0.4")
+
+
+# ---------- Jobs ----------
+def _audit_job(job):
+    def progress(stage, payload):
+        if stage == "cauldron":
+            job.emit("cauldron", payload, progress=0.8 * payload["done"] / payload["total"],
+                     message=f"analyzed {payload['cauldron_id']}")
+        else:
+            job.emit(stage, payload, progress=0.9, message="tickets matched")
+
+    job.emit("stage", {"stage": "audit"}, message="running audit")
+    result = run_reconciliation(incremental=job.params.get("mode") == "incremental", progress=progress)
+    get_audit_index_store().publish(result)
+    response = build_audit_response(result)
+    job.emit("summary", response["summary"])
+    return response
+
+
+def _optimization_job(job):
+    job.emit("stage", {"stage": "schedule"}, progress=0.05, message="loading inputs and scheduling")
+    result = get_schedule_cache().schedule(**optimization_kwargs(job.params))
+    job.emit("summary", {"num_witches": result["num_witches"], "fleet": result.get("fleet"),
+                         "cache": result.get("cache")})
+    return result
+
+
+JOB_TYPES = {"audit": _audit_job, "optimization": _optimization_job}
+
+
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    """
+    Start an audit or optimization in the background. Body: {"type": "audit" | "optimization",
+    "params": {...}} with the same params as the GET endpoints (query args work too).
+    Returns 202 with the job id and links to poll / stream it, or 503 (with Retry-After)
+    while the job queue is full.
+    """
+    body = request.get_json(silent=True) or {}
+    kind = body.get("type") or request.args.get("type")
+    if kind not in JOB_TYPES:
+        return jsonify({"error": f"unknown job type: {kind}"}), 400
+    params = body.get("params") or {k: v for k, v in request.args.items() if k != "type"}
+    if kind == "optimization":
+        try:
+            optimization_kwargs(params)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    try:
+        job = get_job_store().submit(kind, JOB_TYPES[kind], params)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(JOB_RETRY_AFTER_SEC)}
+    links = {"self": f"/api/jobs/{job.id}", "events": f"/api/jobs/{job.id}/events"}
+    return json_response({**job.summary(), "links": links}, status=202)
+
+
+@app.route("/api/jobs", methods=["GET"])
+def list_jobs():
+    return json_response({"jobs": [j.summary() for j in get_job_store().list()]})
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Job status, progress and (once done) result; ?since=<seq> adds the partial events
+    after seq, ?tables=columns encodes audit tables column-wise.
+    """
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    try:
+        tables = _tables_arg()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    out = job.summary(include_result=True)
+    since = request.args.get("since", type=int)
+    if since is not None:
+        out["partial"] = [{"seq": s, "event": name, "data": data} for s, name, data in job.events_after(since)]
+    return json_response(out, tables=tables)
+
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def stream_job_events(job_id):
+    """Server-sent events with the job's partial results, then an "end" event with its status."""
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    since = request.headers.get("Last-Event-ID", type=int) or request.args.get("since", 0, type=int)
+
+    def generate():
+        seq = since
+        while True:
+            finished = job.finished   # checked first so events emitted before finishing are not missed
+            events = job.events_after(seq, timeout=JOB_SSE_KEEPALIVE_SEC)
+            for s, name, data in events:
+                seq = s
+                yield f"id: {s}\nevent: {name}\ndata: {dumps(data).decode()}\n\n"
+            if finished:
+                end = {k: v for k, v in job.summary().items() if k in ("job_id", "status", "error")}
+                yield f"event: end\ndata: {dumps(end).decode()}\n\n"
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # ---------- Runner ----------
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000, debug=True)
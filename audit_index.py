@@ -0,0 +1,290 @@
+"""
+audit_index.py
+
+Paged, filtered reads of the audit tables (daily_audit, mismatched_tickets) without
+re-running the audit or dumping whole tables:
+- an audit result is computed once and kept as a snapshot for AUDIT_INDEX_TTL_SEC;
+  /api/audit/run and audit jobs publish theirs as well. A table is only indexed when
+  it is first paged, so publishing costs nothing for runs nobody pages
+- each table is split into runs per (discrepancy type, cauldron) with rows in date
+  order, so cauldron / type / date-range filters are a few binary searches
+- every sort order is a global rank per row; pages are keyset-paginated on that rank
+  (an opaque cursor) by merging the runs, so a page costs
+  O(runs * log rows + page size * log runs) however deep it is
+- sorting by volume with a date range: a run whose range holds at least
+  1/VOLUME_SCAN_FACTOR of its rows is scanned in volume order with the range applied
+  (at most VOLUME_SCAN_FACTOR rows read per matching row); a narrower range is cut
+  from the run's date order and sorted by volume, O(m log m) for its m matching rows.
+  Either way a run costs O(matching rows), never O(run length)
+"""
+
+import base64
+import heapq
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ---------- CONFIG ----------
+AUDIT_INDEX_TTL_SEC = 60.0     # reuse an audit snapshot for this long
+AUDIT_SNAPSHOTS_KEPT = 4       # older snapshots stay readable for open cursors
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+TABLES = {                     # table -> (type column, volume column)
+    "daily_audit": ("type", "volume"),
+    "mismatched_tickets": ("direction", "abs_difference"),
+}
+SORTS = ("cauldron_id", "date", "volume")
+VOLUME_SCAN_FACTOR = 4         # see module docstring
+
+
+class CursorError(ValueError):
+    """Cursor is malformed or belongs to another table / sort."""
+
+
+class CursorExpired(CursorError):
+    """The snapshot a cursor was issued from is no longer kept."""
+
+
+def _ranks(order):
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order), dtype=np.int64)
+    return rank
+
+
+def _day_numbers(dates):
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def _day_number(date_str):
+    return None if date_str is None else int(np.datetime64(date_str, "D").astype(np.int64))
+
+
+def encode_cursor(snapshot_id, table, sort, rank):
+    raw = json.dumps([snapshot_id, table, sort, int(rank)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        snapshot_id, table, sort, rank = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return snapshot_id, table, sort, int(rank)
+    except Exception:
+        raise CursorError("malformed cursor")
+
+
+class TableIndex:
+    """One audit table with per-(type, cauldron) runs and a global rank per sort order."""
+
+    def __init__(self, df, type_col, value_col):
+        self.df = df.reset_index(drop=True) if df is not None else pd.DataFrame([])
+        n = len(self.df)
+        self.runs = {}   # (type, cauldron) -> run
+        if n == 0:
+            return
+        rows = np.arange(n)
+        cauldron = self.df["cauldron_id"].to_numpy().astype(str)
+        types = self.df[type_col].to_numpy().astype(str)
+        self.day = _day_numbers(self.df["date"].to_numpy())
+        value = self.df[value_col].to_numpy(dtype=np.float64)
+
+        by_cauldron = np.lexsort((rows, self.day, cauldron))
+        self.rank = {
+            "cauldron_id": _ranks(by_cauldron),
+            "date": _ranks(np.lexsort((rows, cauldron, self.day))),
+            "volume": _ranks(np.lexsort((rows, cauldron, value))),
+        }
+        # (type, cauldron, date, row) order; each (type, cauldron) block is one run
+        order = by_cauldron[np.argsort(types[by_cauldron], kind="stable")]
+        keys = np.char.add(np.char.add(types[order], "\x00"), cauldron[order])
+        bounds = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        for run_rows in np.split(order, bounds):
+            r = run_rows[0]
+            volume_rank = self.rank["volume"][run_rows]
+            by_volume = np.argsort(volume_rank)
+            self.runs[(types[r], cauldron[r])] = {
+                "rows": run_rows,                      # date order
+                "days": self.day[run_rows],
+                "ranks": {"cauldron_id": self.rank["cauldron_id"][run_rows],
+                          "date": self.rank["date"][run_rows],
+                          "volume": volume_rank},
+                "by_volume": run_rows[by_volume],
+                "volume_ranks": volume_rank[by_volume],
+            }
+
+    def __len__(self):
+        return len(self.df)
+
+    def types(self):
+        return sorted({t for t, _ in self.runs})
+
+    def _select_runs(self, cauldrons, types):
+        return [run for (t, c), run in self.runs.items()
+                if (cauldrons is None or c in cauldrons) and (types is None or t in types)]
+
+    def _segments(self, run, sort, start, end):
+        """(ranks, rows, day filter) of a run in ascending rank order for sort."""
+        lo = 0 if start is None else np.searchsorted(run["days"], start, side="left")
+        hi = len(run["rows"]) if end is None else np.searchsorted(run["days"], end, side="right")
+        hi = max(lo, hi)
+        if sort == "volume":
+            n, count = len(run["rows"]), int(hi - lo)
+            if count == n:
+                return run["volume_ranks"], run["by_volume"], None, count
+            if count * VOLUME_SCAN_FACTOR >= n:
+                return run["volume_ranks"], run["by_volume"], (start, end), count
+            by_volume = np.argsort(run["ranks"]["volume"][lo:hi])
+            return run["ranks"]["volume"][lo:hi][by_volume], run["rows"][lo:hi][by_volume], None, count
+        # date order == rank order for the cauldron_id and date sorts
+        return run["ranks"][sort][lo:hi], run["rows"][lo:hi], None, int(hi - lo)
+
+    def _iter_run(self, ranks, rows, day_range, after, descending, max_chunk):
+        if after is not None:
+            cut = np.searchsorted(ranks, after, side="left" if descending else "right")
+            ranks, rows = (ranks[:cut], rows[:cut]) if descending else (ranks[cut:], rows[cut:])
+        if descending:
+            ranks, rows = ranks[::-1], rows[::-1]
+        i, chunk = 0, 4   # most runs contribute only a few rows to a page
+        while i < len(rows):
+            r, w = ranks[i:i + chunk], rows[i:i + chunk]
+            i += chunk
+            chunk = min(2 * chunk, max_chunk)
+            if day_range is not None:
+                keep = np.ones(len(w), dtype=bool)
+                if day_range[0] is not None:
+                    keep &= self.day[w] >= day_range[0]
+                if day_range[1] is not None:
+                    keep &= self.day[w] <= day_range[1]
+                r, w = r[keep], w[keep]
+            yield from zip(r.tolist(), w.tolist())
+
+    def page(self, cauldrons=None, types=None, start=None, end=None, sort="cauldron_id",
+             descending=False, after=None, limit=PAGE_SIZE):
+        """Rows of one page, total matching rows, and the rank of the last row (None = last page)."""
+        if sort not in SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SORTS)} (prefix - for descending)")
+        start, end = _day_number(start), _day_number(end)
+        iters, total = [], 0
+        for run in self._select_runs(cauldrons, types):
+            ranks, rows, day_range, count = self._segments(run, sort, start, end)
+            total += count
+            if count:
+                iters.append(self._iter_run(ranks, rows, day_range, after, descending, limit + 1))
+        merged = heapq.merge(*iters, reverse=descending)
+        picked = list(itertools.islice(merged, limit + 1))
+        more = len(picked) > limit
+        picked = picked[:limit]
+        rows = self.df.iloc[[w for _, w in picked]] if picked else self.df.iloc[0:0]
+        return rows, total, (picked[-1][0] if more else None)
+
+
+class AuditSnapshot:
+    def __init__(self, result):
+        self.id = uuid.uuid4().hex[:12]
+        self.created = time.monotonic()
+        self._frames = {name: result.get(name) for name in TABLES}
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def age(self):
+        return time.monotonic() - self.created
+
+    def table(self, name):
+        """TableIndex of one table, built on first use."""
+        with self._lock:
+            index = self._tables.get(name)
+            if index is None:
+                index = self._tables[name] = TableIndex(self._frames.pop(name), *TABLES[name])
+            return index
+
+    def page(self, table, cauldrons=None, types=None, start=None, end=None, sort="cauldron_id",
+             limit=PAGE_SIZE, cursor=None):
+        """One page of a table as {rows, total, next_cursor, ...}; sort may be prefixed with "-"."""
+        if table not in TABLES:
+            raise ValueError(f"unknown table: {table}")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        descending = sort.startswith("-")
+        key = sort.lstrip("-")
+        after = None
+        if cursor:
+            _, c_table, c_sort, after = decode_cursor(cursor)
+            if (c_table, c_sort) != (table, sort):
+                raise CursorError("cursor belongs to a different table or sort")
+        index = self.table(table)
+        rows, total, last = index.page(cauldrons, types, start, end, key, descending, after, limit)
+        return {
+            "table": table,
+            "rows": rows,
+            "total": total,
+            "limit": limit,
+            "sort": sort,
+            "types": index.types(),
+            "next_cursor": None if last is None else encode_cursor(self.id, table, sort, last),
+            "snapshot": {"id": self.id, "age_sec": round(self.age(), 3)},
+        }
+
+
+class AuditIndexStore:
+    def __init__(self, ttl_sec=AUDIT_INDEX_TTL_SEC, keep=AUDIT_SNAPSHOTS_KEPT):
+        self.ttl_sec = ttl_sec
+        self.keep = keep
+        self._snapshots = OrderedDict()   # id -> AuditSnapshot, newest last
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def publish(self, result):
+        """Index a run_reconciliation() result and make it the current snapshot."""
+        snapshot = AuditSnapshot(result)
+        with self._lock:
+            self._snapshots[snapshot.id] = snapshot
+            while len(self._snapshots) > self.keep:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def _latest(self, max_age):
+        with self._lock:
+            if self._snapshots:
+                snapshot = next(reversed(self._snapshots.values()))
+                if snapshot.age() < max_age:
+                    return snapshot
+        return None
+
+    def current(self, max_age=None):
+        """Latest snapshot younger than max_age (default ttl_sec), running the audit if needed."""
+        max_age = self.ttl_sec if max_age is None else max_age
+        snapshot = self._latest(max_age)
+        if snapshot is not None:
+            return snapshot
+        with self._build_lock:   # concurrent misses share one audit run
+            snapshot = self._latest(max_age)
+            if snapshot is None:
+                from ttst import run_reconciliation
+                snapshot = self.publish(run_reconciliation())
+            return snapshot
+
+    def for_cursor(self, cursor):
+        """Snapshot a cursor was issued from (pages stay consistent while it is kept)."""
+        snapshot_id = decode_cursor(cursor)[0]
+        with self._lock:
+            snapshot = self._snapshots.get(snapshot_id)
+        if snapshot is None:
+            raise CursorExpired("cursor expired; restart from the first page")
+        return snapshot
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_audit_index_store():
+    """Process-wide audit snapshot store used by /api/audit/<table>."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = AuditIndexStore()
+        return _STORE
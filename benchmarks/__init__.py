@@ -0,0 +1 @@
+"""Benchmarks for the audit and scheduling pipelines (run from the repo root: python -m benchmarks.<name>)."""
@@ -0,0 +1,132 @@
+"""
+Response serialization: the old to_dict + make_json_safe + json.dumps path vs. json_codec.
+
+    python -m benchmarks.bench_json --rows 10000,100000
+
+Payloads are an audit response (daily audit + mismatched tickets DataFrames with some
+NaNs) and a schedule with route actions holding NumPy scalars. Reports seconds and
+output size per encoder; all encoders are checked to decode to the same document.
+"""
+
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+import json_codec
+
+
+def make_json_safe(obj):
+    """The recursive converter audit_api used before json_codec."""
+    if isinstance(obj, dict):
+        return {k: make_json_safe(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [make_json_safe(i) for i in obj]
+    elif isinstance(obj, (np.floating, float)):
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+        return float(obj)
+    elif isinstance(obj, (np.integer, int)):
+        return int(obj)
+    else:
+        return obj
+
+
+def audit_payload(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    daily = pd.DataFrame({
+        "date": pd.date_range("2025-01-01", periods=30).strftime("%Y-%m-%d")[rng.integers(0, 30, rows)],
+        "cauldron_id": [f"cauldron_{c:03d}" for c in rng.integers(0, 500, rows)],
+        "type": np.array(["Unlogged Drain", "Over-reported", "Under-reported"])[rng.integers(0, 3, rows)],
+        "volume": rng.uniform(1, 400, rows),
+    })
+    volume = rng.uniform(20, 200, rows)
+    detected = volume + rng.normal(0, 20, rows)
+    detected[rng.random(rows) < 0.05] = np.nan
+    mismatched = pd.DataFrame({
+        "ticket_id": [f"T{i}" for i in range(rows)],
+        "cauldron_id": daily["cauldron_id"],
+        "courier_id": "courier_1",
+        "ticket_volume": volume,
+        "detected_volume": detected,
+        "difference": volume - detected,
+        "abs_difference": np.abs(volume - detected),
+        "direction": np.where(volume > detected, "Over-reported", "Under-reported"),
+    })
+    return {"summary": {"matches": np.int64(rows), "average_fill_rate_per_min": np.float64(0.1234)},
+            "daily_audit": daily, "mismatched_tickets": mismatched}
+
+
+def schedule_payload(actions, seed=0):
+    rng = np.random.default_rng(seed)
+    witches = []
+    for w in range(max(1, actions // 50)):
+        witches.append({"id": f"witch_{w}", "capacity": np.int64(100), "route": [{
+            "action": "collect" if k % 3 else "unload",
+            "cauldron_id": f"cauldron_{int(c):03d}",
+            "amount": np.float64(a),
+            "travel_min": np.float64(t),
+            "arrive_time": f"2025-01-01T{k % 24:02d}:00:00+00:00",
+        } for k, (c, a, t) in enumerate(zip(rng.integers(0, 500, 50), rng.uniform(0, 100, 50),
+                                             rng.uniform(1, 60, 50)))]})
+    return {"num_witches": len(witches), "witches": witches, "slack_min": np.float64(np.inf)}
+
+
+def legacy(payload):
+    """to_dict(orient="records") + make_json_safe + json.dumps (what jsonify did)."""
+    obj = {k: v.to_dict(orient="records") if isinstance(v, pd.DataFrame) else v for k, v in payload.items()}
+    return json.dumps(make_json_safe(obj), separators=(",", ":"), sort_keys=True).encode()
+
+
+def stdlib(payload):
+    orjson, json_codec.orjson = json_codec.orjson, None
+    try:
+        return json_codec.dumps(payload)
+    finally:
+        json_codec.orjson = orjson
+
+
+ENCODERS = {
+    "legacy": legacy,
+    "codec-stdlib": stdlib,
+    "codec": json_codec.dumps,
+    "codec-columns": lambda p: json_codec.dumps(p, tables="columns"),
+}
+
+
+def timed(fn, payload, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(payload)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", default="10000,100000", help="comma-separated table rows / route actions")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    if json_codec.orjson is None:
+        print("orjson not installed: codec / codec-columns use the stdlib fallback")
+
+    print(f"{'payload':>9} {'rows':>8} {'encoder':>14} {'seconds':>8} {'MB':>7} {'speedup':>8}")
+    for n in (int(s) for s in args.rows.split(",")):
+        for name, payload in (("audit", audit_payload(n, args.seed)), ("schedule", schedule_payload(n, args.seed))):
+            base, reference = None, None
+            for enc, fn in ENCODERS.items():
+                dt, out = timed(fn, payload, args.repeat)
+                if enc == "legacy":
+                    base, reference = dt, json.loads(out)
+                elif enc != "codec-columns":
+                    assert json.loads(out) == reference, f"{enc} output differs from legacy"
+                print(f"{name:>9} {n:>8} {enc:>14} {dt:>8.3f} {len(out) / 1e6:>7.1f} {base / dt:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Greedy vs. optimal (assignment-based) ticket reconciliation on synthetic data.
+
+    python -m benchmarks.bench_matching --sizes 10000,100000,1000000
+
+Each cauldron gets a few drains per day; most drains get a ticket with a small
+volume error, some tickets are written against the wrong volume, some drains go
+unlogged and some tickets are ghosts. Reports runtime and match quality per matcher.
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from ttst import match_events_to_tickets
+
+
+def synthetic_events_and_tickets(n_tickets, drains_per_day=4, days=30, unlogged_rate=0.1,
+                                 ghost_rate=0.02, mismatch_rate=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    n_events = int(n_tickets / (1 - unlogged_rate))
+    n_cauldrons = max(1, n_events // (drains_per_day * days))
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    cauldron = rng.integers(0, n_cauldrons, n_events)
+    minute = rng.integers(0, days * 1440, n_events)
+    amount = rng.uniform(20, 200, n_events)
+    events = [{
+        "event_id": f"E{i}",
+        "cauldron_id": f"cauldron_{c:05d}",
+        "time_start": (base + timedelta(minutes=int(m))).isoformat(),
+        "collected_amount": float(a)
+    } for i, (c, m, a) in enumerate(zip(cauldron, minute, amount))]
+
+    logged = np.flatnonzero(rng.random(n_events) >= unlogged_rate)[:n_tickets]
+    noise = rng.normal(0, 2.0, len(logged))
+    wrong = rng.random(len(logged)) < mismatch_rate
+    noise[wrong] += rng.uniform(-60, 60, wrong.sum())
+    # some tickets are dated the day after the drain (late paperwork)
+    late = rng.random(len(logged)) < 0.1
+    tickets = []
+    for k, i in enumerate(logged):
+        day = (base + timedelta(minutes=int(minute[i]))).date() + timedelta(days=int(late[k]))
+        tickets.append({
+            "ticket_id": f"T{k}",
+            "cauldron_id": events[i]["cauldron_id"],
+            "courier_id": "courier_1",
+            "amount_collected": max(0.0, float(amount[i] + noise[k])),
+            "date": day.isoformat()
+        })
+    for k in range(int(len(tickets) * ghost_rate)):
+        c = int(rng.integers(0, n_cauldrons))
+        tickets.append({
+            "ticket_id": f"G{k}",
+            "cauldron_id": f"cauldron_{c:05d}",
+            "courier_id": "courier_2",
+            "amount_collected": float(rng.uniform(20, 200)),
+            "date": (base + timedelta(days=int(rng.integers(0, days)))).date().isoformat()
+        })
+    order = rng.permutation(len(tickets))
+    return events, [tickets[k] for k in order]
+
+
+def quality(recon):
+    paired = np.concatenate([recon["matches"]["volume_delta"], recon["mismatches"]["volume_delta"]])
+    return {
+        "matches": len(recon["matches"]),
+        "mismatches": len(recon["mismatches"]),
+        "ghosts": len(recon["unmatched_tickets"]),
+        "unlogged": len(recon["unmatched_events"]),
+        "total_abs_delta": round(float(paired.sum()), 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated ticket counts")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    print(f"{'tickets':>9} {'strategy':>8} {'seconds':>8} {'matches':>8} {'mismatch':>8} "
+          f"{'ghosts':>7} {'unlogged':>8} {'sum|delta|':>12}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        events, tickets = synthetic_events_and_tickets(n, seed=args.seed)
+        for strategy in ("greedy", "optimal"):
+            t0 = time.perf_counter()
+            recon = match_events_to_tickets(events, tickets, strategy=strategy)
+            dt = time.perf_counter() - t0
+            q = quality(recon)
+            print(f"{n:>9} {strategy:>8} {dt:>8.2f} {q['matches']:>8} {q['mismatches']:>8} "
+                  f"{q['ghosts']:>7} {q['unlogged']:>8} {q['total_abs_delta']:>12}")
+
+
+if __name__ == "__main__":
+    main()
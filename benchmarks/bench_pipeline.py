@@ -0,0 +1,235 @@
+"""
+Runtime and peak memory of the audit and scheduler pipeline stages on synthetic data.
+
+    python -m benchmarks.bench_pipeline --cauldrons 10,100,1000 --days 1,7,30
+    python -m benchmarks.bench_pipeline --preset full --no-memory   # 10..10000 cauldrons, 1..365 days
+    python -m benchmarks.bench_pipeline --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --compare benchmarks/baseline.json
+
+Inputs come from benchmarks.generators (seeded; no live API). Stages per case:
+  ingest    ingest_telemetry on the /api/Data JSON (only up to --json-max-cells readings)
+  audit     process_all: fill rates, drain detection, ticket matching, forecasts
+  match     match_events_to_tickets again on the detected events (each --strategies entry)
+  report    discrepancy_columns + audit_daily_potion_losses + summarize_discrepancies
+  schedule  schedule_witches (cold travel matrix; up to --schedule-max-cauldrons)
+--max-cells / --schedule-max-cauldrons default to the preset's limits; "full" runs every
+case, up to 10000 cauldrons x 365 days (~1e9 readings, 8.4 GB for the level matrix alone,
+so leave out the tracemalloc run there). Seconds are the best of --repeat untraced runs;
+peak MB comes from one extra run under tracemalloc (Python and NumPy allocations). Each stage also records a small result
+fingerprint (counts, totals). --compare fails (exit 1) when a fingerprint changed or a
+stage got slower / bigger than the baseline by more than --tolerance.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+import optimized_routes
+from benchmarks import generators
+from ttst import (
+    ingest_telemetry, process_all, match_events_to_tickets, discrepancy_columns,
+    audit_daily_potion_losses, summarize_discrepancies,
+)
+
+# ---------- CONFIG ----------
+PRESETS = {
+    "quick": {"cauldrons": "10,100,1000", "days": "1,7,30", "max_cells": 2e7, "schedule_max_cauldrons": 2000},
+    "full": {"cauldrons": "10,100,1000,10000", "days": "1,7,30,365", "max_cells": 1.1e9,
+             "schedule_max_cauldrons": 10000},
+}
+SCHEDULE_NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)   # fixed so schedules are reproducible
+TOLERANCE = 0.25        # allowed relative slowdown / memory growth vs. the baseline
+MIN_SECONDS = 0.05      # ...and absolute slack, so tiny stages do not flap
+MIN_MB = 1.0
+
+
+# ---------- Measuring ----------
+def measure(fn, repeat=1, memory=True):
+    """(best seconds, peak MB or None, last result) of fn()."""
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    peak = None
+    if memory:
+        out = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            out = fn()
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+    return best, peak, out
+
+
+def _recon_counts(recon):
+    return {k: len(recon[k]) for k in ("matches", "mismatches", "unmatched_events", "unmatched_tickets")}
+
+
+# ---------- Stages ----------
+def run_case(n_cauldrons, days, args):
+    """[(stage, seconds, peak MB, fingerprint)] for one (cauldrons, days) case; None marks a skipped stage."""
+    case = generators.scenario(n_cauldrons, days, interval_min=args.interval_min, seed=args.seed)
+    telem, tickets, info = case["telemetry"], case["tickets"], case["cauldron_info"]
+    cells = telem["levels"].size
+    rows = []
+
+    def stage(name, fn, fingerprint):
+        seconds, peak, out = measure(fn, args.repeat, not args.no_memory)
+        rows.append((name, seconds, peak, fingerprint(out)))
+        return out
+
+    if cells <= args.json_max_cells:
+        data_json = generators.to_data_json(telem)
+        stage("ingest", lambda: ingest_telemetry(data_json),
+              lambda t: {"rows": len(t["epochs"]), "readings": int(np.count_nonzero(~np.isnan(t["levels"])))})
+        del data_json
+    else:
+        rows.append(("ingest", None, None, None))
+
+    result = stage(
+        "audit",
+        lambda: process_all(api_fetch=False, telemetry=telem, tickets_json=tickets, cauldron_info_json=info),
+        lambda r: dict(_recon_counts(r["reconciliation"]), events=len(r["events"]), drains=case["drains"],
+                       overflowing=sum(f["time_to_overflow_min"] is not None for f in r["forecasts"].values())),
+    )
+    ticket_list = tickets["transport_tickets"]
+    for strategy in args.strategies:
+        stage(f"match:{strategy}", lambda: match_events_to_tickets(result["events"], ticket_list, strategy=strategy),
+              _recon_counts)
+
+    def report():
+        columns = discrepancy_columns(result["reconciliation"])
+        with contextlib.redirect_stdout(io.StringIO()):   # summarize_discrepancies prints its report
+            return audit_daily_potion_losses(result, columns), summarize_discrepancies(result, columns)
+    stage("report", report, lambda out: {"daily_rows": len(out[0]), "loss": round(float(out[0]["volume"].sum()), 1)
+                                         if len(out[0]) else 0.0})
+
+    if n_cauldrons <= args.schedule_max_cauldrons:
+        def schedule():
+            optimized_routes._TRAVEL_MATRICES.clear()   # measure the matrix build too
+            return optimized_routes.schedule_witches(case["network"], info, case["couriers"], result["forecasts"],
+                                                     now=SCHEDULE_NOW)
+        stage("schedule", schedule, lambda s: {"num_witches": s["num_witches"], **s["fleet"]})
+    else:
+        rows.append(("schedule", None, None, None))
+    return rows
+
+
+# ---------- Baseline ----------
+def case_key(stage, n_cauldrons, days):
+    return f"{stage}/c{n_cauldrons}/d{days}"
+
+
+def settings(args):
+    return {"interval_min": args.interval_min, "seed": args.seed}
+
+
+def compare(cases, baseline, tolerance):
+    """Regression messages for cases also present in the baseline."""
+    problems = []
+    for key, cur in cases.items():
+        base = baseline["cases"].get(key)
+        if base is None:
+            continue
+        if cur["result"] != base["result"]:
+            problems.append(f"{key}: result changed {base['result']} -> {cur['result']}")
+        if cur["seconds"] > base["seconds"] * (1 + tolerance) + MIN_SECONDS:
+            problems.append(f"{key}: slower {base['seconds']:.3f}s -> {cur['seconds']:.3f}s")
+        if (cur.get("peak_mb") is not None and base.get("peak_mb") is not None
+                and cur["peak_mb"] > base["peak_mb"] * (1 + tolerance) + MIN_MB):
+            problems.append(f"{key}: more memory {base['peak_mb']:.1f}MB -> {cur['peak_mb']:.1f}MB")
+    return problems
+
+
+def _ints(text):
+    return [int(s) for s in text.split(",") if s.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    ap.add_argument("--cauldrons", help="comma-separated cauldron counts (overrides the preset)")
+    ap.add_argument("--days", help="comma-separated days of history (overrides the preset)")
+    ap.add_argument("--interval-min", type=float, default=5.0, help="minutes between readings")
+    ap.add_argument("--strategies", default="greedy", help="match strategies for the match stage")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    ap.add_argument("--max-cells", type=float, help="skip cases with more readings (cauldrons x steps; default: preset)")
+    ap.add_argument("--json-max-cells", type=float, default=2e6, help="largest case whose JSON ingest is measured")
+    ap.add_argument("--schedule-max-cauldrons", type=int, help="largest case that is scheduled (default: preset)")
+    ap.add_argument("--save-baseline", metavar="PATH")
+    ap.add_argument("--compare", metavar="PATH")
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = ap.parse_args()
+    args.strategies = [s.strip() for s in args.strategies.split(",") if s.strip()]
+    preset = PRESETS[args.preset]
+    sizes = _ints(args.cauldrons or preset["cauldrons"])
+    spans = _ints(args.days or preset["days"])
+    if args.max_cells is None:
+        args.max_cells = preset["max_cells"]
+    if args.schedule_max_cauldrons is None:
+        args.schedule_max_cauldrons = preset["schedule_max_cauldrons"]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != settings(args):
+            sys.exit(f"baseline was recorded with {baseline.get('settings')}, not {settings(args)}")
+
+    run_case(10, 1, args)   # warm-up: lazy imports and first-call costs stay out of the numbers
+    cases = {}
+    print(f"{'stage':>14} {'cauldrons':>9} {'days':>5} {'seconds':>8} {'peak MB':>8}  result")
+    for n in sizes:
+        for d in spans:
+            steps = int(d * 1440 / args.interval_min)
+            if n * steps > args.max_cells:
+                print(f"{'*':>14} {n:>9} {d:>5}  skipped ({n * steps:,} readings > --max-cells)")
+                continue
+            for stage, seconds, peak, fingerprint in run_case(n, d, args):
+                if seconds is None:
+                    print(f"{stage:>14} {n:>9} {d:>5}  skipped (size limit)")
+                    continue
+                mb = "-" if peak is None else f"{peak:.1f}"
+                print(f"{stage:>14} {n:>9} {d:>5} {seconds:>8.3f} {mb:>8}  {fingerprint}")
+                cases[case_key(stage, n, d)] = {"seconds": round(seconds, 4),
+                                                "peak_mb": None if peak is None else round(peak, 2),
+                                                "result": fingerprint}
+
+    if args.save_baseline:
+        doc = {
+            "meta": {"python": platform.python_version(), "numpy": np.__version__,
+                     "machine": platform.machine(), "recorded": datetime.now(timezone.utc).isoformat()},
+            "settings": settings(args),
+            "cases": cases,
+        }
+        with open(args.save_baseline, "w") as f:
+            json.dump(doc, f, indent=1, sort_keys=True)
+        print(f"baseline written to {args.save_baseline} ({len(cases)} cases)")
+    if baseline is not None:
+        problems = compare(cases, baseline, args.tolerance)
+        matched = sum(k in baseline["cases"] for k in cases)
+        for p in problems:
+            print("REGRESSION", p)
+        print(f"compared {matched} cases against {args.compare}: "
+              + ("ok" if not problems else f"{len(problems)} regression(s)"))
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Replay harness for rolling_planner: latency per re-planning tick on synthetic data.
+
+    python -m benchmarks.bench_rolling --cauldrons 200 --hours 6 --interval-min 5
+    python -m benchmarks.bench_rolling --no-optimize --verbose
+
+The clock advances --interval-min per tick. Ground truth is the generated cauldrons
+(benchmarks.bench_sim.forecasts) drained by the actions the planner has committed so
+far, replayed with schedule_sim; each tick's forecasts are that truth at `now` with
+the fill rates perturbed by --fill-noise (relative, per tick), as a re-fitted forecast
+would be. Reported: tick latency (p50 / p95 / max, greedy part separately), the cost
+of a cold greedy re-plan at the same tick, committed / re-planned actions, and the
+overflow over the replay of the rolling plan vs. one plan made at the start and
+never revised.
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+import numpy as np
+
+import schedule_sim
+from benchmarks import generators
+from benchmarks.bench_pipeline import SCHEDULE_NOW
+from benchmarks.bench_sim import forecasts as true_forecasts
+from optimized_routes import schedule_witches
+from rolling_planner import FREEZE_MIN, TICK_BUDGET_SEC, RollingPlanner
+
+
+def executed(actions, until):
+    """Schedule dict (for schedule_sim) of the (courier_id, action) pairs started before `until`."""
+    by_witch = {}
+    for key, a in actions:
+        if schedule_sim.datetime.fromisoformat(a["start"]) < until:
+            by_witch.setdefault(key, []).append(a)
+    return {"simulation_start": SCHEDULE_NOW.isoformat(),
+            "witches": [{"id": k, "capacity": None, "start_node": None, "route": r} for k, r in by_witch.items()]}
+
+
+def levels_at(model, actions, minutes):
+    plan = schedule_sim.compile_schedules([executed(actions, SCHEDULE_NOW + timedelta(minutes=minutes))], model)
+    return schedule_sim.simulate_levels(plan, model, minutes)
+
+
+def observed(truth, model, actions, minutes, noise, rng):
+    level = levels_at(model, actions, minutes)["final_level"][0] if minutes > 0 else model.level0
+    scale = np.maximum(0.0, 1.0 + rng.normal(0.0, noise, len(model.ids)))
+    out = {}
+    for i, cid in enumerate(model.ids):
+        f = truth[cid]
+        rate = f["fill_rate_per_min"] * scale[i]
+        out[cid] = dict(f, current_level=float(level[i]), fill_rate_per_min=rate,
+                        time_to_overflow_min=(f["max_volume"] - level[i]) / rate if rate > 0 else None)
+    return out
+
+
+def pct(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--cauldrons", type=int, default=200)
+    ap.add_argument("--hours", type=float, default=6.0)
+    ap.add_argument("--interval-min", type=float, default=5.0)
+    ap.add_argument("--freeze-min", type=float, default=FREEZE_MIN)
+    ap.add_argument("--budget", type=float, default=TICK_BUDGET_SEC, help="compute budget per tick (seconds)")
+    ap.add_argument("--no-optimize", action="store_true", help="greedy tail re-plans only")
+    ap.add_argument("--fill-noise", type=float, default=0.1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--verbose", action="store_true", help="print every tick")
+    args = ap.parse_args()
+
+    case = generators.scenario(args.cauldrons, 1, seed=args.seed)
+    truth = true_forecasts(case, args.seed)
+    model = schedule_sim.CauldronModel.from_forecasts(truth)
+    rng = np.random.default_rng(args.seed)
+    planner = RollingPlanner(case["network"], case["cauldron_info"], case["couriers"], freeze_min=args.freeze_min,
+                             budget_sec=args.budget, optimize=not args.no_optimize, keep_history=True)
+    replay_min = args.hours * 60
+    n_ticks = int(replay_min // args.interval_min)
+
+    latency, greedy, cold, committed, replanned, static = [], [], [], [], [], None
+    for k in range(n_ticks):
+        minutes = k * args.interval_min
+        now = SCHEDULE_NOW + timedelta(minutes=minutes)
+        fc = observed(truth, model, planner.history, minutes, args.fill_noise, rng)
+        t0 = time.perf_counter()
+        out = planner.tick(fc, now)
+        latency.append(time.perf_counter() - t0)
+        greedy.append(out["rolling"]["greedy_ms"] / 1000)
+        t0 = time.perf_counter()
+        cold_plan = schedule_witches(case["network"], case["cauldron_info"], case["couriers"], fc, now=now)
+        cold.append(time.perf_counter() - t0)
+        if static is None:
+            static = [(w["courier_id"] or f"w{w['id']}", a) for w in out["witches"] for a in w["route"]]
+        committed.append(out["rolling"]["committed_actions"])
+        replanned.append(out["rolling"]["replanned_actions"])
+        if args.verbose:
+            r = out["rolling"]
+            print(f"tick {k:>4} +{minutes:>6.0f}min {r['elapsed_ms']:>8.1f}ms (greedy {r['greedy_ms']:.1f}) "
+                  f"witches {out['num_witches']:>3} committed {r['committed_actions']:>4} "
+                  f"replanned {r['replanned_actions']:>5} cold greedy {cold[-1] * 1000:.1f}ms "
+                  f"({cold_plan['num_witches']} witches)")
+
+    print(f"{n_ticks} ticks, {args.cauldrons} cauldrons, every {args.interval_min:g} min, "
+          f"budget {args.budget:g}s, optimize={not args.no_optimize}")
+    print(f"tick latency    p50 {pct(latency, 50):8.1f}ms  p95 {pct(latency, 95):8.1f}ms  max {pct(latency, 100):8.1f}ms")
+    print(f"  greedy part   p50 {pct(greedy, 50):8.1f}ms  p95 {pct(greedy, 95):8.1f}ms  max {pct(greedy, 100):8.1f}ms")
+    print(f"cold greedy     p50 {pct(cold, 50):8.1f}ms  p95 {pct(cold, 95):8.1f}ms  max {pct(cold, 100):8.1f}ms")
+    print(f"actions/tick    committed {np.mean(committed):.1f}  re-planned {np.mean(replanned):.1f}")
+    for name, actions in (("rolling", planner.history), ("static", static)):
+        lv = levels_at(model, actions, replay_min)
+        print(f"{name:>8}: {int((lv['spilled'][0] > schedule_sim.EPS).sum())} cauldrons overflowed, "
+              f"spilled {lv['spilled'][0].sum():.1f}, collected {lv['collected'][0].sum():.1f}, "
+              f"witches {len({k for k, _ in actions})}")
+
+
+if __name__ == "__main__":
+    main()
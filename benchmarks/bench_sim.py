@@ -0,0 +1,79 @@
+"""
+Throughput of schedule_sim: candidate schedules scored per second.
+
+    python -m benchmarks.bench_sim --cauldrons 50,200,1000 --candidates 1000
+
+Per case a greedy schedule_witches() schedule on benchmarks.generators inputs is
+jittered into --candidates variants (collection starts shifted by up to --jitter-min
+minutes, as a local search would propose them). Reported: schedules/s for compiling
+the schedule dicts into one Plan, for simulate() on that Plan, and both together.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import schedule_sim
+from benchmarks import generators
+from benchmarks.bench_pipeline import SCHEDULE_NOW
+from optimized_routes import get_travel_matrix, schedule_witches
+
+
+def forecasts(case, seed=0):
+    rng = np.random.default_rng(seed + 4)
+    out = {}
+    for c in case["cauldron_info"]:
+        fill = float(rng.uniform(0.05, 0.5))
+        level = float(rng.uniform(0.2, 0.9)) * c["max_volume"]
+        out[c["id"]] = {"current_level": level, "max_volume": c["max_volume"], "fill_rate_per_min": fill,
+                        "drain_rate_per_min": float(rng.uniform(5, 15)),
+                        "time_to_overflow_min": (c["max_volume"] - level) / fill}
+    return out
+
+
+def jittered(plan, n, jitter_min, seed=0):
+    """n copies of a one-schedule Plan with collection times shifted at random."""
+    rng = np.random.default_rng(seed)
+    rows, W = len(plan), len(plan.witch_capacity)
+    shift = np.where(plan.kind == schedule_sim.COLLECT, rng.uniform(-jitter_min, jitter_min, (n, rows)), 0.0)
+    tile = lambda a: np.tile(a, n)
+    return schedule_sim.Plan(
+        n, np.repeat(np.arange(n), rows), tile(plan.witch) + np.repeat(np.arange(n) * W, rows), tile(plan.kind),
+        tile(plan.node), tile(plan.cauldron), (plan.start + shift).ravel(), (plan.end + shift).ravel(),
+        tile(plan.amount), tile(plan.travel), tile(plan.witch_capacity), tile(plan.witch_start_node),
+        np.repeat(np.arange(n), W), clock0=np.repeat(plan.clock0, n))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--cauldrons", default="50,200,1000")
+    ap.add_argument("--candidates", type=int, default=1000)
+    ap.add_argument("--jitter-min", type=float, default=10.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    print(f"{'cauldrons':>9} {'actions':>8} {'compile/s':>10} {'simulate/s':>11} {'total/s':>9}  best / worst spill")
+    for n in [int(s) for s in args.cauldrons.split(",") if s.strip()]:
+        case = generators.scenario(n, 1, seed=args.seed)
+        fc = forecasts(case, args.seed)
+        schedule = schedule_witches(case["network"], case["cauldron_info"], case["couriers"], fc, now=SCHEDULE_NOW)
+        model = schedule_sim.CauldronModel.from_forecasts(fc)
+        matrix = get_travel_matrix(case["network"]).for_markets(schedule["market_nodes"])
+
+        t0 = time.perf_counter()
+        schedule_sim.compile_schedules([schedule] * args.candidates, model, matrix)
+        compile_s = time.perf_counter() - t0
+        plan = jittered(schedule_sim.compile_schedules([schedule], model, matrix), args.candidates,
+                        args.jitter_min, args.seed)
+        t0 = time.perf_counter()
+        out = schedule_sim.simulate(plan, model, matrix)
+        simulate_s = time.perf_counter() - t0
+        spill = out["schedules"]["spilled"]
+        k = args.candidates
+        print(f"{n:>9} {len(plan) // k:>8} {k / compile_s:>10.0f} {k / simulate_s:>11.0f} "
+              f"{k / (compile_s + simulate_s):>9.0f}  {spill.min():.1f} / {spill.max():.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Seeded synthetic inputs for the audit and scheduler benchmarks (no live API needed).
+
+- telemetry(): columnar level series (ingest_telemetry shape) with per-cauldron fill
+  rates, drains lasting a few readings, Gaussian noise, missing readings and outages
+- tickets(): transport tickets for the generated drains with controlled unlogged,
+  mismatch, next-day and ghost rates
+- network() / couriers(): road network (k nearest neighbours plus a road to the
+  nearest market, optionally with rush-hour travel_time_profile) and a courier fleet
+  in the /api/Information shapes
+- scenario() bundles all of them; to_data_json() renders telemetry as an /api/Data payload
+
+Each part draws from its own numpy Generator derived from the seed, so a seed
+reproduces a case exactly.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# ---------- CONFIG ----------
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+US_PER_MIN = 60 * 1_000_000
+BLOCK_CELLS = 1 << 22         # random draws over the level matrix are made this many cells at a time
+
+
+def _row_blocks(steps, n_cols):
+    """Row ranges of about BLOCK_CELLS cells; drawing them in order gives the same stream as one draw."""
+    rows = max(1, BLOCK_CELLS // max(1, n_cols))
+    return [(r, min(r + rows, steps)) for r in range(0, steps, rows)]
+
+
+def cauldron_ids(n):
+    return [f"cauldron_{i:05d}" for i in range(n)]
+
+
+# ---------- Telemetry ----------
+def telemetry(n_cauldrons, days, interval_min=5, drains_per_day=2.0, noise=0.05, gap_rate=0.01,
+              outages_per_day=0.05, seed=0):
+    """
+    Level matrix (time x cauldron) plus the drains that produced it:
+    {"telemetry": {epochs, cauldron_ids, levels}, "max_volume": (C,), "drains": {...}}.
+    drains holds cauldron, start / end epoch-us and amount arrays (ground truth).
+    """
+    rng = np.random.default_rng(seed)
+    steps = int(days * 1440 / interval_min)
+    ids = cauldron_ids(n_cauldrons)
+    rate = rng.uniform(0.05, 0.5, n_cauldrons)                      # per minute
+    daily_fill = rate * 1440
+
+    # the level matrix is the only full-size array: noise, cumsum and gaps work on it in place
+    inc = np.empty((steps, n_cauldrons))
+    inc[:] = rate * interval_min
+    for r0, r1 in _row_blocks(steps, n_cauldrons):
+        inc[r0:r1] += noise * rng.standard_normal((r1 - r0, n_cauldrons))
+
+    # drains: a roughly daily fill's worth split over drains_per_day, each over a few readings
+    counts = rng.poisson(drains_per_day * days, n_cauldrons)
+    d_cauldron = np.repeat(np.arange(n_cauldrons), counts)
+    n_drains = len(d_cauldron)
+    d_len = rng.integers(2, 7, n_drains)                           # readings
+    d_start = rng.integers(1, max(2, steps - 7), n_drains)
+    d_amount = daily_fill[d_cauldron] / drains_per_day * rng.uniform(0.6, 1.2, n_drains)
+    # drop drains of the same cauldron less than an hour apart (keeps the ground truth unambiguous)
+    order = np.lexsort((d_start, d_cauldron))
+    d_cauldron, d_len, d_start, d_amount = d_cauldron[order], d_len[order], d_start[order], d_amount[order]
+    same = d_cauldron[1:] == d_cauldron[:-1]
+    keep = np.ones(n_drains, dtype=bool)
+    keep[1:] = ~(same & (d_start[1:] <= d_start[:-1] + d_len[:-1] + max(1, int(60 / interval_min))))
+    d_cauldron, d_len, d_start, d_amount = d_cauldron[keep], d_len[keep], d_start[keep], d_amount[keep]
+    rows = np.repeat(d_start, d_len) + (np.arange(d_len.sum()) - np.repeat(np.cumsum(d_len) - d_len, d_len))
+    np.add.at(inc, (rows, np.repeat(d_cauldron, d_len)), -np.repeat(d_amount / d_len, d_len))
+
+    levels = np.cumsum(inc, axis=0, out=inc)
+    levels += daily_fill                                            # start with about a day's fill
+    np.maximum(levels, 0.0, out=levels)
+    max_volume = np.ceil(levels.max(axis=0) * rng.uniform(1.05, 1.3, n_cauldrons)) if steps else daily_fill
+
+    # missing readings and outages
+    for r0, r1 in _row_blocks(steps, n_cauldrons):
+        block = levels[r0:r1]
+        block[rng.random(block.shape) < gap_rate] = np.nan
+    n_out = rng.poisson(outages_per_day * days * n_cauldrons)
+    o_start = rng.integers(0, max(1, steps), n_out)
+    o_len = rng.integers(5, 60, n_out)
+    o_col = rng.integers(0, n_cauldrons, n_out)
+    for s, n, c in zip(o_start.tolist(), o_len.tolist(), o_col.tolist()):
+        levels[s:s + n, c] = np.nan
+
+    t0 = int(START.timestamp()) * 1_000_000
+    epochs = t0 + np.arange(steps, dtype=np.int64) * int(interval_min * US_PER_MIN)
+    return {
+        "telemetry": {"epochs": epochs, "cauldron_ids": ids, "levels": levels},
+        "max_volume": max_volume,
+        "drains": {
+            "cauldron": d_cauldron,
+            "start_us": epochs[d_start],
+            "end_us": epochs[np.minimum(d_start + d_len, steps - 1)],
+            "amount": d_amount,
+        },
+    }
+
+
+def to_data_json(telem):
+    """Columnar telemetry as an /api/Data payload (missing readings are left out)."""
+    ids = telem["cauldron_ids"]
+    out = []
+    for us, row in zip(telem["epochs"].tolist(), telem["levels"].tolist()):
+        ts = (START + timedelta(microseconds=us - int(START.timestamp()) * 1_000_000)).isoformat()
+        out.append({"timestamp": ts.replace("+00:00", "Z"),
+                    "cauldron_levels": {c: v for c, v in zip(ids, row) if v == v}})
+    return out
+
+
+def cauldron_info(ids, max_volume):
+    return [{"id": c, "max_volume": float(v)} for c, v in zip(ids, max_volume.tolist())]
+
+
+# ---------- Tickets ----------
+def tickets(drains, ids, unlogged_rate=0.1, mismatch_rate=0.05, next_day_rate=0.1, ghost_rate=0.02,
+            seed=0):
+    """
+    One ticket per logged drain: amount within 1% of the drain, or off by 20-50% for
+    mismatch_rate of them; next_day_rate are dated the day after the drain, and
+    ghost_rate * (logged drains) tickets have no drain at all.
+    """
+    rng = np.random.default_rng(seed + 1)
+    n = len(drains["amount"])
+    logged = np.flatnonzero(rng.random(n) >= unlogged_rate)
+    amount = drains["amount"][logged] * (1 + rng.normal(0, 0.01, len(logged)))
+    off = rng.random(len(logged)) < mismatch_rate
+    amount[off] *= rng.choice([-1, 1], off.sum()) * rng.uniform(0.2, 0.5, off.sum()) + 1
+    day = drains["start_us"][logged] // (86_400 * 1_000_000)
+    day = day + (rng.random(len(logged)) < next_day_rate)
+    cauldron = drains["cauldron"][logged]
+
+    n_ghost = int(ghost_rate * len(logged))
+    if n_ghost and len(day):
+        cauldron = np.append(cauldron, rng.integers(0, len(ids), n_ghost))
+        day = np.append(day, rng.integers(day.min(), day.max() + 1, n_ghost))
+        amount = np.append(amount, rng.uniform(20, 200, n_ghost))
+    order = rng.permutation(len(day))
+    dates = np.datetime_as_string(day[order].astype("datetime64[D]")).tolist()
+    return {"transport_tickets": [
+        {"ticket_id": f"T{i:08d}", "cauldron_id": ids[c], "courier_id": f"courier_{c % 7}",
+         "amount_collected": round(a, 3), "date": d}
+        for i, (c, a, d) in enumerate(zip(cauldron[order].tolist(), amount[order].tolist(), dates))
+    ]}
+
+
+# ---------- Network / fleet ----------
+def network(ids, n_markets=None, k=4, seed=0, chunk=1024, rush_hour=0.0, buckets=24):
+    """
+    Directed edge list over cauldrons + markets; travel minutes grow with distance.
+    rush_hour > 0 adds a travel_time_profile of `buckets` slices per edge, slowed by
+    up to that fraction (times a per-edge factor in 0.5-1.5) around 08:00 and 17:00 UTC.
+    """
+    rng = np.random.default_rng(seed + 2)
+    n_markets = n_markets or max(1, len(ids) // 200)
+    nodes = list(ids) + [f"market_{i:03d}" for i in range(n_markets)]
+    pos = rng.random((len(nodes), 2))
+    markets = np.arange(len(ids), len(nodes))
+    k = min(k, len(nodes) - 1)
+    src, dst = [], []
+    for lo in range(0, len(nodes), chunk):
+        d = ((pos[lo:lo + chunk, None, :] - pos[None, :, :]) ** 2).sum(-1)
+        d[np.arange(d.shape[0]), np.arange(lo, lo + d.shape[0])] = np.inf
+        near = np.argpartition(d, k - 1, axis=1)[:, :k] if k > 0 else np.empty((d.shape[0], 0), int)
+        src.append(np.repeat(np.arange(lo, lo + d.shape[0]), k))
+        dst.append(near.ravel())
+        # every cauldron gets a road to its nearest market, which keeps the graph connected
+        rows = np.arange(d.shape[0])[lo + np.arange(d.shape[0]) < len(ids)]
+        src.append(lo + rows)
+        dst.append(markets[np.argmin(d[rows][:, markets], axis=1)])
+    src, dst = np.concatenate(src), np.concatenate(dst)
+    src, dst = np.concatenate([src, dst, markets[:-1]]), np.concatenate([dst, src, markets[1:]])
+    minutes = np.round(5 + 60 * np.sqrt(((pos[src] - pos[dst]) ** 2).sum(-1)), 1)
+    pairs = {}
+    for a, b, t in zip(src.tolist(), dst.tolist(), minutes.tolist()):
+        pairs[(a, b)] = t
+        pairs.setdefault((b, a), t)
+    edges = [{"from": nodes[a], "to": nodes[b], "travel_time_minutes": t} for (a, b), t in pairs.items()]
+    if rush_hour > 0:
+        hour = (np.arange(buckets) + 0.5) * 24 / buckets
+        peak = np.exp(-0.5 * ((hour - 8) / 1.5) ** 2) + np.exp(-0.5 * ((hour - 17) / 1.5) ** 2)
+        slow = 1 + rush_hour * rng.uniform(0.5, 1.5, (len(edges), 1)) * peak
+        for e, f in zip(edges, slow.tolist()):
+            e["travel_time_profile"] = [round(e["travel_time_minutes"] * x, 1) for x in f]
+    return {"edges": edges}
+
+
+def couriers(n_cauldrons, seed=0):
+    rng = np.random.default_rng(seed + 3)
+    n = max(2, n_cauldrons // 20)
+    return [{"courier_id": f"courier_{i}", "max_carrying_capacity": int(c)}
+            for i, c in enumerate(rng.choice([100, 150, 200, 300], n))]
+
+
+def scenario(n_cauldrons, days, interval_min=5, seed=0, rush_hour=0.0, **ticket_rates):
+    """All inputs of one benchmark case (rush_hour: see network())."""
+    t = telemetry(n_cauldrons, days, interval_min=interval_min, seed=seed)
+    ids = t["telemetry"]["cauldron_ids"]
+    return {
+        "telemetry": t["telemetry"],
+        "cauldron_info": cauldron_info(ids, t["max_volume"]),
+        "tickets": tickets(t["drains"], ids, seed=seed, **ticket_rates),
+        "drains": len(t["drains"]["amount"]),
+        "network": network(ids, seed=seed, rush_hour=rush_hour),
+        "couriers": couriers(n_cauldrons, seed=seed),
+    }
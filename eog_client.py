@@ -0,0 +1,155 @@
+"""
+eog_client.py
+
+Shared HTTP client for the EOG hackathon endpoints, used by both ttst and optimized_routes:
+- one pooled requests.Session (keep-alive across calls and threads)
+- concurrent fan-out to several endpoints (thread pool)
+- per-URL TTL cache with ETag / Last-Modified revalidation (304 reuses the cached body);
+  the raw body is cached and decoded per call, so callers may mutate what they get
+- with_version=True also returns a version per body (digest of the cached bytes), which
+  stays the same while the body is cached or revalidated; memoizing callers key on it
+- concurrent requests for the same URL share a single download
+
+Point EOG_API_BASE at a local stub server to run everything offline.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import span
+
+# ---------- CONFIG ----------
+API_BASE = os.environ.get("EOG_API_BASE", "https://hackutd2025.eog.systems").rstrip("/")
+REQUEST_HEADERS = {"Accept": "application/json"}
+REQUEST_TIMEOUT_SEC = 30
+CACHE_TTL_SEC = 30.0          # serve cached bodies without revalidating for this long
+POOL_SIZE = 8                 # pooled connections per host / fan-out threads
+
+
+class _CacheEntry:
+    __slots__ = ("content", "version", "etag", "last_modified", "fetched_at")
+
+    def __init__(self, content, etag, last_modified, fetched_at):
+        self.content = content
+        self.version = hashlib.sha1(content).hexdigest()
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+
+class EOGClient:
+    def __init__(self, base_url=API_BASE, ttl_sec=CACHE_TTL_SEC, pool_size=POOL_SIZE,
+                 timeout=REQUEST_TIMEOUT_SEC):
+        self.base_url = base_url.rstrip("/")
+        self.ttl_sec = ttl_sec
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(REQUEST_HEADERS)
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._url_locks = {}
+
+    def url(self, path_or_url):
+        if path_or_url.startswith(("http://", "https://")):
+            return path_or_url
+        return f"{self.base_url}/{path_or_url.lstrip('/')}"
+
+    def _url_lock(self, url):
+        with self._lock:
+            lock = self._url_locks.get(url)
+            if lock is None:
+                lock = self._url_locks[url] = threading.Lock()
+            return lock
+
+    def fetch_json(self, path_or_url, params=None, max_age=None, with_version=False):
+        """
+        GET a JSON document, served from cache while younger than max_age (default ttl_sec).
+        with_version=True returns (body, version); version changes only with the body bytes.
+        """
+        url = self.url(path_or_url)
+        if params:
+            url = requests.Request("GET", url, params=params).prepare().url
+        max_age = self.ttl_sec if max_age is None else max_age
+
+        with self._url_lock(url):
+            entry = self._cache.get(url)
+            now = time.monotonic()
+            if entry is not None and now - entry.fetched_at < max_age:
+                return self._decode(entry, with_version)
+
+            headers = {}
+            if entry is not None:
+                if entry.etag:
+                    headers["If-None-Match"] = entry.etag
+                if entry.last_modified:
+                    headers["If-Modified-Since"] = entry.last_modified
+            r = self.session.get(url, headers=headers, timeout=self.timeout)
+            if r.status_code == 304 and entry is not None:
+                entry.fetched_at = now
+                return self._decode(entry, with_version)
+            r.raise_for_status()
+            body = r.json()
+            entry = self._cache[url] = _CacheEntry(r.content, r.headers.get("ETag"),
+                                                   r.headers.get("Last-Modified"), now)
+            return (body, entry.version) if with_version else body
+
+    @staticmethod
+    def _decode(entry, with_version):
+        body = json.loads(entry.content)
+        return (body, entry.version) if with_version else body
+
+    def fetch_all(self, *paths_or_urls, max_age=None, with_version=False):
+        """
+        Fetch several endpoints concurrently; results come back in argument order.
+        with_version=True returns (bodies, versions).
+        """
+        def fetch(u):
+            return self.fetch_json(u, max_age=max_age, with_version=with_version)
+
+        with span("fetch", items=len(paths_or_urls)):
+            if len(paths_or_urls) <= 1:
+                results = [fetch(u) for u in paths_or_urls]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.pool_size, len(paths_or_urls))) as pool:
+                    results = list(pool.map(fetch, paths_or_urls))
+        if with_version:
+            return [b for b, _ in results], [v for _, v in results]
+        return results
+
+    def invalidate(self, path_or_url=None):
+        with self._lock:
+            if path_or_url is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(self.url(path_or_url), None)
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client():
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = EOGClient()
+        return _CLIENT
+
+
+def fetch_json(url, params=None, max_age=None, with_version=False):
+    return get_client().fetch_json(url, params=params, max_age=max_age, with_version=with_version)
+
+
+def fetch_all(*urls, max_age=None, with_version=False):
+    return get_client().fetch_all(*urls, max_age=max_age, with_version=with_version)
@@ -0,0 +1,173 @@
+"""
+event_store.py
+
+Compact storage for detected drain events:
+- one NumPy structured array (EVENT_DTYPE, 68 bytes per event) instead of a 10-key
+  dict holding a UUID and two ISO strings per event
+- event ids are row numbers; cauldrons are integer codes into cauldron_ids
+- timestamps stay int64 epoch microseconds; dicts with ISO strings are only produced
+  when events are handed out (to_dict / iteration), i.e. at the API boundary
+- appends go into one buffer that grows by doubling, so array is always a view
+- EventSet is a subset of a store by id (e.g. the unmatched events) sharing its arrays
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# ---------- CONFIG ----------
+EVENT_DTYPE = np.dtype([
+    ("cauldron", np.int32),
+    ("start_us", np.int64),
+    ("end_us", np.int64),
+    ("start_level", np.float64),
+    ("end_level", np.float64),
+    ("raw_drop", np.float64),
+    ("duration_min", np.float64),
+    ("fill_during", np.float64),
+    ("collected_amount", np.float64),
+])
+US_PER_DAY = 86_400 * 1_000_000
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_FLOAT_FIELDS = ("start_level", "end_level", "raw_drop", "duration_min", "fill_during", "collected_amount")
+
+
+def _iso(us):
+    return (_EPOCH + timedelta(microseconds=int(us))).isoformat()
+
+
+def parse_timestamps_us(timestamps, errors="coerce"):
+    """Bulk-parse ISO timestamps to int64 epoch microseconds (UTC); returns (epochs, valid_mask)."""
+    parsed = pd.to_datetime(pd.Series(timestamps, dtype=object), utc=True, errors=errors, format="ISO8601")
+    valid = parsed.notna().to_numpy()
+    epochs = parsed[valid].to_numpy(dtype="datetime64[us]").astype(np.int64)
+    return epochs, valid
+
+
+def runs_chunk(runs):
+    """EVENT_DTYPE rows for one cauldron's drain runs (ttst.drain_runs arrays); cauldron left at 0."""
+    chunk = np.zeros(len(runs["start_epoch"]), dtype=EVENT_DTYPE)
+    chunk["start_us"] = runs["start_epoch"]
+    chunk["end_us"] = runs["end_epoch"]
+    for name in _FLOAT_FIELDS[:-1]:
+        chunk[name] = runs[name]
+    chunk["collected_amount"] = runs["collected"]
+    return chunk
+
+
+class EventStore:
+    """Append-only columnar drain events; ids are row numbers in detection order."""
+
+    def __init__(self):
+        self.cauldron_ids = []
+        self._codes = {}
+        self._buf = np.zeros(0, dtype=EVENT_DTYPE)
+        self._n = 0
+
+    @classmethod
+    def from_records(cls, events):
+        """Store for a list of event dicts (as produced by ttst.detect_drain_events)."""
+        store = cls()
+        store.append_records(events)
+        return store
+
+    def code(self, cauldron_id):
+        c = self._codes.get(cauldron_id)
+        if c is None:
+            c = self._codes[cauldron_id] = len(self.cauldron_ids)
+            self.cauldron_ids.append(cauldron_id)
+        return c
+
+    def _append(self, chunk):
+        first, n = self._n, len(chunk)
+        if first + n > len(self._buf):
+            grown = np.zeros(max(2 * len(self._buf), first + n, 1024), dtype=EVENT_DTYPE)
+            grown[:first] = self._buf[:first]
+            self._buf = grown
+        self._buf[first:first + n] = chunk
+        self._n += n
+        return range(first, first + n)
+
+    def append_runs(self, cauldron_id, runs):
+        """Add one cauldron's drain runs (ttst.drain_runs arrays); returns their ids."""
+        return self.append_chunk(cauldron_id, runs_chunk(runs))
+
+    def append_chunk(self, cauldron_id, chunk):
+        """Add EVENT_DTYPE rows of one cauldron (e.g. built in a worker process); returns their ids."""
+        chunk = np.array(chunk, dtype=EVENT_DTYPE)
+        chunk["cauldron"] = self.code(cauldron_id)
+        return self._append(chunk)
+
+    def append_records(self, events):
+        """Add event dicts; missing fields become NaN (levels, volumes) or time_start (time_end)."""
+        chunk = np.empty(len(events), dtype=EVENT_DTYPE)
+        if len(events):
+            chunk["cauldron"] = [self.code(e["cauldron_id"]) for e in events]
+            chunk["start_us"] = parse_timestamps_us([e["time_start"] for e in events], errors="raise")[0]
+            chunk["end_us"] = parse_timestamps_us([e.get("time_end") or e["time_start"] for e in events],
+                                                  errors="raise")[0]
+            for name in _FLOAT_FIELDS:
+                chunk[name] = [e.get(name, np.nan) for e in events]
+        return self._append(chunk)
+
+    @property
+    def array(self):
+        """All events as one structured array (a view of the buffer)."""
+        return self._buf[:self._n]
+
+    def __len__(self):
+        return self._n
+
+    def days(self, ids=None):
+        """UTC epoch day of each event's start."""
+        start = self.array["start_us"] if ids is None else self.array["start_us"][ids]
+        return start // US_PER_DAY
+
+    def cauldrons(self, ids=None):
+        """Cauldron id strings (object array) of the given events."""
+        codes = self.array["cauldron"] if ids is None else self.array["cauldron"][ids]
+        return np.asarray(self.cauldron_ids, dtype=object)[codes]
+
+    def to_dict(self, event_id):
+        row = self.array[event_id]
+        event = {
+            "event_id": int(event_id),
+            "cauldron_id": self.cauldron_ids[row["cauldron"]],
+            "time_start": _iso(row["start_us"]),
+            "time_end": _iso(row["end_us"]),
+        }
+        for name in _FLOAT_FIELDS:
+            event[name] = float(row[name])
+        return event
+
+    def records(self, ids=None):
+        """Event dicts (ISO timestamps) for the given ids, all events by default."""
+        return [self.to_dict(i) for i in (range(len(self)) if ids is None else ids)]
+
+    def __iter__(self):
+        return iter(self.records())
+
+    def subset(self, ids):
+        return EventSet(self, ids)
+
+    def view(self):
+        """Read-only store of the events so far, sharing their rows; later appends are not seen."""
+        view = EventStore()
+        view.cauldron_ids, view._codes = list(self.cauldron_ids), dict(self._codes)
+        view._buf, view._n = self._buf, self._n
+        return view
+
+
+class EventSet:
+    """Events of a store selected by id; iterates as dicts like the store."""
+
+    def __init__(self, store, ids):
+        self.store = store
+        self.ids = np.asarray(ids, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.store.records(self.ids.tolist()))
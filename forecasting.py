@@ -0,0 +1,198 @@
+"""
+forecasting.py
+
+Projected cauldron level curves for the dashboard and the planners, built on the
+process_all "forecasts" dict (current level, max volume, fill rate per cauldron):
+- every cauldron x horizon step x scenario is computed in one (S, C, T) array
+  operation per collection slot instead of one scalar time_to_overflow per cauldron
+- a scenario scales the fill rates (fill_rate_pct=+10 -> 10% faster) and/or empties
+  cauldrons at given minutes (collections; instantaneous, optionally a fixed amount)
+- levels are clipped to [0, max_volume]; overflow time and spilled volume within the
+  horizon are exact (piecewise linear), not read off the grid
+- curves are downsampled to at most `points` samples, each with the bucket peak, so a
+  short spike between two samples is not lost
+"""
+
+import math
+
+import numpy as np
+
+# ---------- CONFIG ----------
+FORECAST_HORIZON_MIN = 24 * 60    # default projection horizon
+FORECAST_STEP_MIN = 1.0           # grid resolution before downsampling
+FORECAST_POINTS = 97              # samples per returned curve (incl. t=0)
+MAX_FORECAST_CELLS = 20_000_000   # scenarios x cauldrons x steps x passes; the step is coarsened above this
+MAX_SCENARIOS = 32
+MAX_COLLECTIONS = 16              # per scenario; each collection slot is one more pass over the grid
+BASELINE = {"name": "baseline", "fill_rate_pct": 0.0, "collections": []}
+
+
+# ---------- Scenarios ----------
+def _scenario(spec, i):
+    if not isinstance(spec, dict):
+        raise ValueError("each scenario must be an object")
+    pct = float(spec.get("fill_rate_pct", 0.0) or 0.0)
+    if not math.isfinite(pct) or pct <= -100:
+        raise ValueError("fill_rate_pct must be a number greater than -100")
+    specs = spec.get("collections") or []
+    if len(specs) > MAX_COLLECTIONS:
+        raise ValueError(f"at most {MAX_COLLECTIONS} collections per scenario")
+    collections = []
+    for c in specs:
+        at = float(c["at_min"])
+        if not math.isfinite(at) or at < 0:
+            raise ValueError("collection at_min must be a non-negative number")
+        amount = c.get("amount")
+        if amount is not None and not float(amount) >= 0:
+            raise ValueError("collection amount must be non-negative")
+        collections.append({"cauldron_id": c.get("cauldron_id"), "at_min": at,
+                            "amount": None if amount is None else float(amount)})
+    return {"name": str(spec.get("name") or f"scenario_{i}"), "fill_rate_pct": pct,
+            "collections": sorted(collections, key=lambda c: c["at_min"])}
+
+
+def parse_scenarios(specs):
+    """Validated scenario dicts; no specs -> the baseline only."""
+    scenarios = [_scenario(s, i) for i, s in enumerate(specs or [BASELINE])]
+    if len(scenarios) > MAX_SCENARIOS:
+        raise ValueError(f"at most {MAX_SCENARIOS} scenarios")
+    return scenarios
+
+
+def _collection_slots(scenarios, cauldron_ids):
+    """(S, C, K) collection times (inf = none) and amounts (inf = empty the cauldron)."""
+    col = {cid: i for i, cid in enumerate(cauldron_ids)}
+    per_cell = {}
+    for s, scenario in enumerate(scenarios):
+        for c in scenario["collections"]:
+            targets = col.values() if c["cauldron_id"] is None else [col.get(c["cauldron_id"])]
+            for j in targets:
+                if j is not None:
+                    per_cell.setdefault((s, j), []).append(c)
+    k = max((len(v) for v in per_cell.values()), default=0)
+    times = np.full((len(scenarios), len(cauldron_ids), k), np.inf)
+    amounts = np.full_like(times, np.inf)
+    for (s, j), cs in per_cell.items():
+        cs = sorted(cs, key=lambda c: c["at_min"])
+        times[s, j, :len(cs)] = [c["at_min"] for c in cs]
+        amounts[s, j, :len(cs)] = [np.inf if c["amount"] is None else c["amount"] for c in cs]
+    return times, amounts
+
+
+# ---------- Projection ----------
+def _inputs(forecasts, cauldron_ids):
+    def num(cid, key, default):
+        v = forecasts[cid].get(key)
+        return default if v is None or not math.isfinite(float(v)) else float(v)
+    cap = np.array([num(c, "max_volume", np.inf) for c in cauldron_ids])
+    level = np.clip([num(c, "current_level", 0.0) for c in cauldron_ids], 0.0, cap)
+    rate = np.array([num(c, "fill_rate_per_min", 0.0) for c in cauldron_ids])
+    return level, cap, rate
+
+
+def project(forecasts, scenarios=None, horizon_min=FORECAST_HORIZON_MIN, step_min=FORECAST_STEP_MIN,
+            cauldron_ids=None):
+    """
+    Level trajectories for all cauldrons x steps x scenarios.
+    Returns t_min (T,), levels (S, C, T), overflow_min / spilled / collected (S, C);
+    overflow_min is inf when the cauldron does not overflow within the horizon.
+    """
+    cauldron_ids = sorted(forecasts) if cauldron_ids is None else [c for c in cauldron_ids if c in forecasts]
+    scenarios = parse_scenarios(scenarios)
+    horizon_min, step_min = float(horizon_min), float(step_min)
+    if not (math.isfinite(horizon_min) and horizon_min > 0 and math.isfinite(step_min) and step_min > 0):
+        raise ValueError("horizon_min and step_min must be positive finite numbers")
+    n_s, n_c = len(scenarios), len(cauldron_ids)
+    coll_t, coll_amount = _collection_slots(scenarios, cauldron_ids)
+    passes = coll_t.shape[2] + 1                                    # one per segment between collections
+    steps = math.ceil(horizon_min / step_min)
+    if n_s * n_c * (steps + 1) * passes > MAX_FORECAST_CELLS:
+        steps = max(1, MAX_FORECAST_CELLS // max(1, n_s * n_c * passes) - 1)
+        step_min = horizon_min / steps
+    t = np.minimum(np.arange(steps + 1) * step_min, horizon_min)
+
+    level0, cap, base_rate = _inputs(forecasts, cauldron_ids)
+    scale = 1.0 + np.array([s["fill_rate_pct"] for s in scenarios]) / 100.0
+    rate = scale[:, None] * base_rate[None, :]                      # (S, C)
+    cap3 = cap[None, :, None]
+
+    levels = np.empty((n_s, n_c, len(t)))
+    seg_t = np.zeros((n_s, n_c))                                    # current segment start
+    seg_level = np.broadcast_to(level0, (n_s, n_c)).copy()
+    live = np.ones((n_s, n_c), dtype=bool)                          # segment starts within horizon
+    overflow = np.full((n_s, n_c), np.inf)
+    spilled = np.zeros((n_s, n_c))
+    collected = np.zeros((n_s, n_c))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for k in range(coll_t.shape[2] + 1):
+            end = coll_t[:, :, k] if k < coll_t.shape[2] else np.full((n_s, n_c), np.inf)
+            seg_end = np.minimum(end, horizon_min)
+            # grid values of this segment: linear fill from seg_level, clipped to [0, cap]
+            mask = live[:, :, None] & (t >= seg_t[:, :, None]) & (t < end[:, :, None])
+            ramp = seg_level[:, :, None] + rate[:, :, None] * (t - seg_t[:, :, None])
+            np.copyto(levels, np.clip(ramp, 0.0, cap3), where=mask)
+            # exact overflow time / spill inside the segment
+            t_full = np.where(rate > 0, seg_t + np.maximum(cap - seg_level, 0.0) / rate, np.inf)
+            hit = live & (t_full < seg_end)
+            overflow = np.where(hit, np.minimum(overflow, t_full), overflow)
+            spilled += np.where(hit, rate * (seg_end - t_full), 0.0)
+            if k == coll_t.shape[2]:
+                break
+            # the collection at `end` starts the next segment
+            active = live & (end <= horizon_min)
+            before = np.clip(seg_level + rate * (end - seg_t), 0.0, cap)
+            after = np.maximum(before - coll_amount[:, :, k], 0.0)
+            collected += np.where(active, before - after, 0.0)
+            seg_t = np.where(active, end, seg_t)
+            seg_level = np.where(active, after, seg_level)
+            live = active
+    return {
+        "cauldron_ids": cauldron_ids,
+        "scenarios": scenarios,
+        "horizon_min": horizon_min,
+        "step_min": step_min,
+        "t_min": t,
+        "levels": levels,
+        "max_volume": cap,
+        "overflow_min": overflow,
+        "spilled": spilled,
+        "collected": collected,
+    }
+
+
+# ---------- Downsampling ----------
+def downsample(t, levels, points=FORECAST_POINTS):
+    """Every k-th sample (first and last kept) and the peak of each bucket since the previous sample."""
+    n = len(t)
+    points = max(2, int(points))
+    if n <= points:
+        return t, levels, levels
+    k = math.ceil((n - 1) / (points - 1))
+    idx = np.append(np.arange(0, n - 1, k), n - 1)
+    starts = np.append(0, idx[:-1] + 1)
+    peaks = np.maximum.reduceat(levels, starts, axis=-1)
+    return t[idx], levels[..., idx], peaks
+
+
+def forecast_curves(forecasts, scenarios=None, horizon_min=FORECAST_HORIZON_MIN, step_min=FORECAST_STEP_MIN,
+                    points=FORECAST_POINTS, cauldron_ids=None, decimals=3):
+    """API payload: downsampled curves per scenario (levels / peaks are cauldron x sample arrays)."""
+    p = project(forecasts, scenarios, horizon_min, step_min, cauldron_ids)
+    t, levels, peaks = downsample(p["t_min"], p["levels"], points)
+    overflow = np.where(np.isfinite(p["overflow_min"]), p["overflow_min"], np.nan)
+    return {
+        "horizon_min": p["horizon_min"],
+        "step_min": p["step_min"],
+        "t_min": np.round(t, decimals),
+        "cauldron_ids": p["cauldron_ids"],
+        "max_volume": np.where(np.isfinite(p["max_volume"]), p["max_volume"], np.nan),
+        "scenarios": [
+            dict(scenario,
+                 levels=np.round(levels[s], decimals),
+                 peaks=np.round(peaks[s], decimals),
+                 overflow_min=np.round(overflow[s], decimals),   # NaN (null) = no overflow in horizon
+                 spilled=np.round(p["spilled"][s], decimals),
+                 collected=np.round(p["collected"][s], decimals))
+            for s, scenario in enumerate(p["scenarios"])
+        ],
+    }
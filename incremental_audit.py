@@ -0,0 +1,482 @@
+"""
+incremental_audit.py
+
+Stateful, incremental variant of ttst.process_all:
+- keeps a per-cauldron cursor (last reading, open drain run, running fill-rate stats)
+- ingests only telemetry newer than the cursor and extends / closes drain runs
+- re-matches only new or changed tickets, ghosts whose day window gained events,
+  and tickets dated on or after the current telemetry day (their day is still filling in)
+- closed drains go into an EventStore, so results have the same representation as the
+  batch matchers (MATCH_DTYPE records referring to store rows and ticket positions)
+- match records, used-event flags and the daily audit / mismatched ticket rows are
+  updated in place as tickets are matched or released; tickets that leave the feed
+  are evicted
+
+Steady-state cost of update() follows the size of the delta since the last call,
+not the length of the history.
+
+Fill rates differ from the batch audit in one respect: with fill_rate_window_hours=None
+the rate is a P² estimate over the whole history (constant memory), where the batch
+estimator takes the exact median. With a window both take the exact median of the
+same rates. Either way a drain's fill_during uses the rate when the drain closed, so
+collected amounts (and so matches) can differ slightly from a batch run over the
+final history.
+"""
+
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from ttst import (
+    DATA_ENDPOINT, TICKETS_ENDPOINT, CAULDRON_INFO_ENDPOINT,
+    NOISE_DELTA, MIN_DRAIN_VOLUME, MIN_EVENT_DURATION_MIN,
+    iso_to_dt, epoch_us_to_dt, ingest_telemetry,
+    cauldron_series, volume_ok, time_to_overflow, EventIndex, MATCH_DTYPE,
+    DISCREPANCY_TYPES, OVER_REPORTED, UNDER_REPORTED, UNLOGGED_DRAIN, epoch_days_to_iso,
+    FILL_RATE_WINDOW_HOURS,
+)
+from event_store import EVENT_DTYPE, US_PER_DAY, EventStore
+from streaming_stats import FillRateEstimator
+from instrumentation import span
+import eog_client
+
+
+class CauldronCursor:
+    """
+    Everything needed to continue one cauldron's series where the last update stopped.
+
+    The drain state machine mirrors detect_drain_events: a run opens on the first
+    step that drops by more than NOISE_DELTA, extends over non-increasing steps and
+    closes on the first increase. A run still open at the end of the feed stays
+    open (it may keep draining) and is emitted once it closes.
+    """
+
+    def __init__(self, cauldron_id, fill_rate_window_hours=None):
+        self.cauldron_id = cauldron_id
+        self.last_epoch = None
+        self.last_level = None
+        self.n_readings = 0
+        self.open_run = None        # (start_epoch, start_level, end_epoch, end_level)
+        self.fill = FillRateEstimator(window_hours=fill_rate_window_hours)
+        # running drain-rate stats
+        self.drain_rate_sum = 0.0
+        self.drain_rate_count = 0
+
+    # --- fill rate ---
+    def fill_rate(self):
+        return self.fill.median()
+
+    def fill_stats(self):
+        return self.fill.stats()
+
+    def drain_rate(self):
+        return self.drain_rate_sum / self.drain_rate_count if self.drain_rate_count else 0.0
+
+    # --- ingestion ---
+    def advance(self, epochs, levels):
+        """Consume readings (already filtered to be newer than the cursor); return closed drains as EVENT_DTYPE rows."""
+        closed = []
+        for t, v in zip(epochs.tolist(), levels.tolist()):
+            self.fill.update(t, v)
+            if self.last_epoch is None:
+                self.last_epoch, self.last_level, self.n_readings = t, v, 1
+                continue
+            t_prev, v_prev = self.last_epoch, self.last_level
+            delta = v - v_prev
+            if self.open_run is not None:
+                if v <= v_prev:
+                    self.open_run = (self.open_run[0], self.open_run[1], t, v)
+                else:
+                    ev = self._close_run()
+                    if ev is not None:
+                        closed.append(ev)
+            elif delta < -NOISE_DELTA:
+                self.open_run = (t_prev, v_prev, t, v)
+
+            self.last_epoch, self.last_level = t, v
+            self.n_readings += 1
+        return closed
+
+    def _close_run(self):
+        t_start, v_start, t_end, v_end = self.open_run
+        self.open_run = None
+        raw_drop = v_start - v_end
+        duration_min = (t_end - t_start) / 1e6 / 60.0
+        if raw_drop < MIN_DRAIN_VOLUME or duration_min < MIN_EVENT_DURATION_MIN:
+            return None
+        # fill rate is frozen at close time so already-matched tickets stay stable
+        fill_during = self.fill_rate() * duration_min
+        collected = raw_drop + fill_during
+        if duration_min > 0:
+            self.drain_rate_sum += collected / duration_min
+            self.drain_rate_count += 1
+        # EVENT_DTYPE field order; the cauldron code is set when the row is stored
+        return (0, t_start, t_end, v_start, v_end, raw_drop, duration_min, fill_during, collected)
+
+
+NO_MATCH, MATCHED, MISMATCHED = range(3)   # state of a ticket slot
+MISMATCH_COLUMNS = ["ticket_id", "cauldron_id", "date", "courier_id", "ticket_volume", "detected_volume",
+                    "difference", "abs_difference", "matched_previous_day", "direction"]
+
+
+def _grown(arr, n):
+    """arr with room for at least n entries (capacity doubles; new entries are zero)."""
+    if n <= len(arr):
+        return arr
+    grown = np.zeros(max(n, 2 * len(arr), 64), dtype=arr.dtype)
+    grown[:len(arr)] = arr
+    return grown
+
+
+def _ticket_key(t):
+    return t.get("ticket_id") or (t.get("cauldron_id"), t.get("date"), t.get("courier_id"))
+
+
+def _ticket_fingerprint(t):
+    return (t.get("cauldron_id"), t.get("amount_collected", 0), t.get("date"))
+
+
+class IncrementalReconciler:
+    """
+    Long-lived reconciliation state. Call update() with fresh payloads (or let it
+    fetch them); it returns a result dict shaped like ttst.process_all(), plus the
+    "daily_audit" and "mismatched_tickets" tables of ttst.run_reconciliation.
+
+    Every ticket in the feed holds a slot in flat match buffers (MATCH_DTYPE record and
+    a state code); matching or releasing a ticket rewrites its slot, the used flag of
+    its event and the audit rows it contributes, so an update only touches the delta.
+    Tickets that leave the feed are evicted and their events become available again.
+    """
+
+    def __init__(self, fill_rate_window_hours=FILL_RATE_WINDOW_HOURS):
+        self.fill_rate_window_hours = fill_rate_window_hours
+        self.cursors = {}                      # cauldron_id -> CauldronCursor
+        self.global_cursor = None              # newest epoch-us ingested
+        self.events = EventStore()             # closed drains; event ids are store rows
+        self.index = EventIndex(self.events)   # (cauldron, date) buckets for ticket lookups
+        self.used_events = {}                  # event_id -> ticket key
+        self.tickets = {}                      # ticket key -> (fingerprint, ticket)
+        self.slots = {}                        # ticket key -> slot in the match buffers
+        self.ghosts = {}                       # ticket key -> ticket (no event found)
+        self.ghosts_by_day = {}                # (cauldron, date) -> {ticket keys}
+        self.pending = {}                      # ticket key -> ticket whose day is not complete yet
+        self.losses = {}                       # (epoch day, cauldron_id, discrepancy type) -> [volume, rows]
+        self.mismatch_rows = {}                # ticket key -> mismatched_tickets row
+        self.cauldron_max = {}
+        self._free_slots = []
+        self._ticket_at = []                   # slot -> ticket (None once evicted)
+        self._records = np.zeros(0, dtype=MATCH_DTYPE)   # slot -> match record, valid where _state != 0
+        self._state = np.zeros(0, dtype=np.int8)        # slot -> NO_MATCH / MATCHED / MISMATCHED
+        self._used = np.zeros(0, dtype=bool)            # event_id -> matched to a ticket
+        self._lock = threading.Lock()
+
+    # --- telemetry ---
+    def _new_rows(self, data_raw):
+        """Slice of data_raw newer than the global cursor, found by scanning back from the end."""
+        if self.global_cursor is None:
+            return data_raw
+        cursor_dt = epoch_us_to_dt(self.global_cursor)
+        cut = len(data_raw)
+        while cut > 0:
+            try:
+                ts = iso_to_dt(data_raw[cut - 1]["timestamp"])
+            except Exception:
+                cut -= 1
+                continue
+            if ts <= cursor_dt:
+                break
+            cut -= 1
+        return data_raw[cut:]
+
+    def _ingest(self, data_raw):
+        rows = self._new_rows(data_raw)
+        with span("ingestion", items=len(rows)):
+            telemetry = ingest_telemetry(rows)
+        new_ids = []
+        with span("drain_detection", items=telemetry["levels"].size):   # fill-rate stats advance here too
+            for col, cid in enumerate(telemetry["cauldron_ids"]):
+                epochs, levels = cauldron_series(telemetry, col)
+                cursor = self.cursors.get(cid)
+                if cursor is None:
+                    cursor = self.cursors[cid] = CauldronCursor(cid, self.fill_rate_window_hours)
+                if cursor.last_epoch is not None:
+                    fresh = epochs > cursor.last_epoch
+                    epochs, levels = epochs[fresh], levels[fresh]
+                closed = cursor.advance(epochs, levels)
+                if closed:
+                    new_ids.extend(self.events.append_chunk(cid, np.array(closed, dtype=EVENT_DTYPE)))
+        if len(telemetry["epochs"]):
+            newest = int(telemetry["epochs"][-1])
+            self.global_cursor = newest if self.global_cursor is None else max(self.global_cursor, newest)
+        self._used = _grown(self._used, len(self.events))
+        for event_id in new_ids:
+            self._event_loss(event_id, 1)
+        self.index.add(new_ids)
+        return new_ids
+
+    # --- audit rows ---
+    def _event_day(self, event_id):
+        """(UTC epoch day, cauldron_id) of an event's start."""
+        row = self.events.array[event_id]
+        return int(row["start_us"]) // US_PER_DAY, self.events.cauldron_ids[row["cauldron"]]
+
+    def _loss(self, day, cauldron_id, kind, volume, sign):
+        key = (day, cauldron_id, kind)
+        entry = self.losses.setdefault(key, [0.0, 0])
+        entry[0] += sign * volume
+        entry[1] += sign
+        if not entry[1]:
+            del self.losses[key]
+
+    def _event_loss(self, event_id, sign):
+        """Add (sign=1) or remove (sign=-1) an unlogged-drain row."""
+        day, cid = self._event_day(event_id)
+        self._loss(day, cid, UNLOGGED_DRAIN, float(self.events.array["collected_amount"][event_id]), sign)
+
+    def _mismatch_loss(self, key, slot, sign):
+        """Add or remove the audit rows of a volume-mismatched ticket (as ttst.discrepancy_columns)."""
+        record, t = self._records[slot], self._ticket_at[slot]
+        event_id = int(record["event"])
+        day, cid = self._event_day(event_id)
+        ticket_volume = t.get("amount_collected", 0)
+        detected = float(self.events.array["collected_amount"][event_id])
+        difference = ticket_volume - detected
+        kind = OVER_REPORTED if difference > 0 else UNDER_REPORTED
+        self._loss(day, cid, kind, abs(difference), sign)
+        if sign < 0:
+            del self.mismatch_rows[key]
+        else:
+            self.mismatch_rows[key] = (
+                t.get("ticket_id"), cid, epoch_us_to_dt(day * US_PER_DAY).date().isoformat(), t.get("courier_id"),
+                ticket_volume, detected, difference, float(record["volume_delta"]),
+                bool(record["matched_previous_day"]), str(DISCREPANCY_TYPES[kind]))
+
+    # --- tickets ---
+    def _slot(self, key, t):
+        slot = self.slots.get(key)
+        if slot is None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                slot = len(self._ticket_at)
+                self._ticket_at.append(None)
+                self._records = _grown(self._records, slot + 1)
+                self._state = _grown(self._state, slot + 1)
+            self.slots[key] = slot
+        self._ticket_at[slot] = t
+        return slot
+
+    def _add_ghost(self, key, t, t_date):
+        self.ghosts[key] = t
+        self.ghosts_by_day.setdefault((t.get("cauldron_id"), t_date), set()).add(key)
+
+    def _pop_ghost(self, key):
+        t = self.ghosts.pop(key, None)
+        if t is not None:
+            try:
+                day_keys = self.ghosts_by_day.get((t.get("cauldron_id"), iso_to_dt(t["date"]).date()))
+            except Exception:
+                day_keys = None
+            if day_keys:
+                day_keys.discard(key)
+        return t
+
+    def _release(self, key):
+        """Drop a ticket's current outcome; returns the event it held, if any."""
+        self._pop_ghost(key)
+        slot = self.slots.get(key)
+        if slot is None or self._state[slot] == NO_MATCH:
+            return None
+        if self._state[slot] == MISMATCHED:
+            self._mismatch_loss(key, slot, -1)
+        self._state[slot] = NO_MATCH
+        event_id = int(self._records[slot]["event"])
+        self.used_events.pop(event_id, None)
+        self._used[event_id] = False
+        self.index.release(event_id)
+        self._event_loss(event_id, 1)
+        return event_id
+
+    def _evict(self, key):
+        """Forget a ticket that left the feed; returns the event it held, if any."""
+        event_id = self._release(key)
+        self.pending.pop(key, None)
+        del self.tickets[key]
+        slot = self.slots.pop(key)
+        self._ticket_at[slot] = None
+        self._free_slots.append(slot)
+        return event_id
+
+    def _match(self, key, t):
+        cauldron = t.get("cauldron_id")
+        try:
+            t_date = iso_to_dt(t["date"]).date()
+        except Exception:
+            return
+        t_amt = t.get("amount_collected", 0)
+        event_id, diff, matched_day = self.index.best_for_ticket(cauldron, t_amt, t_date)
+        if event_id is None:
+            self._add_ghost(key, t, t_date)
+            return
+        self.used_events[event_id] = key
+        self._used[event_id] = True
+        self.index.use(event_id)
+        self._event_loss(event_id, -1)
+        slot = self.slots[key]
+        self._records[slot] = (event_id, slot, diff, matched_day == t_date - timedelta(days=1))
+        self._state[slot] = MATCHED if volume_ok(diff, t_amt) else MISMATCHED
+        if self._state[slot] == MISMATCHED:
+            self._mismatch_loss(key, slot, 1)
+
+    def _reconcile(self, ticket_list, new_ids):
+        feed = {_ticket_key(t): t for t in ticket_list}      # a repeated key keeps its last ticket
+        dirty, freed = {}, []
+        for key in [key for key in self.tickets if key not in feed]:
+            event_id = self._evict(key)
+            if event_id is not None:
+                freed.append(event_id)
+        # tickets for days the telemetry has not finished are re-matched every update
+        for key, t in list(self.pending.items()):
+            if key in self.tickets and self.tickets[key][1] is t:
+                event_id = self._release(key)
+                if event_id is not None:
+                    freed.append(event_id)
+                dirty[key] = t
+        for key, t in feed.items():
+            fp = _ticket_fingerprint(t)
+            known = self.tickets.get(key)
+            if known is not None and known[0] == fp:
+                continue
+            if known is not None:
+                event_id = self._release(key)
+                if event_id is not None:
+                    freed.append(event_id)
+            self.tickets[key] = (fp, t)
+            self._slot(key, t)
+            self.pending.pop(key, None)
+            dirty[key] = t
+
+        # ghosts whose window (ticket day or the day before) just gained an available event
+        arr = self.events.array
+        for event_id in list(new_ids) + freed:
+            cid = self.events.cauldron_ids[arr["cauldron"][event_id]]
+            d = epoch_us_to_dt(int(arr["start_us"][event_id])).date()
+            for t_day in (d, d + timedelta(days=1)):
+                for key in list(self.ghosts_by_day.get((cid, t_day), ())):
+                    dirty[key] = self._pop_ghost(key)
+
+        # re-match in feed order, as the batch matcher does
+        cursor_day = epoch_us_to_dt(self.global_cursor).date() if self.global_cursor is not None else None
+        order = {key: i for i, key in enumerate(feed)} if dirty else {}
+        self.pending = {}
+        for key in sorted(dirty, key=order.__getitem__):
+            t = dirty[key]
+            self._match(key, t)
+            try:
+                t_day = iso_to_dt(t["date"]).date()
+            except Exception:
+                continue
+            if cursor_day is None or t_day >= cursor_day:
+                self.pending[key] = t
+
+    # --- public API ---
+    def update(self, data_json=None, tickets_json=None, cauldron_info_json=None, api_fetch=True):
+        with self._lock:
+            if api_fetch:
+                data_json, tickets_json, cauldron_info_json = eog_client.fetch_all(
+                    DATA_ENDPOINT, TICKETS_ENDPOINT, CAULDRON_INFO_ENDPOINT)
+            for c in cauldron_info_json or []:
+                self.cauldron_max[c["id"]] = c.get("max_volume")
+
+            new_ids = self._ingest(data_json or [])
+            tickets_raw = tickets_json or {"transport_tickets": []}
+            ticket_list = tickets_raw.get("transport_tickets", []) if isinstance(tickets_raw, dict) else tickets_raw
+            with span("matching", items=len(ticket_list)):
+                self._reconcile(ticket_list, new_ids)
+            return self.snapshot()
+
+    def snapshot(self):
+        """Current state in the shape returned by ttst.process_all(), plus the audit tables."""
+        fill_rates, forecasts = {}, {}
+        total_fill_rates, drain_sum, drain_n = [], 0.0, 0
+        for cid, cur in self.cursors.items():
+            if cur.n_readings == 0:
+                continue
+            if cur.n_readings < 2:
+                fill_rates[cid] = {"fill_rate_per_min": 0.0, "drain_rate_per_min": 0.0,
+                                   "note": "insufficient data"}
+            else:
+                rate = cur.fill_rate()
+                fill_rates[cid] = {"fill_rate_per_min": rate, **cur.fill_stats(),
+                                   "drain_rate_per_min": cur.drain_rate()}
+                total_fill_rates.append(rate)
+            drain_sum += cur.drain_rate_sum
+            drain_n += cur.drain_rate_count
+            max_vol = self.cauldron_max.get(cid)
+            rate = fill_rates[cid]["fill_rate_per_min"]
+            forecasts[cid] = {
+                "time_to_overflow_min": time_to_overflow(cur.last_level, max_vol, rate),
+                "current_level": cur.last_level,
+                "max_volume": max_vol,
+                "fill_rate_per_min": rate,
+                "drain_rate_per_min": fill_rates[cid]["drain_rate_per_min"]
+            }
+
+        # same representation as the batch matchers; ticket positions are slots
+        n = len(self._ticket_at)
+        records, state = self._records[:n], self._state[:n]
+        events = self.events.view()
+        reconciliation = {
+            "matches": records[state == MATCHED],
+            "mismatches": records[state == MISMATCHED],
+            "unmatched_events": events.subset(np.flatnonzero(~self._used[:len(events)])),
+            "unmatched_tickets": list(self.ghosts.values()),
+            "recovered_previous_day": int(records["matched_previous_day"][state != NO_MATCH].sum()),
+            "events": events,
+            "tickets": list(self._ticket_at),
+        }
+        return {
+            "fill_rates": fill_rates,
+            "average_fill_rate_per_min": (sum(total_fill_rates) / len(total_fill_rates)
+                                          if total_fill_rates else 0.0),
+            "average_drain_rate_per_min": drain_sum / drain_n if drain_n else 0.0,
+            "events": events,
+            "reconciliation": reconciliation,
+            "forecasts": forecasts,
+            "open_drains": sum(1 for c in self.cursors.values() if c.open_run is not None),
+            "daily_audit": self.daily_audit(),
+            "mismatched_tickets": self.mismatched_tickets(),
+        }
+
+    def daily_audit(self):
+        """Discrepancy volume per (date, cauldron, type), as ttst.audit_daily_potion_losses."""
+        if not self.losses:
+            return pd.DataFrame([])
+        keys = sorted(self.losses)
+        return pd.DataFrame({
+            "date": epoch_days_to_iso([day for day, _, _ in keys]),
+            "cauldron_id": np.array([cid for _, cid, _ in keys], dtype=object),
+            "type": DISCREPANCY_TYPES[[kind for _, _, kind in keys]].astype(object),
+            "volume": np.array([self.losses[k][0] for k in keys], dtype=np.float64),
+        })
+
+    def mismatched_tickets(self):
+        """Volume-mismatched tickets, as ttst.summarize_discrepancies."""
+        if not self.mismatch_rows:
+            return pd.DataFrame([])
+        return pd.DataFrame(list(self.mismatch_rows.values()), columns=MISMATCH_COLUMNS)
+
+
+_RECONCILER = None
+_RECONCILER_LOCK = threading.Lock()
+
+
+def get_reconciler():
+    """Process-wide reconciler used by the incremental audit mode."""
+    global _RECONCILER
+    with _RECONCILER_LOCK:
+        if _RECONCILER is None:
+            _RECONCILER = IncrementalReconciler()
+        return _RECONCILER
@@ -0,0 +1,256 @@
+"""
+instrumentation.py
+
+Lightweight spans around the pipeline stages (fetch, ingestion, fill rate, drain
+detection, matching, audit aggregation, graph build, simulation, optimization, validation):
+- `with span("matching", items=len(tickets)) as sp:` records wall time, CPU time of the
+  calling thread, net allocations of GC-tracked Python objects (process-wide; NumPy
+  buffers are not counted, but net traced bytes are while tracemalloc is running) and an
+  item count (sp.add(n) adds to it)
+- spans nest; inside `with collect() as trace:` each span is also aggregated into
+  that trace per path (e.g. "analysis/fill_rate"), which the API returns as `timings`
+- every span feeds process-wide totals exported in the Prometheus text format (/metrics)
+- when disabled (ELIXIRNET_INSTRUMENTATION=0 or set_enabled(False)) and outside
+  collect(), span() hands back a shared no-op object: one flag check and one
+  context-variable read per span
+"""
+
+import contextvars
+import gc
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# ---------- CONFIG ----------
+INSTRUMENTATION_ENABLED = os.environ.get("ELIXIRNET_INSTRUMENTATION", "1") != "0"
+METRIC_PREFIX = "elixirnet_span"
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = INSTRUMENTATION_ENABLED
+_state = contextvars.ContextVar("instrumentation_state", default=None)   # (parent path, Trace or None)
+_gc_allocations = 0   # gen-0 counts folded in by collections (each one resets the count)
+
+
+def _on_gc(phase, info):
+    global _gc_allocations
+    if phase == "start":
+        _gc_allocations += gc.get_count()[0]
+
+
+gc.callbacks.append(_on_gc)
+
+
+def allocations():
+    """Running count of net GC-tracked object allocations (cheap: no heap walk)."""
+    return _gc_allocations + gc.get_count()[0]
+
+
+def set_enabled(flag):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def enabled():
+    return _enabled
+
+
+# ---------- Spans ----------
+class _NoopSpan:
+    __slots__ = ()
+    items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, n=1):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "path", "items", "trace", "_token", "_t0", "_c0", "_a0", "_m0")
+
+    def __init__(self, name, items, state):
+        parent, self.trace = state if state is not None else (None, None)
+        self.name = name
+        self.path = name if parent is None else f"{parent}/{name}"
+        self.items = items
+
+    def add(self, n=1):
+        self.items = (self.items or 0) + n
+
+    def __enter__(self):
+        self._token = _state.set((self.path, self.trace))
+        if self.trace is not None:
+            self.trace._open(self.path)
+        self._m0 = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self._a0 = allocations()
+        self._c0 = time.thread_time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._t0
+        cpu = time.thread_time() - self._c0
+        allocs = allocations() - self._a0
+        traced = None
+        if self._m0 is not None and tracemalloc.is_tracing():
+            traced = tracemalloc.get_traced_memory()[0] - self._m0
+        _state.reset(self._token)
+        sample = (wall, cpu, allocs, traced, self.items or 0, exc_type is not None)
+        if self.trace is not None:
+            self.trace._add(self.path, sample)
+        if _enabled:
+            _REGISTRY.observe(self.name, sample)
+        return False
+
+
+def span(name, items=None):
+    """Context manager timing one stage; a shared no-op when disabled and not collecting."""
+    state = _state.get()
+    if not _enabled and (state is None or state[1] is None):
+        return _NOOP
+    return Span(name, items, state)
+
+
+# ---------- Per-request traces ----------
+class Trace:
+    """Spans of one request / run, aggregated per path in first-start order."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self._spans = OrderedDict()   # path -> [calls, errors, wall, cpu, allocations, traced, items]
+        self._lock = threading.Lock()
+
+    def _open(self, path):
+        with self._lock:
+            if path not in self._spans:
+                self._spans[path] = [0, 0, 0.0, 0.0, 0, None, 0]
+
+    def _add(self, path, sample):
+        wall, cpu, allocs, traced, items, failed = sample
+        with self._lock:
+            agg = self._spans.setdefault(path, [0, 0, 0.0, 0.0, 0, None, 0])
+            agg[0] += 1
+            agg[1] += failed
+            agg[2] += wall
+            agg[3] += cpu
+            agg[4] += allocs
+            if traced is not None:
+                agg[5] = (agg[5] or 0) + traced
+            agg[6] += items
+
+    def summary(self):
+        """{"total_ms", "spans": [{span, calls, wall_ms, cpu_ms, allocations, items, ...}]}."""
+        with self._lock:
+            spans = []
+            for path, (calls, errors, wall, cpu, allocs, traced, items) in self._spans.items():
+                if not calls:
+                    continue
+                row = {"span": path, "calls": calls, "wall_ms": round(wall * 1000, 3),
+                       "cpu_ms": round(cpu * 1000, 3), "allocations": allocs, "items": items}
+                if traced is not None:
+                    row["alloc_bytes"] = traced
+                if errors:
+                    row["errors"] = errors
+                spans.append(row)
+        total = self.total if self.total is not None else time.perf_counter() - self.started
+        return {"total_ms": round(total * 1000, 3), "spans": spans}
+
+
+@contextmanager
+def collect(active=True):
+    """Collect the spans run inside this block into a Trace (yields None when not active)."""
+    if not active:
+        yield None
+        return
+    trace = Trace()
+    parent = _state.get()
+    token = _state.set((parent[0] if parent else None, trace))
+    try:
+        yield trace
+    finally:
+        _state.reset(token)
+        trace.total = time.perf_counter() - trace.started
+
+
+# ---------- Process-wide metrics ----------
+class Registry:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._metrics = {}   # name -> [calls, errors, wall, cpu, allocations, items, bucket counts]
+        self._lock = threading.Lock()
+
+    def observe(self, name, sample):
+        wall, cpu, allocs, _, items, failed = sample
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = [0, 0, 0.0, 0.0, 0, 0, [0] * len(self.buckets)]
+            m[0] += 1
+            m[1] += failed
+            m[2] += wall
+            m[3] += cpu
+            m[4] += allocs
+            m[5] += items
+            for i, le in enumerate(self.buckets):
+                if wall <= le:
+                    m[6][i] += 1
+                    break
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: [*m[:6], list(m[6])] for name, m in self._metrics.items()}
+
+    def prometheus_text(self, prefix=METRIC_PREFIX):
+        """Exposition format 0.0.4: counters per span plus a duration histogram."""
+        metrics = sorted(self.snapshot().items())
+        out = []
+
+        def family(suffix, kind, help_text, column):
+            out.append(f"# HELP {prefix}_{suffix} {help_text}")
+            out.append(f"# TYPE {prefix}_{suffix} {kind}")
+            for name, m in metrics:
+                out.append(f'{prefix}_{suffix}{{span="{name}"}} {m[column]}')
+
+        family("calls_total", "counter", "Completed spans.", 0)
+        family("errors_total", "counter", "Spans that exited with an exception.", 1)
+        family("cpu_seconds_total", "counter", "CPU time of the calling thread inside spans.", 3)
+        family("items_total", "counter", "Items processed inside spans.", 5)
+        family("allocations_net", "gauge", "Net GC-tracked object allocations, summed over spans.", 4)
+        out.append(f"# HELP {prefix}_duration_seconds Wall time of spans.")
+        out.append(f"# TYPE {prefix}_duration_seconds histogram")
+        for name, m in metrics:
+            running = 0
+            for le, count in zip(self.buckets, m[6]):
+                running += count
+                out.append(f'{prefix}_duration_seconds_bucket{{span="{name}",le="{le:g}"}} {running}')
+            out.append(f'{prefix}_duration_seconds_bucket{{span="{name}",le="+Inf"}} {m[0]}')
+            out.append(f'{prefix}_duration_seconds_sum{{span="{name}"}} {m[2]:.6f}')
+            out.append(f'{prefix}_duration_seconds_count{{span="{name}"}} {m[0]}')
+        return "\n".join(out) + "\n"
+
+
+_REGISTRY = Registry()
+
+
+def get_registry():
+    """Process-wide span totals behind /metrics."""
+    return _REGISTRY
+
+
+def metrics_text():
+    return _REGISTRY.prometheus_text()
@@ -0,0 +1,163 @@
+"""
+job_queue.py
+
+Background jobs for long audits and optimizations behind the Flask API:
+- a bounded thread pool runs submitted work off the request threads
+- each job tracks status (queued / running / done / failed), progress, result or
+  error, and a sequence of partial-result events that clients can poll or stream
+- the store keeps at most JOB_STORE_SIZE jobs; the oldest finished ones are evicted
+  (queued and running jobs are never evicted)
+- at most JOB_QUEUE_LIMIT jobs may be queued or running; submit() raises JobQueueFull
+  beyond that instead of growing the pool's queue without bound
+"""
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------- CONFIG ----------
+JOB_WORKERS = 2               # jobs running at once
+JOB_STORE_SIZE = 64           # jobs kept (finished ones evicted oldest first)
+JOB_EVENT_BUFFER = 5000       # partial-result events kept per job (oldest dropped)
+JOB_QUEUE_LIMIT = 16          # queued + running jobs accepted at once
+JOB_RETRY_AFTER_SEC = 30      # hint returned with a rejected submission
+
+
+class JobQueueFull(RuntimeError):
+    """Too many jobs queued or running to accept another one."""
+
+
+class Job:
+    def __init__(self, kind, params=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._events = deque(maxlen=JOB_EVENT_BUFFER)   # (seq, name, data)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def emit(self, name, data=None, progress=None, message=None):
+        """Record a partial-result event (and optionally update progress / message)."""
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, name, data))
+            if progress is not None:
+                self.progress = max(self.progress, min(1.0, progress))
+            if message is not None:
+                self.message = message
+            self._cond.notify_all()
+
+    def _finish(self, status, result=None, error=None):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            if status == "done":
+                self.progress = 1.0
+            self._cond.notify_all()
+
+    def events_after(self, seq, timeout=None):
+        """Events with sequence number > seq, waiting up to timeout for one to arrive."""
+        with self._cond:
+            if timeout and not self.finished and self._seq <= seq:
+                self._cond.wait(timeout)
+            return [e for e in self._events if e[0] > seq]
+
+    def summary(self, include_result=False):
+        out = {
+            "job_id": self.id,
+            "type": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "message": self.message,
+            "events": self._seq,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error is not None:
+            out["error"] = self.error
+        if include_result and self.status == "done":
+            out["result"] = self.result
+        return out
+
+
+class JobStore:
+    def __init__(self, workers=JOB_WORKERS, max_jobs=JOB_STORE_SIZE, queue_limit=JOB_QUEUE_LIMIT):
+        self.max_jobs = max_jobs
+        self.queue_limit = queue_limit
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, params=None):
+        """
+        Queue fn(job) -> result on the worker pool; returns the Job right away.
+        Raises JobQueueFull when queue_limit jobs are already queued or running.
+        """
+        job = Job(kind, params)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if not j.finished)
+            if pending >= self.queue_limit:
+                raise JobQueueFull(f"{pending} jobs queued or running; try again later")
+            self._jobs[job.id] = job
+            self._evict()
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            result = fn(job)
+        except Exception as e:
+            traceback.print_exc()
+            job._finish("failed", error=str(e))
+        else:
+            job._finish("done", result=result)
+
+    def _evict(self):
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished]:
+            del self._jobs[job_id]
+            if len(self._jobs) <= self.max_jobs:
+                return
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_job_store():
+    """Process-wide job store used by the /api/jobs endpoints."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = JobStore()
+        return _STORE
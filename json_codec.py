@@ -0,0 +1,148 @@
+"""
+json_codec.py
+
+JSON encoding for the Flask API without the make_json_safe round trip:
+- NumPy scalars / arrays, pandas DataFrames / Series / Timestamps are encoded directly
+- NaN and +/-inf become null (also inside arrays)
+- DataFrames are written as a list of records (the API's historical shape) or, with
+  tables="columns", as {"columns": [...], "data": {column: [values...]}} so numeric
+  columns go straight from the array buffer to JSON
+- uses orjson when it is installed (optional dependency, `pip install orjson`); otherwise
+  falls back to a single sanitizing pass + the stdlib json module, with the same output
+"""
+
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# ---------- CONFIG ----------
+TABLE_FORMATS = ("records", "columns")
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+# ---------- Tables ----------
+def _column_values(series):
+    """Column as a list of JSON-ready Python values (NaN / NaT -> None)."""
+    values = series.to_numpy()
+    if values.dtype.kind == "f":
+        out = values.tolist()
+        for i in np.flatnonzero(~np.isfinite(values)).tolist():
+            out[i] = None
+        return out
+    if values.dtype.kind == "M":
+        out = np.datetime_as_string(values, unit="auto").tolist()
+        for i in np.flatnonzero(np.isnat(values)).tolist():
+            out[i] = None
+        return out
+    if values.dtype.kind in "biu":
+        return values.tolist()
+    # orjson encodes dates, Decimals etc. itself; the stdlib json fallback needs plain types
+    convert = _scalar if orjson is not None else to_builtin
+    return [v if type(v) is str else convert(v) for v in values.tolist()]
+
+
+def _column_array(series):
+    """Column for orjson: numeric arrays are passed through as-is, others as lists."""
+    values = series.to_numpy()
+    if values.dtype.kind in "biuf" and values.flags.c_contiguous:
+        return values
+    return _column_values(series)
+
+
+def records(df):
+    """DataFrame -> list of row dicts, built column-wise (no per-cell pandas boxing)."""
+    columns = [str(c) for c in df.columns]
+    data = [_column_values(df.iloc[:, i]) for i in range(len(columns))]
+    return [dict(zip(columns, row)) for row in zip(*data)]
+
+
+def columns(df, arrays=False):
+    """DataFrame -> {"columns": [...], "data": {column: values}}."""
+    names = [str(c) for c in df.columns]
+    get = _column_array if arrays else _column_values
+    return {"columns": names, "data": {name: get(df.iloc[:, i]) for i, name in enumerate(names)}}
+
+
+# ---------- Encoding ----------
+def _scalar(v):
+    if isinstance(v, float):
+        return v if math.isfinite(v) else None
+    if isinstance(v, np.generic):
+        return _scalar(v.item())
+    if isinstance(v, pd.Timestamp):
+        return None if pd.isna(v) else v.isoformat()
+    if v is pd.NaT or v is pd.NA:
+        return None
+    return v
+
+
+def _default(obj, tables="records"):
+    """orjson default hook for types it does not encode natively."""
+    if isinstance(obj, pd.DataFrame):
+        return records(obj) if tables == "records" else columns(obj, arrays=True)
+    if isinstance(obj, pd.Series):
+        return _column_array(obj)
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == "M":
+            return _column_values(pd.Series(obj)) if obj.ndim == 1 else obj.astype(str).tolist()
+        if obj.dtype.kind in "biuf" and not obj.flags.c_contiguous:
+            return np.ascontiguousarray(obj)
+        return _column_values(pd.Series(obj)) if obj.ndim == 1 else obj.tolist()
+    if isinstance(obj, (pd.Timestamp, np.generic)) or obj is pd.NaT or obj is pd.NA:
+        return _scalar(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def to_builtin(obj, tables="records"):
+    """Recursively convert to plain Python types (the non-orjson path)."""
+    cls = type(obj)
+    if cls is str or cls is int or cls is bool or obj is None:
+        return obj
+    if cls is float:
+        return obj if math.isfinite(obj) else None
+    if cls is dict:
+        return {k if type(k) is str else str(k): to_builtin(v, tables) for k, v in obj.items()}
+    if cls is list or cls is tuple:
+        return [to_builtin(v, tables) for v in obj]
+    if isinstance(obj, (float, np.generic)):
+        return _scalar(obj)
+    if isinstance(obj, dict):
+        return {k if isinstance(k, str) else str(k): to_builtin(v, tables) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_builtin(v, tables) for v in obj]
+    if isinstance(obj, pd.DataFrame):
+        return records(obj) if tables == "records" else columns(obj)
+    if isinstance(obj, pd.Series):
+        return _column_values(obj)
+    if isinstance(obj, np.ndarray):
+        if obj.ndim == 1:
+            return _column_values(pd.Series(obj))
+        return [to_builtin(row, tables) for row in obj]
+    if isinstance(obj, (datetime, date)):
+        return None if obj is pd.NaT else obj.isoformat()
+    if isinstance(obj, (str, int)):
+        return obj
+    return to_builtin(_default(obj, tables), tables)
+
+
+def dumps(obj, tables="records"):
+    """Encode obj as UTF-8 JSON bytes (NaN / inf -> null)."""
+    if tables not in TABLE_FORMATS:
+        raise ValueError(f"tables must be one of {TABLE_FORMATS}")
+    if orjson is not None:
+        return orjson.dumps(obj, default=partial(_default, tables=tables), option=ORJSON_OPTIONS)
+    return json.dumps(to_builtin(obj, tables), separators=(",", ":"), allow_nan=False).encode()
@@ -3,37 +3,295 @@ optimized_routes.py (updated)
 
 Greedy priority-queue scheduler that:
 - Uses per-cauldron drain_rate_per_min for collection durations
-- Respects courier max carrying capacity (from /api/Information/couriers)
-- Sends courier to nearest market when full; includes 15 min unload time
-- Uses Dijkstra shortest travel-time on the provided network graph
+- Models each courier's own carrying capacity and start node (from /api/Information/couriers);
+  the heaviest-filling cauldrons get the largest couriers first, and witches needed beyond
+  the real fleet are flagged as extra
+- Sends courier to nearest market when full; includes 15 min unload time, after waiting
+  for a free unload bay when markets have limited bays (MarketQueue)
+- Uses shortest travel-times from a precomputed all-pairs matrix (cached per network); edges
+  with a travel_time_profile make it time-dependent (one matrix per time-of-day bucket)
+- Fetches all upstream endpoints once, concurrently, through the shared eog_client
 - Returns per-witch detailed routes with ETAs and actions
+- Optionally improves the greedy fleet with route_optimizer (local search / LNS, time-budgeted)
 """
 
+import bisect
 import heapq
-import requests
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
 import networkx as nx
 from datetime import datetime, timedelta, timezone
-from ttst import process_all
+from ttst import process_all, DATA_ENDPOINT, TICKETS_ENDPOINT
+import eog_client
 import math
+from instrumentation import span
 
 # ---------- CONFIG ----------
-API_NETWORK = "https://hackutd2025.eog.systems/api/Information/network"
-API_CAULDRONS = "https://hackutd2025.eog.systems/api/Information/cauldrons"
-API_COURIERS = "https://hackutd2025.eog.systems/api/Information/couriers"
-REQUEST_HEADERS = {"Accept": "application/json"}
+API_NETWORK = f"{eog_client.API_BASE}/api/Information/network"
+API_CAULDRONS = f"{eog_client.API_BASE}/api/Information/cauldrons"
+API_COURIERS = f"{eog_client.API_BASE}/api/Information/couriers"
 
 SAFE_LEVEL_RATIO = 0.25       # leave cauldron at 25% full after full collection
 SERVICE_SETUP_MIN = 0.5       # small overhead before collection (minutes)
 UNLOAD_TIME_MIN = 15.0        # unload at market
 SAFETY_MARGIN_MIN = 5.0       # arrive this many minutes before overflow ideally
 HORIZON_MIN = 24 * 60         # simulation horizon cap
+TRAVEL_MATRIX_CACHE_SIZE = 8  # distinct networks whose all-pairs matrix is kept
+MARKET_VIEW_CACHE_SIZE = 8    # market sets whose nearest-market tables are kept per matrix
+MAX_TRAVEL_BUCKETS = 24       # time-of-day buckets of edge travel_time_profile (longer profiles are sampled)
+MARKET_UNLOAD_BAYS = int(os.environ.get("ELIXIRNET_MARKET_BAYS", "0")) or None   # per market; None = no queueing
+WITCH_SELECTION_POLICY = "earliest_arrival"   # "earliest_arrival" | "best_fit" | "first_fit"
+OPTIMIZE_ROUTES = False       # improve the greedy schedule with route_optimizer (local search / LNS)
+OPTIMIZER_TIME_BUDGET_SEC = 2.0
 
 
 # ---------- HELPERS ----------
 def fetch_json(url):
-    r = requests.get(url, headers=REQUEST_HEADERS, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return eog_client.fetch_json(url)
+
+
+def network_fingerprint(network_json):
+    return hashlib.sha1(json.dumps(network_json, sort_keys=True).encode()).hexdigest()
+
+
+class TravelTimeMatrix:
+    """
+    All-pairs shortest travel times over dense node ids, computed once per network
+    (batched Dijkstra from scipy.sparse.csgraph, Floyd-Warshall via networkx if scipy
+    is missing), plus a nearest-market table. Lookups are O(1) array reads.
+
+    Time-dependent networks: an edge may carry "travel_time_profile", its travel minutes
+    in equal slices of the (UTC) day. The day is split into that many buckets (at most
+    MAX_TRAVEL_BUCKETS) and every distinct bucket weighting gets its own all-pairs
+    layer in dists, so a lookup at a departure time is still one array read. A trip
+    uses the layer of its departure bucket. Layer 0 (dist) is the nominal
+    travel_time_minutes, used when no time is given.
+
+    Matrices are shared between requests and never change after construction;
+    nearest-market lookups go through for_markets(), a view per market set.
+    """
+
+    def __init__(self, network_json, max_buckets=MAX_TRAVEL_BUCKETS):
+        weights = {}
+        profiles = {}
+        nodes = {}
+        for e in network_json.get("edges", []):
+            a, b = e["from"], e["to"]
+            nodes.setdefault(a, len(nodes))
+            nodes.setdefault(b, len(nodes))
+            weights[(a, b)] = float(e.get("travel_time_minutes", 0))   # last edge wins, as in DiGraph
+            if e.get("travel_time_profile"):
+                profiles[(a, b)] = [float(t) for t in e["travel_time_profile"]]
+            else:
+                profiles.pop((a, b), None)
+        self.index = nodes
+        self.nodes = list(nodes)
+
+        n_buckets = max(1, min(max((len(p) for p in profiles.values()), default=1), max_buckets))
+        self.bucket_min = 1440.0 / n_buckets
+        self.bucket_layer = np.zeros(n_buckets, dtype=np.int64)
+        keys = list(weights)
+        layers = {tuple(weights.values()): 0}
+        for k in range(n_buckets):
+            w = tuple(profiles[e][k * len(profiles[e]) // n_buckets] if e in profiles else weights[e] for e in keys)
+            self.bucket_layer[k] = layers.setdefault(w, len(layers))
+        # filled layer by layer: only one all-pairs result besides dists is alive at a time
+        for k, w in enumerate(layers):
+            dist = self._all_pairs(dict(zip(keys, w)))
+            if k == 0:
+                if len(layers) == 1:
+                    self.dists = dist[None]
+                    break
+                self.dists = np.empty((len(layers),) + dist.shape)
+            self.dists[k] = dist
+            del dist
+        self.dist = self.dists[0]
+        self._market_views = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def time_dependent(self):
+        return len(self.dists) > 1
+
+    def layers_at(self, minute_of_day):
+        """Layer index per departure time (minutes after UTC midnight; arrays broadcast)."""
+        bucket = np.floor(np.mod(minute_of_day, 1440.0) / self.bucket_min).astype(np.int64)
+        return self.bucket_layer[np.minimum(bucket, len(self.bucket_layer) - 1)]
+
+    def layer_at(self, minute):
+        """layers_at for one time (plain Python, for per-trip lookups)."""
+        n = len(self.bucket_layer)
+        if n == 1:
+            return int(self.bucket_layer[0])
+        if not hasattr(self, "_layer_list"):
+            self._layer_list = self.bucket_layer.tolist()
+        return self._layer_list[min(int((minute % 1440.0) // self.bucket_min), n - 1)]
+
+    def layer(self, at):
+        """Layer for a departure at datetime `at` (None = nominal layer 0)."""
+        if at is None or len(self.dists) == 1:
+            return 0
+        return self.layer_at(minute_of_day(at))
+
+    def _all_pairs(self, weights):
+        n = len(self.nodes)
+        if n == 0:
+            return np.zeros((0, 0))
+        rows = np.array([self.index[a] for a, _ in weights], dtype=np.int64)
+        cols = np.array([self.index[b] for _, b in weights], dtype=np.int64)
+        vals = np.array(list(weights.values()), dtype=np.float64)
+        try:
+            from scipy.sparse import csr_matrix
+            from scipy.sparse.csgraph import dijkstra
+        except ImportError:
+            G = nx.DiGraph()
+            G.add_nodes_from(self.nodes)
+            for (a, b), t in weights.items():
+                G.add_edge(a, b, travel_time=t)
+            dist = nx.floyd_warshall_numpy(G, nodelist=self.nodes, weight="travel_time")
+        else:
+            graph = csr_matrix((vals, (rows, cols)), shape=(n, n))
+            dist = dijkstra(graph, directed=True)
+        np.fill_diagonal(dist, 0.0)
+        return np.asarray(dist, dtype=np.float64)
+
+    def travel(self, src, dst, at=None):
+        """Travel minutes from src to dst, departing at datetime `at` (None = nominal)."""
+        if src == dst:
+            return 0.0
+        i, j = self.index.get(src), self.index.get(dst)
+        if i is None or j is None:
+            return float("inf")
+        return float(self.dists[self.layer(at), i, j])
+
+    def for_markets(self, market_nodes):
+        """MarketView of this matrix for a market set (cached per set)."""
+        key = tuple(market_nodes)
+        with self._lock:
+            view = self._market_views.get(key)
+            if view is not None:
+                self._market_views.move_to_end(key)
+                return view
+        view = MarketView(self, key)
+        with self._lock:
+            view = self._market_views.setdefault(key, view)
+            while len(self._market_views) > MARKET_VIEW_CACHE_SIZE:
+                self._market_views.popitem(last=False)
+        return view
+
+    def min_travel_into(self, node):
+        """Fastest arrival into node from any other node at any time (lower bound for pruning)."""
+        if not hasattr(self, "_min_in"):
+            off_diag = self.dists.min(axis=0) if self.time_dependent else self.dist.copy()
+            np.fill_diagonal(off_diag, np.inf)
+            self._min_in = off_diag.min(axis=0) if len(self.nodes) else np.zeros(0)
+        j = self.index.get(node)
+        return float("inf") if j is None else float(self._min_in[j])
+
+
+
+class MarketView:
+    """
+    A TravelTimeMatrix with the market reachable fastest from every node, per layer,
+    for one market set (ties: first listed): market_idx / market_time (layers x nodes).
+    Everything else is read from the shared matrix.
+    """
+
+    def __init__(self, matrix, market_nodes):
+        self.matrix = matrix
+        self.market_nodes = list(market_nodes)
+        shape = (len(matrix.dists), len(matrix.nodes))
+        cols = [matrix.index[m] for m in self.market_nodes if m in matrix.index]
+        if not cols or not len(matrix.nodes):
+            self.market_idx = np.full(shape, -1, dtype=np.int64)
+            self.market_time = np.full(shape, np.inf)
+            return
+        sub = matrix.dists[:, :, cols]
+        best = np.argmin(sub, axis=2)
+        self.market_idx = np.asarray(cols, dtype=np.int64)[best]
+        self.market_time = np.take_along_axis(sub, best[:, :, None], axis=2)[:, :, 0]
+
+    def __getattr__(self, name):
+        if name == "matrix":          # not set yet (copy / unpickling)
+            raise AttributeError(name)
+        return getattr(self.matrix, name)
+
+    def nearest_market(self, node, at=None):
+        i = self.index.get(node)
+        k = self.layer(at)
+        if i is None or self.market_idx[k, i] < 0 or np.isinf(self.market_time[k, i]):
+            return None, float("inf")
+        return self.nodes[self.market_idx[k, i]], float(self.market_time[k, i])
+
+
+def minute_of_day(at):
+    """Minutes after UTC midnight of a datetime (naive = UTC)."""
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc)
+    return at.hour * 60 + at.minute + (at.second + at.microsecond / 1e6) / 60.0
+
+
+class MarketQueue:
+    """
+    Unload bays per market: book(market, arrival) reserves the earliest slot of
+    `duration` at or after arrival in any bay of that market and returns its start.
+    bays is one count for every market or {market: count}; None / 0 / a market
+    missing from the dict means unlimited (no wait). Works on datetimes
+    (duration a timedelta) or minutes (duration a float).
+    """
+
+    def __init__(self, bays, duration):
+        self.bays = bays
+        self.duration = duration
+        self._bays = {}   # market -> [(starts, ends) per bay], sorted, non-overlapping
+
+    def capacity(self, market):
+        return self.bays.get(market) if isinstance(self.bays, dict) else self.bays
+
+    def book(self, market, arrival):
+        n = self.capacity(market)
+        if not n:
+            return arrival
+        bays = self._bays.setdefault(market, [([], []) for _ in range(int(n))])
+        best = None
+        for b, (starts, ends) in enumerate(bays):
+            t = arrival
+            i = bisect.bisect_right(ends, t)          # first slot still busy at (or after) arrival
+            while i < len(starts) and starts[i] < t + self.duration:
+                t = max(t, ends[i])
+                i += 1
+            if best is None or t < best[0]:
+                best = (t, b, i)
+                if t == arrival:
+                    break
+        t, b, i = best
+        bays[b][0].insert(i, t)
+        bays[b][1].insert(i, t + self.duration)
+        return t
+
+
+_TRAVEL_MATRICES = OrderedDict()
+_TRAVEL_MATRICES_LOCK = threading.Lock()
+
+
+def get_travel_matrix(network_json):
+    """TravelTimeMatrix for a network, cached by a hash of the network JSON."""
+    key = network_fingerprint(network_json)
+    with _TRAVEL_MATRICES_LOCK:
+        matrix = _TRAVEL_MATRICES.get(key)
+        if matrix is not None:
+            _TRAVEL_MATRICES.move_to_end(key)
+            return matrix
+    matrix = TravelTimeMatrix(network_json)
+    with _TRAVEL_MATRICES_LOCK:
+        matrix = _TRAVEL_MATRICES.setdefault(key, matrix)
+        while len(_TRAVEL_MATRICES) > TRAVEL_MATRIX_CACHE_SIZE:
+            _TRAVEL_MATRICES.popitem(last=False)
+    return matrix
 
 
 def build_graph(network_json):
@@ -44,19 +302,108 @@ def build_graph(network_json):
         b = e["to"]
         t = float(e.get("travel_time_minutes", 0))
         G.add_edge(a, b, travel_time=t)
-    # ensure all nodes appear
+    # precomputed all-pairs travel times; shortest_travel_time reads from it
+    G.graph["travel_matrix"] = get_travel_matrix(network_json)
     return G
 
 
-def shortest_travel_time(G, src, dst):
+def shortest_travel_time(G, src, dst, at=None):
     if src == dst:
         return 0.0
+    matrix = G.graph.get("travel_matrix")
+    if matrix is not None:
+        return matrix.travel(src, dst, at)
     try:
         return nx.shortest_path_length(G, source=src, target=dst, weight="travel_time")
     except (nx.NetworkXNoPath, nx.NodeNotFound):
         return float("inf")
 
 
+def nearest_market(G, node, market_nodes, at=None):
+    """(market, travel_min) of the fastest-reachable market from node (leaving at `at`); (None, inf) if none."""
+    matrix = G.graph.get("travel_matrix")
+    if matrix is not None and getattr(matrix, "market_nodes", None) == list(market_nodes):
+        return matrix.nearest_market(node, at)
+    best_market, best_travel = None, float("inf")
+    for m in market_nodes:
+        tr = shortest_travel_time(G, node, m, at)
+        if tr < best_travel:
+            best_travel = tr
+            best_market = m
+    return best_market, best_travel
+
+
+def _courier_cap(c):
+    cap = c.get("max_carrying_capacity") or c.get("capacity") or 0
+    try:
+        return float(cap)
+    except Exception:
+        return 0.0
+
+
+def courier_capacity(couriers_info):
+    """Largest courier capacity (100 if none); used for extra witches beyond the fleet."""
+    courier_caps = [_courier_cap(c) for c in couriers_info]
+    if courier_caps:
+        return max(courier_caps)
+    return 100.0  # fallback
+
+
+def load_fleet(couriers_info):
+    """
+    Couriers as {courier_id, capacity, start_node, extra, ready_min, load}, largest
+    capacity first. ready_min / load (default 0) describe a witch that is already out
+    (rolling re-plans): free that many minutes after the start, carrying that much.
+    """
+    fleet = []
+    for i, c in enumerate(couriers_info):
+        cap = _courier_cap(c)
+        if cap <= 0:
+            continue
+        fleet.append({
+            # support both "courier_id" and or "id" naming
+            "courier_id": c.get("courier_id") or c.get("id") or f"courier_{i}",
+            "capacity": cap,
+            "start_node": c.get("start_node") or c.get("home_node") or c.get("current_node"),
+            "extra": bool(c.get("extra", False)),
+            "ready_min": float(c.get("ready_min") or 0.0),
+            "load": float(c.get("load") or 0.0),
+        })
+    fleet.sort(key=lambda c: -c["capacity"])
+    return fleet
+
+
+def capacity_preferences(forecasts, fleet):
+    """
+    cauldron -> capacity classes to try, in order. Cauldrons are ranked by fill rate
+    (potion to haul per minute) and matched to classes by cumulative share of fleet
+    capacity, so the heaviest cauldrons get the largest couriers first; the other
+    classes follow, nearest first. Empty if the fleet has a single class.
+    """
+    classes = sorted({c["capacity"] for c in fleet}, reverse=True)
+    if len(classes) <= 1:
+        return {}
+    total_cap = sum(c["capacity"] for c in fleet)
+    bounds, cum = [], 0.0
+    for cap in classes:
+        cum += cap * sum(1 for c in fleet if c["capacity"] == cap)
+        bounds.append(cum / total_cap)
+    orders = [[classes[i] for i in sorted(range(len(classes)), key=lambda i: (abs(i - k), i))]
+              for k in range(len(classes))]
+
+    rates = sorted(((float(f.get("fill_rate_per_min") or 0.0), cid) for cid, f in forecasts.items()),
+                   key=lambda x: -x[0])
+    total_rate = sum(r for r, _ in rates) or 1.0
+    prefs, cum, k = {}, 0.0, 0
+    for rate, cid in rates:
+        position = (cum + rate / 2) / total_rate
+        while k < len(bounds) - 1 and position > bounds[k]:
+            k += 1
+        prefs[cid] = orders[k]
+        cum += rate
+    return prefs
+
+
 def find_market_nodes(network_json, cauldron_ids):
     """
     Heuristic to find market nodes:
@@ -86,38 +433,210 @@ def find_market_nodes(network_json, cauldron_ids):
     return [next(iter(nodes))] if nodes else []
 
 
+class WitchPool:
+    """
+    Witches indexed by capacity class and by the time they become free, so a cauldron
+    can be given a feasible witch without scanning the whole fleet. Couriers that have
+    not been sent out yet wait in a per-class reserve, grouped by start node.
+
+    select() and activate() try capacity classes in the order given (see
+    capacity_preferences), falling through to the next class only if no witch of
+    the current one is feasible. Within a class the policy decides:
+      earliest_arrival  feasible witch that reaches the cauldron first. Witches are
+                        visited in available_at order and the scan stops once
+                        available_at + (fastest possible travel into the cauldron)
+                        cannot beat the best arrival found.
+      best_fit          feasible witch that became free most recently (keeps idle
+                        witches in reserve; scan from the deadline backwards, stop
+                        at the first feasible one).
+      first_fit         original behavior: first feasible witch in creation order
+                        (linear scan, kept for comparison).
+    """
+
+    def __init__(self, G, policy=WITCH_SELECTION_POLICY, fleet=()):
+        if policy not in ("earliest_arrival", "best_fit", "first_fit"):
+            raise ValueError(f"unknown witch selection policy: {policy}")
+        self.G = G
+        self.policy = policy
+        self.witches = []
+        self._by_available = {}        # capacity -> sorted [(available_at, id)]
+        self._by_id = {}
+        self._at_node = {}             # node -> number of witches currently there
+        self._reserve = {}             # capacity -> {start_node: [courier, ...]}
+        for courier in fleet:
+            self._reserve.setdefault(courier["capacity"], {}).setdefault(courier["start_node"], []).append(courier)
+
+    def __len__(self):
+        return len(self.witches)
+
+    def classes(self):
+        """Capacity classes present (active or in reserve), largest first."""
+        return sorted(set(self._by_available) | set(self._reserve), reverse=True)
+
+    def add(self, witch):
+        self.witches.append(witch)
+        self._by_id[witch["id"]] = witch
+        bisect.insort(self._by_available.setdefault(witch["capacity"], []), (witch["available_at"], witch["id"]))
+        self._at_node[witch["current_node"]] = self._at_node.get(witch["current_node"], 0) + 1
+
+    def reindex(self, witch, old_available, old_node=None):
+        """Call after changing a witch's available_at / current_node."""
+        index = self._by_available[witch["capacity"]]
+        i = bisect.bisect_left(index, (old_available, witch["id"]))
+        del index[i]
+        bisect.insort(index, (witch["available_at"], witch["id"]))
+        if old_node is not None and old_node != witch["current_node"]:
+            self._at_node[old_node] -= 1
+            self._at_node[witch["current_node"]] = self._at_node.get(witch["current_node"], 0) + 1
+
+    def _travel(self, witch, cid):
+        src = witch["current_node"]
+        return 0.0 if src is None else shortest_travel_time(self.G, src, cid, witch["available_at"])
+
+    def activate(self, cid, deadline, now, class_order=None):
+        """
+        Take the reserve courier that reaches cid soonest (by the deadline) from the
+        first class that has one. Once the deadline has passed every reachable courier
+        is late anyway, so the one with the least travel is taken rather than none.
+        Couriers without a known start node appear at the cauldron. (courier, travel_min)
+        or (None, None).
+        """
+        latest = deadline if deadline > now else None
+        for cap in class_order or self.classes():
+            by_start = self._reserve.get(cap)
+            if not by_start:
+                continue
+            best_start, best_travel = None, math.inf
+            for start in by_start:
+                travel_min = 0.0 if start is None else shortest_travel_time(self.G, start, cid, now)
+                if travel_min < best_travel and (latest is None or now + timedelta(minutes=travel_min) <= latest):
+                    best_start, best_travel = start, travel_min
+            if math.isinf(best_travel):
+                continue
+            couriers = by_start[best_start]
+            courier = couriers.pop(0)
+            if not couriers:
+                del by_start[best_start]
+                if not by_start:
+                    del self._reserve[cap]
+            return courier, best_travel
+        return None, None
+
+    def select(self, cid, deadline, class_order=None):
+        """(witch, travel_min, arrival) for the chosen feasible witch, or (None, None, None)."""
+        for cap in class_order or self.classes():
+            if cap in self._by_available:
+                best = self._select_in_class(cap, cid, deadline)
+                if best[0] is not None:
+                    return best
+        return None, None, None
+
+    def _select_in_class(self, cap, cid, deadline):
+        if self.policy == "first_fit":
+            for witch in self.witches:
+                if witch["capacity"] != cap:
+                    continue
+                travel_min = self._travel(witch, cid)
+                if math.isinf(travel_min):
+                    continue
+                arrival = witch["available_at"] + timedelta(minutes=travel_min)
+                if arrival <= deadline:
+                    return witch, travel_min, arrival
+            return None, None, None
+
+        by_available = self._by_available[cap]
+        # witches free after the deadline can never make it
+        cutoff = bisect.bisect_right(by_available, (deadline, float("inf")))
+        if self.policy == "best_fit":
+            for i in range(cutoff - 1, -1, -1):
+                witch = self._by_id[by_available[i][1]]
+                travel_min = self._travel(witch, cid)
+                if math.isinf(travel_min):
+                    continue
+                arrival = witch["available_at"] + timedelta(minutes=travel_min)
+                if arrival <= deadline:
+                    return witch, travel_min, arrival
+            return None, None, None
+
+        matrix = self.G.graph.get("travel_matrix")
+        if self._at_node.get(cid):
+            lower_bound = timedelta(0)
+        elif matrix is not None:
+            lb = matrix.min_travel_into(cid)
+            if math.isinf(lb):
+                return None, None, None
+            lower_bound = timedelta(minutes=lb)
+        else:
+            lower_bound = timedelta(0)
+        best = (None, None, None)
+        for i in range(cutoff):
+            available_at, wid = by_available[i]
+            if best[0] is not None and available_at + lower_bound >= best[2]:
+                break
+            witch = self._by_id[wid]
+            travel_min = self._travel(witch, cid)
+            if math.isinf(travel_min):
+                continue
+            arrival = available_at + timedelta(minutes=travel_min)
+            if arrival <= deadline and (best[0] is None or arrival < best[2]):
+                best = (witch, travel_min, arrival)
+        return best
+
+
 # ---------- CORE SIMULATION ----------
-def compute_minimum_witches_with_markets():
-    now = datetime.now(timezone.utc)
-
-    # Fetch data
-    network = fetch_json(API_NETWORK)
-    cauldron_info = fetch_json(API_CAULDRONS)
-    couriers_info = fetch_json(API_COURIERS)
-    result = process_all(api_fetch=True)
-    forecasts = result["forecasts"]
+def load_scheduler_inputs():
+    """Fetch network, cauldrons, couriers and audit forecasts (all endpoints concurrently, once)."""
+    network, cauldron_info, couriers_info, data_raw, tickets_raw = eog_client.fetch_all(
+        API_NETWORK, API_CAULDRONS, API_COURIERS, DATA_ENDPOINT, TICKETS_ENDPOINT)
+    result = process_all(api_fetch=False, data_json=data_raw, tickets_json=tickets_raw,
+                         cauldron_info_json=cauldron_info)
+    return network, cauldron_info, couriers_info, result["forecasts"]
+
+
+def compute_minimum_witches_with_markets(selection_policy=WITCH_SELECTION_POLICY, optimize=OPTIMIZE_ROUTES,
+                                         time_budget_sec=OPTIMIZER_TIME_BUDGET_SEC):
+    network, cauldron_info, couriers_info, forecasts = load_scheduler_inputs()
+    schedule = schedule_witches(network, cauldron_info, couriers_info, forecasts,
+                                selection_policy=selection_policy)
+    if not optimize:
+        return schedule
+    from route_optimizer import optimize_schedule
+    with span("optimization"):
+        return optimize_schedule(schedule, network, couriers_info, time_budget_sec=time_budget_sec)
+
+
+def schedule_witches(network, cauldron_info, couriers_info, forecasts, now=None,
+                     selection_policy=WITCH_SELECTION_POLICY, witch_states=None, first_due=None,
+                     market_bays=None):
+    """
+    Greedy overflow-driven simulation on already-loaded inputs (see module docstring).
+    witch_states are witches already out (rolling re-plans: id, courier_id, capacity,
+    extra, current_node, available_at, remaining_capacity); they are scheduled from
+    where and when they become free, and their couriers are not in the reserve.
+    first_due maps cauldrons to the minute before which they need no visit (e.g. the
+    projected overflow after collections already committed). market_bays: unload bays
+    per market (int or {market: n}; default MARKET_UNLOAD_BAYS, None = no queueing);
+    unloads then wait for a free bay and carry wait_min.
+    """
+    now = now or datetime.now(timezone.utc)
+
     fill_rates_map = {cid: f.get("fill_rate_per_min", 0) for cid, f in forecasts.items()}
     drain_rates_map = {cid: f.get("drain_rate_per_min", None) for cid, f in forecasts.items()}
 
     # graph and market nodes
-    G = build_graph(network)
-    cauldron_ids = set([c["id"] for c in cauldron_info])
-    market_nodes = find_market_nodes(network, cauldron_ids)
-
-    # compute courier capacity to use (choose maximum capacity available)
-    courier_caps = []
-    for c in couriers_info:
-        # support both "courier_id" and or "id" naming
-        cap = c.get("max_carrying_capacity") or c.get("capacity") or 0
-        try:
-            cap = float(cap)
-        except Exception:
-            cap = 0.0
-        courier_caps.append(cap)
-    if courier_caps:
-        COURIER_CAPACITY = max(courier_caps)
-    else:
-        COURIER_CAPACITY = 100.0  # fallback
+    with span("graph_build", items=len(network.get("edges", []))):
+        G = build_graph(network)
+        cauldron_ids = set([c["id"] for c in cauldron_info])
+        market_nodes = find_market_nodes(network, cauldron_ids)
+        G.graph["travel_matrix"] = G.graph["travel_matrix"].for_markets(market_nodes)
+
+    # courier fleet: each courier keeps its own capacity / start node; heavy cauldrons
+    # prefer the large classes. Extra witches (beyond the fleet) get the largest capacity.
+    fleet = load_fleet(couriers_info)
+    class_prefs = capacity_preferences(forecasts, fleet)
+    witch_states = list(witch_states or ())
+    busy = {w["courier_id"] for w in witch_states if w.get("courier_id")}
+    extra_capacity = courier_capacity(couriers_info)
 
     # build lookup for max volumes from cauldron_info
     max_vols = {c["id"]: c.get("max_volume") for c in cauldron_info}
@@ -131,14 +650,54 @@ def compute_minimum_witches_with_markets():
         if not rate or not maxv:
             continue
         t_to_overflow = max(0.0, (maxv - lvl) / rate)
+        if first_due and cid in first_due:
+            t_to_overflow = max(t_to_overflow, first_due[cid])
         heapq.heappush(pq, (t_to_overflow, cid))
 
-    witches = []  # each witch: {id, current_node, available_at(datetime), load}
+    market_bays = MARKET_UNLOAD_BAYS if market_bays is None else market_bays
+    queue = MarketQueue(market_bays, timedelta(minutes=UNLOAD_TIME_MIN)) if market_bays else None
+
+    pool = WitchPool(G, selection_policy, [c for c in fleet if c["courier_id"] not in busy])
+    witches = pool.witches  # each witch: {id, courier_id, capacity, current_node, available_at(datetime), ...}
     witch_id_seq = 0
+    for state in witch_states:
+        pool.add(dict(state, start_node=state.get("start_node") or state["current_node"], route=[]))
+        witch_id_seq = max(witch_id_seq, state["id"])
 
     # Detailed route actions per witch
     # actions: {"type":"collect"|"market_unload", "cauldron_id":..., "amount":..., "start":..., "end":..., "travel_min":...}
     # Start simulation loop
+    with span("simulation") as sim:
+        sim.add(_simulate(G, pool, pq, forecasts, now, drain_rates_map, max_vols, class_prefs,
+                          extra_capacity, market_nodes, queue, witch_id_seq))
+
+    # prepare response
+    response = {
+        "simulation_start": now.isoformat(),
+        "num_witches": len(witches),
+        "witches": witches,
+        "fleet": {
+            "couriers": len(fleet),
+            "dispatched": sum(1 for w in witches if not w["extra"]),
+            "extra_witches": sum(1 for w in witches if w["extra"]),
+        },
+        "market_nodes": market_nodes,
+        "forecast_summary": {
+            cid: {
+                "current_level": f.get("current_level"),
+                "fill_rate_per_min": f.get("fill_rate_per_min"),
+                "drain_rate_per_min": f.get("drain_rate_per_min"),
+                "max_volume": f.get("max_volume"),
+                "time_to_overflow_min": f.get("time_to_overflow_min")
+            } for cid, f in forecasts.items()
+        }
+    }
+    return response
+
+
+def _simulate(G, pool, pq, forecasts, now, drain_rates_map, max_vols, class_prefs, extra_capacity, market_nodes,
+              queue, witch_id_seq):
+    """Main loop of schedule_witches: serves cauldrons from pq in overflow order; returns the steps simulated."""
     simulated_steps = 0
     while pq:
         t_overflow, cid = heapq.heappop(pq)
@@ -156,40 +715,32 @@ def compute_minimum_witches_with_markets():
         if drain_rate < fill_rate:
             drain_rate = fill_rate
 
-        # Try existing witches
-        for witch in witches:
-            # compute travel time from witch current node to this cauldron
-            src = witch["current_node"]
-            if src is None:
-                travel_min = 0.0
+        # Pick an existing witch that can arrive before overflow - safety margin
+        deadline = overflow_time - timedelta(minutes=SAFETY_MARGIN_MIN)
+        class_order = class_prefs.get(cid)
+        witch, travel_min, arrival = pool.select(cid, deadline, class_order)
+        if witch is not None:
+            old_available, old_node = witch["available_at"], witch["current_node"]
+            # compute amount this witch can collect (remaining capacity)
+            remaining_capacity = witch["remaining_capacity"]
+            # target to lower cauldron to SAFE_LEVEL_RATIO*maxv
+            maxv = f.get("max_volume") or max_vols.get(cid)
+            if maxv is None:
+                target_after = 0.0
+            else:
+                target_after = SAFE_LEVEL_RATIO * maxv
+            possible_collectable = max(0.0, current_level - target_after)
+            collect_amount = min(possible_collectable, remaining_capacity)
+            if collect_amount <= 0:
+                # nothing meaningful to collect; skip assignment (could be already safe)
+                assigned = True  # treat as serviced
+                witch["current_node"] = cid
+                witch["available_at"] = arrival + timedelta(minutes=SERVICE_SETUP_MIN)
+                # recompute next overflow from current_level (no change)
+                next_t = (maxv - current_level) / fill_rate if fill_rate > 0 else None
+                if next_t:
+                    heapq.heappush(pq, (t_overflow + next_t, cid))
             else:
-                travel_min = shortest_travel_time(G, src, cid)
-            if travel_min == float("inf") or math.isinf(travel_min):
-                continue
-            arrival = witch["available_at"] + timedelta(minutes=travel_min)
-            # must arrive before overflow - safety margin
-            if arrival <= overflow_time - timedelta(minutes=SAFETY_MARGIN_MIN):
-                # compute amount this witch can collect (remaining capacity)
-                remaining_capacity = witch["remaining_capacity"]
-                # target to lower cauldron to SAFE_LEVEL_RATIO*maxv
-                maxv = f.get("max_volume") or max_vols.get(cid)
-                if maxv is None:
-                    target_after = 0.0
-                else:
-                    target_after = SAFE_LEVEL_RATIO * maxv
-                possible_collectable = max(0.0, current_level - target_after)
-                collect_amount = min(possible_collectable, remaining_capacity)
-                if collect_amount <= 0:
-                    # nothing meaningful to collect; skip assignment (could be already safe)
-                    assigned = True  # treat as serviced
-                    witch["current_node"] = cid
-                    witch["available_at"] = arrival + timedelta(minutes=SERVICE_SETUP_MIN)
-                    # recompute next overflow from current_level (no change)
-                    next_t = (maxv - current_level) / fill_rate if fill_rate > 0 else None
-                    if next_t:
-                        heapq.heappush(pq, (t_overflow + next_t, cid))
-                    break
-
                 # compute collection time using drain_rate (amount per minute)
                 collect_time_min = collect_amount / drain_rate if drain_rate > 0 else 0.0
                 start_collect = arrival + timedelta(minutes=SERVICE_SETUP_MIN)
@@ -202,7 +753,8 @@ def compute_minimum_witches_with_markets():
                     "amount": collect_amount,
                     "start": start_collect.isoformat(),
                     "end": end_collect.isoformat(),
-                    "travel_min": travel_min
+                    "travel_min": travel_min,
+                    "deadline": deadline.isoformat()
                 })
                 witch["current_node"] = cid
                 witch["available_at"] = end_collect
@@ -215,51 +767,57 @@ def compute_minimum_witches_with_markets():
                 # if witch full -> send to nearest market
                 if witch["remaining_capacity"] <= 1e-6:
                     # find nearest market node
-                    best_market = None
-                    best_travel = float("inf")
-                    for m in market_nodes:
-                        tr = shortest_travel_time(G, witch["current_node"], m)
-                        if tr < best_travel:
-                            best_travel = tr
-                            best_market = m
+                    best_market, best_travel = nearest_market(G, witch["current_node"], market_nodes,
+                                                              witch["available_at"])
                     if best_market is None or math.isinf(best_travel):
                         # no market reachable; assume witch stays and unloads nowhere (skip)
                         pass
                     else:
-                        # travel to market
+                        # travel to market (and wait for a free bay)
                         arrival_market = witch["available_at"] + timedelta(minutes=best_travel)
-                        start_unload = arrival_market
+                        start_unload = queue.book(best_market, arrival_market) if queue else arrival_market
                         end_unload = start_unload + timedelta(minutes=UNLOAD_TIME_MIN)
                         witch["route"].append({
                             "type": "market_unload",
                             "market_node": best_market,
-                            "amount_unloaded": (COURIER_CAPACITY - witch["remaining_capacity"]),  # how much was carried
+                            "amount_unloaded": (witch["capacity"] - witch["remaining_capacity"]),  # how much was carried
                             "start": start_unload.isoformat(),
                             "end": end_unload.isoformat(),
                             "travel_min": best_travel
                         })
+                        if queue:
+                            witch["route"][-1]["wait_min"] = (start_unload - arrival_market).total_seconds() / 60.0
                         witch["current_node"] = best_market
                         witch["available_at"] = end_unload
-                        witch["remaining_capacity"] = COURIER_CAPACITY  # emptied
+                        witch["remaining_capacity"] = witch["capacity"]  # emptied
                 # after servicing, recompute next overflow time using current_level and fill_rate
                 maxv = f.get("max_volume") or max_vols.get(cid)
                 if fill_rate > 0 and maxv:
                     t_next = (maxv - current_level) / fill_rate
                     heapq.heappush(pq, (t_overflow + t_next, cid))
-                break
+            pool.reindex(witch, old_available, old_node)
 
         if assigned:
             simulated_steps += 1
             continue
 
-        # If not assigned, spawn a new witch at 'now' starting at this cauldron
+        # If not assigned, send out a reserve courier at 'now' (from its start node, or
+        # starting at this cauldron); if none can make it, add an extra witch
         witch_id_seq += 1
-        start_time = now
+        courier, start_travel = pool.activate(cid, deadline, now, class_order)
+        if courier is None:
+            courier, start_travel = {"courier_id": None, "capacity": extra_capacity, "start_node": None,
+                                     "extra": True}, 0.0
+        start_time = now + timedelta(minutes=start_travel)
         new_witch = {
             "id": witch_id_seq,
+            "courier_id": courier["courier_id"],
+            "capacity": courier["capacity"],
+            "extra": courier["extra"],
+            "start_node": courier["start_node"] or cid,
             "current_node": cid,
             "available_at": start_time,   # will become after service
-            "remaining_capacity": COURIER_CAPACITY,
+            "remaining_capacity": courier["capacity"],
             "route": []
         }
         # compute collection for new witch
@@ -279,7 +837,8 @@ def compute_minimum_witches_with_markets():
                 "amount": collect_amount,
                 "start": start_collect.isoformat(),
                 "end": end_collect.isoformat(),
-                "travel_min": 0.0
+                "travel_min": start_travel,
+                "deadline": deadline.isoformat()
             })
             new_witch["available_at"] = end_collect
             new_witch["remaining_capacity"] -= collect_amount
@@ -288,34 +847,31 @@ def compute_minimum_witches_with_markets():
 
             # if full -> go market
             if new_witch["remaining_capacity"] <= 1e-6:
-                best_market = None
-                best_travel = float("inf")
-                for m in market_nodes:
-                    tr = shortest_travel_time(G, new_witch["current_node"], m)
-                    if tr < best_travel:
-                        best_travel = tr
-                        best_market = m
+                best_market, best_travel = nearest_market(G, new_witch["current_node"], market_nodes,
+                                                          new_witch["available_at"])
                 if best_market and not math.isinf(best_travel):
                     arrival_market = new_witch["available_at"] + timedelta(minutes=best_travel)
-                    start_unload = arrival_market
+                    start_unload = queue.book(best_market, arrival_market) if queue else arrival_market
                     end_unload = start_unload + timedelta(minutes=UNLOAD_TIME_MIN)
                     new_witch["route"].append({
                         "type": "market_unload",
                         "market_node": best_market,
-                        "amount_unloaded": (COURIER_CAPACITY - new_witch["remaining_capacity"]),
+                        "amount_unloaded": (new_witch["capacity"] - new_witch["remaining_capacity"]),
                         "start": start_unload.isoformat(),
                         "end": end_unload.isoformat(),
                         "travel_min": best_travel
                     })
+                    if queue:
+                        new_witch["route"][-1]["wait_min"] = (start_unload - arrival_market).total_seconds() / 60.0
                     new_witch["current_node"] = best_market
                     new_witch["available_at"] = end_unload
-                    new_witch["remaining_capacity"] = COURIER_CAPACITY
+                    new_witch["remaining_capacity"] = new_witch["capacity"]
 
         else:
             # nothing to collect, just mark available after small setup
             new_witch["available_at"] = start_time + timedelta(minutes=SERVICE_SETUP_MIN)
 
-        witches.append(new_witch)
+        pool.add(new_witch)
 
         # recompute next overflow from current_level
         if fill_rate > 0 and maxv:
@@ -326,24 +882,7 @@ def compute_minimum_witches_with_markets():
         # safety net
         if simulated_steps > 100000:
             break
-
-    # prepare response
-    response = {
-        "simulation_start": now.isoformat(),
-        "num_witches": len(witches),
-        "witches": witches,
-        "market_nodes": market_nodes,
-        "forecast_summary": {
-            cid: {
-                "current_level": f.get("current_level"),
-                "fill_rate_per_min": f.get("fill_rate_per_min"),
-                "drain_rate_per_min": f.get("drain_rate_per_min"),
-                "max_volume": f.get("max_volume"),
-                "time_to_overflow_min": f.get("time_to_overflow_min")
-            } for cid, f in forecasts.items()
-        }
-    }
-    return response
+    return simulated_steps
 
 
 # ---------- Runner ----------
@@ -351,6 +890,6 @@ if __name__ == "__main__":
     out = compute_minimum_witches_with_markets()
     print(f"Computed schedule using {out['num_witches']} witches")
     for w in out["witches"]:
-        print(f"\nWitch {w['id']} (start node {w['current_node']}):")
+        print(f"\nWitch {w['id']} ({w['courier_id'] or 'extra'}, capacity {w['capacity']}, start node {w['start_node']}):")
         for a in w["route"]:
             print(" ", a)
@@ -0,0 +1,62 @@
+"""
+parallel_audit.py
+
+Process-pool execution of the per-cauldron stage of ttst.process_all
+(fill-rate estimation, drain detection with the selected engine, event rows and
+drain rates), so the parent only appends the rows and sums up.
+
+The telemetry arrays are written once to memory-mapped .npy files (levels stored
+cauldron-major so each column is contiguous); workers map them read-only instead
+of receiving pickled series, and send back only the small per-cauldron results.
+Results are merged in column order, so the output is identical to the serial path.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ttst import DRAIN_ENGINE, analyze_cauldron
+
+SHARDS_PER_WORKER = 4          # smaller shards even out cauldrons with very different history lengths
+
+
+def _analyze_shard(epochs_path, levels_path, cols, fill_rate_window_hours, drain_engine):
+    epochs = np.load(epochs_path, mmap_mode="r")
+    levels_t = np.load(levels_path, mmap_mode="r")
+    out = []
+    for col in cols:
+        column = np.asarray(levels_t[col])
+        present = ~np.isnan(column)
+        out.append((col, analyze_cauldron(np.asarray(epochs[present]), column[present], fill_rate_window_hours,
+                                          drain_engine)))
+    return out
+
+
+def analyze_cauldrons_parallel(telemetry, workers, fill_rate_window_hours=None, drain_engine=DRAIN_ENGINE):
+    """Return analyze_cauldron() results for every column, in column order."""
+    n_cols = len(telemetry["cauldron_ids"])
+    shards = [s.tolist() for s in np.array_split(np.arange(n_cols), min(n_cols, workers * SHARDS_PER_WORKER))]
+
+    with tempfile.TemporaryDirectory(prefix="elixirnet-") as tmp:
+        epochs_path = os.path.join(tmp, "epochs.npy")
+        levels_path = os.path.join(tmp, "levels_t.npy")
+        np.save(epochs_path, telemetry["epochs"])
+        levels_t = np.lib.format.open_memmap(levels_path, mode="w+", dtype=np.float64,
+                                             shape=(n_cols, len(telemetry["epochs"])))
+        levels = telemetry["levels"]          # dense, or snapshot_store.PartitionedLevels
+        for col in range(n_cols):
+            levels_t[col] = levels[:, col]
+        levels_t.flush()
+        del levels_t
+
+        results = [None] * n_cols
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_analyze_shard, epochs_path, levels_path, shard, fill_rate_window_hours,
+                                   drain_engine)
+                       for shard in shards if shard]
+            for fut in futures:
+                for col, analysis in fut.result():
+                    results[col] = analysis
+    return results
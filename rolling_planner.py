@@ -0,0 +1,263 @@
+"""
+rolling_planner.py
+
+Rolling-horizon re-planning for the courier scheduler. Instead of planning from
+scratch on every call (compute_minimum_witches_with_markets), a RollingPlanner keeps
+the plan between ticks and on each tick (fresh forecasts, e.g. every few minutes):
+- commits the route prefix of every witch up to the actions it has to set out for
+  within FREEZE_MIN of now (travel + setup before the start time); the unload run of
+  a full witch goes with the collection that filled it. Committed actions are never
+  changed again, finished ones drop out of the plan
+- derives each witch's state after its committed actions: position, load and
+  available_at; couriers not yet sent out stay in the reserve
+- moves the first visit of cauldrons with committed collections to their projected
+  overflow after those collections (schedule_witches first_due)
+- re-plans only the uncommitted tail: schedule_witches starting from those witch
+  states, then (optimize=True) route_optimizer with whatever is left of the tick
+  budget, warm-started from the previous tail
+Extra witches get a stable courier_id ("extra-<n>") once they have committed work,
+so they are tracked across ticks like fleet couriers.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import eog_client
+from optimized_routes import (
+    API_NETWORK, API_CAULDRONS, API_COURIERS, SERVICE_SETUP_MIN, WITCH_SELECTION_POLICY, schedule_witches,
+)
+from instrumentation import span
+
+# ---------- CONFIG ----------
+FREEZE_MIN = 5.0          # actions a witch sets out for within this many minutes are committed
+TICK_BUDGET_SEC = 0.5     # compute budget per tick; the optimizer gets what the greedy pass leaves
+FULL_EPS = 1e-6
+
+
+def _t(iso):
+    return datetime.fromisoformat(iso)
+
+
+def _departure(action):
+    """When the witch has to leave for this action."""
+    lead = (action.get("travel_min") or 0.0) + (action.get("wait_min") or 0.0)
+    if action["type"] == "collect":
+        lead += SERVICE_SETUP_MIN
+    return _t(action["start"]) - timedelta(minutes=lead)
+
+
+def _fold(state, action):
+    """Witch state (node, load, free_at) after an action."""
+    if action["type"] == "collect":
+        return action["cauldron_id"], state[1] + action["amount"], _t(action["end"])
+    return action["market_node"], 0.0, _t(action["end"])
+
+
+class RollingPlanner:
+    def __init__(self, network, cauldron_info, couriers_info, freeze_min=FREEZE_MIN, budget_sec=TICK_BUDGET_SEC,
+                 optimize=True, selection_policy=WITCH_SELECTION_POLICY, keep_history=False):
+        self.network = network
+        self.cauldron_info = cauldron_info
+        self.couriers_info = couriers_info
+        self.freeze_min = freeze_min
+        self.budget_sec = budget_sec
+        self.optimize = optimize
+        self.selection_policy = selection_policy
+        self.ticks = 0
+        self.completed = 0          # actions finished since the first tick
+        self._witches = {}          # courier_id -> {capacity, extra, base (node, load, free_at), committed}
+        self._tail = None           # last re-planned tail (schedule response)
+        self._extra_seq = 0
+        self.history = [] if keep_history else None   # (courier_id, action) of every committed action
+        self._lock = threading.Lock()
+
+    # ----- committing -----
+    def _witch(self, courier_id, capacity, extra, start_node, start):
+        w = self._witches.get(courier_id)
+        if w is None:
+            w = self._witches[courier_id] = {"capacity": capacity, "extra": extra,
+                                             "base": (start_node, 0.0, start), "committed": []}
+        return w
+
+    def _commit(self, now):
+        """Move the due prefix of every tail route into the committed actions; fold finished ones."""
+        horizon = now + timedelta(minutes=self.freeze_min)
+        for tw in (self._tail or {}).get("witches", []):
+            route = tw["route"]
+            n = 0
+            while n < len(route) and _departure(route[n]) <= horizon:
+                n += 1
+            if not n:
+                continue
+            key = tw.get("courier_id")
+            if key is None:
+                self._extra_seq += 1
+                key = f"extra-{self._extra_seq}"
+            w = self._witch(key, tw["capacity"], tw["extra"], tw["start_node"],
+                            _t(self._tail["simulation_start"]))
+            node, load, _ = self.state(dict(w, committed=w["committed"] + route[:n]))
+            if n < len(route) and route[n]["type"] == "market_unload" and load >= w["capacity"] - FULL_EPS:
+                n += 1
+            w["committed"].extend(route[:n])
+            if self.history is not None:
+                self.history.extend((key, a) for a in route[:n])
+        for w in self._witches.values():
+            while w["committed"] and _t(w["committed"][0]["end"]) <= now:
+                w["base"] = _fold(w["base"], w["committed"].pop(0))
+                self.completed += 1
+
+    @staticmethod
+    def state(w):
+        s = w["base"]
+        for a in w["committed"]:
+            s = _fold(s, a)
+        return s
+
+    def _witch_states(self, now):
+        states = []
+        for wid, (key, w) in enumerate(sorted(self._witches.items()), start=1):
+            node, load, free_at = self.state(w)
+            states.append({"id": wid, "courier_id": key, "capacity": w["capacity"], "extra": w["extra"],
+                           "start_node": node, "current_node": node, "available_at": max(now, free_at),
+                           "remaining_capacity": max(0.0, w["capacity"] - load)})
+        return states
+
+    def _vehicles(self, states, now):
+        """couriers_info for the optimizer: witches already out start from their state (see load_fleet)."""
+        by_key = {s["courier_id"]: s for s in states}
+        out = []
+        for c in self.couriers_info:
+            s = by_key.pop(c.get("courier_id") or c.get("id"), None)
+            out.append(c if s is None else dict(c, **self._vehicle(s, now)))
+        for s in by_key.values():   # extra witches with committed work
+            out.append(dict(courier_id=s["courier_id"], max_carrying_capacity=s["capacity"], extra=True,
+                            **self._vehicle(s, now)))
+        return out
+
+    @staticmethod
+    def _vehicle(state, now):
+        return {"start_node": state["current_node"],
+                "ready_min": (state["available_at"] - now).total_seconds() / 60.0,
+                "load": state["capacity"] - state["remaining_capacity"]}
+
+    def _first_due(self, forecasts, now):
+        """
+        Minutes from now until cauldrons with committed collections overflow again:
+        the level at the end of the last one (fill included, what is still to be
+        collected taken out) refilling at the fill rate.
+        """
+        pending, until = {}, {}
+        for w in self._witches.values():
+            for a in w["committed"]:
+                if a["type"] != "collect":
+                    continue
+                cid, start, end = a["cauldron_id"], _t(a["start"]), _t(a["end"])
+                left = 1.0 if end <= start else min(1.0, max(0.0, (end - now) / (end - start)))
+                pending[cid] = pending.get(cid, 0.0) + a["amount"] * left
+                until[cid] = max(until.get(cid, now), end)
+        due = {}
+        for cid, amount in pending.items():
+            f = forecasts.get(cid) or {}
+            rate, maxv = f.get("fill_rate_per_min"), f.get("max_volume")
+            if not rate or not maxv:
+                continue
+            t_end = (until[cid] - now).total_seconds() / 60.0
+            level = min(maxv, float(f.get("current_level") or 0.0) + rate * t_end)
+            due[cid] = t_end + (maxv - max(0.0, level - amount)) / rate
+        return due
+
+    # ----- ticks -----
+    def tick(self, forecasts, now=None, budget_sec=None, optimize=None):
+        """
+        Commit what is due, re-plan the tail from fresh forecasts; returns the merged plan.
+        budget_sec / optimize override the planner's settings for this tick only.
+        """
+        budget_sec = self.budget_sec if budget_sec is None else budget_sec
+        optimize = self.optimize if optimize is None else optimize
+        with self._lock:
+            t0 = time.monotonic()
+            now = now or datetime.now(timezone.utc)
+            self._commit(now)
+            states = self._witch_states(now)
+            with span("replan", items=len(states)):
+                tail = schedule_witches(self.network, self.cauldron_info, self.couriers_info, forecasts, now=now,
+                                        selection_policy=self.selection_policy, witch_states=states,
+                                        first_due=self._first_due(forecasts, now))
+                greedy_sec = time.monotonic() - t0
+                left = budget_sec - greedy_sec
+                if optimize and left > 0 and tail["witches"]:
+                    from route_optimizer import optimize_schedule
+                    tail = optimize_schedule(tail, self.network, self._vehicles(states, now), time_budget_sec=left,
+                                             warm_start=self._tail if self._tail and "optimizer" in self._tail else None)
+            self._tail = tail
+            self.ticks += 1
+            return self._response(tail, now, greedy_sec, time.monotonic() - t0, budget_sec)
+
+    def _response(self, tail, now, greedy_sec, elapsed_sec, budget_sec):
+        committed = {k: w for k, w in self._witches.items() if w["committed"]}
+        witches, seen = [], set()
+        for tw in tail["witches"]:
+            key = tw.get("courier_id")
+            done = committed.get(key, {}).get("committed", []) if key is not None else []
+            seen.add(key)
+            if done or tw["route"]:
+                witches.append(dict(tw, route=[dict(a, committed=True) for a in done] + tw["route"]))
+        for key, w in committed.items():
+            if key not in seen:
+                node, load, free_at = self.state(w)
+                witches.append({"courier_id": key, "capacity": w["capacity"], "extra": w["extra"],
+                                "start_node": w["base"][0], "current_node": node, "available_at": free_at,
+                                "remaining_capacity": w["capacity"] - load,
+                                "route": [dict(a, committed=True) for a in w["committed"]]})
+        for wid, w in enumerate(witches, start=1):
+            w["id"] = wid
+        n_committed = sum(len(w["committed"]) for w in committed.values())
+        return dict(
+            tail,
+            num_witches=len(witches),
+            witches=witches,
+            fleet=dict(tail.get("fleet", {}), dispatched=sum(1 for w in witches if not w["extra"]),
+                       extra_witches=sum(1 for w in witches if w["extra"])),
+            rolling={
+                "tick": self.ticks,
+                "now": now.isoformat(),
+                "freeze_min": self.freeze_min,
+                "committed_actions": n_committed,
+                "replanned_actions": sum(len(w["route"]) for w in tail["witches"]),
+                "completed_actions": self.completed,
+                "greedy_ms": round(greedy_sec * 1000, 3),
+                "elapsed_ms": round(elapsed_sec * 1000, 3),
+                "budget_sec": budget_sec,
+                "optimizer": tail.get("optimizer", {}).get("status"),
+            },
+        )
+
+
+# ---------- Process-wide planner ----------
+_PLANNER = None
+_PLANNER_KEY = None
+_PLANNER_LOCK = threading.Lock()
+
+
+def get_rolling_planner(network, cauldron_info, couriers_info, reset=False):
+    """
+    Shared planner; started over when the network, cauldrons or couriers change (or reset).
+    Per-tick settings (budget, optimize) are passed to tick() and keep the committed plan.
+    """
+    global _PLANNER, _PLANNER_KEY
+    from schedule_cache import structure_key
+    key = structure_key(network, cauldron_info, couriers_info, None)
+    with _PLANNER_LOCK:
+        if reset or _PLANNER is None or key != _PLANNER_KEY:
+            _PLANNER = RollingPlanner(network, cauldron_info, couriers_info)
+            _PLANNER_KEY = key
+        return _PLANNER
+
+
+def rolling_tick(reset=False, budget_sec=None, optimize=None):
+    """One tick of the shared planner on the current upstream data (/api/optimization/rolling)."""
+    from schedule_cache import get_schedule_cache
+    network, cauldron_info, couriers_info = eog_client.fetch_all(API_NETWORK, API_CAULDRONS, API_COURIERS)
+    planner = get_rolling_planner(network, cauldron_info, couriers_info, reset=reset)
+    return planner.tick(get_schedule_cache().current_forecasts(), budget_sec=budget_sec, optimize=optimize)
@@ -0,0 +1,661 @@
+"""
+route_optimizer.py
+
+Improvement pass over the greedy schedule from optimized_routes.schedule_witches
+(local search + large-neighbourhood search, anytime within a time budget).
+
+Every collect action of the greedy schedule becomes a job with a fixed amount,
+collection time and deadline (overflow - SAFETY_MARGIN_MIN), the same model the
+greedy pass uses. A witch route is a courier (capacity, start node) plus an
+ordered job list; it is re-timed from the simulation start with the same rules
+as the greedy pass:
+- the courier leaves its start node at simulation start (a witch already out, see
+  load_fleet, leaves its current node once free, with its load on board); a courier
+  without a known start node (and an extra witch) starts at its first cauldron
+- SERVICE_SETUP_MIN before each collection, collection time = amount / drain rate
+- when full, or when the next job would not fit its capacity, the witch unloads
+  at the nearest market (UNLOAD_TIME_MIN) first
+- a route is feasible if every arrival is before its job's deadline
+- on a time-dependent network (TravelTimeMatrix layers) each trip takes the
+  travel time of its departure time of day, like the greedy pass
+Market bays (MARKET_UNLOAD_BAYS / market_bays) are not modelled by the moves; a new
+best solution is only taken if its routes, re-timed together through a MarketQueue,
+still meet every deadline, and the output carries those queued times. While no
+solution has passed yet (the greedy routes may not, re-timed in arrival order), any
+one no worse than the greedy schedule is tried; if none passes within the budget the
+greedy schedule is kept ("queue_infeasible").
+
+Moves: relocate, swap, 2-opt (segment reversal), 2-opt* (tail exchange),
+remove-route and random destroy/repair. Each route keeps its prefix states, so
+trying an insertion only re-times the route from the insertion point on, and a
+move only re-times the routes it touches. On a static network the rest of the route
+is not re-timed at all: best_insertion keeps per-position slack (how late each
+suffix may start) and spare capacity, so each position is checked in O(1) and only
+falls back to re-timing the suffix when an insertion changes where the witch unloads. New routes take an idle courier of the
+fleet when one can make it, else an extra witch.
+Objective: fewest extra witches, then fewest witches, then least travel time.
+
+Warm start: given an earlier optimized schedule for the same network and fleet,
+its routes are mapped onto the new jobs (each visit takes the job of the same
+cauldron with the nearest deadline), jobs that no longer fit are re-inserted, and
+the search starts from whichever of that and the greedy schedule is better.
+"""
+
+import heapq
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+from optimized_routes import (
+    MARKET_UNLOAD_BAYS, SERVICE_SETUP_MIN, UNLOAD_TIME_MIN, OPTIMIZER_TIME_BUDGET_SEC, MarketQueue,
+    courier_capacity, get_travel_matrix, load_fleet, minute_of_day,
+)
+
+# ---------- CONFIG ----------
+DESTROY_FRACTION = 0.15       # share of jobs removed by a destroy/repair move
+DESTROY_MAX_JOBS = 40
+START_TEMPERATURE = 0.05      # annealing temperature as a fraction of the mean route travel time
+MOVE_WEIGHTS = {"relocate": 4, "swap": 2, "two_opt": 1, "two_opt_star": 2, "remove_route": 1, "destroy_repair": 1}
+EPS = 1e-6
+
+EMPTY_STATE = (0.0, None, 0.0, 0.0)   # (time_min, node, load, travel_min) before the first job
+
+
+def _minutes(iso, now):
+    return (datetime.fromisoformat(iso) - now).total_seconds() / 60.0
+
+
+def extract_jobs(schedule, couriers_info):
+    """
+    Jobs (times in minutes after simulation_start), the schedule's routes as
+    (vehicle, job indices) and the fleet couriers it leaves idle.
+    """
+    now = datetime.fromisoformat(schedule["simulation_start"])
+    fleet = {c["courier_id"]: c for c in load_fleet(couriers_info)}
+    extra_capacity = courier_capacity(couriers_info)
+    jobs, routes = [], []
+    for w in schedule["witches"]:
+        route = []
+        for a in w["route"]:
+            if a["type"] != "collect":
+                continue
+            start = _minutes(a["start"], now)
+            deadline = _minutes(a["deadline"], now) if a.get("deadline") else start - SERVICE_SETUP_MIN
+            route.append(len(jobs))
+            jobs.append({
+                "cauldron_id": a["cauldron_id"],
+                "amount": float(a["amount"]),
+                "duration": _minutes(a["end"], now) - start,
+                "deadline": max(deadline, 0.0),
+                "deadline_min": deadline,
+                "deadline_iso": a.get("deadline"),
+            })
+        vehicle = fleet.pop(w.get("courier_id"), None) or {
+            "courier_id": None, "capacity": w.get("capacity") or extra_capacity, "start_node": None, "extra": True}
+        if route:
+            routes.append((vehicle, route))
+        elif vehicle["courier_id"] is not None:
+            fleet[vehicle["courier_id"]] = vehicle
+    return now, jobs, routes, list(fleet.values())
+
+
+class RouteEvaluator:
+    """
+    Re-times job sequences against a TravelTimeMatrix; states are (time, node, load, travel).
+    now (the simulation start) anchors minute 0 to the time of day of a time-dependent
+    matrix; queue, when set, is a MarketQueue (in minutes) that unloads book bays in.
+    """
+
+    def __init__(self, jobs, matrix, now=None):
+        self.jobs = jobs
+        self.dist = None if matrix.time_dependent else matrix.dist.tolist()
+        self.market_time = matrix.market_time.tolist()
+        self.market_node = matrix.market_idx.tolist()
+        self.matrix = matrix if matrix.time_dependent else None
+        self.clock0 = minute_of_day(now) if now is not None else 0.0
+        self.queue = None
+        self.index = matrix.index
+        self.names = list(matrix.nodes)
+        # cauldrons missing from the network get their own negative id (reachable from nowhere)
+        self.node = []
+        for k, j in enumerate(jobs):
+            idx = matrix.index.get(j["cauldron_id"])
+            self.node.append(idx if idx is not None else -(k + 1))
+        self.amount = [j["amount"] for j in jobs]
+        self.duration = [j["duration"] for j in jobs]
+        self.deadline = [j["deadline"] for j in jobs]
+
+    def name(self, node):
+        return self.names[node] if node >= 0 else self.jobs[-node - 1]["cauldron_id"]
+
+    def start_state(self, vehicle):
+        if vehicle["start_node"] is None:
+            return EMPTY_STATE
+        idx = self.index.get(vehicle["start_node"])
+        return None if idx is None else (vehicle.get("ready_min", 0.0), idx, vehicle.get("load", 0.0), 0.0)
+
+    def _layer(self, t):
+        return 0 if self.matrix is None else self.matrix.layer_at(self.clock0 + t)
+
+    def _travel(self, a, b, t):
+        if a == b:
+            return 0.0
+        if a < 0 or b < 0:
+            return math.inf
+        if self.matrix is None:
+            return self.dist[a][b]
+        return float(self.matrix.dists[self._layer(t), a, b])
+
+    def _unload(self, state, actions):
+        t, node, load, travel = state
+        k = self._layer(t)
+        m = self.market_time[k][node] if node >= 0 else math.inf
+        if math.isinf(m):
+            return None
+        market = self.market_node[k][node]
+        start = self.queue.book(market, t + m) if self.queue is not None else t + m
+        if actions is not None:
+            actions.append(("market_unload", market, load, start, start + UNLOAD_TIME_MIN, m, start - (t + m)))
+        return (start + UNLOAD_TIME_MIN, market, 0.0, travel + m)
+
+    def advance(self, state, j, capacity, actions=None):
+        """State after appending job j to a route in `state`; None if infeasible."""
+        amt = self.amount[j]
+        if amt > capacity + EPS:
+            return None
+        if state[1] is None:
+            # no start node: the witch starts at the job's cauldron at simulation start
+            t, node, load, travel, d = 0.0, self.node[j], 0.0, state[3], 0.0
+        else:
+            if state[2] + amt > capacity + EPS:
+                state = self._unload(state, actions)
+                if state is None:
+                    return None
+            t, node, load, travel = state
+            d = self._travel(node, self.node[j], t)
+            t += d
+            if t > self.deadline[j] + EPS:
+                return None
+            travel += d
+            node = self.node[j]
+        start = t + SERVICE_SETUP_MIN
+        end = start + self.duration[j]
+        if actions is not None:
+            actions.append(("collect", j, amt, start, end, d, 0.0))
+        state = (end, node, load + amt, travel)
+        if capacity - state[2] <= EPS:
+            # full: straight to the nearest market (stays loaded if none is reachable)
+            state = self._unload(state, actions) or state
+        return state
+
+    def states(self, vehicle, route):
+        """Prefix states [before job 0, after job 0, ...]; None if the route is infeasible."""
+        s = self.start_state(vehicle)
+        if s is None:
+            return None
+        out = [s]
+        for j in route:
+            s = self.advance(s, j, vehicle["capacity"])
+            if s is None:
+                return None
+            out.append(s)
+        return out
+
+    def cost_from(self, state, seq, capacity):
+        """Travel of the route continuing from `state` with jobs `seq`; None if infeasible."""
+        for j in seq:
+            state = self.advance(state, j, capacity)
+            if state is None:
+                return None
+        return state[3]
+
+    def suffix_slack(self, vehicle, route, states):
+        """
+        (slack, room) per position k of a feasible route: slack[k] is how many minutes
+        later jobs k.. may all start and still meet their deadlines, room[k] the capacity
+        left at the fullest point before the next unload from job k on. None where a
+        delay does not simply shift the rest of the route (time-dependent travel, queue).
+        """
+        if self.matrix is not None or self.queue is not None or not route:
+            return None
+        cap, n = vehicle["capacity"], len(route)
+        slack, room = [math.inf] * (n + 1), [math.inf] * (n + 1)
+        peak, unload_next = None, True
+        for k in range(n - 1, -1, -1):
+            j, before, after = route[k], states[k], states[k + 1]
+            load = self.amount[j]
+            unload_before = before[1] is not None and before[2] + load > cap + EPS
+            if before[1] is not None and not unload_before:
+                load += before[2]
+            end = after[0]
+            if after[2] < load - EPS:
+                # full after job k: `after` is the state after its market unload
+                end -= UNLOAD_TIME_MIN + self.market_time[0][self.node[j]]
+                unload_next = True
+            if unload_next:
+                peak = load
+            slack[k] = min(slack[k + 1], self.deadline[j] - (end - self.duration[j] - SERVICE_SETUP_MIN))
+            room[k] = cap - peak
+            unload_next = unload_before
+        return slack, room
+
+    def best_insertion(self, vehicle, route, states, j, slack=False):
+        """
+        (position, travel) of the cheapest feasible insertion of job j, or (None, inf).
+        slack: suffix_slack() of the route if the caller keeps it, computed here otherwise.
+        """
+        cap = vehicle["capacity"]
+        best_pos, best_cost = None, math.inf
+        if slack is False:
+            slack = self.suffix_slack(vehicle, route, states)
+        # on a static network a later start shifts the rest of the route by the same delay
+        slack, room = slack or (None, None)
+        for p in range(len(route) + 1):
+            s = self.advance(states[p], j, cap)
+            if s is None or s[3] >= best_cost:
+                continue
+            if p == len(route):
+                c = s[3]
+            elif slack is not None:
+                s = self.advance(s, route[p], cap)
+                if s is None:
+                    continue
+                old = states[p + 1]
+                extra = s[2] - old[2]
+                if s[1] == old[1] and (abs(extra) <= EPS or 0 < extra < room[p + 1] - EPS):
+                    # same unloads as before: the rest only starts s[0] - old[0] later
+                    if s[0] - old[0] > slack[p + 1] + EPS:
+                        continue
+                    c = states[-1][3] + s[3] - old[3]
+                else:
+                    c = self.cost_from(s, route[p + 1:], cap)
+            else:
+                c = self.cost_from(s, route[p:], cap)
+            # ties (within EPS: suffix travel is summed in another order) go to the earliest position
+            if c is not None and c < best_cost - EPS:
+                best_pos, best_cost = p, c
+        return best_pos, best_cost
+
+
+class LocalSearch:
+    def __init__(self, evaluator, routes, idle, extra_capacity, rng):
+        self.ev = evaluator
+        self.rng = rng
+        self.extra_capacity = extra_capacity
+        self.vehicles, self.routes, self.states = [], [], []
+        for vehicle, r in routes:
+            self.vehicles.append(vehicle)
+            self.routes.append(list(r))
+            self.states.append(evaluator.states(vehicle, r))
+        self._slack = [False] * len(self.routes)   # suffix_slack per route, computed on demand
+        # idle couriers, largest first; couriers whose start node is off the network are never usable
+        self.idle = sorted((v for v in idle if evaluator.start_state(v) is not None),
+                           key=lambda v: -v["capacity"])
+
+    def feasible(self):
+        return all(s is not None for s in self.states)
+
+    def travel(self):
+        return sum(s[-1][3] for s in self.states)
+
+    def key(self):
+        return (sum(1 for v in self.vehicles if v["extra"]), len(self.routes), self.travel())
+
+    def snapshot(self):
+        return [(v, list(r)) for v, r in zip(self.vehicles, self.routes)]
+
+    def slack(self, a):
+        if self._slack[a] is False:
+            self._slack[a] = self.ev.suffix_slack(self.vehicles[a], self.routes[a], self.states[a])
+        return self._slack[a]
+
+    # --- moves: each returns {route_index: (vehicle, new_route)} (index >= len(routes) = new route) or None ---
+    def _pick_job(self):
+        a = self.rng.randrange(len(self.routes))
+        return a, self.rng.randrange(len(self.routes[a]))
+
+    def relocate(self):
+        a, i = self._pick_job()
+        va, j = self.vehicles[a], self.routes[a][i]
+        new_a = self.routes[a][:i] + self.routes[a][i + 1:]
+        b = self.rng.randrange(len(self.routes))
+        if b == a:
+            states = self.ev.states(va, new_a)
+            if states is None:
+                return None
+            pos, _ = self.ev.best_insertion(va, new_a, states, j)
+            return None if pos is None else {a: (va, new_a[:pos] + [j] + new_a[pos:])}
+        if self.ev.cost_from(self.states[a][i], new_a[i:], va["capacity"]) is None:
+            return None
+        vb = self.vehicles[b]
+        pos, _ = self.ev.best_insertion(vb, self.routes[b], self.states[b], j, self.slack(b))
+        if pos is None:
+            return None
+        return {a: (va, new_a), b: (vb, self.routes[b][:pos] + [j] + self.routes[b][pos:])}
+
+    def swap(self):
+        if len(self.routes) < 2:
+            return None
+        a, i = self._pick_job()
+        b = self.rng.randrange(len(self.routes) - 1)
+        b += b >= a
+        k = self.rng.randrange(len(self.routes[b]))
+        new_a, new_b = list(self.routes[a]), list(self.routes[b])
+        new_a[i], new_b[k] = new_b[k], new_a[i]
+        return {a: (self.vehicles[a], new_a), b: (self.vehicles[b], new_b)}
+
+    def two_opt(self):
+        a = self.rng.randrange(len(self.routes))
+        r = self.routes[a]
+        if len(r) < 2:
+            return None
+        i, k = sorted(self.rng.sample(range(len(r)), 2))
+        return {a: (self.vehicles[a], r[:i] + r[i:k + 1][::-1] + r[k + 1:])}
+
+    def two_opt_star(self):
+        if len(self.routes) < 2:
+            return None
+        a, b = self.rng.sample(range(len(self.routes)), 2)
+        ra, rb = self.routes[a], self.routes[b]
+        i = self.rng.randrange(len(ra) + 1)
+        k = self.rng.randrange(len(rb) + 1)
+        return {a: (self.vehicles[a], ra[:i] + rb[k:]), b: (self.vehicles[b], rb[:k] + ra[i:])}
+
+    def remove_route(self):
+        # shorter routes (and extra witches) are dissolved first
+        weights = [(4.0 if v["extra"] else 1.0) / len(r) for v, r in zip(self.vehicles, self.routes)]
+        a = self.rng.choices(range(len(self.routes)), weights=weights)[0]
+        return self._repair({a: (self.vehicles[a], [])}, list(self.routes[a]))
+
+    def destroy_repair(self):
+        n_jobs = sum(len(r) for r in self.routes)
+        k = max(1, min(DESTROY_MAX_JOBS, int(n_jobs * DESTROY_FRACTION)))
+        picked = set(self.rng.sample([(a, i) for a, r in enumerate(self.routes) for i in range(len(r))], k))
+        changes, removed = {}, []
+        for a in {a for a, _ in picked}:
+            changes[a] = (self.vehicles[a], [j for i, j in enumerate(self.routes[a]) if (a, i) not in picked])
+            removed.extend(j for i, j in enumerate(self.routes[a]) if (a, i) in picked)
+        return self._repair(changes, removed)
+
+    def _new_route(self, j, taken):
+        """Vehicle for a new route [j]: an idle courier that can make it, else an extra witch."""
+        for v in self.idle:
+            if id(v) not in taken and self.ev.states(v, [j]) is not None:
+                return v
+        return {"courier_id": None, "capacity": self.extra_capacity, "start_node": None, "extra": True}
+
+    def _repair(self, changes, removed):
+        """Cheapest-insertion of removed jobs (earliest deadline first); new routes if needed."""
+        routes = {a: (self.vehicles[a], self.routes[a]) for a in range(len(self.routes))}
+        routes.update(changes)
+        states = {a: (self.states[a] if a not in changes else self.ev.states(v, r))
+                  for a, (v, r) in routes.items()}
+        if any(s is None for s in states.values()):
+            return None
+        taken = set()
+        for j in sorted(removed, key=lambda j: self.ev.deadline[j]):
+            best = (None, None, math.inf)
+            for a, (v, r) in routes.items():
+                if not r and a in changes and a < len(self.routes):
+                    continue   # the emptied route stays empty
+                base = states[a][-1][3]
+                pos, cost = self.ev.best_insertion(v, r, states[a], j, False if a in changes else self.slack(a))
+                if pos is not None and cost - base < best[2]:
+                    best = (a, pos, cost - base)
+            a, pos, _ = best
+            if a is None:
+                v = self._new_route(j, taken)
+                taken.add(id(v))
+                a, pos = len(routes), 0
+                routes[a] = (v, [])
+            v, r = routes[a]
+            routes[a] = changes[a] = (v, r[:pos] + [j] + r[pos:])
+            states[a] = self.ev.states(*routes[a])
+        return changes
+
+    def apply(self, changes):
+        """Evaluate changes; returns ((n_extra, n_routes, travel), new states) or None if infeasible."""
+        new_states = {}
+        for a, (v, r) in changes.items():
+            s = self.ev.states(v, r)
+            if s is None:
+                return None
+            new_states[a] = s
+        n_extra, n_routes, travel = self.key()
+        for a, (v, r) in changes.items():
+            if a < len(self.routes):
+                travel -= self.states[a][-1][3]
+                n_routes -= 1
+                n_extra -= v["extra"]
+            if r:
+                travel += new_states[a][-1][3]
+                n_routes += 1
+                n_extra += v["extra"]
+        return (n_extra, n_routes, travel), new_states
+
+    def commit(self, changes, new_states):
+        for a, (v, r) in sorted(changes.items()):
+            if a < len(self.routes):
+                self.routes[a], self.states[a], self._slack[a] = r, new_states[a], False
+            else:
+                self.vehicles.append(v)
+                self.routes.append(r)
+                self.states.append(new_states[a])
+                self._slack.append(False)
+                if v["courier_id"] is not None:   # fleet courier, or an extra witch already out
+                    self.idle = [u for u in self.idle if u is not v]
+        keep = []
+        for a, r in enumerate(self.routes):
+            if r:
+                keep.append(a)
+            elif self.vehicles[a]["courier_id"] is not None:
+                self.idle.append(self.vehicles[a])
+        self.idle.sort(key=lambda v: -v["capacity"])
+        self.vehicles = [self.vehicles[a] for a in keep]
+        self.routes = [self.routes[a] for a in keep]
+        self.states = [self.states[a] for a in keep]
+        self._slack = [self._slack[a] for a in keep]
+
+
+def seed_routes(ev, previous, couriers_info, extra_capacity, now):
+    """
+    Routes of an earlier schedule mapped onto ev's jobs: (routes, idle couriers,
+    jobs left over). Each earlier collect takes the free job of the same cauldron
+    with the nearest deadline; a job that would break its route is left over.
+    """
+    by_cauldron = {}
+    for j in range(len(ev.jobs)):
+        by_cauldron.setdefault(ev.jobs[j]["cauldron_id"], []).append(j)
+    fleet = {c["courier_id"]: c for c in load_fleet(couriers_info)}
+    assigned, routes = set(), []
+    for w in previous["witches"]:
+        vehicle = fleet.pop(w.get("courier_id"), None) or {
+            "courier_id": None, "capacity": extra_capacity, "start_node": None, "extra": True}
+        state = ev.start_state(vehicle)
+        route = []
+        for a in w["route"]:
+            if a["type"] != "collect" or state is None or not a.get("deadline"):
+                continue
+            target = _minutes(a["deadline"], now)
+            free = [j for j in by_cauldron.get(a["cauldron_id"], ()) if j not in assigned]
+            if not free:
+                continue
+            j = min(free, key=lambda j: abs(ev.jobs[j]["deadline_min"] - target))
+            nxt = ev.advance(state, j, vehicle["capacity"])
+            if nxt is not None:
+                state = nxt
+                route.append(j)
+                assigned.add(j)
+        if route:
+            routes.append((vehicle, route))
+        elif vehicle["courier_id"] is not None:
+            fleet[vehicle["courier_id"]] = vehicle
+    leftover = [j for j in range(len(ev.jobs)) if j not in assigned]
+    return routes, list(fleet.values()), leftover
+
+
+def _queued(ev, routes, bays):
+    """
+    Re-time routes together with unloads sharing `bays` per market, booked in the order
+    the witches get to them; [(actions, final state)] per route, None if a job gets late.
+    """
+    ev.queue = MarketQueue(bays, UNLOAD_TIME_MIN)
+    try:
+        timed = [([], ev.start_state(vehicle)) for vehicle, _ in routes]
+        heap = [(timed[k][1][0], k, 0) for k, (_, route) in enumerate(routes) if route]
+        heapq.heapify(heap)
+        while heap:
+            _, k, i = heapq.heappop(heap)
+            vehicle, route = routes[k]
+            actions, state = timed[k]
+            state = ev.advance(state, route[i], vehicle["capacity"], actions)
+            if state is None:
+                return None
+            timed[k] = (actions, state)
+            if i + 1 < len(route):
+                heapq.heappush(heap, (state[0], k, i + 1))
+        return timed
+    finally:
+        ev.queue = None
+
+
+def _build_witches(ev, routes, now, timed=None):
+    """Schedule witch dicts for the routes; timed: precomputed (actions, final state) per route (_queued)."""
+    witches = []
+    for wid, (vehicle, route) in enumerate(routes, start=1):
+        if timed is not None:
+            actions, state = timed[wid - 1]
+        else:
+            actions = []
+            state = ev.start_state(vehicle)
+            for j in route:
+                state = ev.advance(state, j, vehicle["capacity"], actions)
+        out = []
+        for kind, ref, amount, start, end, travel, wait in actions:
+            if kind == "collect":
+                job = ev.jobs[ref]
+                out.append({
+                    "type": "collect",
+                    "cauldron_id": job["cauldron_id"],
+                    "amount": amount,
+                    "start": (now + timedelta(minutes=start)).isoformat(),
+                    "end": (now + timedelta(minutes=end)).isoformat(),
+                    "travel_min": travel,
+                    "deadline": job["deadline_iso"],
+                })
+            else:
+                out.append({
+                    "type": "market_unload",
+                    "market_node": ev.name(ref),
+                    "amount_unloaded": amount,
+                    "start": (now + timedelta(minutes=start)).isoformat(),
+                    "end": (now + timedelta(minutes=end)).isoformat(),
+                    "travel_min": travel,
+                })
+                if timed is not None:
+                    out[-1]["wait_min"] = wait
+        witches.append({
+            "id": wid,
+            "courier_id": vehicle["courier_id"],
+            "capacity": vehicle["capacity"],
+            "extra": vehicle["extra"],
+            "start_node": vehicle["start_node"] or ev.jobs[route[0]]["cauldron_id"],
+            "current_node": ev.name(state[1]),
+            "available_at": now + timedelta(minutes=state[0]),
+            "remaining_capacity": vehicle["capacity"] - state[2],
+            "route": out,
+        })
+    return witches
+
+
+def optimize_schedule(schedule, network, couriers_info, time_budget_sec=OPTIMIZER_TIME_BUDGET_SEC,
+                      max_iterations=None, seed=0, warm_start=None, market_bays=None):
+    """
+    Improve a schedule_witches() result in place of the greedy fleet: returns the same
+    response shape with the best fleet found within time_budget_sec (or max_iterations),
+    plus an "optimizer" block with before/after witch counts and travel. warm_start is
+    an earlier result for the same network and fleet to start from (see seed_routes).
+    market_bays: unload bays per market (default MARKET_UNLOAD_BAYS).
+    """
+    t0 = time.monotonic()
+    now, jobs, routes, idle = extract_jobs(schedule, couriers_info)
+    matrix = get_travel_matrix(network).for_markets(schedule["market_nodes"])
+    ev = RouteEvaluator(jobs, matrix, now)
+    extra_capacity = courier_capacity(couriers_info)
+    search = LocalSearch(ev, routes, idle, extra_capacity, random.Random(seed))
+
+    info = {"initial_witches": schedule["num_witches"], "time_budget_sec": time_budget_sec, "warm_start": False}
+    if not search.feasible() or not search.routes:
+        # greedy output outside the optimizer's model (e.g. unreachable market): keep it
+        info.update({"num_witches": schedule["num_witches"], "iterations": 0, "status": "skipped"})
+        return dict(schedule, optimizer=info)
+    greedy_key = search.key()
+
+    if warm_start is not None:
+        seeded, seeded_idle, leftover = seed_routes(ev, warm_start, couriers_info, extra_capacity, now)
+        warm = LocalSearch(ev, seeded, seeded_idle, extra_capacity, search.rng)
+        if leftover:
+            changes = warm._repair({}, leftover)
+            result = warm.apply(changes) if changes else None
+            if result is not None:
+                warm.commit(changes, result[1])
+        n_jobs = sum(len(r) for r in warm.routes)
+        if n_jobs == len(jobs) and warm.key() <= search.key():
+            search = warm
+            info["warm_start"] = True
+
+    info["initial_travel_min"] = search.travel()
+    market_bays = MARKET_UNLOAD_BAYS if market_bays is None else market_bays
+    best_key, best_routes = search.key(), search.snapshot()
+    timed = _queued(ev, best_routes, market_bays) if market_bays else None
+    moves = list(MOVE_WEIGHTS)
+    weights = [MOVE_WEIGHTS[m] for m in moves]
+    accepted = dict.fromkeys(moves, 0)
+    t_end = t0 + time_budget_sec
+    iterations = 0
+    while time.monotonic() < t_end and (max_iterations is None or iterations < max_iterations):
+        iterations += 1
+        move = search.rng.choices(moves, weights=weights)[0]
+        changes = getattr(search, move)()
+        if not changes:
+            continue
+        result = search.apply(changes)
+        if result is None:
+            continue
+        key, new_states = result
+        cur = search.key()
+        if key[:2] > cur[:2]:
+            continue
+        if key[:2] == cur[:2] and key[2] > cur[2] + EPS:
+            # simulated annealing on travel time, cooling linearly over the budget
+            frac_left = max(0.0, (t_end - time.monotonic()) / time_budget_sec) if time_budget_sec else 0.0
+            temp = START_TEMPERATURE * frac_left * cur[2] / max(1, cur[1])
+            if temp <= 0 or search.rng.random() >= math.exp(-(key[2] - cur[2]) / temp):
+                continue
+        search.commit(changes, new_states)
+        accepted[move] += 1
+        new_key = search.key()
+        if new_key < best_key or (market_bays and timed is None and new_key <= greedy_key):
+            snap = search.snapshot()
+            queued = _queued(ev, snap, market_bays) if market_bays else None
+            if not market_bays or queued is not None:
+                best_key, best_routes, timed = new_key, snap, queued
+
+    if market_bays and timed is None:
+        info.update({"num_witches": schedule["num_witches"], "iterations": iterations,
+                     "elapsed_sec": time.monotonic() - t0, "status": "queue_infeasible"})
+        return dict(schedule, optimizer=info)
+    witches = _build_witches(ev, best_routes, now, timed)
+    info.update({
+        "num_witches": len(witches),
+        "travel_min": best_key[2],
+        "iterations": iterations,
+        "accepted_moves": accepted,
+        "elapsed_sec": time.monotonic() - t0,
+        "status": "ok",
+    })
+    fleet = dict(schedule.get("fleet", {}),
+                 dispatched=sum(1 for w in witches if not w["extra"]),
+                 extra_witches=sum(1 for w in witches if w["extra"]))
+    return dict(schedule, num_witches=len(witches), witches=witches, fleet=fleet, optimizer=info)
@@ -0,0 +1,238 @@
+"""
+schedule_cache.py
+
+Result cache in front of the scheduler for /api/optimization/run:
+- the audit (process_all) is only re-run when an upstream document changed: it is
+  memoized on the eog_client versions (digests of the cached bytes) of its inputs
+- schedules are cached under a fingerprint of network, cauldrons, couriers, the
+  scheduler options and the forecasts (levels in LEVEL_TOLERANCE steps, rates
+  rounded to RATE_DECIMALS), LRU-bounded with a TTL
+- concurrent requests for the same fingerprint share one computation
+- on a miss, the optimizer is warm-started from the last optimized schedule for the
+  same network / fleet / options if no cauldron's projected overflow time moved by
+  more than WARM_START_MAX_SHIFT_MIN (a level that rose at its fill rate while time
+  passed does not move it)
+- ?validate=1 adds a "validation" block: the schedule replayed against the forecasts
+  by schedule_sim (overflows, short collections, travel / capacity violations,
+  utilization); computed once per cache entry
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+
+import eog_client
+from instrumentation import span
+from ttst import process_all, DATA_ENDPOINT, TICKETS_ENDPOINT
+from optimized_routes import (
+    API_NETWORK, API_CAULDRONS, API_COURIERS, WITCH_SELECTION_POLICY, OPTIMIZE_ROUTES,
+    OPTIMIZER_TIME_BUDGET_SEC, network_fingerprint, schedule_witches,
+)
+
+# ---------- CONFIG ----------
+SCHEDULE_CACHE_SIZE = 16        # schedules kept (expired ones stay as warm-start seeds)
+SCHEDULE_CACHE_TTL_SEC = 60.0   # serve a cached schedule for this long
+LEVEL_TOLERANCE = 5.0           # forecast levels are compared in steps of this many units
+RATE_DECIMALS = 3               # fill / drain rates are compared at this many decimals
+WARM_START_MAX_SHIFT_MIN = 15.0  # max change of any projected overflow time for a warm start
+
+
+def _digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _round_rate(x):
+    return None if x is None else round(float(x), RATE_DECIMALS)
+
+
+def structure_key(network, cauldron_info, couriers_info, options):
+    """Fingerprint of everything but the forecasts."""
+    return _digest([network_fingerprint(network), cauldron_info, couriers_info, options])
+
+
+def forecast_key(forecasts):
+    """Fingerprint of forecasts at the cache tolerance."""
+    return _digest({
+        cid: [round(float(f.get("current_level") or 0.0) / LEVEL_TOLERANCE),
+              _round_rate(f.get("fill_rate_per_min")), _round_rate(f.get("drain_rate_per_min")),
+              f.get("max_volume")]
+        for cid, f in forecasts.items()
+    })
+
+
+def overflow_times(forecasts, simulation_start):
+    """cauldron -> projected overflow as epoch seconds (None if it never overflows)."""
+    t0 = datetime.fromisoformat(simulation_start).timestamp()
+    return {cid: (None if f.get("time_to_overflow_min") is None else t0 + 60.0 * f["time_to_overflow_min"])
+            for cid, f in forecasts.items()}
+
+
+def overflow_shift(old, new):
+    """Largest change of a projected overflow time in minutes (inf if the cauldron set changed)."""
+    if set(old) != set(new):
+        return float("inf")
+    shift = 0.0
+    for cid, t in new.items():
+        if (t is None) != (old[cid] is None):
+            return float("inf")
+        if t is not None:
+            shift = max(shift, abs(t - old[cid]) / 60.0)
+    return shift
+
+
+class ScheduleCache:
+    def __init__(self, max_entries=SCHEDULE_CACHE_SIZE, ttl_sec=SCHEDULE_CACHE_TTL_SEC):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._entries = OrderedDict()   # fingerprint -> entry
+        self._inflight = {}             # fingerprint -> Future(entry)
+        self._lock = threading.Lock()
+        self._audit = None              # (input versions, forecasts)
+        self._audit_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "warm_starts": 0, "audits": 0}
+
+    def forecasts(self, data_raw, tickets_raw, cauldron_info, versions=None):
+        """
+        process_all forecasts, reused while the upstream documents are unchanged. versions
+        are the eog_client versions of (data, tickets, cauldron info); without them the
+        documents' content is digested instead.
+        """
+        versions = tuple(versions) if versions is not None else (_digest([data_raw, tickets_raw, cauldron_info]),)
+        with self._audit_lock:
+            memo = self._audit
+            if memo and memo[0] == versions:
+                return memo[1]
+            forecasts = process_all(api_fetch=False, data_json=data_raw, tickets_json=tickets_raw,
+                                    cauldron_info_json=cauldron_info)["forecasts"]
+            self._audit = (versions, forecasts)
+            self.stats["audits"] += 1
+            return forecasts
+
+    def current_forecasts(self):
+        """Forecasts for the current upstream data (shares the audit memo with schedule())."""
+        (data_raw, tickets_raw, cauldron_info), versions = eog_client.fetch_all(
+            DATA_ENDPOINT, TICKETS_ENDPOINT, API_CAULDRONS, with_version=True)
+        return self.forecasts(data_raw, tickets_raw, cauldron_info, versions)
+
+    def _warm_seed(self, structure, overflow_at):
+        for entry in reversed(self._entries.values()):
+            if entry["structure"] != structure:
+                continue
+            if overflow_shift(entry["overflow_at"], overflow_at) <= WARM_START_MAX_SHIFT_MIN:
+                return entry["result"]
+        return None
+
+    def _validation(self, entry, network, forecasts):
+        validation = entry.get("validation")
+        if validation is None:
+            from schedule_sim import validate_schedule
+            with span("validation", items=entry["result"]["num_witches"]):
+                validation = entry["validation"] = validate_schedule(entry["result"], forecasts, network)
+        return validation
+
+    def _tag(self, entry, status, validation=None):
+        extra = {} if validation is None else {"validation": validation}
+        return dict(entry["result"], **extra, cache={
+            "status": status,
+            "fingerprint": entry["fingerprint"],
+            "age_sec": round(time.monotonic() - entry["created"], 3),
+            "warm_start": entry["warm_start"],
+        })
+
+    def schedule(self, selection_policy=WITCH_SELECTION_POLICY, optimize=OPTIMIZE_ROUTES,
+                 time_budget_sec=OPTIMIZER_TIME_BUDGET_SEC, max_age=None, validate=False):
+        """
+        Scheduler result for the current upstream data, served from cache when the
+        fingerprint matches an entry younger than max_age (default ttl_sec). The
+        response gets a "cache" block: status hit / miss / shared, fingerprint, age, warm_start,
+        and with validate=True a "validation" block (see schedule_sim.validate_schedule).
+        """
+        (network, couriers_info, data_raw, tickets_raw, cauldron_info), versions = eog_client.fetch_all(
+            API_NETWORK, API_COURIERS, DATA_ENDPOINT, TICKETS_ENDPOINT, API_CAULDRONS, with_version=True)
+        forecasts = self.forecasts(data_raw, tickets_raw, cauldron_info, versions[2:])
+        options = {"policy": selection_policy, "optimize": bool(optimize),
+                   "time_budget_sec": time_budget_sec if optimize else None}
+        structure = structure_key(network, cauldron_info, couriers_info, options)
+        key = f"{structure[:20]}-{forecast_key(forecasts)[:20]}"
+        max_age = self.ttl_sec if max_age is None else max_age
+
+        def tagged(entry, status):
+            validation = self._validation(entry, network, forecasts) if validate else None
+            return self._tag(entry, status, validation)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and time.monotonic() - entry["created"] < max_age
+            if hit:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+            else:
+                future = self._inflight.get(key)
+                owner = future is None
+                if owner:
+                    future = self._inflight[key] = Future()
+                    self.stats["misses"] += 1
+                else:
+                    self.stats["shared"] += 1
+        if hit:
+            return tagged(entry, "hit")
+        if not owner:
+            return tagged(future.result(), "shared")
+
+        try:
+            result = schedule_witches(network, cauldron_info, couriers_info, forecasts,
+                                      selection_policy=selection_policy)
+            overflow_at = overflow_times(forecasts, result["simulation_start"])
+            if optimize:
+                from route_optimizer import optimize_schedule
+                with self._lock:
+                    seed = self._warm_seed(structure, overflow_at)
+                with span("optimization") as sp:
+                    result = optimize_schedule(result, network, couriers_info, time_budget_sec=time_budget_sec,
+                                               warm_start=seed)
+                    sp.add(result["optimizer"].get("iterations", 0))
+            entry = {
+                "result": result,
+                "fingerprint": key,
+                "structure": structure,
+                "overflow_at": overflow_at,
+                "created": time.monotonic(),
+                "warm_start": bool(optimize and result.get("optimizer", {}).get("warm_start")),
+            }
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            del self._inflight[key]
+            self.stats["warm_starts"] += entry["warm_start"]
+        future.set_result(entry)
+        return tagged(entry, "miss")
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+        with self._audit_lock:
+            self._audit = None
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_schedule_cache():
+    """Process-wide schedule cache used by /api/optimization/run."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ScheduleCache()
+        return _CACHE
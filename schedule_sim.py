@@ -0,0 +1,379 @@
+"""
+schedule_sim.py
+
+Discrete-event replay of witch schedules (schedule_witches / optimize_schedule output)
+against the cauldrons' projected levels, to check what a route actually achieves:
+- every cauldron fills continuously at its fill rate, also while a witch travels and
+  while it collects (a collection draws amount / duration per minute, so the level
+  only drops at draw rate - fill rate); levels are capped at max_volume (the excess
+  is spilled) and cannot go below zero (a witch then collects less than planned)
+- witches are replayed action by action: travel between consecutive stops is checked
+  against the travel matrix (the layer of the departure time of day on a
+  time-dependent network), load against capacity (reset at each market unload) and
+  unloads against the bays of their market (MARKET_UNLOAD_BAYS)
+- reports overflow violations (spilled volume, first overflow minute per cauldron),
+  short collections, travel / capacity / ordering / market queue violations, and busy / idle time
+  and utilization per witch and for the fleet
+
+Many candidate schedules are scored at once: all actions go into one flat Plan, the
+witch checks are segment operations over it, and cauldron levels advance on a shared
+clock one collection round at a time as (schedules x cauldrons) arrays, so the Python
+loop runs once per collection round, not per schedule or cauldron.
+"""
+
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from optimized_routes import HORIZON_MIN, MARKET_UNLOAD_BAYS, SERVICE_SETUP_MIN, minute_of_day
+
+# ---------- CONFIG ----------
+EPS = 1e-6
+COLLECT, UNLOAD = 0, 1
+
+
+# ---------- Inputs ----------
+class CauldronModel:
+    """Starting level, capacity and fill rate per cauldron (columns in ids order)."""
+
+    def __init__(self, ids, level0, cap, fill):
+        self.ids = list(ids)
+        self.index = {c: i for i, c in enumerate(self.ids)}
+        self.level0 = np.asarray(level0, dtype=np.float64)
+        self.cap = np.asarray(cap, dtype=np.float64)
+        self.fill = np.asarray(fill, dtype=np.float64)
+
+    @classmethod
+    def from_forecasts(cls, forecasts):
+        """From process_all forecasts or a schedule's forecast_summary (missing max_volume = never full)."""
+        ids = sorted(forecasts)
+
+        def num(cid, key, default):
+            v = forecasts[cid].get(key)
+            return default if v is None or not math.isfinite(float(v)) else float(v)
+        return cls(ids, [num(c, "current_level", 0.0) for c in ids], [num(c, "max_volume", math.inf) for c in ids],
+                   [max(0.0, num(c, "fill_rate_per_min", 0.0)) for c in ids])
+
+
+class Plan:
+    """
+    Flat action table of one or more schedules, rows ordered by (witch, start):
+    batch / witch / kind / node / cauldron (int arrays; -1 = unknown) and start / end /
+    amount / travel (minutes after each schedule's simulation_start). Per witch:
+    capacity, start_node (-1 = starts at its first stop) and batch. Per schedule:
+    clock0, the UTC minute of day of its simulation_start.
+    """
+
+    def __init__(self, n_batch, batch, witch, kind, node, cauldron, start, end, amount, travel,
+                 witch_capacity, witch_start_node, witch_batch, witch_ids=None, clock0=None):
+        self.n_batch = int(n_batch)
+        self.clock0 = np.zeros(self.n_batch) if clock0 is None else np.asarray(clock0, dtype=np.float64)
+        self.batch = np.asarray(batch, dtype=np.int64)
+        self.witch = np.asarray(witch, dtype=np.int64)
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.node = np.asarray(node, dtype=np.int64)
+        self.cauldron = np.asarray(cauldron, dtype=np.int64)
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.amount = np.asarray(amount, dtype=np.float64)
+        self.travel = np.asarray(travel, dtype=np.float64)
+        self.witch_capacity = np.asarray(witch_capacity, dtype=np.float64)
+        self.witch_start_node = np.asarray(witch_start_node, dtype=np.int64)
+        self.witch_batch = np.asarray(witch_batch, dtype=np.int64)
+        self.witch_ids = list(witch_ids) if witch_ids is not None else list(range(len(self.witch_capacity)))
+
+    def __len__(self):
+        return len(self.start)
+
+
+def _minutes(iso, t0):
+    return (datetime.fromisoformat(iso) - t0).total_seconds() / 60.0
+
+
+def compile_schedules(schedules, model, matrix=None):
+    """Flatten schedule responses into one Plan (node ids from matrix, cauldron columns from model)."""
+    node_index = matrix.index if matrix is not None else {}
+    cols = {k: [] for k in ("batch", "witch", "kind", "node", "cauldron", "start", "end", "amount", "travel")}
+    caps, start_nodes, witch_batch, witch_ids, clock0 = [], [], [], [], []
+    for b, schedule in enumerate(schedules):
+        t0 = datetime.fromisoformat(schedule["simulation_start"])
+        clock0.append(minute_of_day(t0))
+        for w in schedule["witches"]:
+            wi = len(caps)
+            caps.append(float(w.get("capacity") or 0.0))
+            start_nodes.append(node_index.get(w.get("start_node"), -1))
+            witch_batch.append(b)
+            witch_ids.append(w.get("id"))
+            actions = sorted(((_minutes(a["start"], t0), a) for a in w["route"]), key=lambda x: x[0])
+            for start, a in actions:
+                collect = a["type"] == "collect"
+                stop = a["cauldron_id"] if collect else a.get("market_node")
+                cols["batch"].append(b)
+                cols["witch"].append(wi)
+                cols["kind"].append(COLLECT if collect else UNLOAD)
+                cols["node"].append(node_index.get(stop, -1))
+                cols["cauldron"].append(model.index.get(stop, -1) if collect else -1)
+                cols["start"].append(start)
+                cols["end"].append(_minutes(a["end"], t0))
+                cols["amount"].append(float(a.get("amount") or 0.0) if collect else 0.0)
+                cols["travel"].append(float(a.get("travel_min") or 0.0))
+    return Plan(len(schedules), **cols, witch_capacity=caps, witch_start_node=start_nodes,
+                witch_batch=witch_batch, witch_ids=witch_ids, clock0=clock0)
+
+
+# ---------- Cauldron levels ----------
+def _rounds(plan, model, horizon):
+    """Collections as (B, C, K) start / end / amount arrays, k-th collection of each cauldron in round k."""
+    B, C = plan.n_batch, len(model.ids)
+    rows = np.flatnonzero((plan.kind == COLLECT) & (plan.cauldron >= 0) & (plan.start < horizon))
+    b, c = plan.batch[rows], plan.cauldron[rows]
+    s = np.clip(plan.start[rows], 0.0, horizon)
+    e = np.clip(np.maximum(plan.end[rows], s), 0.0, horizon)
+    full = np.maximum(plan.end[rows] - np.maximum(plan.start[rows], 0.0), 0.0)
+    # a collection cut by the horizon only counts the part inside it
+    a = np.where(full > 0, plan.amount[rows] * np.divide(e - s, full, out=np.ones_like(full), where=full > 0),
+                 plan.amount[rows])
+    order = np.lexsort((s, c, b))
+    b, c, s, e, a = b[order], c[order], s[order], e[order], a[order]
+    key = b * C + c
+    first = np.r_[True, key[1:] != key[:-1]] if len(key) else np.zeros(0, dtype=bool)
+    starts = np.flatnonzero(first)
+    rank = np.arange(len(key)) - np.repeat(starts, np.diff(np.r_[starts, len(key)]))
+    K = int(rank.max()) + 1 if len(rank) else 0
+    S = np.full((B, C, K), np.nan)
+    E = np.full((B, C, K), np.nan)
+    A = np.zeros((B, C, K))
+    S[b, c, rank], E[b, c, rank], A[b, c, rank] = s, e, a
+    return S, E, A
+
+
+def _fill(level, t, until, fill, cap, spilled, first_over):
+    """Advance levels from t to `until` at the fill rate (capped); updates spill / first overflow."""
+    raw = level + fill * (until - t)
+    over = raw > cap + EPS
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_full = np.where(fill > 0, t + np.maximum(cap - level, 0.0) / fill, np.inf)
+    first_over = np.where(over, np.minimum(first_over, t_full), first_over)
+    spilled += np.where(over, raw - cap, 0.0)
+    return np.minimum(raw, cap), first_over
+
+
+def simulate_levels(plan, model, horizon_min=HORIZON_MIN):
+    """
+    Cauldron pass: (B, C) arrays spilled, first_overflow (inf = none), short (planned minus
+    collected), collected and final level at the horizon.
+    """
+    B, C = plan.n_batch, len(model.ids)
+    S, E, A = _rounds(plan, model, horizon_min)
+    cap = np.broadcast_to(model.cap, (B, C))
+    fill = np.broadcast_to(model.fill, (B, C))
+    spilled = np.maximum(model.level0 - model.cap, 0.0) * np.ones((B, 1))   # already over at t=0
+    level = np.minimum(np.broadcast_to(model.level0, (B, C)), cap)
+    first_over = np.where(spilled > EPS, 0.0, np.inf)
+    t = np.zeros((B, C))
+    short = np.zeros((B, C))
+    collected = np.zeros((B, C))
+    for k in range(S.shape[2]):
+        valid = ~np.isnan(S[:, :, k])
+        s = np.where(valid, np.maximum(S[:, :, k], t), t)   # overlapping visits are served one after another
+        e = np.where(valid, np.maximum(E[:, :, k], s), t)
+        amount = A[:, :, k]
+        level, first_over = _fill(level, t, s, fill, cap, spilled, first_over)
+        # collection: draw amount over [s, e] while the fill continues
+        d = e - s
+        available = level + fill * d
+        got = np.minimum(amount, available)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            net = np.where(d > 0, fill - amount / d, -np.inf)   # level slope while collecting
+            t_full = np.where(net > 0, s + np.maximum(cap - level, 0.0) / net, np.inf)
+        raw = available - got
+        over = raw > cap + EPS
+        first_over = np.where(over, np.minimum(first_over, t_full), first_over)
+        spilled += np.where(over, raw - cap, 0.0)
+        level = np.minimum(raw, cap)
+        short += amount - got
+        collected += got
+        t = e
+    level, first_over = _fill(level, t, np.full((B, C), float(horizon_min)), fill, cap, spilled, first_over)
+    return {"spilled": spilled, "first_overflow": first_over, "short": short, "collected": collected,
+            "final_level": level}
+
+
+# ---------- Witches ----------
+def _queued(plan, matrix, market_bays):
+    """Per row: an unload starting while every bay of its market is still taken."""
+    n_nodes = len(matrix.nodes)
+    bays = np.full(n_nodes, np.inf)
+    if isinstance(market_bays, dict):
+        for m, k in market_bays.items():
+            if k and m in matrix.index:
+                bays[matrix.index[m]] = k
+    else:
+        bays[:] = market_bays
+    rows = np.flatnonzero((plan.kind == UNLOAD) & (plan.node >= 0))
+    rows = rows[np.isfinite(bays[plan.node[rows]])]
+    out = np.zeros(len(plan), dtype=bool)
+    if not len(rows):
+        return out
+    # sweep: +1 at each start, -1 at each end (ends first on ties); every market's events sum
+    # to zero, so the running sum restarts at each (schedule, market) group
+    key = np.tile(plan.batch[rows] * n_nodes + plan.node[rows], 2)
+    t = np.r_[plan.start[rows], np.maximum(plan.end[rows], plan.start[rows]) - EPS]
+    delta = np.r_[np.ones(len(rows)), -np.ones(len(rows))]
+    order = np.lexsort((delta, t, key))
+    busy = np.empty(len(t))
+    busy[order] = np.cumsum(delta[order])
+    out[rows] = busy[:len(rows)] > bays[plan.node[rows]]
+    return out
+
+
+def simulate_witches(plan, matrix=None, market_bays=None):
+    """
+    Witch pass over the action table: per row lateness (arrival after the scheduled
+    start) and load after the action; per witch busy / idle / shift minutes and counts
+    of travel, capacity, ordering and market queue violations (market_bays: per market
+    or {market: n}, default MARKET_UNLOAD_BAYS; only checked with a matrix).
+    """
+    n, W = len(plan), len(plan.witch_capacity)
+    w = plan.witch
+    first = np.r_[True, w[1:] != w[:-1]] if n else np.zeros(0, dtype=bool)
+    prev_end = np.where(first, 0.0, np.r_[0.0, plan.end[:-1]])
+    prev_node = np.where(first, plan.witch_start_node[w], np.r_[-1, plan.node[:-1]])
+    # a witch without a start node begins at its first stop
+    prev_node = np.where(first & (prev_node < 0), plan.node, prev_node)
+
+    setup = np.where(plan.kind == COLLECT, SERVICE_SETUP_MIN, 0.0)
+    if matrix is not None and n:
+        known = (prev_node >= 0) & (plan.node >= 0)
+        layer = matrix.layers_at(plan.clock0[plan.batch] + prev_end) if matrix.time_dependent else 0
+        travel = np.where(known, matrix.dists[layer, np.maximum(prev_node, 0), np.maximum(plan.node, 0)],
+                          plan.travel)
+    else:
+        travel = plan.travel
+    arrival_needed = prev_end + travel
+    lateness = np.maximum(arrival_needed - (plan.start - setup), 0.0)
+    out_of_order = plan.start < prev_end - EPS
+
+    # load since the last unload (or the witch's first action)
+    picked = np.where(plan.kind == COLLECT, plan.amount, 0.0)
+    cum = np.cumsum(picked)
+    marker = first | (plan.kind == UNLOAD)
+    base_val = np.where(plan.kind == UNLOAD, cum, cum - picked)
+    base = base_val[np.maximum.accumulate(np.where(marker, np.arange(n), 0))] if n else cum
+    load = cum - base
+    over_capacity = (plan.kind == COLLECT) & (load > plan.witch_capacity[w] + EPS)
+
+    market_bays = MARKET_UNLOAD_BAYS if market_bays is None else market_bays
+    queued = _queued(plan, matrix, market_bays) if matrix is not None and market_bays else np.zeros(n, dtype=bool)
+
+    busy = np.bincount(w, weights=(plan.end - plan.start) + setup + travel, minlength=W)
+    shift = np.zeros(W)
+    np.maximum.at(shift, w, plan.end)
+    return {
+        "lateness": lateness,
+        "load": load,
+        "travel_violations": np.bincount(w, weights=lateness > EPS, minlength=W).astype(np.int64),
+        "capacity_violations": np.bincount(w, weights=over_capacity, minlength=W).astype(np.int64),
+        "order_violations": np.bincount(w, weights=out_of_order, minlength=W).astype(np.int64),
+        "queue_violations": np.bincount(w, weights=queued, minlength=W).astype(np.int64),
+        "busy": busy,
+        "shift": shift,
+        "idle": np.maximum(shift - busy, 0.0),
+    }
+
+
+# ---------- Scoring ----------
+def simulate(plan, model, matrix=None, horizon_min=HORIZON_MIN, market_bays=None):
+    """Both passes plus per-schedule (B,) totals: overflowing cauldrons, spill, violations, utilization."""
+    levels = simulate_levels(plan, model, horizon_min)
+    witches = simulate_witches(plan, matrix, market_bays)
+    B, wb = plan.n_batch, plan.witch_batch
+    per_batch = {
+        "overflow_cauldrons": (levels["spilled"] > EPS).sum(axis=1),
+        "spilled": levels["spilled"].sum(axis=1),
+        "short_collected": levels["short"].sum(axis=1),
+        "collected": levels["collected"].sum(axis=1),
+    }
+    for key in ("travel_violations", "capacity_violations", "order_violations", "queue_violations"):
+        per_batch[key] = np.bincount(wb, weights=witches[key], minlength=B).astype(np.int64)
+    busy = np.bincount(wb, weights=witches["busy"], minlength=B)
+    shift = np.bincount(wb, weights=witches["shift"], minlength=B)
+    per_batch.update(busy=busy, idle=np.maximum(shift - busy, 0.0),
+                     utilization=np.divide(busy, shift, out=np.zeros(B), where=shift > 0))
+    per_batch["feasible"] = ((per_batch["overflow_cauldrons"] == 0) & (per_batch["travel_violations"] == 0)
+                             & (per_batch["capacity_violations"] == 0) & (per_batch["order_violations"] == 0)
+                             & (per_batch["queue_violations"] == 0))
+    return {"levels": levels, "witches": witches, "schedules": per_batch}
+
+
+def score_schedules(schedules, forecasts, network=None, horizon_min=HORIZON_MIN):
+    """(B,) totals for candidate schedules sharing one set of forecasts (see simulate)."""
+    model = CauldronModel.from_forecasts(forecasts)
+    matrix = _matrix(network, schedules[0] if schedules else None)
+    return simulate(compile_schedules(schedules, model, matrix), model, matrix, horizon_min)["schedules"]
+
+
+def _matrix(network, schedule):
+    if network is None:
+        return None
+    from optimized_routes import get_travel_matrix
+    matrix = get_travel_matrix(network)
+    if schedule is not None and schedule.get("market_nodes"):
+        matrix = matrix.for_markets(schedule["market_nodes"])
+    return matrix
+
+
+def validate_schedule(schedule, forecasts=None, network=None, horizon_min=HORIZON_MIN):
+    """
+    Replay one schedule and return a JSON-ready report. forecasts default to the
+    schedule's forecast_summary; travel is only checked when the network is given.
+    """
+    forecasts = forecasts if forecasts is not None else schedule.get("forecast_summary", {})
+    model = CauldronModel.from_forecasts(forecasts)
+    matrix = _matrix(network, schedule)
+    plan = compile_schedules([schedule], model, matrix)
+    out = simulate(plan, model, matrix, horizon_min)
+    levels, witches, totals = out["levels"], out["witches"], out["schedules"]
+    t0 = datetime.fromisoformat(schedule["simulation_start"])
+
+    overflows = []
+    for c in np.flatnonzero(levels["spilled"][0] > EPS).tolist():
+        minute = float(levels["first_overflow"][0, c])
+        overflows.append({"cauldron_id": model.ids[c], "first_overflow_min": round(minute, 2),
+                          "first_overflow_at": (t0 + timedelta(minutes=minute)).isoformat(),
+                          "spilled": round(float(levels["spilled"][0, c]), 3)})
+    short = [{"cauldron_id": model.ids[c], "short": round(float(levels["short"][0, c]), 3)}
+             for c in np.flatnonzero(levels["short"][0] > EPS).tolist()]
+    witch_rows = [{
+        "id": plan.witch_ids[i],
+        "busy_min": round(float(witches["busy"][i]), 2),
+        "idle_min": round(float(witches["idle"][i]), 2),
+        "utilization": round(float(witches["busy"][i] / witches["shift"][i]), 4) if witches["shift"][i] > 0 else 0.0,
+        "travel_violations": int(witches["travel_violations"][i]),
+        "capacity_violations": int(witches["capacity_violations"][i]),
+        "order_violations": int(witches["order_violations"][i]),
+        "queue_violations": int(witches["queue_violations"][i]),
+    } for i in range(len(plan.witch_capacity))]
+    return {
+        "horizon_min": horizon_min,
+        "feasible": bool(totals["feasible"][0]),
+        "violations": {
+            "overflow": int(totals["overflow_cauldrons"][0]),
+            "short_collection": len(short),
+            "travel": int(totals["travel_violations"][0]) if matrix is not None else None,
+            "capacity": int(totals["capacity_violations"][0]),
+            "order": int(totals["order_violations"][0]),
+            "queue": int(totals["queue_violations"][0]) if matrix is not None else None,
+        },
+        "spilled": round(float(totals["spilled"][0]), 3),
+        "collected": round(float(totals["collected"][0]), 3),
+        "overflows": sorted(overflows, key=lambda o: o["first_overflow_min"]),
+        "short_collections": short,
+        "fleet": {
+            "busy_min": round(float(totals["busy"][0]), 2),
+            "idle_min": round(float(totals["idle"][0]), 2),
+            "utilization": round(float(totals["utilization"][0]), 4),
+        },
+        "witches": witch_rows,
+    }
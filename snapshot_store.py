@@ -0,0 +1,277 @@
+"""
+snapshot_store.py
+
+Local on-disk snapshot of the EOG data so audits and schedules can run offline and
+cold-start quickly.
+
+Layout (under SNAPSHOT_DIR):
+    telemetry/YYYY-MM-DD/epochs.npy     int64 epoch-us, ascending
+    telemetry/YYYY-MM-DD/levels.npy     float64 (time x cauldron), NaN = missing
+    telemetry/YYYY-MM-DD/cauldrons.json column labels for levels.npy
+    docs/<name>.json                    tickets, cauldrons, network, couriers
+    manifest.json                       days that are complete (never re-fetched)
+
+Day partitions are read with np.load(mmap_mode="r"), so a query only touches the
+days in its range, and load_telemetry() hands out the mapped partitions
+(PartitionedLevels) rather than a dense copy. sync() only asks the API for days
+that are not complete yet.
+"""
+
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+import eog_client
+from ttst import (
+    DATA_ENDPOINT, TICKETS_ENDPOINT, CAULDRON_INFO_ENDPOINT, US_PER_MIN,
+    ingest_telemetry, iso_to_dt, epoch_us_to_dt,
+)
+
+# ---------- CONFIG ----------
+SNAPSHOT_DIR = os.environ.get("ELIXIRNET_SNAPSHOT_DIR", "snapshots")
+US_PER_DAY = 24 * 60 * US_PER_MIN
+DOC_ENDPOINTS = {
+    "tickets": TICKETS_ENDPOINT,
+    "cauldrons": CAULDRON_INFO_ENDPOINT,
+    "network": f"{eog_client.API_BASE}/api/Information/network",
+    "couriers": f"{eog_client.API_BASE}/api/Information/couriers",
+}
+
+
+def _as_date(d):
+    if d is None or isinstance(d, date) and not isinstance(d, datetime):
+        return d
+    if isinstance(d, datetime):
+        return d.astimezone(timezone.utc).date()
+    return iso_to_dt(d).date()
+
+
+def _day_start_us(d):
+    return (d.toordinal() - date(1970, 1, 1).toordinal()) * US_PER_DAY
+
+
+class PartitionedLevels:
+    """
+    Level matrix (time x cauldron) over memory-mapped day partitions. levels[:, col]
+    gathers one cauldron across the days (NaN where a day lacks it) without building
+    the whole matrix; np.asarray(levels) builds the dense matrix if really needed.
+    """
+
+    ndim = 2
+    dtype = np.dtype(np.float64)
+
+    def __init__(self, parts, n_cols):
+        self.parts = parts            # [(first row, mapped day levels, day column per column or -1)]
+        n_rows = parts[-1][0] + len(parts[-1][1]) if parts else 0
+        self.shape = (n_rows, n_cols)
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def column(self, col):
+        out = np.full(self.shape[0], np.nan)
+        for row, lv, day_col in self.parts:
+            j = day_col[col]
+            if j >= 0:
+                out[row:row + len(lv)] = lv[:, j]
+        return out
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple) and len(key) == 2 and key[0] == slice(None) \
+                and isinstance(key[1], (int, np.integer)):
+            return self.column(int(key[1]))
+        return np.asarray(self)[key]
+
+    def __array__(self, dtype=None, copy=None):
+        dense = np.full(self.shape, np.nan)
+        for row, lv, day_col in self.parts:
+            present = np.flatnonzero(day_col >= 0)
+            dense[row:row + len(lv), present] = lv[:, day_col[present]]
+        return dense if dtype is None else dense.astype(dtype)
+
+
+class SnapshotStore:
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = root
+        self.telemetry_dir = os.path.join(root, "telemetry")
+        self.docs_dir = os.path.join(root, "docs")
+        os.makedirs(self.telemetry_dir, exist_ok=True)
+        os.makedirs(self.docs_dir, exist_ok=True)
+
+    # --- manifest ---
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"complete_days": []}
+
+    def _write_manifest(self, manifest):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path())
+
+    def days(self):
+        """Days with a stored telemetry partition, ascending."""
+        return sorted(date.fromisoformat(d) for d in os.listdir(self.telemetry_dir)
+                      if os.path.exists(os.path.join(self.telemetry_dir, d, "epochs.npy")))
+
+    def complete_days(self):
+        return {date.fromisoformat(d) for d in self._read_manifest()["complete_days"]}
+
+    # --- documents ---
+    def write_doc(self, name, obj):
+        path = os.path.join(self.docs_dir, f"{name}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(obj, f)
+        os.replace(path + ".tmp", path)
+
+    def read_doc(self, name):
+        try:
+            with open(os.path.join(self.docs_dir, f"{name}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    # --- telemetry ---
+    def write_telemetry(self, telemetry, complete_before=None):
+        """
+        Split a telemetry matrix (see ttst.ingest_telemetry) into day partitions.
+        Days strictly before complete_before are recorded as complete.
+        """
+        epochs, levels = telemetry["epochs"], telemetry["levels"]
+        if not len(epochs):
+            return []
+        first_day = epoch_us_to_dt(epochs[0]).date()
+        last_day = epoch_us_to_dt(epochs[-1]).date()
+        written = []
+        d = first_day
+        while d <= last_day:
+            lo = np.searchsorted(epochs, _day_start_us(d), side="left")
+            hi = np.searchsorted(epochs, _day_start_us(d + timedelta(days=1)), side="left")
+            if hi > lo:
+                self._write_day(d, epochs[lo:hi], levels[lo:hi], telemetry["cauldron_ids"])
+                written.append(d)
+            d += timedelta(days=1)
+
+        if complete_before is not None:
+            manifest = self._read_manifest()
+            complete = set(manifest["complete_days"])
+            complete.update(d.isoformat() for d in written if d < complete_before)
+            manifest["complete_days"] = sorted(complete)
+            self._write_manifest(manifest)
+        return written
+
+    def _write_day(self, d, epochs, levels, cauldron_ids):
+        day_dir = os.path.join(self.telemetry_dir, d.isoformat())
+        os.makedirs(day_dir, exist_ok=True)
+        for name, arr in (("epochs", epochs), ("levels", levels)):
+            tmp = os.path.join(day_dir, f"{name}.tmp.npy")
+            np.save(tmp, np.ascontiguousarray(arr))
+            os.replace(tmp, os.path.join(day_dir, f"{name}.npy"))
+        with open(os.path.join(day_dir, "cauldrons.json"), "w") as f:
+            json.dump(list(cauldron_ids), f)
+
+    def load_telemetry(self, start=None, end=None, cauldrons=None):
+        """
+        Telemetry for the inclusive UTC day range [start, end] (None = open), restricted
+        to the given cauldron ids if any. Only days in range are touched; levels is
+        the mapped partition of a single day or a PartitionedLevels over several, so
+        readings are only read when a column is asked for.
+        """
+        start, end = _as_date(start), _as_date(end)
+        wanted = None if cauldrons is None else set(cauldrons)
+        days = [d for d in self.days() if (start is None or d >= start) and (end is None or d <= end)]
+        days_cols, cauldron_ids, col_of = [], [], {}
+        for d in days:
+            with open(os.path.join(self.telemetry_dir, d.isoformat(), "cauldrons.json")) as f:
+                cols = json.load(f)
+            for c in cols:
+                if c not in col_of and (wanted is None or c in wanted):
+                    col_of[c] = len(cauldron_ids)
+                    cauldron_ids.append(c)
+            days_cols.append((d, cols))
+
+        parts, epoch_parts, row = [], [], 0
+        for d, cols in days_cols:
+            day_dir = os.path.join(self.telemetry_dir, d.isoformat())
+            epochs = np.load(os.path.join(day_dir, "epochs.npy"), mmap_mode="r")
+            day_col = np.full(len(cauldron_ids), -1, dtype=np.int64)
+            for j, c in enumerate(cols):
+                if c in col_of:
+                    day_col[col_of[c]] = j
+            # plain ndarray view of the mapping (np.memmap slices pay subclass overhead per operation)
+            parts.append((row, np.asarray(np.load(os.path.join(day_dir, "levels.npy"), mmap_mode="r")), day_col))
+            epoch_parts.append(epochs)
+            row += len(epochs)
+
+        epochs = np.concatenate(epoch_parts) if epoch_parts else np.empty(0, dtype=np.int64)
+        if len(parts) == 1 and np.array_equal(parts[0][2], np.arange(parts[0][1].shape[1])):
+            levels = parts[0][1]
+        else:
+            levels = PartitionedLevels(parts, len(cauldron_ids))
+        return {"epochs": epochs, "cauldron_ids": cauldron_ids, "levels": levels}
+
+    # --- sync ---
+    def missing_range(self, today=None):
+        """First day that still needs fetching (None = nothing stored yet) and today."""
+        today = today or datetime.now(timezone.utc).date()
+        complete = self.complete_days()
+        if not complete:
+            return None, today
+        d = max(complete) + timedelta(days=1)
+        return d, today
+
+    def sync(self, client=None, today=None):
+        """
+        Fetch days that are not complete yet plus the small documents and store them.
+        /api/Data is asked for the missing range only (start_date / end_date, unix
+        seconds); rows outside the range are ignored if the server returns more.
+        """
+        client = client or eog_client.get_client()
+        first_missing, today = self.missing_range(today)
+        if first_missing is None:
+            data = client.fetch_json(DATA_ENDPOINT)
+        else:
+            start_s = _day_start_us(first_missing) // 1_000_000
+            end_s = _day_start_us(today + timedelta(days=1)) // 1_000_000
+            data = client.fetch_json(DATA_ENDPOINT, params={"start_date": start_s, "end_date": end_s})
+
+        telemetry = ingest_telemetry(data)
+        if first_missing is not None and len(telemetry["epochs"]):
+            keep = telemetry["epochs"] >= _day_start_us(first_missing)
+            telemetry = {"epochs": telemetry["epochs"][keep], "cauldron_ids": telemetry["cauldron_ids"],
+                         "levels": telemetry["levels"][keep]}
+        written = self.write_telemetry(telemetry, complete_before=today)
+
+        names = list(DOC_ENDPOINTS)
+        for name, doc in zip(names, client.fetch_all(*(DOC_ENDPOINTS[n] for n in names))):
+            self.write_doc(name, doc)
+        return written
+
+
+def tickets_in_range(tickets_raw, start=None, end=None):
+    """Tickets dated within [start, end + 1 day] (a drain can be ticketed the day after)."""
+    start, end = _as_date(start), _as_date(end)
+    ticket_list = tickets_raw.get("transport_tickets", []) if isinstance(tickets_raw, dict) else tickets_raw
+    if start is None and end is None:
+        return ticket_list
+    out = []
+    for t in ticket_list:
+        try:
+            d = iso_to_dt(t["date"]).date()
+        except Exception:
+            continue
+        if (start is None or d >= start) and (end is None or d <= end + timedelta(days=1)):
+            out.append(t)
+    return out
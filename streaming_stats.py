@@ -0,0 +1,205 @@
+"""
+streaming_stats.py
+
+Bounded-memory running statistics for fill-rate estimation:
+- P2Median:            constant-memory median estimate (P² algorithm, Jain & Chlamtac)
+- SlidingWindowMedian: exact median over a sliding window (two heaps + lazy deletion)
+- FillRateEstimator:   per-cauldron fill rate updated one reading at a time, either over
+                       the whole history (P²) or over the last N hours (sliding window)
+"""
+
+import heapq
+from collections import deque
+
+US_PER_MIN = 60 * 1_000_000
+US_PER_HOUR = 60 * US_PER_MIN
+
+
+class P2Median:
+    """Streaming median in O(1) memory; exact for the first five samples."""
+
+    def __init__(self):
+        self.n = 0
+        self.q = []                          # marker heights
+        self.pos = [1, 2, 3, 4, 5]           # marker positions
+        self.desired = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.incr = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+    def add(self, x):
+        self.n += 1
+        if self.n <= 5:
+            self.q.append(x)
+            self.q.sort()
+            return
+        q, pos = self.q, self.pos
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while k < 3 and x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i in range(5):
+            self.desired[i] += self.incr[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                s = 1 if d > 0 else -1
+                # piecewise-parabolic prediction, fall back to linear if it breaks ordering
+                cand = q[i] + s / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + s) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - s) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                if not (q[i - 1] < cand < q[i + 1]):
+                    cand = q[i] + s * (q[i + s] - q[i]) / (pos[i + s] - pos[i])
+                q[i] = cand
+                pos[i] += s
+
+    def value(self):
+        if self.n == 0:
+            return 0.0
+        if self.n <= 5:
+            mid = self.n // 2
+            return self.q[mid] if self.n % 2 else (self.q[mid - 1] + self.q[mid]) / 2
+        return self.q[2]
+
+
+class SlidingWindowMedian:
+    """Exact median of a multiset supporting add / remove-by-handle in O(log n)."""
+
+    def __init__(self):
+        self.low = []        # max-heap as (-value, handle)
+        self.high = []       # min-heap as (value, handle)
+        self.side = {}       # handle -> "low" | "high"
+        self.deleted = set()
+        self.low_size = 0
+        self.high_size = 0
+        self._seq = 0
+
+    def __len__(self):
+        return self.low_size + self.high_size
+
+    def add(self, x):
+        self._seq += 1
+        h = self._seq
+        self._prune(self.low)
+        if self.low_size == 0 or x <= -self.low[0][0]:
+            heapq.heappush(self.low, (-x, h))
+            self.side[h] = "low"
+            self.low_size += 1
+        else:
+            heapq.heappush(self.high, (x, h))
+            self.side[h] = "high"
+            self.high_size += 1
+        self._rebalance()
+        return h
+
+    def remove(self, h):
+        side = self.side.pop(h)
+        self.deleted.add(h)
+        if side == "low":
+            self.low_size -= 1
+        else:
+            self.high_size -= 1
+        self._rebalance()
+        # lazily deleted entries buried in the heaps are dropped once they dominate
+        if len(self.low) + len(self.high) > 2 * len(self) + 64:
+            self._compact()
+
+    def median(self):
+        if not len(self):
+            return 0.0
+        self._prune(self.low)
+        if self.low_size > self.high_size:
+            return -self.low[0][0]
+        self._prune(self.high)
+        return (-self.low[0][0] + self.high[0][0]) / 2
+
+    def _prune(self, heap):
+        while heap and heap[0][1] in self.deleted:
+            self.deleted.discard(heapq.heappop(heap)[1])
+
+    def _rebalance(self):
+        while self.low_size > self.high_size + 1:
+            self._prune(self.low)
+            v, h = heapq.heappop(self.low)
+            heapq.heappush(self.high, (-v, h))
+            self.side[h] = "high"
+            self.low_size -= 1
+            self.high_size += 1
+        while self.high_size > self.low_size:
+            self._prune(self.high)
+            v, h = heapq.heappop(self.high)
+            heapq.heappush(self.low, (-v, h))
+            self.side[h] = "low"
+            self.high_size -= 1
+            self.low_size += 1
+
+    def _compact(self):
+        self.low = [e for e in self.low if e[1] not in self.deleted]
+        self.high = [e for e in self.high if e[1] not in self.deleted]
+        heapq.heapify(self.low)
+        heapq.heapify(self.high)
+        self.deleted.clear()
+
+
+class FillRateEstimator:
+    """
+    Fill rate (median of positive level-increase rates, units/min) fed one reading
+    at a time. With window_hours=None the median is a P² estimate over the whole
+    history (constant memory); otherwise it is the exact median of the rates whose
+    reading falls in the last window_hours of telemetry (memory bounded by the window).
+    Reports the same n_samples / median_rate / mean_rate stats as the batch estimator.
+    """
+
+    def __init__(self, window_hours=None):
+        self.window_us = None if window_hours is None else int(window_hours * US_PER_HOUR)
+        self.prev = None                 # (epoch_us, level)
+        self.n = 0
+        self.total = 0.0
+        if self.window_us is None:
+            self._median = P2Median()
+        else:
+            self._median = SlidingWindowMedian()
+            self._window = deque()       # (epoch_us, rate, handle)
+
+    def update(self, epoch_us, level):
+        if self.prev is not None:
+            t_prev, v_prev = self.prev
+            delta = level - v_prev
+            dt_min = (epoch_us - t_prev) / 1e6 / 60.0
+            if delta > 0 and dt_min > 0:
+                self._add(epoch_us, delta / dt_min)
+        self.prev = (epoch_us, level)
+        if self.window_us is not None:
+            self._expire(epoch_us - self.window_us)
+
+    def _add(self, epoch_us, rate):
+        self.n += 1
+        self.total += rate
+        h = self._median.add(rate)
+        if self.window_us is not None:
+            self._window.append((epoch_us, rate, h))
+
+    def _expire(self, cutoff_us):
+        while self._window and self._window[0][0] < cutoff_us:
+            _, rate, h = self._window.popleft()
+            self._median.remove(h)
+            self.n -= 1
+            self.total -= rate
+        if not self.n:
+            self.total = 0.0
+
+    def median(self):
+        return self._median.value() if self.window_us is None else self._median.median()
+
+    def stats(self):
+        if not self.n:
+            return {"n_samples": 0}
+        median = self.median()
+        return {"n_samples": self.n, "median_rate": median, "mean_rate": self.total / self.n}
@@ -0,0 +1,63 @@
+"""Shared fixtures: a local stub of the EOG API."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class Stub:
+    """Serves self.docs[path] as JSON with an ETag (and Last-Modified); records every request."""
+
+    def __init__(self):
+        self.docs = {}
+        self.versions = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append((self.path, dict(self.headers)))
+                if self.path not in stub.docs:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                etag = f'"v{stub.versions[self.path]}"'
+                modified = f"Wed, 01 Jan 2025 00:00:{stub.versions[self.path]:02d} GMT"
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                body = json.dumps(stub.docs[self.path]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def publish(self, path, doc):
+        self.docs[path] = doc
+        self.versions[path] = self.versions.get(path, 0) + 1
+
+    def received(self, path):
+        """Request headers of every request for path."""
+        return [h for p, h in self.requests if p == path]
+
+
+@pytest.fixture
+def stub():
+    s = Stub()
+    yield s
+    s.server.shutdown()
+    s.server.server_close()
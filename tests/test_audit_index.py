@@ -0,0 +1,151 @@
+"""Audit table paging (audit_index) against a brute-force filter + sort, and the /api/audit/<table> args."""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import audit_index
+from audit_index import AuditIndexStore, CursorError, CursorExpired, TableIndex
+
+DAY0 = np.datetime64("2025-01-01")
+TYPES = ["Over-reported", "Under-reported", "Unlogged Drain"]
+
+
+def table(seed, n=600, days=60):
+    """Skewed cauldrons (long and short runs), repeated volumes, several rows per (date, cauldron)."""
+    rng = np.random.default_rng(seed)
+    cauldrons = np.array([f"c{k}" for k in range(6)])
+    return pd.DataFrame({
+        "date": (DAY0 + rng.integers(0, days, n)).astype(str),
+        "cauldron_id": cauldrons[np.minimum(rng.geometric(0.4, n) - 1, 5)],
+        "type": np.array(TYPES)[rng.integers(0, 3, n)],
+        "volume": np.round(rng.uniform(0, 50, n)) / 2,
+    })
+
+
+def brute_force(df, cauldrons, types, start, end, sort, descending):
+    """Row indices in page order: the rank order TableIndex documents (ties broken by cauldron, then row)."""
+    keep = np.ones(len(df), dtype=bool)
+    if cauldrons is not None:
+        keep &= df["cauldron_id"].isin(cauldrons).to_numpy()
+    if types is not None:
+        keep &= df["type"].isin(types).to_numpy()
+    if start is not None:
+        keep &= (df["date"] >= start).to_numpy()
+    if end is not None:
+        keep &= (df["date"] <= end).to_numpy()
+    by = {"cauldron_id": ["cauldron_id", "date", "row"], "date": ["date", "cauldron_id", "row"],
+          "volume": ["volume", "cauldron_id", "row"]}[sort]
+    rows = df[keep].assign(row=np.flatnonzero(keep)).sort_values(by, ascending=not descending)
+    return rows["row"].tolist()
+
+
+def page_all(index, limit, **kwargs):
+    """Every row reached by following the keyset cursor, page by page."""
+    got, after, totals = [], None, set()
+    while True:
+        rows, total, after = index.page(after=after, limit=limit, **kwargs)
+        assert len(rows) <= limit
+        got += rows.index.tolist()
+        totals.add(total)
+        if after is None:
+            return got, totals
+
+
+FILTERS = [
+    {},
+    {"cauldrons": {"c0"}},
+    {"cauldrons": {"c1", "c4", "missing"}, "types": {"Unlogged Drain"}},
+    {"types": {"Over-reported", "Under-reported"}},
+    {"start": "2025-01-10", "end": "2025-02-20"},            # wide: volume runs scanned with the range applied
+    {"start": "2025-01-20", "end": "2025-01-22"},            # narrow: cut from date order and re-sorted
+    {"cauldrons": {"c0", "c5"}, "start": "2025-02-01"},
+    {"types": {"Over-reported"}, "end": "2025-01-05"},
+    {"start": "2025-01-15", "end": "2025-01-15"},
+    {"start": "2025-01-20", "end": "2025-01-10"},            # empty range
+    {"start": "2024-12-01", "end": "2025-12-31"},            # covers everything
+]
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("sort", audit_index.SORTS)
+def test_pages_equal_brute_force(seed, sort, descending):
+    df = table(seed)
+    index = TableIndex(df, "type", "volume")
+    for filters, limit in itertools.product(FILTERS, (1, 7, 100, 5000)):
+        if limit == 1 and filters.get("types") is None and filters.get("start") is None:
+            continue                                         # one row per page over most of the table: slow, adds nothing
+        expected = brute_force(df, filters.get("cauldrons"), filters.get("types"), filters.get("start"),
+                               filters.get("end"), sort, descending)
+        got, totals = page_all(index, limit, sort=sort, descending=descending, **filters)
+        assert got == expected, (filters, limit)
+        assert totals == {len(expected)}
+
+
+def test_snapshot_cursor_roundtrip_and_errors():
+    store = AuditIndexStore(keep=2)
+    df = table(0, n=300)
+    mismatched = pd.DataFrame({"cauldron_id": df["cauldron_id"], "date": df["date"],
+                               "direction": df["type"], "abs_difference": df["volume"]})
+    snapshot = store.publish({"daily_audit": df, "mismatched_tickets": mismatched})
+
+    for name in ("daily_audit", "mismatched_tickets"):
+        got, cursor = [], None
+        while True:
+            page = store.for_cursor(cursor).page(name, sort="-volume", limit=40, cursor=cursor) if cursor \
+                else snapshot.page(name, sort="-volume", limit=40)
+            got += page["rows"].index.tolist()
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert got == brute_force(df, None, None, None, None, "volume", True)
+        assert page["types"] == sorted(set(df["type"]))
+
+    first = snapshot.page("daily_audit", sort="date", limit=10)
+    with pytest.raises(CursorError):
+        snapshot.page("daily_audit", sort="-date", cursor=first["next_cursor"])
+    with pytest.raises(CursorError):
+        snapshot.page("mismatched_tickets", sort="date", cursor=first["next_cursor"])
+    with pytest.raises(CursorError):
+        store.for_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        snapshot.page("daily_audit", sort="ticket_id")
+    assert snapshot.page("daily_audit", limit=10 ** 6)["limit"] == audit_index.MAX_PAGE_SIZE
+
+    store.publish({"daily_audit": df})
+    store.publish({"daily_audit": df})                       # keep=2: the first snapshot is dropped
+    with pytest.raises(CursorExpired):
+        store.for_cursor(first["next_cursor"])
+
+
+def test_empty_table_pages():
+    index = TableIndex(None, "type", "volume")
+    rows, total, after = index.page(sort="volume", descending=True)
+    assert len(rows) == 0 and total == 0 and after is None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    audit_api = pytest.importorskip("audit_api")
+    store = AuditIndexStore(ttl_sec=3600)
+    store.publish({"daily_audit": table(1, n=50), "mismatched_tickets": None})
+    monkeypatch.setattr(audit_index, "_STORE", store)
+    return audit_api.app.test_client()
+
+
+@pytest.mark.parametrize("limit", ["abc", "0", "-3", "2.5", ""])
+def test_invalid_limit_is_rejected(client, limit):
+    response = client.get(f"/api/audit/daily_audit?limit={limit}")
+    assert response.status_code == 400
+    assert "limit" in response.get_json()["error"]
+
+
+def test_limit_is_applied(client):
+    response = client.get("/api/audit/daily_audit?limit=7&sort=-date")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body["rows"]) == 7 and body["limit"] == 7 and body["total"] == 50
+    assert client.get("/api/audit/daily_audit").get_json()["limit"] == audit_index.PAGE_SIZE
@@ -0,0 +1,61 @@
+"""Parity between the loop and the vectorized drain detection engines in ttst."""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import ttst
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def series(seed, n=500):
+    """Seeded level series: steady fill, noise, drains over a few readings, flat stretches, uneven spacing."""
+    rng = np.random.default_rng(seed)
+    step = rng.choice([1.0, 1.0, 1.0, 0.5, 2.0, 5.0], n)
+    minutes = np.cumsum(step) - step[0]
+    inc = rng.uniform(0.0, 0.6, n) + rng.normal(0.0, 0.08, n)
+    drains = rng.random(n) < 0.03
+    for i in np.flatnonzero(drains):
+        inc[i:i + rng.integers(1, 6)] -= rng.uniform(1.0, 30.0)
+    inc[rng.random(n) < 0.05] = 0.0                                    # exact plateaus
+    inc[rng.random(n) < 0.02] = -ttst.NOISE_DELTA                      # drops right at the noise threshold
+    levels = np.round(np.maximum(np.cumsum(inc) + 500.0, 0.0), 3)
+    return [(START + timedelta(minutes=float(m)), float(v)) for m, v in zip(minutes, levels)]
+
+
+def assert_same_events(records, fill_rate):
+    loop = ttst.detect_drain_events(records, "cauldron_001", fill_rate)
+    vec = ttst.detect_drain_events_vectorized(*ttst.records_to_arrays(records), "cauldron_001", fill_rate)
+    assert len(loop) == len(vec)
+    for a, b in zip(loop, vec):
+        assert a.keys() == b.keys()
+        for key in ("cauldron_id", "time_start", "time_end"):
+            assert a[key] == b[key]
+        for key in ("start_level", "end_level", "raw_drop", "duration_min", "fill_during", "collected_amount"):
+            assert a[key] == pytest.approx(b[key], rel=1e-12, abs=1e-12)
+    return loop
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_series(seed):
+    records = series(seed)
+    fill_rate, _ = ttst.estimate_fill_rate_from_arrays(*ttst.records_to_arrays(records))
+    assert assert_same_events(records, fill_rate)
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3])
+def test_short_series(n):
+    assert_same_events(series(7)[:n], 0.2)
+
+
+def test_filters_tiny_and_short_drains():
+    t = [START + timedelta(seconds=s) for s in (0, 60, 120, 130, 190, 250)]
+    levels = [100.0, 99.9, 99.7, 80.0, 80.0, 70.0]     # a 0.3 drop below MIN_DRAIN_VOLUME, a 10 s drop
+    assert_same_events(list(zip(t, levels)), 0.0)
+
+
+def test_constant_series_has_no_drains():
+    records = [(START + timedelta(minutes=i), 42.0) for i in range(50)]
+    assert assert_same_events(records, 0.1) == []
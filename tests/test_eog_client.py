@@ -0,0 +1,81 @@
+"""EOGClient against a local stub HTTP server: TTL cache, ETag / Last-Modified revalidation."""
+
+import pytest
+import requests
+
+from eog_client import EOGClient
+
+
+def test_served_from_cache_within_ttl(stub):
+    stub.publish("/api/Data", [{"a": 1}])
+    client = EOGClient(stub.base, ttl_sec=60)
+    assert client.fetch_json("/api/Data") == [{"a": 1}]
+    assert client.fetch_json("api/Data") == [{"a": 1}]
+    assert len(stub.received("/api/Data")) == 1
+
+
+def test_revalidates_with_etag_after_ttl(stub):
+    stub.publish("/api/Data", {"v": 1})
+    client = EOGClient(stub.base, ttl_sec=0)
+    assert client.fetch_json("/api/Data") == {"v": 1}
+    assert client.fetch_json("/api/Data") == {"v": 1}     # 304, cached body
+    first, second = stub.received("/api/Data")
+    assert "If-None-Match" not in first
+    assert second["If-None-Match"] == '"v1"'
+    assert second["If-Modified-Since"] == "Wed, 01 Jan 2025 00:00:01 GMT"
+
+    stub.publish("/api/Data", {"v": 2})
+    assert client.fetch_json("/api/Data") == {"v": 2}     # ETag changed: new body
+    assert client.fetch_json("/api/Data", max_age=60) == {"v": 2}
+    assert len(stub.received("/api/Data")) == 3
+
+
+def test_version_is_stable_while_cached_and_on_304(stub):
+    stub.publish("/api/Data", {"v": 1})
+    client = EOGClient(stub.base, ttl_sec=60)
+    body, version = client.fetch_json("/api/Data", with_version=True)
+    assert body == {"v": 1}
+    assert client.fetch_json("/api/Data", with_version=True)[1] == version          # TTL hit
+    assert client.fetch_json("/api/Data", max_age=0, with_version=True)[1] == version  # 304
+    stub.publish("/api/Data", {"v": 2})
+    body, changed = client.fetch_json("/api/Data", max_age=0, with_version=True)
+    assert body == {"v": 2} and changed != version
+
+    stub.publish("/a", "A")
+    bodies, versions = client.fetch_all("/a", "/api/Data", with_version=True)
+    assert bodies == ["A", {"v": 2}] and versions[1] == changed
+
+
+def test_max_age_overrides_ttl(stub):
+    stub.publish("/x", [1])
+    client = EOGClient(stub.base, ttl_sec=60)
+    client.fetch_json("/x")
+    client.fetch_json("/x", max_age=0)
+    assert len(stub.received("/x")) == 2
+
+
+def test_callers_cannot_corrupt_the_cache(stub):
+    stub.publish("/api/Information/network", {"edges": [{"from": "a", "to": "b"}]})
+    client = EOGClient(stub.base, ttl_sec=0)
+    doc = client.fetch_json("/api/Information/network")
+    doc["edges"].clear()
+    assert client.fetch_json("/api/Information/network")["edges"] == [{"from": "a", "to": "b"}]   # via 304
+    client.ttl_sec = 60
+    client.fetch_json("/api/Information/network")["edges"].append("junk")
+    assert client.fetch_json("/api/Information/network")["edges"] == [{"from": "a", "to": "b"}]   # via TTL
+
+
+def test_fetch_all_keeps_order_and_invalidate_refetches(stub):
+    stub.publish("/a", "A")
+    stub.publish("/b", "B")
+    client = EOGClient(stub.base, ttl_sec=60)
+    assert client.fetch_all("/b", "/a") == ["B", "A"]
+    client.invalidate("/a")
+    assert client.fetch_all("/a", "/b") == ["A", "B"]
+    assert len(stub.received("/a")) == 2 and len(stub.received("/b")) == 1
+
+
+def test_http_errors_raise(stub):
+    client = EOGClient(stub.base)
+    with pytest.raises(requests.HTTPError):
+        client.fetch_json("/missing")
@@ -0,0 +1,134 @@
+"""Heterogeneous courier fleet: parsing, capacity classes, reserve activation, per-courier schedules."""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from benchmarks import generators
+from optimized_routes import (WitchPool, build_graph, capacity_preferences, courier_capacity, load_fleet,
+                              schedule_witches, shortest_travel_time)
+
+NOW = datetime(2025, 1, 1, 8, tzinfo=timezone.utc)
+
+# travel into X: A 10, B 30, C 5 minutes; D has no road to X
+NETWORK = {"edges": [
+    {"from": "A", "to": "X", "travel_time_minutes": 10},
+    {"from": "B", "to": "X", "travel_time_minutes": 30},
+    {"from": "C", "to": "X", "travel_time_minutes": 5},
+    {"from": "X", "to": "D", "travel_time_minutes": 1},
+]}
+
+
+def test_load_fleet():
+    fleet = load_fleet([
+        {"id": "a", "max_carrying_capacity": "50", "home_node": "H"},
+        {"courier_id": "b", "capacity": 200, "start_node": "S", "current_node": "X"},
+        {"courier_id": "none", "max_carrying_capacity": 0},
+        {"courier_id": "bad", "max_carrying_capacity": "lots"},
+        {"max_carrying_capacity": 100, "current_node": "X", "ready_min": 5, "load": 20, "extra": True},
+    ])
+    assert fleet == [
+        {"courier_id": "b", "capacity": 200.0, "start_node": "S", "extra": False, "ready_min": 0.0, "load": 0.0},
+        {"courier_id": "courier_4", "capacity": 100.0, "start_node": "X", "extra": True, "ready_min": 5.0,
+         "load": 20.0},
+        {"courier_id": "a", "capacity": 50.0, "start_node": "H", "extra": False, "ready_min": 0.0, "load": 0.0},
+    ]
+    assert courier_capacity([{"max_carrying_capacity": 50}, {"capacity": 200}]) == 200.0
+    assert courier_capacity([]) == 100.0
+
+
+def fleet_of(*caps):
+    return [{"courier_id": f"c{i}", "capacity": float(cap)} for i, cap in enumerate(caps)]
+
+
+def test_capacity_preferences_send_large_couriers_to_heavy_cauldrons():
+    forecasts = {cid: {"fill_rate_per_min": rate} for cid, rate in [("a", 4.0), ("b", 3.0), ("c", 2.0), ("d", 1.0)]}
+    # the 200s carry half the fleet capacity: the cauldrons making the first half of the potion prefer them
+    prefs = capacity_preferences(forecasts, fleet_of(200, 200, 100, 100, 100, 100))
+    assert prefs == {"a": [200.0, 100.0], "b": [100.0, 200.0], "c": [100.0, 200.0], "d": [100.0, 200.0]}
+    # other classes follow nearest first (ties: larger first)
+    prefs = capacity_preferences(forecasts, fleet_of(300, 200, 100))
+    assert prefs["a"] == [300.0, 200.0, 100.0]
+    assert prefs["b"] == [200.0, 300.0, 100.0]
+    assert prefs["d"] == [100.0, 200.0, 300.0]
+    assert capacity_preferences(forecasts, fleet_of(100, 100)) == {}
+
+
+def reserve(*couriers):
+    fleet = [{"courier_id": cid, "capacity": float(cap), "start_node": node, "extra": False}
+             for cid, cap, node in couriers]
+    return WitchPool(build_graph(NETWORK), fleet=fleet)
+
+
+def test_activate_takes_the_nearest_reserve_courier_of_the_first_feasible_class():
+    pool = reserve(("c1", 100, "A"), ("c2", 100, "C"), ("c3", 100, "C"), ("big1", 200, "B"), ("big2", 200, "D"))
+    assert pool.classes() == [200.0, 100.0]
+    deadline = NOW + timedelta(minutes=40)
+    taken = [pool.activate("X", deadline, NOW, [200.0, 100.0]) for _ in range(5)]
+    # big1 first although the 100s are closer; big2 never reaches X: fall through to the 100s, nearest first
+    assert [(c and c["courier_id"], t) for c, t in taken] == \
+        [("big1", 30.0), ("c2", 5.0), ("c3", 5.0), ("c1", 10.0), (None, None)]
+    assert pool.classes() == [200.0]                       # big2 is still in reserve
+
+
+def test_activate_deadline():
+    pool = reserve(("big", 200, "B"), ("small", 100, "A"))
+    # big would arrive at 30: too late for 20, the smaller class is tried
+    assert pool.activate("X", NOW + timedelta(minutes=20), NOW)[0]["courier_id"] == "small"
+    assert pool.activate("X", NOW + timedelta(minutes=20), NOW) == (None, None)
+    # once the deadline has passed everyone is late: the least travel still goes
+    pool = reserve(("far", 100, "B"), ("near", 100, "A"))
+    assert pool.activate("X", NOW - timedelta(minutes=1), NOW) == (
+        {"courier_id": "near", "capacity": 100.0, "start_node": "A", "extra": False}, 10.0)
+
+
+def test_courier_without_start_node_appears_at_the_cauldron():
+    pool = reserve(("home", 100, "C"), ("anywhere", 100, None))
+    courier, travel = pool.activate("X", NOW + timedelta(minutes=40), NOW)
+    assert courier["courier_id"] == "anywhere" and travel == 0.0
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_schedule_uses_each_couriers_capacity_and_start_node(seed):
+    rng = np.random.default_rng(seed)
+    ids = generators.cauldron_ids(40)
+    max_volume = rng.uniform(500, 1000, len(ids))
+    network = generators.network(ids, n_markets=2, seed=seed)
+    couriers = [{"courier_id": f"courier_{k}", "max_carrying_capacity": cap,
+                 **({"start_node": f"market_00{k % 2}"} if k % 3 else {})}
+                for k, cap in enumerate([300, 100, 100, 150, 100, 300, 100, 150])]
+    forecasts = {cid: {"current_level": float(m * rng.uniform(0.2, 0.9)), "max_volume": float(m),
+                       "fill_rate_per_min": float(rng.uniform(0.2, 1.0)),
+                       "drain_rate_per_min": float(rng.uniform(5, 15))}
+                 for cid, m in zip(ids, max_volume)}
+    schedule = schedule_witches(network, generators.cauldron_info(ids, max_volume), couriers, forecasts, now=NOW)
+
+    G = build_graph(network)
+    by_id = {c["courier_id"]: c for c in couriers}
+    dispatched = [w for w in schedule["witches"] if not w["extra"]]
+    assert schedule["fleet"]["dispatched"] == len(dispatched) == len({w["courier_id"] for w in dispatched})
+    assert {w["capacity"] for w in dispatched} == {100.0, 150.0, 300.0}        # every class goes out
+    for w in schedule["witches"]:
+        courier = by_id.get(w["courier_id"])
+        if courier is None:
+            assert w["extra"] and w["capacity"] == 300.0                      # extras get the largest capacity
+            continue
+        assert w["capacity"] == courier["max_carrying_capacity"]
+        if not w["route"]:
+            continue
+        first = w["route"][0]
+        if "start_node" in courier:
+            assert w["start_node"] == courier["start_node"]
+            assert first["travel_min"] == pytest.approx(shortest_travel_time(G, courier["start_node"],
+                                                                             first["cauldron_id"], NOW))
+        else:
+            assert w["start_node"] == first["cauldron_id"] and first["travel_min"] == 0.0
+        load = 0.0
+        for a in w["route"]:
+            if a["type"] == "collect":
+                load += a["amount"]
+                assert load <= w["capacity"] + 1e-6
+            else:
+                assert a["amount_unloaded"] == pytest.approx(load)
+                load = 0.0
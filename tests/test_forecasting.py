@@ -0,0 +1,197 @@
+"""Forecast projection: hand-computed overflow timing, what-if scenarios, coarsening, downsampling."""
+
+import math
+
+import numpy as np
+import pytest
+
+import forecasting
+from forecasting import downsample, forecast_curves, parse_scenarios, project
+
+# a: 100 of 1000 at 2/min -> full at 450 min; b: never fills; c: already full
+FORECASTS = {
+    "a": {"current_level": 100.0, "max_volume": 1000.0, "fill_rate_per_min": 2.0},
+    "b": {"current_level": 300.0, "max_volume": 500.0, "fill_rate_per_min": 0.0},
+    "c": {"current_level": 800.0, "max_volume": 800.0, "fill_rate_per_min": 1.0},
+}
+
+
+def by_cauldron(p, key, s=0):
+    return dict(zip(p["cauldron_ids"], p[key][s].tolist()))
+
+
+def reference(level, cap, rate, collections, horizon):
+    """Scalar replay: overflow time, spilled and collected volume within the horizon."""
+    prev, overflow, spilled, collected = 0.0, math.inf, 0.0, 0.0
+
+    def fill_until(at):
+        nonlocal overflow, spilled
+        if rate > 0 and level + rate * (at - prev) > cap:
+            t_full = prev + (cap - level) / rate
+            overflow = min(overflow, t_full)
+            spilled += rate * (at - t_full)
+        return min(cap, level + rate * (at - prev))
+
+    for c in collections:
+        if c["at_min"] > horizon:
+            break
+        before = fill_until(c["at_min"])
+        level = 0.0 if c["amount"] is None else max(before - c["amount"], 0.0)
+        collected += before - level
+        prev = c["at_min"]
+    fill_until(horizon)
+    return overflow, spilled, collected
+
+
+def level_at(level, cap, rate, collections, t):
+    prev = 0.0
+    for c in collections:
+        if c["at_min"] > t:
+            break
+        level = min(cap, level + rate * (c["at_min"] - prev))
+        level = 0.0 if c["amount"] is None else max(level - c["amount"], 0.0)
+        prev = c["at_min"]
+    return min(cap, level + rate * (t - prev))
+
+
+def test_baseline_overflow_timing_by_hand():
+    p = project(FORECASTS, horizon_min=1440)
+    assert by_cauldron(p, "overflow_min") == {"a": 450.0, "b": math.inf, "c": 0.0}
+    assert by_cauldron(p, "spilled") == {"a": 2.0 * (1440 - 450), "b": 0.0, "c": 1440.0}
+    assert by_cauldron(p, "collected") == {"a": 0.0, "b": 0.0, "c": 0.0}
+    a = p["levels"][0, p["cauldron_ids"].index("a")]
+    assert a[0] == 100.0 and a[100] == 300.0 and a[449] == 998.0 and a[450] == 1000.0 and a[-1] == 1000.0
+    assert p["t_min"][-1] == 1440 and len(p["t_min"]) == 1441
+
+
+def test_overflow_between_grid_points_is_exact():
+    p = project({"a": {"current_level": 0.0, "max_volume": 10.0, "fill_rate_per_min": 3.0}},
+                horizon_min=60, step_min=7)
+    assert p["overflow_min"][0, 0] == pytest.approx(10.0 / 3.0)
+    assert p["spilled"][0, 0] == pytest.approx(3.0 * (60 - 10.0 / 3.0))
+    assert p["t_min"][-1] == 60                              # horizon not a multiple of the step
+
+
+def test_what_if_scenarios_by_hand():
+    scenarios = [
+        {"name": "faster", "fill_rate_pct": 100},
+        {"name": "slower", "fill_rate_pct": -50},
+        {"name": "empty a at 400", "collections": [{"cauldron_id": "a", "at_min": 400}]},
+        {"name": "take 300 of a", "collections": [{"cauldron_id": "a", "at_min": 400, "amount": 300}]},
+        {"name": "twice", "collections": [{"cauldron_id": "a", "at_min": 600}, {"cauldron_id": "a", "at_min": 300}]},
+        {"name": "all at 100", "collections": [{"at_min": 100}]},
+        {"name": "after horizon", "collections": [{"cauldron_id": "a", "at_min": 2000}]},
+        {"name": "at horizon", "collections": [{"cauldron_id": "a", "at_min": 1440}]},
+        {"name": "unknown cauldron", "collections": [{"cauldron_id": "zz", "at_min": 10}]},
+    ]
+    p = project(FORECASTS, scenarios, horizon_min=1440)
+    names = [s["name"] for s in p["scenarios"]]
+    overflow = {n: by_cauldron(p, "overflow_min", s) for s, n in enumerate(names)}
+    spilled = {n: by_cauldron(p, "spilled", s) for s, n in enumerate(names)}
+    collected = {n: by_cauldron(p, "collected", s) for s, n in enumerate(names)}
+
+    assert overflow["faster"]["a"] == 225.0 and overflow["slower"]["a"] == 900.0
+    assert overflow["faster"]["b"] == math.inf
+    # emptied at 400 (900 in it), full again 500 minutes later
+    assert collected["empty a at 400"]["a"] == 900.0
+    assert overflow["empty a at 400"]["a"] == 900.0 and spilled["empty a at 400"]["a"] == 2.0 * 540
+    assert overflow["empty a at 400"]["c"] == 0.0             # other cauldrons untouched
+    assert collected["take 300 of a"]["a"] == 300.0 and overflow["take 300 of a"]["a"] == 600.0
+    # collections are applied in time order: 700 at 300, 600 at 600, full at 1100
+    assert collected["twice"]["a"] == 1300.0 and overflow["twice"]["a"] == 1100.0
+    assert collected["all at 100"] == {"a": 300.0, "b": 300.0, "c": 800.0}
+    # c spills until it is emptied at 100, then again from 900: overflow_min is the first time
+    assert overflow["all at 100"]["c"] == 0.0 and spilled["all at 100"]["c"] == 100.0 + 540.0
+    assert overflow["all at 100"]["b"] == math.inf
+    assert collected["after horizon"]["a"] == 0.0 and overflow["after horizon"]["a"] == 450.0
+    assert collected["at horizon"]["a"] == 1000.0 and spilled["at horizon"]["a"] == spilled["after horizon"]["a"]
+    assert overflow["unknown cauldron"] == overflow["faster"] | {"a": 450.0}
+
+    a = p["levels"][names.index("empty a at 400"), p["cauldron_ids"].index("a")]
+    assert a[399] == 898.0 and a[400] == 0.0 and a[401] == 2.0
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_scenarios_against_scalar_replay(seed):
+    rng = np.random.default_rng(seed)
+    ids = [f"c{k}" for k in range(6)]
+    forecasts = {cid: {"current_level": float(rng.uniform(0, 900)), "max_volume": 1000.0,
+                       "fill_rate_per_min": float(rng.choice([0.0, rng.uniform(0.1, 3)]))} for cid in ids}
+    scenarios = [{"fill_rate_pct": float(rng.uniform(-90, 100)),
+                  "collections": [{"cauldron_id": None if rng.random() < 0.2 else str(rng.choice(ids)),
+                                   "at_min": float(rng.integers(0, 1600)),
+                                   "amount": None if rng.random() < 0.5 else float(rng.uniform(0, 600))}
+                                  for _ in range(rng.integers(0, 6))]}
+                 for _ in range(4)]
+    horizon = 1440
+    p = project(forecasts, scenarios, horizon_min=horizon, step_min=5)
+    for s, scenario in enumerate(p["scenarios"]):
+        for j, cid in enumerate(p["cauldron_ids"]):
+            f = forecasts[cid]
+            rate = f["fill_rate_per_min"] * (1 + scenario["fill_rate_pct"] / 100)
+            cs = [c for c in scenario["collections"] if c["cauldron_id"] in (None, cid)]
+            overflow, spilled, collected = reference(f["current_level"], 1000.0, rate, cs, horizon)
+            assert p["overflow_min"][s, j] == pytest.approx(overflow)
+            assert p["spilled"][s, j] == pytest.approx(spilled, abs=1e-6)
+            assert p["collected"][s, j] == pytest.approx(collected, abs=1e-6)
+            expected = [level_at(f["current_level"], 1000.0, rate, cs, t) for t in p["t_min"].tolist()]
+            np.testing.assert_allclose(p["levels"][s, j], expected, atol=1e-9)
+
+
+def test_grid_is_coarsened_above_max_cells(monkeypatch):
+    scenarios = [{"collections": [{"cauldron_id": "a", "at_min": 400}]}, {"fill_rate_pct": 10}]
+    fine = project(FORECASTS, scenarios, horizon_min=1440)
+    # 2 scenarios x 3 cauldrons x 2 passes (one collection slot)
+    monkeypatch.setattr(forecasting, "MAX_FORECAST_CELLS", 2 * 3 * 2 * 101)
+    coarse = project(FORECASTS, scenarios, horizon_min=1440)
+    assert len(coarse["t_min"]) == 101 and coarse["step_min"] == 14.4
+    assert 2 * 3 * 2 * len(coarse["t_min"]) <= forecasting.MAX_FORECAST_CELLS
+    assert coarse["t_min"][-1] == 1440
+    # overflow, spill and collection amounts do not depend on the grid
+    for key in ("overflow_min", "spilled", "collected"):
+        np.testing.assert_array_equal(coarse[key], fine[key])
+    np.testing.assert_array_equal(coarse["levels"], project(FORECASTS, scenarios, 1440, step_min=14.4)["levels"])
+
+    monkeypatch.setattr(forecasting, "MAX_FORECAST_CELLS", 1)
+    tiny = project(FORECASTS, scenarios, horizon_min=1440)
+    assert len(tiny["t_min"]) == 2 and tiny["t_min"].tolist() == [0.0, 1440.0]
+
+
+def test_downsample_keeps_bucket_peaks():
+    t = np.arange(11, dtype=float)
+    levels = np.array([[0, 1, 9, 1, 0, 0, 0, 5, 0, 0, 3]], dtype=float)
+    ts, ls, peaks = downsample(t, levels, points=3)
+    assert ts.tolist() == [0, 5, 10]
+    assert ls.tolist() == [[0, 0, 3]]
+    assert peaks.tolist() == [[0, 9, 5]]                     # spikes at 2 and 7 fall between samples
+    assert downsample(t, levels, points=20)[0] is t
+
+
+def test_forecast_curves_payload():
+    out = forecast_curves(FORECASTS, [{"name": "x", "fill_rate_pct": 100}], horizon_min=1440, points=97)
+    assert len(out["t_min"]) == 97 and out["t_min"][-1] == 1440
+    (x,) = out["scenarios"]
+    assert x["name"] == "x" and x["levels"].shape == (3, 97)
+    overflow = dict(zip(out["cauldron_ids"], x["overflow_min"].tolist()))
+    assert overflow["a"] == 225.0 and math.isnan(overflow["b"])      # NaN (null) = no overflow
+
+
+@pytest.mark.parametrize("spec", [
+    {"fill_rate_pct": -100},
+    {"fill_rate_pct": float("nan")},
+    {"collections": [{"at_min": -1}]},
+    {"collections": [{"at_min": 5, "amount": -2}]},
+    {"collections": [{"at_min": k} for k in range(forecasting.MAX_COLLECTIONS + 1)]},
+    "not an object",
+])
+def test_invalid_scenarios_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_scenarios([spec])
+
+
+def test_too_many_scenarios_and_bad_horizon():
+    with pytest.raises(ValueError):
+        parse_scenarios([{}] * (forecasting.MAX_SCENARIOS + 1))
+    with pytest.raises(ValueError):
+        project(FORECASTS, horizon_min=0)
+    assert [s["name"] for s in parse_scenarios(None)] == ["baseline"]
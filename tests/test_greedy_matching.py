@@ -0,0 +1,108 @@
+"""Greedy matcher (bucketed EventIndex) against the original linear greedy loop."""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import ttst
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def linear_greedy(events, tickets, tolerance_rel=ttst.VOLUME_MATCH_REL_TOL, tolerance_abs=ttst.VOLUME_MATCH_ABS_TOL):
+    """The original matcher: scan the ticket day's and the previous day's events for each ticket."""
+    by_cauldron_date = defaultdict(lambda: defaultdict(list))
+    for i, e in enumerate(events):
+        by_cauldron_date[e["cauldron_id"]][ttst.iso_to_dt(e["time_start"]).date()].append(i)
+    used, outcome, ghosts, recovered = set(), {}, [], 0
+    for pos, t in enumerate(tickets):
+        t_amt = t.get("amount_collected", 0)
+        try:
+            t_date = ttst.iso_to_dt(t["date"]).date()
+        except Exception:
+            continue
+        candidates = [(i, d) for d in (t_date, t_date - timedelta(days=1))
+                      for i in by_cauldron_date[t.get("cauldron_id")].get(d, [])]
+        best = None
+        for i, d in candidates:
+            if i in used:
+                continue
+            diff = abs(events[i]["collected_amount"] - t_amt)
+            if best is None or diff < best[1]:
+                best = (i, diff, d)
+        if best is None:
+            ghosts.append(pos)
+            continue
+        i, diff, d = best
+        used.add(i)
+        prev_day = d == t_date - timedelta(days=1)
+        recovered += prev_day
+        ok = diff / max(1.0, t_amt) <= tolerance_rel or diff <= tolerance_abs
+        outcome[pos] = (i, diff, prev_day, ok)
+    return outcome, ghosts, sorted(set(range(len(events))) - used), recovered
+
+
+def case(seed, n_cauldrons=3, days=4, n_events=60, n_tickets=70):
+    """
+    Few distinct amounts (exact ties, equidistant tickets), several events per cauldron-day,
+    tickets dated on and after their drains, more tickets than events, unparseable dates.
+    """
+    rng = np.random.default_rng(seed)
+    amounts = [50.0, 60.0, 60.0, 75.5, 100.0, 100.0, 140.0]
+    events = []
+    for _ in range(n_events):
+        start = START + timedelta(days=int(rng.integers(0, days)), minutes=int(rng.integers(0, 1440)))
+        events.append({"cauldron_id": f"c{rng.integers(0, n_cauldrons)}",
+                       "time_start": start.isoformat(),
+                       "time_end": (start + timedelta(minutes=30)).isoformat(),
+                       "collected_amount": float(rng.choice(amounts)) + float(rng.choice([0.0, 0.0, 0.25, 5.0]))})
+    tickets = []
+    for k in range(n_tickets):
+        day = START + timedelta(days=int(rng.integers(0, days + 1)))
+        amount = float(rng.choice([55.0, 60.0, 67.75, 100.0, 120.0, 95.0, 300.0]))
+        tickets.append({"ticket_id": f"T{k}", "cauldron_id": f"c{rng.integers(0, n_cauldrons)}",
+                        "amount_collected": amount, "courier_id": "w",
+                        "date": "not a date" if rng.random() < 0.03 else day.date().isoformat()})
+    return events, tickets
+
+
+def assert_same_as_linear(events, tickets):
+    recon = ttst.match_events_to_tickets(events, tickets, strategy="greedy")
+    outcome, ghosts, unmatched, recovered = linear_greedy(events, tickets)
+    got = {}
+    for name, ok in (("matches", True), ("mismatches", False)):
+        for m in recon[name]:
+            got[int(m["ticket"])] = (int(m["event"]), float(m["volume_delta"]), bool(m["matched_previous_day"]), ok)
+    assert got == outcome
+    assert [tickets.index(t) for t in recon["unmatched_tickets"]] == ghosts
+    assert recon["unmatched_events"].ids.tolist() == unmatched
+    assert recon["recovered_previous_day"] == recovered
+    return recon
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_same_as_linear_greedy(seed):
+    events, tickets = case(seed)
+    recon = assert_same_as_linear(events, tickets)
+    assert len(recon["matches"]) and len(recon["unmatched_tickets"])
+
+
+def test_ties_go_to_ticket_day_then_detection_order():
+    day0, day1 = START, START + timedelta(days=1)
+    events = [
+        {"cauldron_id": "c", "time_start": (day0 + timedelta(hours=1)).isoformat(), "collected_amount": 90.0},
+        {"cauldron_id": "c", "time_start": (day1 + timedelta(hours=5)).isoformat(), "collected_amount": 110.0},
+        {"cauldron_id": "c", "time_start": (day1 + timedelta(hours=2)).isoformat(), "collected_amount": 90.0},
+        {"cauldron_id": "c", "time_start": (day1 + timedelta(hours=3)).isoformat(), "collected_amount": 90.0},
+    ]
+    tickets = [{"ticket_id": f"T{k}", "cauldron_id": "c", "amount_collected": 100.0, "date": "2025-01-02"}
+               for k in range(5)]
+    recon = assert_same_as_linear(events, tickets)
+    order = [int(m["event"]) for m in np.sort(np.concatenate([recon["matches"], recon["mismatches"]]),
+                                                order="ticket")]
+    # all four are 10 away: ticket day first (detection order 1, 2, 3), then the previous day
+    assert order == [1, 2, 3, 0]
+    assert recon["recovered_previous_day"] == 1
+    assert len(recon["unmatched_tickets"]) == 1            # every candidate already used
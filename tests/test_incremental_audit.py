@@ -0,0 +1,129 @@
+"""IncrementalReconciler over split feeds against the batch pipeline (ttst.process_all / matchers)."""
+
+import numpy as np
+import pytest
+
+import ttst
+from benchmarks import generators
+from incremental_audit import IncrementalReconciler
+
+
+def _case(seed, n_cauldrons=20, days=6):
+    # noise-free levels: the streaming and batch fill-rate estimators then (nearly) agree
+    t = generators.telemetry(n_cauldrons, days, noise=0.0, gap_rate=0.0, outages_per_day=0.0, seed=seed)
+    ids = t["telemetry"]["cauldron_ids"]
+    tickets = generators.tickets(t["drains"], ids, seed=seed)["transport_tickets"]
+    tickets.sort(key=lambda x: x["date"])          # tickets are appended to the feed as they are logged
+    return generators.to_data_json(t["telemetry"]), tickets, generators.cauldron_info(ids, t["max_volume"])
+
+
+def _run_split(data, tickets, info, splits=6):
+    """Feed telemetry in splits; a ticket shows up once its day's telemetry is complete."""
+    rec = IncrementalReconciler()
+    for k in range(1, splits + 1):
+        cut = len(data) * k // splits
+        day = data[cut - 1]["timestamp"][:10]
+        visible = tickets if k == splits else [t for t in tickets if t["date"] < day]
+        result = rec.update(data[:cut], {"transport_tickets": visible}, info, api_fetch=False)
+    return rec, result
+
+
+def _event_keys(store):
+    arr = store.array
+    return {(store.cauldron_ids[c], s, e): a for c, s, e, a in
+            zip(arr["cauldron"].tolist(), arr["start_us"].tolist(), arr["end_us"].tolist(),
+                arr["collected_amount"].tolist())}
+
+
+def _pairs(recon):
+    store, arr = recon["events"], recon["events"].array
+    return {(name, recon["tickets"][int(m["ticket"])]["ticket_id"], store.cauldron_ids[arr["cauldron"][m["event"]]],
+             int(arr["start_us"][m["event"]]), bool(m["matched_previous_day"]))
+            for name in ("matches", "mismatches") for m in recon[name]}
+
+
+def _assert_tables_match(result):
+    """The incrementally kept audit tables equal a batch aggregation of the same reconciliation."""
+    columns = ttst.discrepancy_columns(result["reconciliation"])
+    expected = ttst.audit_daily_potion_losses(result, columns)
+    daily = result["daily_audit"]
+    assert len(daily) == len(expected)
+    if len(expected):
+        for col in ("date", "cauldron_id", "type"):
+            assert daily[col].tolist() == expected[col].tolist()
+        np.testing.assert_allclose(daily["volume"], expected["volume"], rtol=1e-9, atol=1e-9)
+    mismatched = result["mismatched_tickets"]
+    assert (sorted(mismatched["ticket_id"]) if len(mismatched) else []) == sorted(columns["ticket_id"])
+    if len(mismatched):
+        by_ticket = mismatched.set_index("ticket_id")
+        for tid, diff, direction in zip(columns["ticket_id"], columns["difference"], ttst.DISCREPANCY_TYPES[
+                columns["type"][columns["n_unlogged"]:]]):
+            assert by_ticket.loc[tid, "difference"] == pytest.approx(diff)
+            assert by_ticket.loc[tid, "direction"] == direction
+
+
+@pytest.mark.parametrize("seed", [0, 1, 3])
+def test_split_feeds_match_batch(seed):
+    data, tickets, info = _case(seed)
+    _, inc = _run_split(data, tickets, info)
+    batch = ttst.process_all(api_fetch=False, data_json=data, tickets_json={"transport_tickets": tickets},
+                             cauldron_info_json=info)
+
+    # same drains, except runs still open at the end of the feed (batch closes them there)
+    last_us = ttst.parse_timestamps_us([data[-1]["timestamp"]])[0][0]
+    inc_events, batch_events = _event_keys(inc["events"]), _event_keys(batch["events"])
+    assert {k for k in batch_events if k[2] != last_us} == set(inc_events)
+    # fill_during uses the fill rate when the drain closed, batch the rate of the whole feed
+    for k, amount in inc_events.items():
+        assert amount == pytest.approx(batch_events[k], rel=1e-4)
+
+    # same matching as the batch greedy matcher over those drains
+    expected = ttst.match_events_to_tickets(inc["events"], tickets)
+    recon = inc["reconciliation"]
+    for k in ("matches", "mismatches", "unmatched_events", "unmatched_tickets"):
+        assert len(recon[k]) == len(expected[k]), k
+    assert recon["recovered_previous_day"] == expected["recovered_previous_day"]
+    assert _pairs(recon) == _pairs(expected)
+    assert recon["unmatched_events"].ids.tolist() == expected["unmatched_events"].ids.tolist()
+    assert sorted(t["ticket_id"] for t in recon["unmatched_tickets"]) == \
+        sorted(t["ticket_id"] for t in expected["unmatched_tickets"])
+    _assert_tables_match(inc)
+
+
+def test_tickets_leaving_the_feed_are_evicted():
+    data, tickets, info = _case(0)
+    rec, before = _run_split(data, tickets, info)
+    kept = tickets[::2]
+    after = rec.update(data, {"transport_tickets": kept}, info, api_fetch=False)
+    recon = after["reconciliation"]
+
+    kept_ids = {t["ticket_id"] for t in kept}
+    outcome_ids = [recon["tickets"][int(m["ticket"])]["ticket_id"]
+                   for name in ("matches", "mismatches") for m in recon[name]]
+    outcome_ids += [t["ticket_id"] for t in recon["unmatched_tickets"]]
+    assert sorted(outcome_ids) == sorted(kept_ids)
+    assert len(rec.tickets) == len(kept)
+    # events held by dropped tickets are unmatched again (or taken by a kept ticket)
+    used = set(recon["matches"]["event"].tolist()) | set(recon["mismatches"]["event"].tolist())
+    assert set(recon["unmatched_events"].ids.tolist()) == set(range(len(after["events"]))) - used
+    assert len(recon["unmatched_events"]) > len(before["reconciliation"]["unmatched_events"])
+    _assert_tables_match(after)
+
+    # dropped tickets can come back; their slots are reused
+    slots = len(rec._ticket_at)
+    again = rec.update(data, {"transport_tickets": tickets}, info, api_fetch=False)
+    assert len(rec._ticket_at) == slots
+    assert sum(len(again["reconciliation"][k]) for k in ("matches", "mismatches", "unmatched_tickets")) == len(tickets)
+    _assert_tables_match(again)
+
+
+def test_snapshot_does_not_change_with_later_updates():
+    data, tickets, info = _case(1)
+    rec = IncrementalReconciler()
+    half = len(data) // 2
+    first = rec.update(data[:half], {"transport_tickets": []}, info, api_fetch=False)
+    n_events, unmatched = len(first["events"]), first["reconciliation"]["unmatched_events"].ids.copy()
+    rec.update(data, {"transport_tickets": tickets}, info, api_fetch=False)
+    assert len(first["events"]) == n_events
+    assert first["reconciliation"]["unmatched_events"].ids.tolist() == unmatched.tolist()
+    assert len(first["reconciliation"]["matches"]) == 0
@@ -0,0 +1,52 @@
+"""json_codec with and without orjson: both encoders give the same JSON for the API's value types."""
+
+import datetime
+import json
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import json_codec
+
+FRAMES = {
+    "dates": pd.DataFrame({"b": [datetime.date(2024, 1, 1), None]}),
+    "mixed_objects": pd.DataFrame({"o": [datetime.datetime(2024, 1, 1, 6, 30), Decimal("1.5"), pd.NA, np.float32(2.5),
+                                         pd.Timestamp("2024-01-02"), pd.NaT, {"k": float("nan")}, "s"]}),
+    "numbers": pd.DataFrame({"f": [1.5, np.nan, np.inf], "i": [1, 2, 3], "t": pd.to_datetime(["2024-01-01", None, "2024-01-03"])}),
+}
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(json_codec, "orjson", None)
+    return request.param
+
+
+@pytest.mark.parametrize("name", sorted(FRAMES))
+@pytest.mark.parametrize("tables", json_codec.TABLE_FORMATS)
+def test_frames_encode(encoder, name, tables):
+    out = json.loads(json_codec.dumps({"table": FRAMES[name]}, tables=tables))
+    rows = out["table"] if tables == "records" else [
+        dict(zip(out["table"]["columns"], r)) for r in zip(*out["table"]["data"].values())]
+    assert len(rows) == len(FRAMES[name])
+
+
+def test_fallback_matches_orjson(monkeypatch):
+    pytest.importorskip("orjson")
+    for tables in json_codec.TABLE_FORMATS:
+        for frame in FRAMES.values():
+            fast = json.loads(json_codec.dumps(frame, tables=tables))
+            with monkeypatch.context() as m:
+                m.setattr(json_codec, "orjson", None)
+                slow = json.loads(json_codec.dumps(frame, tables=tables))
+            assert fast == slow
+
+
+def test_fallback_date_column(monkeypatch):
+    monkeypatch.setattr(json_codec, "orjson", None)
+    assert json.loads(json_codec.dumps(FRAMES["dates"])) == [{"b": "2024-01-01"}, {"b": None}]
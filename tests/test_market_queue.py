@@ -0,0 +1,98 @@
+"""MarketQueue bookings and the unload waits they put into schedules."""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from benchmarks import generators
+from optimized_routes import UNLOAD_TIME_MIN, MarketQueue, schedule_witches
+
+NOW = datetime(2025, 1, 1, 6, tzinfo=timezone.utc)
+
+
+def test_single_bay_by_hand():
+    q = MarketQueue(1, 15.0)
+    assert q.book("M", 0.0) == 0.0
+    assert q.book("M", 5.0) == 15.0          # waits for the first unload
+    assert q.book("M", 40.0) == 40.0
+    assert q.book("M", 20.0) == 55.0         # the 30-40 gap is too short
+    assert q.book("M", 100.0) == 100.0
+    assert q.book("M", 60.0) == 70.0         # fits in the 70-100 gap
+    assert q.book("N", 5.0) == 5.0           # markets queue separately
+
+
+def test_several_bays():
+    q = MarketQueue(2, 15.0)
+    assert [q.book("M", t) for t in (0.0, 0.0, 0.0, 3.0, 3.0)] == [0.0, 0.0, 15.0, 15.0, 30.0]
+    q = MarketQueue({"M": 1}, 15.0)
+    assert [q.book("M", 0.0), q.book("M", 0.0), q.book("other", 0.0), q.book("other", 0.0)] == [0.0, 15.0, 0.0, 0.0]
+    for unlimited in (None, 0):
+        assert MarketQueue(unlimited, 15.0).book("M", 7.0) == 7.0
+
+
+def test_datetimes():
+    q = MarketQueue(1, timedelta(minutes=UNLOAD_TIME_MIN))
+    assert q.book("M", NOW) == NOW
+    assert q.book("M", NOW + timedelta(minutes=1)) == NOW + timedelta(minutes=UNLOAD_TIME_MIN)
+
+
+def reference_book(bays, arrival, duration):
+    """Earliest start per bay over every candidate (arrival or the end of a booking); first bay on ties."""
+    best = None
+    for b, slots in enumerate(bays):
+        for t in sorted({arrival} | {e for _, e in slots if e >= arrival}):
+            if all(not (s < t + duration and t < e) for s, e in slots):
+                if best is None or t < best[0]:
+                    best = (t, b)
+                break
+    bays[best[1]].append((best[0], best[0] + duration))
+    return best[0]
+
+
+@pytest.mark.parametrize("n_bays", [1, 2, 3])
+@pytest.mark.parametrize("seed", range(3))
+def test_bookings_against_brute_force(n_bays, seed):
+    rng = np.random.default_rng(seed)
+    q, bays = MarketQueue(n_bays, 15.0), [[] for _ in range(n_bays)]
+    for _ in range(300):
+        arrival = float(rng.integers(0, 600)) if rng.random() < 0.5 else float(rng.uniform(0, 600))
+        assert q.book("M", arrival) == reference_book(bays, arrival, 15.0)
+
+
+def unloads(schedule):
+    """(market, arrival, start, end, action) for every unload, arrival = end of the previous action + travel."""
+    out = []
+    for w in schedule["witches"]:
+        prev_end = None
+        for a in w["route"]:
+            start, end = datetime.fromisoformat(a["start"]), datetime.fromisoformat(a["end"])
+            if a["type"] == "market_unload":
+                out.append((a["market_node"], prev_end + timedelta(minutes=a["travel_min"]), start, end, a))
+            prev_end = end
+    return out
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_schedule_waits_for_a_free_bay(seed):
+    rng = np.random.default_rng(seed)
+    ids = generators.cauldron_ids(60)
+    max_volume = rng.uniform(500, 1000, len(ids))
+    network = generators.network(ids, n_markets=2, seed=seed)
+    forecasts = {cid: {"current_level": float(m * rng.uniform(0.5, 0.95)), "max_volume": float(m),
+                       "fill_rate_per_min": float(rng.uniform(0.5, 2.0)), "drain_rate_per_min": 20.0}
+                 for cid, m in zip(ids, max_volume)}
+    args = (network, generators.cauldron_info(ids, max_volume), generators.couriers(60, seed=seed), forecasts)
+
+    free = unloads(schedule_witches(*args, now=NOW, market_bays=None))
+    assert free and all(start == arrival and "wait_min" not in a for _, arrival, start, _, a in free)
+
+    queued = unloads(schedule_witches(*args, now=NOW, market_bays=1))
+    waits = [a["wait_min"] for *_, a in queued]
+    for _, arrival, start, end, a in queued:
+        assert a["wait_min"] == pytest.approx((start - arrival).total_seconds() / 60.0) and a["wait_min"] >= 0.0
+        assert end - start == timedelta(minutes=UNLOAD_TIME_MIN)
+    assert max(waits) > 0.0
+    for market in {m for m, *_ in queued}:
+        spans = sorted((start, end) for m, _, start, end, _ in queued if m == market)
+        assert all(e0 <= s1 for (_, e0), (s1, _) in zip(spans, spans[1:]))     # one unload at a time
@@ -0,0 +1,144 @@
+"""Optimal (min-cost assignment) matcher: feasibility, blocks, and against greedy / a global assignment."""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+
+import ttst
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def event(cauldron, day, hour, amount):
+    return {"cauldron_id": cauldron, "time_start": (START + timedelta(days=day, hours=hour)).isoformat(),
+            "collected_amount": amount}
+
+
+def ticket(k, cauldron, day, amount):
+    return {"ticket_id": f"T{k}", "cauldron_id": cauldron, "amount_collected": amount, "courier_id": "w",
+            "date": (START + timedelta(days=day)).date().isoformat()}
+
+
+def case(seed, n_cauldrons=2, days=12, n_events=80, n_tickets=90):
+    """Clustered days (with gaps) so blocks split both at day gaps and at max_block."""
+    rng = np.random.default_rng(seed)
+    active = np.flatnonzero(rng.random(days) < 0.7)
+    events = [event(f"c{rng.integers(0, n_cauldrons)}", int(rng.choice(active)), float(rng.uniform(0, 24)),
+                    float(np.round(rng.uniform(40, 160), 1))) for _ in range(n_events)]
+    tickets = [ticket(k, f"c{rng.integers(0, n_cauldrons)}", int(rng.choice(active)) + int(rng.random() < 0.3),
+                      float(np.round(rng.uniform(40, 160), 1))) for k in range(n_tickets)]
+    return events, tickets
+
+
+def outcome(recon):
+    return [(int(m["event"]), int(m["ticket"]), float(m["volume_delta"]), bool(m["matched_previous_day"]))
+            for name in ("matches", "mismatches") for m in recon[name]]
+
+
+def assert_feasible(recon, events, tickets):
+    pairs = outcome(recon)
+    assert len({e for e, _, _, _ in pairs}) == len(pairs)                    # each event at most once
+    assert len({t for _, t, _, _ in pairs}) == len(pairs)
+    for e, t, diff, prev_day in pairs:
+        ev, tk = events[e], tickets[t]
+        assert ev["cauldron_id"] == tk["cauldron_id"]
+        ev_day = ttst.iso_to_dt(ev["time_start"]).date()
+        t_day = ttst.iso_to_dt(tk["date"]).date()
+        assert ev_day in (t_day, t_day - timedelta(days=1))
+        assert prev_day == (ev_day != t_day)
+        assert diff == pytest.approx(abs(ev["collected_amount"] - tk["amount_collected"]))
+    matched = {t for _, t, _, _ in pairs}
+    assert sorted(tickets.index(t) for t in recon["unmatched_tickets"]) == \
+        sorted(set(range(len(tickets))) - matched)
+    assert recon["unmatched_events"].ids.tolist() == sorted(set(range(len(events))) - {e for e, _, _, _ in pairs})
+
+
+def global_assignment(events, tickets):
+    """(matches, total volume difference) of one assignment per cauldron over all its tickets and events."""
+    by_cauldron = defaultdict(lambda: ([], []))
+    for i, e in enumerate(events):
+        by_cauldron[e["cauldron_id"]][0].append(i)
+    for k, t in enumerate(tickets):
+        by_cauldron[t["cauldron_id"]][1].append(k)
+    n_matched, total = 0, 0.0
+    for evs, tks in by_cauldron.values():
+        if not evs or not tks:
+            continue
+        ev_day = np.array([ttst.iso_to_dt(events[i]["time_start"]).date().toordinal() for i in evs])[None, :]
+        t_day = np.array([ttst.iso_to_dt(tickets[k]["date"]).date().toordinal() for k in tks])[:, None]
+        diff = np.abs(np.array([events[i]["collected_amount"] for i in evs])[None, :]
+                      - np.array([tickets[k]["amount_collected"] for k in tks])[:, None])
+        allowed = (ev_day == t_day) | (ev_day == t_day - 1)
+        cost = np.where(allowed, diff, 1e6)
+        rows, cols = linear_sum_assignment(cost)
+        ok = allowed[rows, cols]
+        n_matched += int(ok.sum())
+        total += float(diff[rows, cols][ok].sum())
+    return n_matched, total
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_never_fewer_matches_than_greedy_and_globally_optimal(seed):
+    events, tickets = case(seed)
+    greedy = ttst.match_events_to_tickets(events, tickets, strategy="greedy")
+    optimal = ttst.match_events_to_tickets(events, tickets, strategy="optimal")
+    assert_feasible(optimal, events, tickets)
+    n_greedy, n_optimal = (len(r["matches"]) + len(r["mismatches"]) for r in (greedy, optimal))
+    assert n_optimal >= n_greedy
+    # splitting at day gaps loses nothing against one assignment over the whole cauldron
+    n_global, total_global = global_assignment(events, tickets)
+    assert n_optimal == n_global
+    assert sum(diff for _, _, diff, _ in outcome(optimal)) == pytest.approx(total_global, abs=1e-6)
+
+
+@pytest.mark.parametrize("max_block", [1, 2, 3, 7])
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_across_block_boundaries_stay_feasible(seed, max_block):
+    events, tickets = case(seed)
+    recon = ttst.match_events_to_tickets_optimal(events, tickets, max_block=max_block)
+    assert_feasible(recon, events, tickets)
+
+
+def test_early_ticket_does_not_take_a_later_tickets_event():
+    # greedy: T0 (day 1) takes the day-0 100 (closest), leaving T1 (day 0) with nothing
+    events = [event("c", 0, 3, 100.0), event("c", 1, 5, 90.0)]
+    tickets = [ticket(0, "c", 1, 99.0), ticket(1, "c", 0, 100.0)]
+    greedy = ttst.match_events_to_tickets(events, tickets, strategy="greedy")
+    optimal = ttst.match_events_to_tickets(events, tickets, strategy="optimal")
+    assert [(e, t) for e, t, _, _ in outcome(greedy)] == [(0, 0)]
+    assert [t["ticket_id"] for t in greedy["unmatched_tickets"]] == ["T1"]
+    assert sorted((e, t) for e, t, _, _ in outcome(optimal)) == [(0, 1), (1, 0)]
+    assert not optimal["unmatched_tickets"]
+
+    # same count, but greedy's order costs volume: T0 takes the 100 that T1 matches exactly
+    events = [event("c", 1, 3, 100.0), event("c", 1, 5, 80.0)]
+    tickets = [ticket(0, "c", 1, 95.0), ticket(1, "c", 1, 100.0)]
+    greedy = ttst.match_events_to_tickets(events, tickets, strategy="greedy")
+    optimal = ttst.match_events_to_tickets(events, tickets, strategy="optimal")
+    assert sorted((e, t) for e, t, _, _ in outcome(greedy)) == [(0, 0), (1, 1)]
+    assert sorted((e, t) for e, t, _, _ in outcome(optimal)) == [(0, 1), (1, 0)]
+    assert sum(d for _, _, d, _ in outcome(optimal)) < sum(d for _, _, d, _ in outcome(greedy))
+
+
+def test_infeasible_pairs_are_never_chosen():
+    # the exact-volume events are outside the window (day after / two days before); the big-M
+    # cost must keep them out even though it leaves a ticket unmatched or badly matched
+    events = [event("c", 3, 1, 100.0), event("c", 0, 1, 100.0), event("c", 2, 1, 10.0), event("d", 2, 1, 100.0)]
+    tickets = [ticket(0, "c", 2, 100.0), ticket(1, "c", 2, 100.0)]
+    recon = ttst.match_events_to_tickets_optimal(events, tickets)
+    assert_feasible(recon, events, tickets)
+    assert [(e, t) for e, t, _, _ in outcome(recon)] == [(2, 0)]
+    assert len(recon["mismatches"]) == 1 and len(recon["unmatched_tickets"]) == 1
+    assert sorted(recon["unmatched_events"].ids.tolist()) == [0, 1, 3]
+
+
+def test_blocks_split_at_day_gaps_are_independent():
+    # the day-5 ticket must not see day-1 events; the day-1 block must not see day-5 events
+    events = [event("c", 1, 1, 100.0), event("c", 5, 1, 200.0)]
+    tickets = [ticket(0, "c", 5, 100.0), ticket(1, "c", 1, 200.0)]
+    recon = ttst.match_events_to_tickets_optimal(events, tickets)
+    assert sorted((e, t) for e, t, _, _ in outcome(recon)) == [(0, 1), (1, 0)]
+    assert len(recon["mismatches"]) == 2
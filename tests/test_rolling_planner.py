@@ -0,0 +1,145 @@
+"""RollingPlanner.tick across ticks: committed actions stay put, finished ones fold into the base state."""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import rolling_planner
+from benchmarks import generators
+from rolling_planner import RollingPlanner, _departure, _fold, _t
+
+NOW = datetime(2025, 1, 1, 6, tzinfo=timezone.utc)
+IDS = generators.cauldron_ids(40)
+MAX_VOLUME = np.random.default_rng(0).uniform(500, 1000, len(IDS))
+
+
+def forecasts(k, step_min):
+    """Levels rising with the clock; fill rates jitter from tick to tick so the tail keeps changing."""
+    rng = np.random.default_rng(k)
+    return {cid: {"current_level": float(min(m, 0.5 * m + 0.5 * k * step_min)), "max_volume": float(m),
+                  "fill_rate_per_min": float(0.5 * (1 + 0.2 * rng.standard_normal())), "drain_rate_per_min": 10.0}
+            for cid, m in zip(IDS, MAX_VOLUME)}
+
+
+def strip(action):
+    return {k: v for k, v in action.items() if k != "committed"}
+
+
+def ident(action):
+    return action["type"], action["start"], action.get("cauldron_id") or action.get("market_node")
+
+
+def run(optimize, ticks=14, step_min=7.0):
+    planner = RollingPlanner(generators.network(IDS, n_markets=2, seed=0),
+                             generators.cauldron_info(IDS, MAX_VOLUME), generators.couriers(40, seed=0),
+                             optimize=optimize, budget_sec=0.2, keep_history=True)
+    for k in range(ticks):
+        now = NOW + timedelta(minutes=k * step_min)
+        history = list(planner.history)
+        response = planner.tick(forecasts(k, step_min), now=now)
+        yield planner, now, history, response
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_ticks_keep_commitments(optimize):
+    extras_before, planned_by = {}, {}
+    for planner, now, history_before, response in run(optimize):
+        history = planner.history
+        # commitments are only ever appended, never edited or withdrawn
+        assert history[:len(history_before)] == history_before
+        for key, a in history[len(history_before):]:
+            due = _departure(a) <= now + timedelta(minutes=planner.freeze_min)
+            assert due or a["type"] == "market_unload", (key, a)        # unload run of a full witch
+            # committed under the witch that planned it; a new id only for witches not seen before
+            owner = planned_by[ident(a)]
+            assert key == owner if owner is not None else key not in extras_before
+        planned_by = {ident(a): w["courier_id"] for w in response["witches"]
+                      for a in w["route"] if not a.get("committed")}
+
+        by_key = {}
+        for key, a in history:
+            by_key.setdefault(key, []).append(a)
+        in_response = {w["courier_id"]: [strip(a) for a in w["route"] if a.get("committed")]
+                       for w in response["witches"]}
+        for key, actions in by_key.items():
+            open_ = [a for a in actions if _t(a["end"]) > now]
+            done = [a for a in actions if _t(a["end"]) <= now]
+            w = planner._witches[key]
+            # unfinished commitments are returned unchanged, as the head of the witch's route
+            assert w["committed"] == open_
+            assert in_response.get(key, []) == open_
+            route = next((r["route"] for r in response["witches"] if r["courier_id"] == key), [])
+            assert all(a.get("committed") for a in route[:len(open_)])
+            assert not any(a.get("committed") for a in route[len(open_):])
+            # finished ones are folded into the base state (witches set out empty)
+            base = (None, 0.0, None)
+            for a in done:
+                base = _fold(base, a)
+            assert w["base"] == base if done else w["base"][1] == 0.0
+        assert planner.completed == sum(_t(a["end"]) <= now for _, a in history)
+        assert response["rolling"]["committed_actions"] == sum(len(w["committed"]) for w in planner._witches.values())
+
+        # re-planned witches start where their commitments leave them
+        for state in planner._witch_states(now):
+            node, load, free_at = RollingPlanner.state(planner._witches[state["courier_id"]])
+            assert state["current_node"] == node and state["available_at"] == max(now, free_at)
+            assert state["remaining_capacity"] == pytest.approx(max(0.0, state["capacity"] - load))
+
+        # extra witches keep their id (and everything committed under it) from tick to tick
+        extras = {k: w for k, w in planner._witches.items() if k.startswith("extra-")}
+        assert set(extras_before) <= set(extras)
+        assert sorted(extras, key=lambda k: int(k.split("-")[1])) == [f"extra-{i}" for i in range(1, len(extras) + 1)]
+        for key, w in extras.items():
+            assert w["extra"]
+        extras_before = extras
+
+    assert planner.completed > 0 and extras, "scenario should finish actions and commit extra witches"
+
+
+def test_commit_takes_due_prefix_and_full_unload():
+    planner = RollingPlanner({"edges": []}, [], [], freeze_min=5.0)
+    t0 = NOW
+
+    def action(kind, start, end, travel=0.0, amount=0.0, where="c1"):
+        a = {"type": kind, "start": (t0 + timedelta(minutes=start)).isoformat(),
+             "end": (t0 + timedelta(minutes=end)).isoformat(), "travel_min": travel}
+        if kind == "collect":
+            a.update(cauldron_id=where, amount=amount)
+        else:
+            a.update(market_node=where)
+        return a
+
+    route = [action("collect", 3, 8, travel=2, amount=100),           # leaves at 0.5: due
+             action("market_unload", 30, 45, travel=10, where="m"),    # witch is full: goes with it
+             action("collect", 50, 60, travel=5, amount=40, where="c2")]
+    planner._tail = {"simulation_start": t0.isoformat(), "witches": [
+        {"courier_id": None, "capacity": 100.0, "extra": True, "start_node": "m", "route": route},
+        {"courier_id": "courier_0", "capacity": 100.0, "extra": False, "start_node": "m",
+         "route": [action("collect", 20, 25, travel=1, amount=10)]},   # not due yet
+        {"courier_id": "courier_1", "capacity": 100.0, "extra": False, "start_node": "m",
+         "route": [action("collect", 2, 4, travel=1, amount=60),       # due, but leaves room: unload stays open
+                   action("market_unload", 20, 35, travel=10, where="m")]},
+    ]}
+    planner._commit(t0)
+    assert list(planner._witches) == ["extra-1", "courier_1"]
+    assert [a["type"] for a in planner._witches["courier_1"]["committed"]] == ["collect"]
+    assert planner._witches["extra-1"]["committed"] == route[:2]
+    assert RollingPlanner.state(planner._witches["extra-1"]) == ("m", 0.0, _t(route[1]["end"]))
+
+    # the unload finishes 45 minutes in: both actions fold into the base; a new extra gets the next id
+    planner._tail = {"simulation_start": t0.isoformat(), "witches": [
+        {"courier_id": None, "capacity": 100.0, "extra": True, "start_node": "m", "route": [route[2]]}]}
+    planner._commit(t0 + timedelta(minutes=46))
+    assert planner._witches["extra-1"]["committed"] == []
+    assert planner._witches["extra-1"]["base"] == ("m", 0.0, _t(route[1]["end"]))
+    assert planner._witches["extra-2"]["committed"] == [route[2]]
+    assert planner.completed == 3                                 # courier_1 finished its collection too
+
+
+def test_shared_planner_is_reset_when_inputs_change(monkeypatch):
+    monkeypatch.setattr(rolling_planner, "_PLANNER", None)
+    network, info = generators.network(IDS, seed=0), generators.cauldron_info(IDS, MAX_VOLUME)
+    first = rolling_planner.get_rolling_planner(network, info, generators.couriers(40, seed=0))
+    assert rolling_planner.get_rolling_planner(network, info, generators.couriers(40, seed=0)) is first
+    assert rolling_planner.get_rolling_planner(network, info, generators.couriers(40, seed=1)) is not first
@@ -0,0 +1,135 @@
+"""route_optimizer: optimized schedules re-checked from their output, and never worse than the greedy seed."""
+
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from benchmarks import generators
+from optimized_routes import SERVICE_SETUP_MIN, UNLOAD_TIME_MIN, TravelTimeMatrix, schedule_witches
+from route_optimizer import optimize_schedule
+
+NOW = datetime(2025, 1, 1, 6, tzinfo=timezone.utc)
+EPS = 1e-6
+
+
+def case(seed, n=40, rush_hour=0.0):
+    rng = np.random.default_rng(seed)
+    ids = generators.cauldron_ids(n)
+    max_volume = rng.uniform(500, 1000, n)
+    network = generators.network(ids, n_markets=2, seed=seed, rush_hour=rush_hour)
+    # half the couriers start at a market, the others at their first cauldron
+    couriers = [dict(c, courier_id=f"courier_{k}", **({"start_node": "market_000"} if k % 2 == 0 else {}))
+                for k, c in enumerate(generators.couriers(n, seed=seed) * 2)]
+    forecasts = {cid: {"current_level": float(m * rng.uniform(0.2, 0.9)), "max_volume": float(m),
+                       "fill_rate_per_min": float(rng.uniform(0.2, 1.0)),
+                       "drain_rate_per_min": float(rng.uniform(5, 15))}
+                 for cid, m in zip(ids, max_volume)}
+    greedy = schedule_witches(network, generators.cauldron_info(ids, max_volume), couriers, forecasts, now=NOW)
+    return network, couriers, greedy
+
+
+def minutes(iso):
+    return (datetime.fromisoformat(iso) - NOW).total_seconds() / 60.0
+
+
+def jobs(schedule):
+    return Counter((a["cauldron_id"], round(a["amount"], 6), round(minutes(a["end"]) - minutes(a["start"]), 4),
+                    a["deadline"]) for w in schedule["witches"] for a in w["route"] if a["type"] == "collect")
+
+
+def assert_feasible(schedule, network, couriers, market_bays=None):
+    """Replays every route from the output alone, against a fresh travel matrix."""
+    matrix = TravelTimeMatrix(network)
+    markets = set(schedule["market_nodes"])
+    fleet = {c["courier_id"]: c for c in couriers}
+    used = [w["courier_id"] for w in schedule["witches"] if w["courier_id"] is not None]
+    assert len(used) == len(set(used))
+    unloads = []
+    for w in schedule["witches"]:
+        assert w["route"]
+        courier = fleet.get(w["courier_id"])
+        assert w["extra"] == (courier is None)
+        if courier is not None:
+            assert w["capacity"] == courier["max_carrying_capacity"]
+        node = courier.get("start_node") if courier is not None else None
+        t, load = 0.0, 0.0
+        for a in w["route"]:
+            start, end = minutes(a["start"]), minutes(a["end"])
+            dest = a["cauldron_id"] if a["type"] == "collect" else a["market_node"]
+            travel = 0.0 if node is None else matrix.travel(node, dest, datetime.fromtimestamp(
+                NOW.timestamp() + t * 60, timezone.utc))
+            assert a["travel_min"] == pytest.approx(travel)
+            arrival = t + travel
+            if a["type"] == "collect":
+                assert start == pytest.approx(arrival + SERVICE_SETUP_MIN)
+                assert arrival <= max(minutes(a["deadline"]), 0.0) + EPS
+                load += a["amount"]
+                assert load <= w["capacity"] + EPS
+            else:
+                assert dest in markets
+                assert start >= arrival - EPS
+                if not market_bays:
+                    assert start == pytest.approx(arrival)
+                assert end - start == pytest.approx(UNLOAD_TIME_MIN)
+                assert a["amount_unloaded"] == pytest.approx(load)
+                unloads.append((dest, start, end))
+                load = 0.0
+            t, node = end, dest
+    if market_bays:
+        for market in markets:
+            spans = sorted((s, e) for m, s, e in unloads if m == market)
+            for k, (s, _) in enumerate(spans):
+                assert sum(s0 <= s < e0 - EPS for s0, e0 in spans[:k]) < market_bays
+
+
+def key(schedule):
+    return sum(w["extra"] for w in schedule["witches"]), len(schedule["witches"])
+
+
+@pytest.mark.parametrize("seed, rush_hour", [(0, 0.0), (1, 0.0), (2, 0.0), (0, 0.5)])
+def test_optimized_routes_are_feasible_and_never_worse(seed, rush_hour):
+    network, couriers, greedy = case(seed, rush_hour=rush_hour)
+    opt = optimize_schedule(greedy, network, couriers, time_budget_sec=60, max_iterations=400, seed=seed)
+    info = opt["optimizer"]
+    assert info["status"] == "ok"
+    assert jobs(opt) == jobs(greedy)                      # every collection kept, none added
+    assert_feasible(opt, network, couriers)
+    assert key(opt) <= key(greedy)
+    assert opt["num_witches"] == len(opt["witches"]) == info["num_witches"]
+    travel = sum(a["travel_min"] for w in opt["witches"] for a in w["route"])
+    assert travel == pytest.approx(info["travel_min"])
+    if key(opt) == key(greedy):
+        assert info["travel_min"] <= info["initial_travel_min"] + EPS
+    assert opt["fleet"]["extra_witches"] == key(opt)[0]
+
+
+def test_warm_start_is_never_worse_than_its_seed():
+    network, couriers, greedy = case(3)
+    first = optimize_schedule(greedy, network, couriers, time_budget_sec=60, max_iterations=300, seed=0)
+    again = optimize_schedule(greedy, network, couriers, time_budget_sec=60, max_iterations=50, seed=1,
+                              warm_start=first)
+    assert again["optimizer"]["warm_start"] is True
+    assert_feasible(again, network, couriers)
+    assert (key(again), again["optimizer"]["travel_min"]) <= (key(first), first["optimizer"]["travel_min"] + EPS)
+
+
+@pytest.mark.parametrize("seed, bays", [(7, 1), (4, 2)])
+def test_market_bays_are_respected(seed, bays):
+    network, couriers, greedy = case(seed)
+    opt = optimize_schedule(greedy, network, couriers, time_budget_sec=60, max_iterations=300, seed=0,
+                            market_bays=bays)
+    assert opt["optimizer"]["status"] == "ok"
+    assert jobs(opt) == jobs(greedy)
+    assert_feasible(opt, network, couriers, market_bays=bays)
+    waits = [a["wait_min"] for w in opt["witches"] for a in w["route"] if a["type"] == "market_unload"]
+    assert min(waits) >= 0.0 and max(waits) > 0.0                # the bays are actually contended
+
+
+def test_queue_infeasible_keeps_the_seed():
+    network, couriers, greedy = case(4)
+    opt = optimize_schedule(greedy, network, couriers, time_budget_sec=60, max_iterations=300, seed=0,
+                            market_bays=1)
+    assert opt["optimizer"]["status"] == "queue_infeasible"
+    assert opt["witches"] == greedy["witches"]
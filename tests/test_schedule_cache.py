@@ -0,0 +1,63 @@
+"""ScheduleCache audit memo: process_all runs once per upstream content, not once per call."""
+
+import pytest
+
+import eog_client
+import schedule_cache
+from benchmarks import generators
+from eog_client import EOGClient
+from schedule_cache import ScheduleCache
+
+
+@pytest.fixture
+def upstream(stub, monkeypatch):
+    sc = generators.scenario(3, 1, seed=0)
+    stub.publish("/api/Data", generators.to_data_json(sc["telemetry"]))
+    stub.publish("/api/Tickets", sc["tickets"])
+    stub.publish("/api/Information/cauldrons", sc["cauldron_info"])
+    monkeypatch.setattr(schedule_cache, "DATA_ENDPOINT", "/api/Data")
+    monkeypatch.setattr(schedule_cache, "TICKETS_ENDPOINT", "/api/Tickets")
+    monkeypatch.setattr(schedule_cache, "API_CAULDRONS", "/api/Information/cauldrons")
+    client = EOGClient(stub.base, ttl_sec=60)
+    monkeypatch.setattr(eog_client, "_CLIENT", client)
+
+    calls = []
+    process_all = schedule_cache.process_all
+
+    def counting(**kwargs):
+        calls.append(kwargs)
+        return process_all(**kwargs)
+
+    monkeypatch.setattr(schedule_cache, "process_all", counting)
+    return stub, client, calls
+
+
+def test_audit_memo_hits_within_ttl(upstream):
+    stub, client, calls = upstream
+    cache = ScheduleCache()
+    first = cache.current_forecasts()
+    assert cache.current_forecasts() == first
+    assert cache.current_forecasts() == first
+    assert len(calls) == 1 and cache.stats["audits"] == 1
+
+
+def test_audit_memo_survives_revalidation_and_follows_changes(upstream):
+    stub, client, calls = upstream
+    client.ttl_sec = 0                      # every call revalidates; unchanged documents get a 304
+    cache = ScheduleCache()
+    cache.current_forecasts()
+    cache.current_forecasts()
+    assert len(calls) == 1
+
+    stub.publish("/api/Tickets", {"transport_tickets": []})
+    cache.current_forecasts()
+    assert len(calls) == 2
+
+
+def test_audit_memo_without_versions_digests_the_documents(upstream):
+    stub, client, calls = upstream
+    cache = ScheduleCache()
+    docs = [client.fetch_json(p) for p in ("/api/Data", "/api/Tickets", "/api/Information/cauldrons")]
+    cache.forecasts(*docs)
+    cache.forecasts(*[client.fetch_json(p) for p in ("/api/Data", "/api/Tickets", "/api/Information/cauldrons")])
+    assert len(calls) == 1
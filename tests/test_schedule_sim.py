@@ -0,0 +1,156 @@
+"""Schedule replay (schedule_sim): levels, overflow and witch checks on hand-computed schedules."""
+
+import math
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import schedule_sim
+from schedule_sim import CauldronModel, compile_schedules, score_schedules, simulate_levels, validate_schedule
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# directed edges, so every shortest path is the edge itself
+NETWORK = {"edges": [
+    {"from": "M", "to": "C", "travel_time_minutes": 5},
+    {"from": "C", "to": "A", "travel_time_minutes": 30},
+    {"from": "A", "to": "M", "travel_time_minutes": 20},
+    {"from": "M", "to": "E", "travel_time_minutes": 0.5},
+    {"from": "E", "to": "D", "travel_time_minutes": 10},
+    {"from": "D", "to": "M", "travel_time_minutes": 15},
+]}
+
+FORECASTS = {
+    "A": {"current_level": 500.0, "max_volume": 1000.0, "fill_rate_per_min": 2.0},   # full at 250
+    "B": {"current_level": 100.0, "max_volume": 1000.0, "fill_rate_per_min": 1.0},   # full at 900, never visited
+    "C": {"current_level": 50.0, "max_volume": 1000.0, "fill_rate_per_min": 0.0},    # holds less than planned
+    "D": {"current_level": 0.0, "max_volume": 1000.0, "fill_rate_per_min": 0.5},
+    "E": {"current_level": 990.0, "max_volume": 1000.0, "fill_rate_per_min": 5.0},   # fills faster than it is drawn
+}
+
+
+def at(minute, t0=T0):
+    return (t0 + timedelta(minutes=minute)).isoformat()
+
+
+def collect(cid, start, end, amount, t0=T0):
+    return {"type": "collect", "cauldron_id": cid, "start": at(start, t0), "end": at(end, t0), "amount": amount}
+
+
+def unload(market, start, end, t0=T0):
+    return {"type": "unload", "market_node": market, "start": at(start, t0), "end": at(end, t0)}
+
+
+def schedule(witches, t0=T0, forecasts=FORECASTS):
+    return {"simulation_start": t0.isoformat(), "market_nodes": ["M"], "forecast_summary": forecasts,
+            "witches": [dict(id=f"w{i}", start_node="M", **w) for i, w in enumerate(witches)]}
+
+
+SCHEDULE = schedule([
+    {"capacity": 500.0, "route": [collect("C", 10, 20, 200), collect("A", 300, 310, 400),   # 600 on board
+                                  unload("M", 320, 335)]},                                   # A->M takes 20
+    {"capacity": 1000.0, "route": [collect("E", 1, 11, 10), collect("D", 50, 60, 10),
+                                   unload("M", 325, 340)]},                                  # overlaps w0's unload
+])
+
+
+def test_levels_of_a_schedule_with_known_overflow():
+    model = CauldronModel.from_forecasts(FORECASTS)
+    levels = simulate_levels(compile_schedules([SCHEDULE], model), model, horizon_min=1440)
+    got = {k: dict(zip(model.ids, v[0].tolist())) for k, v in levels.items()}
+    # A: spills 100 by the visit at 300, 1020 there less 400 drawn, then 620 + 2 * 1130 - 1000
+    assert got["first_overflow"]["A"] == 250.0
+    assert got["spilled"]["A"] == pytest.approx(100.0 + 1880.0)
+    assert got["collected"]["A"] == 400.0 and got["final_level"]["A"] == 1000.0
+    assert got["first_overflow"]["B"] == 900.0 and got["spilled"]["B"] == 540.0
+    assert got["collected"]["C"] == 50.0 and got["short"]["C"] == 150.0 and got["final_level"]["C"] == 0.0
+    assert got["collected"]["D"] == 10.0 and got["final_level"]["D"] == pytest.approx(20.0 + 0.5 * 1380)
+    assert got["first_overflow"]["D"] == math.inf and got["spilled"]["D"] == 0.0
+    # E: 995 when the draw starts, still rising at 5 - 10/10 per minute: full 5/4 minutes later
+    assert got["first_overflow"]["E"] == pytest.approx(2.25)
+    assert got["spilled"]["E"] == pytest.approx(35.0 + 5.0 * 1429)
+
+
+def test_validate_schedule_report(monkeypatch):
+    monkeypatch.setattr(schedule_sim, "MARKET_UNLOAD_BAYS", 1)
+    report = validate_schedule(SCHEDULE, network=NETWORK, horizon_min=1440)
+    assert report["feasible"] is False
+    assert report["violations"] == {"overflow": 3, "short_collection": 1, "travel": 1, "capacity": 1,
+                                    "order": 0, "queue": 1}
+    assert [(o["cauldron_id"], o["first_overflow_min"]) for o in report["overflows"]] == \
+        [("E", 2.25), ("A", 250.0), ("B", 900.0)]
+    assert report["overflows"][1]["first_overflow_at"] == at(250)
+    assert report["short_collections"] == [{"cauldron_id": "C", "short": 150.0}]
+    assert report["collected"] == 400.0 + 50.0 + 10.0 + 10.0
+
+    w0, w1 = report["witches"]
+    assert (w0["travel_violations"], w0["capacity_violations"], w0["queue_violations"]) == (1, 1, 0)
+    assert (w1["travel_violations"], w1["capacity_violations"], w1["queue_violations"]) == (0, 0, 1)
+    # busy = action time + 0.5 setup per collection + matrix travel; shift ends with the last action
+    assert w0["busy_min"] == 35.0 + 1.0 + 55.0 and w0["idle_min"] == 335.0 - 91.0
+    assert w1["busy_min"] == 35.0 + 1.0 + 25.5 and w1["idle_min"] == 340.0 - 61.5
+    assert report["fleet"] == {"busy_min": 152.5, "idle_min": 522.5, "utilization": round(152.5 / 675.0, 4)}
+
+    # without a network travel and queueing are not checked; forecasts default to forecast_summary
+    offline = validate_schedule(SCHEDULE, horizon_min=1440)
+    assert offline["violations"]["travel"] is None and offline["violations"]["queue"] is None
+    assert offline["overflows"] == report["overflows"]
+
+
+def test_feasible_schedule():
+    forecasts = {"A": {"current_level": 0.0, "max_volume": 1000.0, "fill_rate_per_min": 0.5}}
+    s = schedule([{"capacity": 800.0, "route": [collect("A", 600, 620, 300), unload("M", 640, 655)]}],
+                 forecasts=forecasts)
+    network = {"edges": [{"from": "M", "to": "A", "travel_time_minutes": 10},
+                         {"from": "A", "to": "M", "travel_time_minutes": 10}]}
+    report = validate_schedule(s, network=network, horizon_min=1440)
+    assert report["feasible"] is True and not report["overflows"] and not report["short_collections"]
+    assert set(report["violations"].values()) == {0}
+
+
+def test_order_violation_and_horizon_cut():
+    forecasts = {"A": {"current_level": 1000.0, "max_volume": 1000.0, "fill_rate_per_min": 0.0}}
+    s = schedule([{"capacity": 1e9, "route": [collect("A", 0, 30, 100), collect("A", 20, 40, 100),
+                                              collect("A", 1430, 1450, 200)]}], forecasts=forecasts)
+    report = validate_schedule(s, horizon_min=1440)
+    assert report["violations"]["order"] == 1
+    # the visits overlap: the second starts when the first ends; the last is cut at the horizon
+    assert report["collected"] == 100.0 + 100.0 + 100.0
+    assert not report["short_collections"]
+
+
+def test_time_dependent_travel_uses_the_departure_layer():
+    network = {"edges": [{"from": "M", "to": "A", "travel_time_minutes": 10,
+                          "travel_time_profile": [10.0] * 12 + [60.0] * 12}]}
+    forecasts = {"A": {"current_level": 0.0, "max_volume": 1000.0, "fill_rate_per_min": 0.0}}
+    morning, afternoon = T0, T0 + timedelta(hours=13)
+    schedules = [schedule([{"capacity": 100.0, "route": [collect("A", 20, 30, 0)]}], t0=t0, forecasts=forecasts)
+                 for t0 in (morning, afternoon)]
+    totals = score_schedules(schedules, forecasts, network=network, horizon_min=1440)
+    assert totals["travel_violations"].tolist() == [0, 1]
+    assert totals["feasible"].tolist() == [True, False]
+
+
+def test_batched_scores_equal_single_replays(monkeypatch):
+    monkeypatch.setattr(schedule_sim, "MARKET_UNLOAD_BAYS", 1)
+    rng = np.random.default_rng(0)
+    schedules = []
+    for _ in range(6):
+        witches = []
+        for _ in range(int(rng.integers(1, 4))):
+            t, route = float(rng.uniform(0, 60)), []
+            for _ in range(int(rng.integers(1, 5))):
+                cid = str(rng.choice(list(FORECASTS)))
+                route.append(collect(cid, t, t + 10, float(rng.uniform(0, 300))))
+                t += float(rng.uniform(10, 200))
+                if rng.random() < 0.4:
+                    route.append(unload("M", t, t + 15))
+                    t += 30
+            witches.append({"capacity": float(rng.uniform(200, 800)), "route": route})
+        schedules.append(schedule(witches))
+    batch = score_schedules(schedules, FORECASTS, network=NETWORK, horizon_min=1440)
+    for b, s in enumerate(schedules):
+        single = score_schedules([s], FORECASTS, network=NETWORK, horizon_min=1440)
+        for key, values in batch.items():
+            assert values[b] == pytest.approx(single[key][0]), key
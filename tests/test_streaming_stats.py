@@ -0,0 +1,134 @@
+"""Streaming fill-rate estimators against np.median and the batch estimator (ttst.estimate_fill_rate_from_arrays)."""
+
+import numpy as np
+import pytest
+
+import ttst
+from benchmarks import generators
+from incremental_audit import IncrementalReconciler
+from streaming_stats import US_PER_MIN, FillRateEstimator, P2Median, SlidingWindowMedian
+
+# P² is an estimate: on unimodal data its error stays well under this fraction of the IQR
+P2_IQR_TOL = 0.05
+
+
+def series(seed, n=3000):
+    """Irregular timestamps (some repeated), a rising level with drains and noise."""
+    rng = np.random.default_rng(seed)
+    steps = rng.choice([0, 1, 1, 1, 2, 5], size=n) * US_PER_MIN
+    epochs = 1_700_000_000_000_000 + np.cumsum(steps)
+    levels = np.cumsum(rng.lognormal(-1.0, 0.4, n) - (rng.random(n) < 0.05) * 20) + rng.normal(0, 0.05, n)
+    return epochs.astype(np.int64), levels
+
+
+def feed(estimator, epochs, levels):
+    for t, v in zip(epochs.tolist(), levels.tolist()):
+        estimator.update(t, v)
+    return estimator
+
+
+def rates_in_window(epochs, levels, window_hours):
+    """Positive increase rates whose ending reading lies within window_hours of the last one."""
+    delta, dt_min = np.diff(levels), np.diff(epochs) / 1e6 / 60.0
+    keep = (delta > 0) & (dt_min > 0) & (epochs[1:] >= epochs[-1] - int(window_hours * 60 * US_PER_MIN))
+    return delta[keep] / dt_min[keep]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("window_hours", [0.5, 3, 12, 1e6])
+def test_window_mode_is_the_exact_median(seed, window_hours):
+    epochs, levels = series(seed)
+    est = feed(FillRateEstimator(window_hours=window_hours), epochs, levels)
+    rates = rates_in_window(epochs, levels, window_hours)
+    assert est.median() == np.median(rates)
+    batch_rate, batch_stats = ttst.estimate_fill_rate_from_arrays(epochs, levels, window_hours)
+    assert est.median() == batch_rate
+    stats = est.stats()
+    assert stats["n_samples"] == batch_stats["n_samples"] == len(rates)
+    assert stats["mean_rate"] == pytest.approx(batch_stats["mean_rate"], rel=1e-9)
+
+
+def test_window_mode_tracks_the_median_after_every_reading():
+    epochs, levels = series(7, n=600)
+    est = FillRateEstimator(window_hours=1)
+    for k, (t, v) in enumerate(zip(epochs.tolist(), levels.tolist())):
+        est.update(t, v)
+        rates = rates_in_window(epochs[:k + 1], levels[:k + 1], 1)
+        assert est.median() == (np.median(rates) if len(rates) else 0.0)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_full_history_p2_is_close_to_the_median(seed):
+    epochs, levels = series(seed)
+    est = feed(FillRateEstimator(), epochs, levels)
+    batch_rate, batch_stats = ttst.estimate_fill_rate_from_arrays(epochs, levels)
+    rates = rates_in_window(epochs, levels, 1e9)
+    q25, q75 = np.percentile(rates, [25, 75])
+    assert batch_rate == np.median(rates)
+    # not exact: P² approximates the median batch mode computes exactly
+    assert abs(est.median() - batch_rate) <= P2_IQR_TOL * (q75 - q25)
+    assert est.stats()["n_samples"] == batch_stats["n_samples"]
+    assert est.stats()["mean_rate"] == pytest.approx(batch_stats["mean_rate"], rel=1e-9)
+
+
+@pytest.mark.parametrize("draw", ["uniform", "normal", "lognormal", "exponential"])
+def test_p2_median_within_tolerance(draw):
+    rng = np.random.default_rng(11)
+    for n in (6, 50, 1000, 5000):
+        x = {"uniform": lambda: rng.uniform(0, 1, n), "normal": lambda: rng.normal(0.3, 0.05, n),
+             "lognormal": lambda: rng.lognormal(0, 1, n), "exponential": lambda: rng.exponential(1, n)}[draw]()
+        p2 = P2Median()
+        for v in x.tolist():
+            p2.add(v)
+        q25, q50, q75 = np.percentile(x, [25, 50, 75])
+        # few samples leave the markers coarse; allow more slack there
+        tol = P2_IQR_TOL if n >= 1000 else 0.5
+        assert abs(p2.value() - q50) <= tol * (q75 - q25)
+
+
+def test_p2_median_exact_for_five_samples():
+    p2 = P2Median()
+    assert p2.value() == 0.0
+    xs = [3.0, -1.0, 7.5, 2.0, 2.0]
+    for k, v in enumerate(xs, 1):
+        p2.add(v)
+        assert p2.value() == np.median(xs[:k])
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_sliding_window_median_add_remove(seed):
+    rng = np.random.default_rng(seed)
+    swm, live = SlidingWindowMedian(), {}
+    assert swm.median() == 0.0
+    for _ in range(3000):
+        if live and rng.random() < 0.45:
+            h = list(live)[int(rng.integers(0, len(live)))]
+            swm.remove(h)
+            del live[h]
+        else:
+            v = float(rng.choice([1.0, 2.0, 2.0, 3.5]) if rng.random() < 0.3 else rng.normal())
+            live[swm.add(v)] = v
+        assert len(swm) == len(live)
+        assert swm.median() == (np.median(list(live.values())) if live else 0.0)
+
+
+def test_incremental_fill_rates_against_batch():
+    """Window mode equals the batch pipeline exactly; full history is the P² estimate of it."""
+    t = generators.telemetry(8, 3, seed=2)
+    data = generators.to_data_json(t["telemetry"])
+    info = generators.cauldron_info(t["telemetry"]["cauldron_ids"], t["max_volume"])
+    tickets = {"transport_tickets": []}
+    for window_hours in (6, None):
+        rec = IncrementalReconciler(fill_rate_window_hours=window_hours)
+        for cut in (len(data) // 3, 2 * len(data) // 3, len(data)):
+            inc = rec.update(data[:cut], tickets, info, api_fetch=False)
+        batch = ttst.process_all(api_fetch=False, data_json=data, tickets_json=tickets, cauldron_info_json=info,
+                                 fill_rate_window_hours=window_hours)
+        assert inc["fill_rates"].keys() == batch["fill_rates"].keys()
+        for cid, b in batch["fill_rates"].items():
+            got = inc["fill_rates"][cid]["fill_rate_per_min"]
+            if window_hours is not None:
+                assert got == b["fill_rate_per_min"]
+            else:
+                assert got == pytest.approx(b["fill_rate_per_min"], rel=0.01)
+            assert inc["fill_rates"][cid]["n_samples"] == b["n_samples"]
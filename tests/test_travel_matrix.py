@@ -0,0 +1,96 @@
+"""TravelTimeMatrix time buckets: layer lookups, departure-time travel, profile sampling, nearest markets."""
+
+from datetime import datetime, timedelta, timezone
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from benchmarks import generators
+from optimized_routes import TravelTimeMatrix
+
+MIDNIGHT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# M->A slows down from noon; A->B has twice as many slices as buckets (odd ones are never sampled)
+NETWORK = {"edges": [
+    {"from": "M", "to": "A", "travel_time_minutes": 10, "travel_time_profile": [10.0] * 12 + [60.0] * 12},
+    {"from": "A", "to": "B", "travel_time_minutes": 5,
+     "travel_time_profile": [99.0 if k % 2 else (5.0 if k < 24 else 20.0) for k in range(48)]},
+    {"from": "B", "to": "M", "travel_time_minutes": 7},
+]}
+
+
+def at(minute):
+    return MIDNIGHT + timedelta(minutes=minute)
+
+
+def test_buckets_and_layers_by_hand():
+    m = TravelTimeMatrix(NETWORK)
+    assert m.time_dependent and m.bucket_min == 60.0 and len(m.bucket_layer) == 24
+    # the morning weights are the nominal ones: they share layer 0
+    assert m.bucket_layer.tolist() == [0] * 12 + [1] * 12 and len(m.dists) == 2
+    minutes = np.array([0.0, 719.9, 720.0, 1439.99, 1440.0, 2900.0, -1.0])
+    assert m.layers_at(minutes).tolist() == [0, 0, 1, 1, 0, 0, 1]
+    assert [m.layer_at(x) for x in minutes.tolist()] == [0, 0, 1, 1, 0, 0, 1]
+    assert m.layer(None) == 0 and m.layer(at(13 * 60)) == 1
+    # a trip uses the layer it departs in, even if it arrives in the next one
+    assert m.travel("M", "B", at(719)) == 15.0
+    assert m.travel("M", "B", at(720)) == 80.0
+    assert m.travel("M", "B", at(1440 + 30)) == 15.0            # next day, morning again
+    assert m.travel("M", "B") == 15.0
+    assert m.travel("B", "A", at(800)) == 67.0
+    assert m.travel("B", "B", at(800)) == 0.0
+    assert m.travel("M", "nowhere") == float("inf")
+    # other time zones are read in UTC
+    assert m.travel("M", "B", at(720).astimezone(timezone(timedelta(hours=-5)))) == 80.0
+
+
+def test_profiles_are_sampled_to_max_buckets():
+    m = TravelTimeMatrix(NETWORK, max_buckets=4)
+    assert m.bucket_min == 360.0 and m.bucket_layer.tolist() == [0, 0, 1, 1]
+    assert m.travel("M", "B", at(11 * 60)) == 15.0 and m.travel("M", "B", at(12 * 60)) == 80.0
+    flat = TravelTimeMatrix({"edges": [{"from": "M", "to": "A", "travel_time_minutes": 10}]})
+    assert not flat.time_dependent and flat.bucket_min == 1440.0
+    assert flat.layer(at(800)) == 0 and flat.layer_at(800.0) == 0
+
+
+def test_scalar_and_vector_layer_lookups_agree():
+    m = TravelTimeMatrix(generators.network(generators.cauldron_ids(30), n_markets=2, seed=0, rush_hour=0.5))
+    minutes = np.random.default_rng(0).uniform(-3000, 3000, 2000)
+    minutes[:48] = np.arange(48) * 30.0                            # bucket edges
+    assert m.layers_at(minutes).tolist() == [m.layer_at(x) for x in minutes.tolist()]
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_every_bucket_against_dijkstra(seed):
+    ids = generators.cauldron_ids(25)
+    network = generators.network(ids, n_markets=2, seed=seed, rush_hour=0.8, buckets=24)
+    m = TravelTimeMatrix(network, max_buckets=8)
+    assert m.bucket_min == 180.0
+    rng = np.random.default_rng(seed)
+    for k in range(8):
+        G = nx.DiGraph()
+        for e in network["edges"]:
+            G.add_edge(e["from"], e["to"], w=e["travel_time_profile"][k * 3])
+        lengths = dict(nx.all_pairs_dijkstra_path_length(G, weight="w"))
+        departure = at(k * 180 + float(rng.uniform(0, 180)))
+        for src in m.nodes:
+            for dst in m.nodes:
+                expected = 0.0 if src == dst else lengths[src].get(dst, float("inf"))
+                assert m.travel(src, dst, departure) == pytest.approx(expected)
+
+
+def test_nearest_market_per_layer():
+    network = {"edges": [
+        {"from": "X", "to": "M1", "travel_time_minutes": 10, "travel_time_profile": [10.0] * 12 + [40.0] * 12},
+        {"from": "X", "to": "M2", "travel_time_minutes": 20},
+        {"from": "M1", "to": "Y", "travel_time_minutes": 1},
+    ]}
+    view = TravelTimeMatrix(network).for_markets(["M1", "M2"])
+    assert view.nearest_market("X", at(60)) == ("M1", 10.0)
+    assert view.nearest_market("X", at(13 * 60)) == ("M2", 20.0)
+    assert view.nearest_market("X") == ("M1", 10.0)
+    assert view.nearest_market("M2", at(60)) == ("M2", 0.0)
+    assert view.nearest_market("Y", at(60)) == (None, float("inf"))         # no road to any market
+    assert view.nearest_market("unknown") == (None, float("inf"))
+    assert TravelTimeMatrix(network).for_markets(["M2"]).nearest_market("X", at(60)) == ("M2", 20.0)
@@ -0,0 +1,133 @@
+"""WitchPool selection policies against hand cases and brute-force scans of the pool."""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import optimized_routes
+from benchmarks import generators
+from optimized_routes import WitchPool, build_graph, shortest_travel_time
+
+NOW = datetime(2025, 1, 1, 8, tzinfo=timezone.utc)
+
+# travel into X: A 10, B 30, C 5 minutes
+NETWORK = {"edges": [
+    {"from": "A", "to": "X", "travel_time_minutes": 10},
+    {"from": "B", "to": "X", "travel_time_minutes": 30},
+    {"from": "C", "to": "X", "travel_time_minutes": 5},
+    {"from": "X", "to": "A", "travel_time_minutes": 10},
+    {"from": "D", "to": "A", "travel_time_minutes": 1},
+]}
+
+
+def witch(wid, node, available_min, capacity=100.0):
+    return {"id": wid, "courier_id": f"w{wid}", "capacity": capacity, "extra": False, "start_node": node,
+            "current_node": node, "available_at": NOW + timedelta(minutes=available_min),
+            "remaining_capacity": capacity, "route": []}
+
+
+def pool(policy, witches):
+    p = WitchPool(build_graph(NETWORK), policy)
+    for w in witches:
+        p.add(dict(w))
+    return p
+
+
+WITCHES = [
+    witch(1, "A", 0),        # arrives 10
+    witch(2, "B", -5),       # arrives 25
+    witch(3, "C", 20),       # arrives 25, free most recently
+    witch(4, "X", 8),        # already there: arrives 8
+    witch(5, "X", 50),       # free after every deadline below
+    witch(6, "D", 0),        # no road to X
+]
+
+
+@pytest.mark.parametrize("policy, deadline_min, expected", [
+    ("first_fit", 40, 1),           # creation order
+    ("earliest_arrival", 40, 4),
+    ("best_fit", 40, 3),            # latest available_at that still makes it
+    ("first_fit", 9, 4),
+    ("earliest_arrival", 9, 4),
+    ("best_fit", 24, 4),            # 3 would arrive at 25
+    ("first_fit", 7, None),
+    ("earliest_arrival", 7, None),
+    ("best_fit", 7, None),
+])
+def test_policy_picks_expected_witch(policy, deadline_min, expected):
+    p = pool(policy, WITCHES)
+    w, travel, arrival = p.select("X", NOW + timedelta(minutes=deadline_min))
+    assert (w and w["id"]) == expected
+    if w is not None:
+        assert arrival == w["available_at"] + timedelta(minutes=travel)
+        assert travel == shortest_travel_time(p.G, w["current_node"], "X")
+
+
+@pytest.mark.parametrize("policy", ["first_fit", "earliest_arrival", "best_fit"])
+def test_capacity_classes_are_tried_in_order(policy):
+    witches = WITCHES + [witch(7, "B", 0, capacity=200.0), witch(8, "C", 30, capacity=200.0)]
+    p = pool(policy, witches)
+    deadline = NOW + timedelta(minutes=40)
+    # the 200 class has a feasible witch (7 arrives 30; 8 at 35): taken although 100s arrive sooner
+    assert p.select("X", deadline, class_order=[200.0, 100.0])[0]["capacity"] == 200.0
+    # nobody in the 200 class makes a 20 minute deadline: fall through to the 100s
+    assert p.select("X", NOW + timedelta(minutes=20), class_order=[200.0, 100.0])[0]["capacity"] == 100.0
+    assert p.classes() == [200.0, 100.0]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        WitchPool(build_graph(NETWORK), "random")
+
+
+def brute_force(policy, witches, G, cid, deadline, cap):
+    feasible = []
+    for w in witches:
+        if w["capacity"] != cap:
+            continue
+        arrival = w["available_at"] + timedelta(minutes=shortest_travel_time(G, w["current_node"], cid,
+                                                                             w["available_at"]))
+        if arrival <= deadline:
+            feasible.append((w, arrival))
+    if not feasible:
+        return None
+    if policy == "first_fit":
+        return feasible[0][0]["id"]
+    if policy == "best_fit":
+        return max(feasible, key=lambda x: (x[0]["available_at"], x[0]["id"]))[0]["id"]
+    best = min(f[1] for f in feasible)
+    return {w["id"] for w, arrival in feasible if arrival == best}
+
+
+@pytest.mark.parametrize("policy", ["first_fit", "earliest_arrival", "best_fit"])
+@pytest.mark.parametrize("seed", range(3))
+def test_selection_against_brute_force(policy, seed):
+    rng = np.random.default_rng(seed)
+    ids = generators.cauldron_ids(60)
+    G = build_graph(generators.network(ids, n_markets=2, seed=seed))
+    nodes = list(G.nodes)
+    p = WitchPool(G, policy)
+    for wid in range(1, 41):
+        p.add(witch(wid, str(rng.choice(nodes)), float(rng.uniform(-30, 120)), float(rng.choice([100, 200]))))
+    for _ in range(200):
+        cid = str(rng.choice(ids))
+        deadline = NOW + timedelta(minutes=float(rng.uniform(0, 180)))
+        cap = float(rng.choice([100, 200]))
+        w, travel, arrival = p.select(cid, deadline, class_order=[cap])
+        expected = brute_force(policy, p.witches, G, cid, deadline, cap)
+        if policy == "earliest_arrival":
+            assert (w is None and expected is None) or w["id"] in expected
+        else:
+            assert (w and w["id"]) == expected
+        if w is not None:
+            # serve the cauldron: the pool has to follow the witch's new state
+            old_available, old_node = w["available_at"], w["current_node"]
+            w["available_at"], w["current_node"] = arrival + timedelta(minutes=float(rng.uniform(1, 30))), cid
+            p.reindex(w, old_available, old_node)
+
+
+def test_default_policy():
+    # earliest_arrival replaced the original first_fit scan as the default (see README)
+    assert optimized_routes.WITCH_SELECTION_POLICY == "earliest_arrival"
+    assert WitchPool(build_graph(NETWORK)).policy == "earliest_arrival"
@@ -4,16 +4,20 @@ Includes fix for ghost tickets due to previous-day date mismatch and recovery tr
 (No CSV writing — fully in-memory.)
 """
 
-import requests
+import bisect
 import uuid
 from datetime import datetime, timezone, timedelta
 from dateutil import parser as dtparser
 from collections import defaultdict
+import numpy as np
 import pandas as pd
 import math
+import eog_client
+from event_store import EventStore, US_PER_DAY, parse_timestamps_us, runs_chunk
+from instrumentation import span
 
 # -------- CONFIG --------
-API_BASE = "https://hackutd2025.eog.systems"
+API_BASE = eog_client.API_BASE
 DATA_ENDPOINT = f"{API_BASE}/api/Data"
 TICKETS_ENDPOINT = f"{API_BASE}/api/Tickets"
 CAULDRON_INFO_ENDPOINT = f"{API_BASE}/api/Information/cauldrons"
@@ -24,7 +28,11 @@ MIN_DRAIN_VOLUME = 0.5
 VOLUME_MATCH_REL_TOL = 0.05
 VOLUME_MATCH_ABS_TOL = 10.0
 MIN_EVENT_DURATION_MIN = 0.5   # ignore drains shorter than this (minutes)
-REQUEST_HEADERS = {"Accept": "application/json"}
+DRAIN_ENGINE = "numpy"         # "numpy" (vectorized) or "loop" (reference implementation)
+FILL_RATE_WINDOW_HOURS = None  # estimate fill rate from the last N hours only (None = full history)
+MATCH_STRATEGY = "greedy"      # "greedy" (ticket order) or "optimal" (min-cost assignment)
+ASSIGNMENT_MAX_BLOCK = 500     # max tickets per assignment sub-problem in optimal mode
+PROCESS_WORKERS = 1            # >1 analyzes cauldron shards in a process pool
 
 # -------- Utilities --------
 def iso_to_dt(ts):
@@ -33,33 +41,89 @@ def iso_to_dt(ts):
 def minutes_diff(t_end, t_start):
     return (t_end - t_start).total_seconds() / 60.0
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+US_PER_MIN = 60 * 1_000_000
+
+def dt_to_epoch_us(dt):
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+def epoch_us_to_dt(us):
+    return EPOCH + timedelta(microseconds=int(us))
+
+def records_to_arrays(records):
+    """Split a sorted [(datetime, level)] list into int64 epoch-us and float64 level arrays."""
+    epochs = np.fromiter((dt_to_epoch_us(t) for t, _ in records), dtype=np.int64, count=len(records))
+    levels = np.fromiter((v for _, v in records), dtype=np.float64, count=len(records))
+    return epochs, levels
+
+def _epoch_day_to_date(day):
+    return EPOCH.date() + timedelta(days=int(day))
+
 def make_event_id():
     return str(uuid.uuid4())
 
 def fetch_json(url):
-    r = requests.get(url, headers=REQUEST_HEADERS, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return eog_client.fetch_json(url)
+
+# -------- Columnar ingestion --------
+def ingest_telemetry(data_raw):
+    """
+    Build the columnar view of an /api/Data payload:
+      epochs       int64 epoch-us per row, ascending (one shared time axis)
+      cauldron_ids column labels, in order of first appearance
+      levels       float64 matrix (time x cauldron), NaN where a reading is missing
+    Rows with unparseable timestamps and non-numeric levels are dropped, as before.
+    """
+    rows = [rec for rec in data_raw if isinstance(rec, dict)]
+    epochs, valid = parse_timestamps_us([rec.get("timestamp") for rec in rows])
+    level_dicts = [rec.get("cauldron_levels") or {} for rec, ok in zip(rows, valid) if ok]
+
+    frame = pd.DataFrame.from_records(level_dicts) if level_dicts else pd.DataFrame()
+    cauldron_ids = [str(c) for c in frame.columns]
+    levels = np.empty((len(epochs), len(cauldron_ids)), dtype=np.float64)
+    for col, name in enumerate(frame.columns):
+        levels[:, col] = pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+    # skip the sort when the feed is already in time order (the usual case)
+    if len(epochs) > 1 and not np.all(epochs[1:] >= epochs[:-1]):
+        order = np.argsort(epochs, kind="stable")
+        epochs, levels = epochs[order], levels[order]
+
+    return {"epochs": epochs, "cauldron_ids": cauldron_ids, "levels": levels}
+
+
+def cauldron_series(telemetry, col):
+    """Return (epochs, levels) of one cauldron column with missing readings removed."""
+    column = telemetry["levels"][:, col]
+    present = ~np.isnan(column)
+    if present.all():
+        return telemetry["epochs"], column
+    return telemetry["epochs"][present], column[present]
+
+
+def arrays_to_records(epochs, levels):
+    return [(epoch_us_to_dt(t), float(v)) for t, v in zip(epochs, levels)]
+
 
 # -------- Fill-rate estimation --------
-def estimate_fill_rate_for_cauldron(records):
-    increases, increases_minutes = [], []
-    for i in range(1, len(records)):
-        t_prev, v_prev = records[i - 1]
-        t_cur, v_cur = records[i]
-        delta = v_cur - v_prev
-        dt_min = minutes_diff(t_cur, t_prev)
-        if delta > 0 and dt_min > 0:
-            increases.append(delta)
-            increases_minutes.append(dt_min)
-    rates = [(inc / m) for inc, m in zip(increases, increases_minutes) if m > 0]
-    if not rates:
+def estimate_fill_rate_from_arrays(epochs, levels, window_hours=None):
+    """
+    Fill rate of one cauldron: median of positive level-increase rates.
+    With window_hours, only increases ending in the last window_hours of the series count.
+    """
+    if window_hours is not None and len(epochs):
+        cutoff = epochs[-1] - int(window_hours * 60 * US_PER_MIN)
+        first = max(int(np.searchsorted(epochs, cutoff, side="left")) - 1, 0)
+        epochs, levels = epochs[first:], levels[first:]
+    delta = np.diff(levels)
+    dt_min = np.diff(epochs) / 1e6 / 60.0
+    rising = (delta > 0) & (dt_min > 0)
+    rates = delta[rising] / dt_min[rising]
+    if len(rates) == 0:
         return 0.0, {"n_samples": 0}
-    rates.sort()
-    mid = len(rates) // 2
-    median = rates[mid] if len(rates) % 2 else (rates[mid - 1] + rates[mid]) / 2
-    mean_rate = sum(rates) / len(rates)
-    return median, {"n_samples": len(rates), "median_rate": median, "mean_rate": mean_rate}
+    median = float(np.median(rates))
+    mean_rate = float(rates.mean())
+    return median, {"n_samples": int(len(rates)), "median_rate": median, "mean_rate": mean_rate}
 
 # -------- Drain detection --------
 def detect_drain_events(records, cauldron_id, fill_rate_per_min):
@@ -108,20 +172,353 @@ def detect_drain_events(records, cauldron_id, fill_rate_per_min):
         i += 1
     return events
 
+def find_drain_runs(epochs, levels, fill_rate_per_min):
+    """
+    Vectorized core of detect_drain_events over columnar arrays
+    (int64 epoch microseconds, float64 levels).
+
+    A drain run is a maximal block of consecutive non-increasing steps; it starts
+    one sample before the first step in the block that drops by more than NOISE_DELTA.
+    Returns (start_idx, end_idx, raw_drop, duration_min, fill_during, collected)
+    arrays for the runs that survive the MIN_DRAIN_VOLUME / MIN_EVENT_DURATION_MIN filters.
+    """
+    n = len(levels)
+    if n < 2:
+        empty_i, empty_f = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return empty_i, empty_i, empty_f, empty_f, empty_f, empty_f
+
+    # step k (k = 0..n-2) goes from sample k to sample k+1
+    non_increasing = levels[1:] <= levels[:-1]
+    trigger = (levels[1:] - levels[:-1]) < -NOISE_DELTA
+
+    # block boundaries of consecutive non-increasing steps
+    padded = np.concatenate(([False], non_increasing, [False]))
+    edges = np.diff(padded.astype(np.int8))
+    block_starts = np.flatnonzero(edges == 1)
+    block_ends = np.flatnonzero(edges == -1) - 1       # last step of each block
+
+    has_trigger = np.logical_or.reduceat(trigger, block_starts) if len(block_starts) else np.empty(0, dtype=bool)
+    # first triggering step in each block
+    block_id = np.cumsum(edges[:-1] == 1) - 1
+    trig_steps = np.flatnonzero(trigger)
+    _, first_pos = np.unique(block_id[trig_steps], return_index=True)
+    first_trigger = trig_steps[first_pos]
+    block_ends = block_ends[has_trigger]
+
+    start_idx = first_trigger               # sample before the first triggering step
+    end_idx = block_ends + 1                # sample after the last non-increasing step
+    raw_drop = levels[start_idx] - levels[end_idx]
+    duration_min = (epochs[end_idx] - epochs[start_idx]) / 1e6 / 60.0
+    keep = ~((raw_drop < MIN_DRAIN_VOLUME) | (duration_min < MIN_EVENT_DURATION_MIN))
+
+    start_idx, end_idx = start_idx[keep], end_idx[keep]
+    raw_drop, duration_min = raw_drop[keep], duration_min[keep]
+    fill_during = fill_rate_per_min * duration_min
+    collected = raw_drop + fill_during
+    return start_idx, end_idx, raw_drop, duration_min, fill_during, collected
+
+
+def detect_drain_events_vectorized(epochs, levels, cauldron_id, fill_rate_per_min):
+    """
+    Columnar counterpart of detect_drain_events; produces identical events
+    (same boundaries, volumes and filters) from epoch-us / level arrays.
+    """
+    return runs_to_events(cauldron_id, drain_runs(epochs, levels, fill_rate_per_min))
+
+
+def drain_runs(epochs, levels, fill_rate_per_min):
+    """find_drain_runs resolved to per-run arrays (boundary times/levels and volumes)."""
+    start_idx, end_idx, raw_drop, duration_min, fill_during, collected = \
+        find_drain_runs(epochs, levels, fill_rate_per_min)
+    return {
+        "start_epoch": epochs[start_idx], "end_epoch": epochs[end_idx],
+        "start_level": levels[start_idx], "end_level": levels[end_idx],
+        "raw_drop": raw_drop, "duration_min": duration_min,
+        "fill_during": fill_during, "collected": collected
+    }
+
+
+def runs_to_events(cauldron_id, runs):
+    events = []
+    for k in range(len(runs["start_epoch"])):
+        events.append({
+            "event_id": make_event_id(),
+            "cauldron_id": cauldron_id,
+            "time_start": epoch_us_to_dt(runs["start_epoch"][k]).isoformat(),
+            "time_end": epoch_us_to_dt(runs["end_epoch"][k]).isoformat(),
+            "start_level": float(runs["start_level"][k]),
+            "end_level": float(runs["end_level"][k]),
+            "raw_drop": float(runs["raw_drop"][k]),
+            "duration_min": float(runs["duration_min"][k]),
+            "fill_during": float(runs["fill_during"][k]),
+            "collected_amount": float(runs["collected"][k])
+        })
+    return events
+
+
+def analyze_cauldron(epochs, levels, fill_rate_window_hours=None, drain_engine=DRAIN_ENGINE):
+    """
+    Per-cauldron stage of process_all on one column: fill rate, drain events as
+    EVENT_DTYPE rows (cauldron code left for the caller) and drain rates, with the
+    given drain engine only. Independent of every other cauldron, so it can run in
+    a worker process.
+    """
+    n = len(levels)
+    analysis = {"n_readings": n, "last_level": float(levels[-1]) if n else None}
+    if n < 2:
+        return analysis
+    with span("fill_rate", items=n):
+        rate, stats = estimate_fill_rate_from_arrays(epochs, levels, fill_rate_window_hours)
+    with span("drain_detection", items=n):
+        if drain_engine == "numpy":
+            drains = runs_chunk(drain_runs(epochs, levels, rate))
+        else:
+            drains = EventStore.from_records(
+                detect_drain_events(arrays_to_records(epochs, levels), None, rate)).array.copy()
+        positive = drains["duration_min"] > 0
+        drain_rates = (drains["collected_amount"][positive] / drains["duration_min"][positive]).tolist()
+    analysis.update(rate=rate, stats=stats, drains=drains, drain_rates=drain_rates,
+                    drain_rate=sum(drain_rates) / len(drain_rates) if drain_rates else 0.0)
+    return analysis
+
+
 # -------- Matching (with -1 day recovery) --------
+MATCH_DTYPE = np.dtype([
+    ("event", np.int64),            # event id (row of the EventStore)
+    ("ticket", np.int64),           # position in the ticket list
+    ("volume_delta", np.float64),
+    ("matched_previous_day", np.bool_),
+])
+
+
+class _DayBucket:
+    """
+    One (cauldron, day) slice of drain events (by id), sorted by (collected_amount,
+    detection order), with a Fenwick tree over "still unused" flags so the closest
+    unused volume is found by bisection in O(log n) and events can be used / released
+    in O(log n).
+    """
+
+    def __init__(self, ids=(), amounts=()):
+        self.ids = []
+        self._rebuild(list(ids), list(amounts), list(range(len(ids))))
+
+    @classmethod
+    def from_sorted(cls, ids, amounts, rank):
+        """Bucket from ids already sorted by (amount, rank); rank orders detection."""
+        bucket = cls.__new__(cls)
+        bucket._set(ids, amounts, rank)
+        return bucket
+
+    def _rebuild(self, ids, amounts, rank):
+        order = sorted(range(len(ids)), key=lambda k: (amounts[k], rank[k]))
+        used = {eid for p, eid in enumerate(self.ids) if not self.is_free(p)}
+        self._set([ids[k] for k in order], [amounts[k] for k in order], [rank[k] for k in order])
+        for eid in used:
+            self.set_free(self.pos[eid], False)
+
+    def _set(self, ids, amounts, rank):
+        self.ids = ids
+        self.amounts = amounts
+        self.rank = rank                                # detection order, used for ties
+        self.pos = {eid: p for p, eid in enumerate(ids)}
+        n = len(ids)
+        self.free = [1] * n
+        self.tree = [0] * (n + 1)
+        for i in range(1, n + 1):
+            self.tree[i] += 1
+            j = i + (i & -i)
+            if j <= n:
+                self.tree[j] += self.tree[i]
+
+    def add(self, ids, amounts):
+        base = max(self.rank) + 1 if self.rank else 0
+        self._rebuild(self.ids + list(ids), self.amounts + list(amounts),
+                      self.rank + list(range(base, base + len(ids))))
+
+    def is_free(self, p):
+        return self.free[p] == 1
+
+    def set_free(self, p, flag):
+        delta = (1 if flag else 0) - self.free[p]
+        if not delta:
+            return
+        self.free[p] += delta
+        i = p + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def _count(self, p):
+        """Number of free slots in positions [0, p)."""
+        total, i = 0, p
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _kth(self, k):
+        """Position of the k-th free slot (1-based k)."""
+        pos, step = 0, 1 << len(self.tree).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(self.tree) and self.tree[nxt] < k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+    def _first_free_from(self, p):
+        k = self._count(p) + 1
+        return self._kth(k) if k <= self._count(len(self.ids)) else None
+
+    def closest(self, x):
+        """(position, diff) of the free event closest to x; ties go to the earliest detected."""
+        r = bisect.bisect_left(self.amounts, x)
+        best = None
+        right = self._first_free_from(r)
+        if right is not None:
+            best = (abs(self.amounts[right] - x), self.rank[right], right)
+        n_left = self._count(r)
+        if n_left:
+            left_amt = self.amounts[self._kth(n_left)]
+            # earliest-detected free event among those sharing the left amount
+            left = self._first_free_from(bisect.bisect_left(self.amounts, left_amt))
+            cand = (abs(left_amt - x), self.rank[left], left)
+            if best is None or cand[:2] < best[:2]:
+                best = cand
+        if best is None:
+            return None, None
+        return best[2], best[0]
+
+
+class EventIndex:
+    """
+    Drain events of an EventStore (ids are store rows) indexed by (cauldron, UTC day).
+    Supports the greedy ticket lookup of match_events_to_tickets without rescanning
+    candidate lists; events appended to the store later are indexed with add().
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.buckets = {}          # (cauldron_id, date) -> _DayBucket
+
+    @classmethod
+    def from_store(cls, store):
+        """Index every event of an EventStore with one sort (no per-event parsing)."""
+        index = cls(store)
+        arr = store.array
+        if not len(arr):
+            return index
+        ids = np.arange(len(arr))
+        days = store.days()
+        amounts = arr["collected_amount"]
+        order = np.lexsort((ids, amounts, days, arr["cauldron"]))
+        codes, order_days = arr["cauldron"][order], days[order]
+        bounds = np.flatnonzero((codes[1:] != codes[:-1]) | (order_days[1:] != order_days[:-1])) + 1
+        for run in np.split(order, bounds):
+            key = (store.cauldron_ids[arr["cauldron"][run[0]]], _epoch_day_to_date(days[run[0]]))
+            ids_sorted = run.tolist()
+            index.buckets[key] = _DayBucket.from_sorted(ids_sorted, amounts[run].tolist(), ids_sorted)
+        return index
+
+    def add(self, ids):
+        """Index events appended to the store since the index was built (ids in detection order)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        arr = self.store.array
+        grouped = defaultdict(list)
+        for eid, code, day in zip(ids.tolist(), arr["cauldron"][ids].tolist(), self.store.days(ids).tolist()):
+            grouped[(code, day)].append(eid)
+        for (code, day), group in grouped.items():
+            key = (self.store.cauldron_ids[code], _epoch_day_to_date(day))
+            amounts = arr["collected_amount"][group].tolist()
+            if key in self.buckets:
+                self.buckets[key].add(group, amounts)
+            else:
+                self.buckets[key] = _DayBucket(group, amounts)
+
+    def _bucket(self, event_id):
+        arr = self.store.array
+        key = (self.store.cauldron_ids[arr["cauldron"][event_id]],
+               _epoch_day_to_date(arr["start_us"][event_id] // US_PER_DAY))
+        return self.buckets[key]
+
+    def _set_free(self, event_id, flag):
+        bucket = self._bucket(event_id)
+        bucket.set_free(bucket.pos[event_id], flag)
+
+    def use(self, event_id):
+        self._set_free(event_id, False)
+
+    def release(self, event_id):
+        self._set_free(event_id, True)
+
+    def is_used(self, event_id):
+        bucket = self._bucket(event_id)
+        return not bucket.is_free(bucket.pos[event_id])
+
+    def best_for_ticket(self, cauldron, t_amt, t_date):
+        """
+        Greedy pick for one ticket: the unused event on the ticket day or the day
+        before whose collected_amount is closest to the ticket amount (ties: ticket
+        day first, then detection order). Returns (event_id, diff, event_date) or Nones.
+        """
+        best = None
+        for d in (t_date, t_date - timedelta(days=1)):
+            bucket = self.buckets.get((cauldron, d))
+            if bucket is None:
+                continue
+            p, diff = bucket.closest(t_amt)
+            if p is not None and (best is None or diff < best[1]):
+                best = (bucket.ids[p], diff, d)
+        return best if best is not None else (None, None, None)
+
+
+def volume_ok(diff, t_amt, tolerance_rel=VOLUME_MATCH_REL_TOL, tolerance_abs=VOLUME_MATCH_ABS_TOL):
+    """Scalar form of the volume check in make_reconciliation."""
+    return (diff / max(1.0, t_amt) <= tolerance_rel) or (diff <= tolerance_abs)
+
+
+def make_reconciliation(store, tickets, pairs, unmatched_tickets,
+                        tolerance_rel=VOLUME_MATCH_REL_TOL, tolerance_abs=VOLUME_MATCH_ABS_TOL):
+    """
+    Reconciliation result of a matcher (batch or incremental). pairs are (event id, ticket
+    position, diff, previous-day flag) in ticket order; matches / mismatches are MATCH_DTYPE
+    arrays that refer to store rows and ticket positions (store and tickets are kept alongside).
+    """
+    records = np.array(pairs, dtype=MATCH_DTYPE) if pairs else np.zeros(0, dtype=MATCH_DTYPE)
+    t_amts = np.fromiter((tickets[i].get("amount_collected", 0) for i in records["ticket"]),
+                         dtype=np.float64, count=len(records))
+    diff = records["volume_delta"]
+    ok = (diff / np.maximum(1.0, t_amts) <= tolerance_rel) | (diff <= tolerance_abs)
+    used = np.zeros(len(store), dtype=bool)
+    used[records["event"]] = True
+    return {
+        "matches": records[ok],
+        "mismatches": records[~ok],
+        "unmatched_events": store.subset(np.flatnonzero(~used)),
+        "unmatched_tickets": unmatched_tickets,
+        "recovered_previous_day": int(records["matched_previous_day"].sum()),
+        "events": store,
+        "tickets": tickets,
+    }
+
+
 def match_events_to_tickets(events, tickets,
                             tolerance_rel=VOLUME_MATCH_REL_TOL,
-                            tolerance_abs=VOLUME_MATCH_ABS_TOL):
-    events_by_cauldron_date = defaultdict(lambda: defaultdict(list))
-    for e in events:
-        e_date = iso_to_dt(e["time_start"]).date()
-        events_by_cauldron_date[e["cauldron_id"]][e_date].append(e)
-
-    matches, mismatches, unmatched_events, unmatched_tickets = [], [], [], []
-    used_events = set()
-    recovered_previous_day = 0
+                            tolerance_abs=VOLUME_MATCH_ABS_TOL,
+                            strategy=MATCH_STRATEGY):
+    """
+    Pair tickets with drain events (an EventStore, or event dicts which are stored
+    first). Matches refer to events and tickets by index; see make_reconciliation.
+    """
+    store = events if isinstance(events, EventStore) else EventStore.from_records(list(events))
+    if strategy == "optimal":
+        return match_events_to_tickets_optimal(store, tickets, tolerance_rel, tolerance_abs)
+    index = EventIndex.from_store(store)
 
-    for t in tickets:
+    pairs, unmatched_tickets = [], []
+    for pos, t in enumerate(tickets):
         cauldron = t.get("cauldron_id")
         t_amt = t.get("amount_collected", 0)
         try:
@@ -129,59 +526,115 @@ def match_events_to_tickets(events, tickets,
         except Exception:
             continue
 
-        candidate_dates = [t_date, t_date - timedelta(days=1)]
-        candidate_events = []
-        matched_previous_day = False
-        for d in candidate_dates:
-            if d == t_date - timedelta(days=1):
-                matched_previous_day = True
-            candidate_events.extend(events_by_cauldron_date[cauldron].get(d, []))
-
-        if not candidate_events:
+        best_ev, best_diff, matched_day = index.best_for_ticket(cauldron, t_amt, t_date)
+        if best_ev is None:
             unmatched_tickets.append(t)
             continue
 
-        best_ev, best_diff, matched_day = None, None, None
-        for ev in candidate_events:
-            if ev["event_id"] in used_events:
-                continue
-            diff = abs(ev["collected_amount"] - t_amt)
-            ev_date = iso_to_dt(ev["time_start"]).date()
-            if best_diff is None or diff < best_diff:
-                best_diff, best_ev, matched_day = diff, ev, ev_date
+        index.use(best_ev)
+        pairs.append((best_ev, pos, best_diff, matched_day == t_date - timedelta(days=1)))
 
-        if best_ev is None:
-            unmatched_tickets.append(t)
+    return make_reconciliation(store, tickets, pairs, unmatched_tickets, tolerance_rel, tolerance_abs)
+
+def _solve_assignment_block(index, cauldron, block, outcome, linear_sum_assignment):
+    """
+    Min-cost assignment of one block of same-cauldron tickets [(t_date, pos, ticket)]
+    to the unused events of their +/-1 day windows. Only (ticket day, ticket day - 1)
+    pairs are allowed; everything else gets a cost larger than any feasible total, so
+    the solver first maximizes the number of matches, then minimizes volume difference.
+    """
+    days = sorted({d for d, _, _ in block} | {d - timedelta(days=1) for d, _, _ in block})
+    evs, ev_amts, ev_days = [], [], []
+    for d in days:
+        bucket = index.buckets.get((cauldron, d))
+        if bucket is None:
             continue
+        for p, eid in enumerate(bucket.ids):
+            if bucket.is_free(p):
+                evs.append(eid)
+                ev_amts.append(bucket.amounts[p])
+                ev_days.append(d.toordinal())
+    if not evs:
+        for _, pos, _ in block:
+            outcome[pos] = None
+        return
+
+    t_days = np.array([d.toordinal() for d, _, _ in block])[:, None]
+    t_amts = np.array([float(t.get("amount_collected", 0)) for _, _, t in block])[:, None]
+    ev_days = np.array(ev_days)[None, :]
+    ev_amts = np.array(ev_amts, dtype=np.float64)[None, :]
+
+    same_day = ev_days == t_days
+    allowed = same_day | (ev_days == t_days - 1)
+    diff = np.abs(ev_amts - t_amts)
+    # ticket-day events win ties, as in the greedy matcher
+    cost = diff + np.where(same_day, 0.0, 1e-9)
+    feasible_max = float(cost[allowed].max()) if allowed.any() else 0.0
+    big = (feasible_max + 1.0) * (min(cost.shape) + 1)
+    cost = np.where(allowed, cost, big)
+
+    rows, cols = linear_sum_assignment(cost)
+    assigned = {}
+    for r, c in zip(rows, cols):
+        if allowed[r, c]:
+            assigned[r] = c
+    for r, (t_date, pos, _) in enumerate(block):
+        c = assigned.get(r)
+        if c is None:
+            outcome[pos] = None
+            continue
+        eid = evs[c]
+        index.use(eid)
+        outcome[pos] = (eid, float(diff[r, c]), not same_day[r, c])
 
-        used_events.add(best_ev["event_id"])
-        rel_diff = best_diff / max(1.0, t_amt)
-        prev_day_flag = (matched_day == t_date - timedelta(days=1))
-        if prev_day_flag:
-            recovered_previous_day += 1
-
-        if (rel_diff <= tolerance_rel) or (best_diff <= tolerance_abs):
-            matches.append({"event": best_ev, "ticket": t,
-                            "volume_delta": best_diff,
-                            "status": "matched",
-                            "matched_previous_day": prev_day_flag})
-        else:
-            mismatches.append({"event": best_ev, "ticket": t,
-                               "volume_delta": best_diff,
-                               "status": "volume_mismatch",
-                               "matched_previous_day": prev_day_flag})
 
-    for e in events:
-        if e["event_id"] not in used_events:
-            unmatched_events.append(e)
+def match_events_to_tickets_optimal(events, tickets,
+                                    tolerance_rel=VOLUME_MATCH_REL_TOL,
+                                    tolerance_abs=VOLUME_MATCH_ABS_TOL,
+                                    max_block=ASSIGNMENT_MAX_BLOCK):
+    """
+    Global alternative to the greedy matcher: per cauldron, tickets and events are
+    paired by a min-cost bipartite assignment on volume difference (same +/-1 day
+    window as greedy), so an early ticket cannot steal a later ticket's better event.
+    Tickets are split into blocks at day gaps (independent sub-problems) and at
+    max_block tickets; events left unused by a block stay available to the next one,
+    which keeps the cost close to linear in the number of tickets.
+    """
+    from scipy.optimize import linear_sum_assignment
 
-    return {
-        "matches": matches,
-        "mismatches": mismatches,
-        "unmatched_events": unmatched_events,
-        "unmatched_tickets": unmatched_tickets,
-        "recovered_previous_day": recovered_previous_day
-    }
+    store = events if isinstance(events, EventStore) else EventStore.from_records(list(events))
+    index = EventIndex.from_store(store)
+    by_cauldron = defaultdict(list)
+    parsed = []
+    for pos, t in enumerate(tickets):
+        try:
+            t_date = iso_to_dt(t["date"]).date()
+        except Exception:
+            continue
+        parsed.append(pos)
+        by_cauldron[t.get("cauldron_id")].append((t_date, pos, t))
+
+    outcome = {}
+    for cauldron, items in by_cauldron.items():
+        items.sort(key=lambda x: (x[0], x[1]))
+        block = []
+        for item in items:
+            if block and (item[0] - block[-1][0] > timedelta(days=1) or len(block) >= max_block):
+                _solve_assignment_block(index, cauldron, block, outcome, linear_sum_assignment)
+                block = []
+            block.append(item)
+        if block:
+            _solve_assignment_block(index, cauldron, block, outcome, linear_sum_assignment)
+
+    pairs, unmatched_tickets = [], []
+    for pos in parsed:
+        if outcome[pos] is None:
+            unmatched_tickets.append(tickets[pos])
+            continue
+        eid, diff, prev_day_flag = outcome[pos]
+        pairs.append((eid, pos, diff, prev_day_flag))
+
+    return make_reconciliation(store, tickets, pairs, unmatched_tickets, tolerance_rel, tolerance_abs)
 
 # -------- Overflow Forecast --------
 def time_to_overflow(current_level, max_volume, fill_rate_per_min):
@@ -191,39 +644,60 @@ def time_to_overflow(current_level, max_volume, fill_rate_per_min):
     return 0.0 if remaining <= 0 else remaining / fill_rate_per_min
 
 # -------- Main processing --------
-def process_all(api_fetch=True, data_json=None, tickets_json=None, cauldron_info_json=None):
-    if api_fetch:
-        data_raw = fetch_json(DATA_ENDPOINT)
-        tickets_raw = fetch_json(TICKETS_ENDPOINT)
-        cauldron_info = fetch_json(CAULDRON_INFO_ENDPOINT)
+def process_all(api_fetch=True, data_json=None, tickets_json=None, cauldron_info_json=None,
+                drain_engine=DRAIN_ENGINE, fill_rate_window_hours=FILL_RATE_WINDOW_HOURS,
+                match_strategy=MATCH_STRATEGY, workers=PROCESS_WORKERS,
+                snapshot=None, start=None, end=None, progress=None, telemetry=None):
+    """
+    Full audit pass. Inputs come from the API (api_fetch=True), from the given JSON
+    payloads, or - with api_fetch=False and snapshot=<SnapshotStore or directory> -
+    from the local snapshot store, reading only the UTC days in [start, end].
+    telemetry, if given, is already-ingested columnar telemetry (ingest_telemetry shape)
+    used instead of /api/Data; tickets and cauldron info then come from the JSON arguments.
+    progress(stage, payload), if given, is called with partial results: "cauldron"
+    after each cauldron's drains are detected, "reconciliation" once tickets are matched.
+    """
+    if telemetry is not None:
+        tickets_raw = tickets_json or {"transport_tickets": []}
+        cauldron_info = cauldron_info_json or []
+    elif api_fetch:
+        data_raw, tickets_raw, cauldron_info = eog_client.fetch_all(
+            DATA_ENDPOINT, TICKETS_ENDPOINT, CAULDRON_INFO_ENDPOINT)
+    elif snapshot is not None and data_json is None:
+        from snapshot_store import SnapshotStore, tickets_in_range
+        store = snapshot if isinstance(snapshot, SnapshotStore) else SnapshotStore(snapshot)
+        telemetry = store.load_telemetry(start, end)
+        tickets_raw = tickets_in_range(tickets_json or store.read_doc("tickets") or [], start, end)
+        cauldron_info = cauldron_info_json or store.read_doc("cauldrons") or []
     else:
         data_raw = data_json or []
         tickets_raw = tickets_json or {"transport_tickets": []}
         cauldron_info = cauldron_info_json or []
 
-    # organize cauldron time-series
-    cauldron_records = defaultdict(list)
-    for rec in data_raw:
-        try:
-            dt = iso_to_dt(rec["timestamp"])
-        except Exception:
-            continue
-        for cid, level in rec.get("cauldron_levels", {}).items():
-            try:
-                val = float(level)
-            except Exception:
-                continue
-            cauldron_records[cid].append((dt, val))
-    for k in cauldron_records:
-        cauldron_records[k].sort(key=lambda x: x[0])
+    if telemetry is None:
+        with span("ingestion", items=len(data_raw)):
+            telemetry = ingest_telemetry(data_raw)
+    cauldron_ids = telemetry["cauldron_ids"]
+
+    if workers and workers > 1 and len(cauldron_ids) > 1:
+        from parallel_audit import analyze_cauldrons_parallel
+        with span("analysis", items=len(cauldron_ids)):   # fill rate + drains in worker processes
+            analyses = analyze_cauldrons_parallel(telemetry, workers, fill_rate_window_hours, drain_engine)
+    else:
+        analyses = (analyze_cauldron(*cauldron_series(telemetry, col), fill_rate_window_hours, drain_engine)
+                    for col in range(len(cauldron_ids)))
 
-    fill_rates, events = {}, []
+    fill_rates, events = {}, EventStore()
     total_fill_rates = []
     total_drain_rates = []
+    last_readings = {}
 
-    # --- Compute fill and drain per cauldron ---
-    for cid, recs in cauldron_records.items():
-        if len(recs) < 2:
+    # --- Compute fill and drain per cauldron (merged in column order) ---
+    for col, (cid, analysis) in enumerate(zip(cauldron_ids, analyses)):
+        if analysis["n_readings"] == 0:
+            continue
+        last_readings[cid] = analysis["last_level"]
+        if analysis["n_readings"] < 2:
             fill_rates[cid] = {
                 "fill_rate_per_min": 0.0,
                 "drain_rate_per_min": 0.0,
@@ -231,34 +705,33 @@ def process_all(api_fetch=True, data_json=None, tickets_json=None, cauldron_info
             }
             continue
 
-        rate, stats = estimate_fill_rate_for_cauldron(recs)
-        fill_rates[cid] = {"fill_rate_per_min": rate, **stats}
+        rate = analysis["rate"]
+        fill_rates[cid] = {"fill_rate_per_min": rate, **analysis["stats"]}
         total_fill_rates.append(rate)
 
-        # detect drains and compute per-cauldron drain rate
-        drain_events = detect_drain_events(recs, cid, rate)
-        events.extend(drain_events)
-
-        drain_rates = []
-        for e in drain_events:
-            dur = e["duration_min"]
-            if dur > 0:
-                drain_rates.append(e["collected_amount"] / dur)
-                total_drain_rates.append(e["collected_amount"] / dur)
-
-        avg_drain_rate = sum(drain_rates) / len(drain_rates) if drain_rates else 0.0
+        # store drains (detected, with their rates, by analyze_cauldron)
+        ids = events.append_chunk(cid, analysis["drains"])
+        total_drain_rates.extend(analysis["drain_rates"])
+        avg_drain_rate = analysis["drain_rate"]
         fill_rates[cid]["drain_rate_per_min"] = avg_drain_rate
+        if progress is not None:
+            progress("cauldron", {"cauldron_id": cid, "done": col + 1, "total": len(cauldron_ids),
+                                  "fill_rate_per_min": rate, "drain_rate_per_min": avg_drain_rate,
+                                  "events": events.records(ids)})
 
     avg_fill_rate = sum(total_fill_rates) / len(total_fill_rates) if total_fill_rates else 0.0
     avg_drain_rate = sum(total_drain_rates) / len(total_drain_rates) if total_drain_rates else 0.0
 
     ticket_list = tickets_raw.get("transport_tickets", []) if isinstance(tickets_raw, dict) else tickets_raw
-    reconciliation = match_events_to_tickets(events, ticket_list)
+    with span("matching", items=len(ticket_list)):
+        reconciliation = match_events_to_tickets(events, ticket_list, strategy=match_strategy)
+    if progress is not None:
+        progress("reconciliation", {k: len(reconciliation[k]) for k in
+                                    ("matches", "mismatches", "unmatched_events", "unmatched_tickets")})
 
     cauldron_max = {c["id"]: c.get("max_volume") for c in cauldron_info}
     forecasts = {}
-    for cid, recs in cauldron_records.items():
-        last_dt, last_lvl = recs[-1]
+    for cid, last_lvl in last_readings.items():
         max_vol = cauldron_max.get(cid)
         rate = fill_rates[cid]["fill_rate_per_min"]
         forecasts[cid] = {
@@ -275,43 +748,99 @@ def process_all(api_fetch=True, data_json=None, tickets_json=None, cauldron_info
         "average_drain_rate_per_min": avg_drain_rate,
         "events": events,
         "reconciliation": reconciliation,
-        "forecasts": forecasts
+        "forecasts": forecasts,
+        "telemetry": telemetry
     }
 
 
 
 # -------- Auditing --------
-def audit_daily_potion_losses(result):
-    recon = result["reconciliation"]
-    unlogged = recon["unmatched_events"]
-    mismatches = recon["mismatches"]
+DISCREPANCY_TYPES = np.array(["Over-reported", "Under-reported", "Unlogged Drain"])  # code order = name order
+OVER_REPORTED, UNDER_REPORTED, UNLOGGED_DRAIN = range(3)
+
+
+def epoch_days_to_iso(days):
+    return np.datetime_as_string(np.asarray(days, dtype=np.int64).astype("datetime64[D]")).astype(object)
 
-    audit_rows = []
-    for e in unlogged:
-        d = iso_to_dt(e["time_start"]).date().isoformat()
-        audit_rows.append({
-            "date": d, "cauldron_id": e["cauldron_id"],
-            "type": "Unlogged Drain", "volume": e["collected_amount"]
-        })
-    for m in mismatches:
-        t, e = m["ticket"], m["event"]
-        d = iso_to_dt(e["time_start"]).date().isoformat()
-        diff = t["amount_collected"] - e["collected_amount"]
-        discrepancy = "Over-reported" if diff > 0 else "Under-reported"
-        audit_rows.append({
-            "date": d, "cauldron_id": t["cauldron_id"],
-            "type": discrepancy, "volume": abs(diff)
-        })
 
-    if not audit_rows:
+def discrepancy_columns(recon):
+    """
+    Unlogged drains (first) and mismatched tickets of a reconciliation as columnar
+    arrays: cauldron codes into cauldron_ids (sorted), drain epoch day, discrepancy type
+    code (see DISCREPANCY_TYPES) and volume, plus the mismatch-only ticket columns.
+    Read straight from the event store the reconciliation refers to.
+    """
+    mismatches, store = recon["mismatches"], recon["events"]
+    tickets = [recon["tickets"][i] for i in mismatches["ticket"].tolist()]
+    event_ids = np.concatenate([recon["unmatched_events"].ids, mismatches["event"]])
+    n_u = len(recon["unmatched_events"])
+    cauldrons = store.cauldrons(event_ids)
+    day = store.days(event_ids)
+    amount = store.array["collected_amount"][event_ids]
+    abs_difference = mismatches["volume_delta"]
+    matched_previous_day = mismatches["matched_previous_day"]
+
+    n_m = len(tickets)
+    ticket_volume = np.fromiter((t["amount_collected"] for t in tickets), dtype=np.float64, count=n_m)
+    detected_volume = amount[n_u:]
+    difference = ticket_volume - detected_volume
+    codes, cauldron_ids = pd.factorize(cauldrons, sort=True)
+    return {
+        "n_unlogged": n_u,
+        "cauldron_ids": np.asarray(cauldron_ids, dtype=object),
+        "cauldron": codes.astype(np.int64),
+        "day": day,
+        "type": np.concatenate([np.full(n_u, UNLOGGED_DRAIN, dtype=np.int64),
+                                np.where(difference > 0, OVER_REPORTED, UNDER_REPORTED)]),
+        "volume": np.concatenate([amount[:n_u], np.abs(difference)]),
+        # mismatched tickets only
+        "ticket_id": [t["ticket_id"] for t in tickets],
+        "courier_id": [t["courier_id"] for t in tickets],
+        "ticket_volume": ticket_volume,
+        "detected_volume": detected_volume,
+        "difference": difference,
+        "abs_difference": np.asarray(abs_difference, dtype=np.float64),
+        "matched_previous_day": np.asarray(matched_previous_day, dtype=bool),
+    }
+
+
+def audit_daily_potion_losses(result, columns=None):
+    """Discrepancy volume per (date, cauldron, type), from one sort + bincount over the columns."""
+    cols = columns if columns is not None else discrepancy_columns(result["reconciliation"])
+    if not len(cols["volume"]):
         return pd.DataFrame([])
 
-    df = pd.DataFrame(audit_rows)
-    summary = df.groupby(["date", "cauldron_id", "type"])["volume"].sum().reset_index()
-    return summary
+    n_cauldrons, n_types = len(cols["cauldron_ids"]), len(DISCREPANCY_TYPES)
+    key = (cols["day"] * n_cauldrons + cols["cauldron"]) * n_types + cols["type"]
+    groups, inverse = np.unique(key, return_inverse=True)
+    volume = np.bincount(inverse, weights=cols["volume"], minlength=len(groups))
+    day_cauldron, type_code = np.divmod(groups, n_types)
+    day, cauldron = np.divmod(day_cauldron, n_cauldrons)
+    return pd.DataFrame({
+        "date": epoch_days_to_iso(day),
+        "cauldron_id": cols["cauldron_ids"][cauldron],
+        "type": DISCREPANCY_TYPES[type_code].astype(object),
+        "volume": volume,
+    })
 
 # -------- Reporting --------
-def summarize_discrepancies(result):
+def _mismatched_tickets_frame(cols):
+    m = slice(cols["n_unlogged"], None)
+    return pd.DataFrame({
+        "ticket_id": cols["ticket_id"],
+        "cauldron_id": cols["cauldron_ids"][cols["cauldron"][m]],
+        "date": epoch_days_to_iso(cols["day"][m]),
+        "courier_id": cols["courier_id"],
+        "ticket_volume": cols["ticket_volume"],
+        "detected_volume": cols["detected_volume"],
+        "difference": cols["difference"],
+        "abs_difference": cols["abs_difference"],
+        "matched_previous_day": cols["matched_previous_day"],
+        "direction": DISCREPANCY_TYPES[cols["type"][m]].astype(object),
+    })
+
+
+def summarize_discrepancies(result, columns=None):
     recon = result["reconciliation"]
     mismatches = recon["mismatches"]
     unlogged = recon["unmatched_events"]
@@ -324,35 +853,34 @@ def summarize_discrepancies(result):
     print(f"Recovered {recovered} ghost tickets via previous-day match")
     print("=" * 40)
 
-    if mismatches:
-        df = pd.DataFrame([
-            {
-                "ticket_id": m["ticket"]["ticket_id"],
-                "cauldron_id": m["ticket"]["cauldron_id"],
-                "courier_id": m["ticket"]["courier_id"],
-                "ticket_volume": m["ticket"]["amount_collected"],
-                "detected_volume": m["event"]["collected_amount"],
-                "difference": m["ticket"]["amount_collected"] - m["event"]["collected_amount"],
-                "abs_difference": m["volume_delta"],
-                "matched_previous_day": m["matched_previous_day"]
-            } for m in mismatches
-        ])
-        df["direction"] = df["difference"].apply(lambda x: "Over-reported" if x > 0 else "Under-reported")
+    if len(mismatches):
+        df = result.get("mismatched_tickets")     # kept up to date by the incremental reconciler
+        if df is None:
+            df = _mismatched_tickets_frame(columns if columns is not None else discrepancy_columns(recon))
         print("\nMismatched Tickets Summary:")
         print(df.groupby("direction")["difference"].agg(["count", "mean", "sum"]))
         return df
     return pd.DataFrame([])
 
 # -------- Runner --------
-def run_reconciliation():
-    result = process_all(api_fetch=True)
+def run_reconciliation(incremental=False, progress=None):
+    if incremental:
+        # stateful mode: only telemetry/tickets newer than the last call are processed
+        from incremental_audit import get_reconciler
+        result = get_reconciler().update(api_fetch=True)
+    else:
+        result = process_all(api_fetch=True, progress=progress)
     print("\nDetected drain events:", len(result["events"]))
     recon = result["reconciliation"]
     print(f"Matches: {len(recon['matches'])}, Mismatches: {len(recon['mismatches'])}, "
           f"Unlogged drains: {len(recon['unmatched_events'])}, Ghost tickets: {len(recon['unmatched_tickets'])}")
     print(f"Average fill rate across cauldrons: {result['average_fill_rate_per_min']:.6f} units/min")
-    mismatch_df = summarize_discrepancies(result)
-    audit_df = audit_daily_potion_losses(result)
+    with span("audit_aggregation") as sp:
+        # the incremental reconciler hands both tables back already aggregated
+        columns = None if "daily_audit" in result else discrepancy_columns(recon)
+        mismatch_df = summarize_discrepancies(result, columns)
+        audit_df = result["daily_audit"] if columns is None else audit_daily_potion_losses(result, columns)
+        sp.add(len(mismatch_df) + len(audit_df))
     result["mismatched_tickets"] = mismatch_df
     result["daily_audit"] = audit_df
     return result